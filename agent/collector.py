@@ -5,56 +5,226 @@ Recopila información del sistema utilizando las bibliotecas psutil, platform y
 """
 
 import os
+import time
 import psutil
 import platform
 import socket
 import datetime
-from typing import Dict, List, Any
+import threading
+from concurrent.futures import Executor
+from typing import Callable, Dict, Iterable, List, Any, Optional
 
 
-def get_cpu_info() -> Dict[str, Any]:
+class CPUSampler:
+    """
+    Muestreador de uso de CPU sin bloqueo.
+    
+    Usa psutil.cpu_percent(interval=None), que mide desde la llamada anterior: el
+    estado de psutil se conserva entre recolecciones, por lo que cada lectura
+    cubre el intervalo desde la última y devuelve casi al instante. El promedio
+    se calcula a partir de la misma medición por núcleo, así ambos valores coinciden.
+    
+    En modo de fondo (`start`), un hilo mide cada `period` segundos y `read`
+    devuelve además el mínimo, máximo y promedio del uso en la ventana desde la
+    lectura anterior. En ese modo el hilo es el único que llama a psutil.
+    """
+    
+    def __init__(self, prime_interval: float = 0.1):
+        """
+        Inicializa el muestreador.
+        
+        Args:
+            prime_interval: Espera de la primera medición, ya que psutil devuelve
+                ceros en la primera llamada sin intervalo
+        """
+        self.prime_interval = prime_interval
+        self._primed = False
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last: List[float] = []
+        self._window: List[float] = []
+        self._window_started = time.monotonic()
+    
+    def _measure(self) -> List[float]:
+        """Mide el uso por núcleo desde la medición anterior."""
+        if not self._primed:
+            psutil.cpu_percent(interval=None, percpu=True)
+            time.sleep(self.prime_interval)
+            self._primed = True
+        return psutil.cpu_percent(interval=None, percpu=True)
+    
+    @staticmethod
+    def _average(per_core: List[float]) -> float:
+        """Promedio de los núcleos redondeado a un decimal."""
+        return round(sum(per_core) / len(per_core), 1) if per_core else 0.0
+    
+    @property
+    def running(self) -> bool:
+        """Indica si el muestreo de fondo está activo."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, period: float = 1.0) -> None:
+        """
+        Inicia el muestreo de fondo.
+        
+        Args:
+            period: Segundos entre mediciones
+        """
+        if self.running:
+            return
+        with self._lock:
+            self._last = self._measure()
+            self._window = [self._average(self._last)]
+            self._window_started = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(period,), name='cpu-sampler', daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Detiene el muestreo de fondo."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self, period: float) -> None:
+        """Bucle del hilo de muestreo."""
+        while not self._stop.wait(period):
+            per_core = self._measure()
+            with self._lock:
+                self._last = per_core
+                self._window.append(self._average(per_core))
+    
+    def read(self) -> Dict[str, Any]:
+        """
+        Devuelve el uso actual por núcleo y su promedio.
+        
+        Returns:
+            Diccionario con usage_percent y avg_usage; en modo de fondo incluye
+            además usage_window (min, max, avg, samples, seconds) de la ventana
+            transcurrida desde la lectura anterior.
+        """
+        if not self.running:
+            per_core = self._measure()
+            return {"usage_percent": per_core, "avg_usage": self._average(per_core)}
+        
+        with self._lock:
+            per_core = list(self._last)
+            window = self._window or [self._average(per_core)]
+            now = time.monotonic()
+            seconds = now - self._window_started
+            self._window = []
+            self._window_started = now
+        
+        return {
+            "usage_percent": per_core,
+            "avg_usage": self._average(per_core),
+            "usage_window": {
+                "min": min(window),
+                "max": max(window),
+                "avg": round(sum(window) / len(window), 1),
+                "samples": len(window),
+                "seconds": round(seconds, 1)
+            }
+        }
+
+
+# Muestreador compartido por las recolecciones del proceso
+cpu_sampler = CPUSampler()
+
+
+def get_cpu_model() -> str:
+    """
+    Obtiene el modelo de la CPU (depende del sistema).
+    
+    Returns:
+        Nombre del modelo o "Unknown" si no puede determinarse.
+    """
+    if platform.system() == "Linux":
+        try:
+            with open("/proc/cpuinfo", "r") as f:
+                for line in f:
+                    if "model name" in line:
+                        return line.split(":")[1].strip()
+        except:
+            pass
+        return "Unknown"
+    return platform.processor()
+
+
+def get_cpu_info(sampler: Optional[CPUSampler] = None) -> Dict[str, Any]:
     """
     Recopila información de la CPU.
     
+    Args:
+        sampler: Muestreador a utilizar (predeterminado: el compartido del módulo)
+    
     Returns:
         Diccionario con detalles de la CPU incluyendo conteo, porcentaje de uso e información del modelo.
     """
     cpu_info = {
         "physical_cores": psutil.cpu_count(logical=False),
         "logical_cores": psutil.cpu_count(logical=True),
-        "usage_percent": psutil.cpu_percent(interval=1, percpu=True),
-        "avg_usage": psutil.cpu_percent(interval=1),
     }
+    # Uso por núcleo y promedio de una misma medición, sin bloquear la recolección
+    cpu_info.update((sampler or cpu_sampler).read())
     
     # Añadir información del modelo de CPU si está disponible (depende del sistema)
-    if platform.system() == "Linux":
-        try:
-            with open("/proc/cpuinfo", "r") as f:
-                for line in f:
-                    if "model name" in line:
-                        cpu_info["model"] = line.split(":")[1].strip()
-                        break
-        except:
-            cpu_info["model"] = "Unknown"
-    elif platform.system() == "Windows":
-        cpu_info["model"] = platform.processor()
-    else:
-        cpu_info["model"] = platform.processor()
+    cpu_info["model"] = get_cpu_model()
         
     return cpu_info
 
 
-def get_process_list() -> List[Dict[str, Any]]:
+# Atributos de proceso que se reportan; solo estos se leen del sistema
+PROCESS_ATTRS = ['pid', 'name', 'username', 'memory_percent', 'cpu_percent']
+
+
+class ProcessCollector:
     """
-    Obtiene la lista de procesos en ejecución.
+    Enumerador de procesos de bajo costo.
     
-    Returns:
-        Lista de diccionarios con detalles de los procesos.
+    Lee solo los atributos de PROCESS_ATTRS (as_dict(attrs=...) los obtiene dentro
+    de un oneshot) y conserva los objetos psutil.Process entre recolecciones: así
+    cpu_percent mide el uso real desde la recolección anterior en lugar de
+    devolver siempre 0. Un PID reutilizado por otro proceso se detecta con
+    is_running(), que compara el instante de creación.
     """
-    processes = []
-    for proc in psutil.process_iter(['pid', 'name', 'username', 'memory_percent', 'cpu_percent']):
-        try:
-            pinfo = proc.as_dict()
+    
+    def __init__(self, attrs: Optional[List[str]] = None):
+        """
+        Inicializa el recolector.
+        
+        Args:
+            attrs: Atributos a leer de cada proceso (predeterminado: PROCESS_ATTRS)
+        """
+        self.attrs = attrs or PROCESS_ATTRS
+        self._processes: Dict[int, psutil.Process] = {}
+        self.last_stats: Dict[str, Any] = {}
+    
+    def collect(self) -> List[Dict[str, Any]]:
+        """
+        Obtiene la lista de procesos en ejecución.
+        
+        Returns:
+            Lista de diccionarios con detalles de los procesos. El costo de la
+            recolección queda en `last_stats` (procesos, nuevos y milisegundos).
+        """
+        started = time.perf_counter()
+        processes = []
+        cache: Dict[int, psutil.Process] = {}
+        new = 0
+        for pid in psutil.pids():
+            try:
+                proc = self._processes.get(pid)
+                if proc is None or not proc.is_running():
+                    proc = psutil.Process(pid)
+                    new += 1
+                pinfo = proc.as_dict(attrs=self.attrs)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                continue
+            cache[pid] = proc
+            
             # Manejar valores que podrían ser None
             memory_percent = pinfo.get('memory_percent')
             memory_percent = round(memory_percent, 2) if memory_percent is not None else 0
@@ -69,9 +239,29 @@ def get_process_list() -> List[Dict[str, Any]]:
                 "memory_percent": memory_percent,
                 "cpu_percent": cpu_percent
             })
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return processes
+        
+        # Los procesos terminados salen de la caché
+        self._processes = cache
+        self.last_stats = {
+            "processes": len(processes),
+            "new_processes": new,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+        return processes
+
+
+# Recolector de procesos compartido por las recolecciones del proceso
+process_collector = ProcessCollector()
+
+
+def get_process_list() -> List[Dict[str, Any]]:
+    """
+    Obtiene la lista de procesos en ejecución.
+    
+    Returns:
+        Lista de diccionarios con detalles de los procesos.
+    """
+    return process_collector.collect()
 
 
 def get_logged_users() -> List[Dict[str, str]]:
@@ -126,19 +316,22 @@ def get_os_info() -> Dict[str, str]:
     return os_info
 
 
-def collect_all() -> Dict[str, Any]:
+def get_ip_address(hostname: str) -> str:
     """
-    Recopila toda la información del sistema.
+    Obtiene la dirección IP principal del host.
+    
+    Args:
+        hostname: Nombre del host
     
     Returns:
-        Diccionario con toda la información recopilada.
+        Dirección IP de la interfaz con ruta hacia el exterior, o la que resuelve el hostname.
     """
-    hostname = socket.gethostname()
     ip_address = socket.gethostbyname(hostname)
     
     # Para máquinas con múltiples interfaces de red, intentar obtener una IP más precisa
     try:
         # Crear una conexión de socket a un servidor externo y obtener la IP local
+        # (con UDP, connect no envía paquetes: solo elige la interfaz de salida)
         temp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         temp_socket.connect(("8.8.8.8", 80))
         ip_address = temp_socket.getsockname()[0]
@@ -146,17 +339,179 @@ def collect_all() -> Dict[str, Any]:
     except:
         pass
     
+    return ip_address
+
+
+class HostFacts:
+    """
+    Caché de los datos invariables del host: hostname, IP, núcleos y modelo de CPU
+    e información del sistema operativo.
+    
+    Los datos se recalculan cuando vence `ttl`, cuando el host se reinició (cambia
+    psutil.boot_time()) o cuando cambian el hostname o la IP, que se comprueban
+    cada `ip_check_interval` segundos. `generation` aumenta cada vez que los datos
+    cambian, lo que permite enviarlos solo cuando son nuevos.
+    """
+    
+    def __init__(self, ttl: float = 3600.0, ip_check_interval: float = 60.0):
+        """
+        Inicializa la caché.
+        
+        Args:
+            ttl: Segundos tras los que los datos se recalculan aunque no haya cambios
+            ip_check_interval: Segundos entre comprobaciones del hostname y la IP
+        """
+        self.ttl = ttl
+        self.ip_check_interval = ip_check_interval
+        self.generation = 0
+        # Generación incluida en el último snapshot enviado con éxito
+        self.sent_generation: Optional[int] = None
+        self._facts: Optional[Dict[str, Any]] = None
+        self._boot_time: Optional[float] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _load() -> Dict[str, Any]:
+        """Calcula todos los datos invariables."""
+        hostname = socket.gethostname()
+        return {
+            "hostname": hostname,
+            "ip_address": get_ip_address(hostname),
+            "cpu_info": {
+                "physical_cores": psutil.cpu_count(logical=False),
+                "logical_cores": psutil.cpu_count(logical=True),
+                "model": get_cpu_model()
+            },
+            "os_info": get_os_info()
+        }
+    
+    def _is_stale(self, now: float, boot_time: float) -> bool:
+        """Indica si los datos en caché deben recalcularse."""
+        if self._facts is None or boot_time != self._boot_time or now - self._loaded_at >= self.ttl:
+            return True
+        if now - self._checked_at >= self.ip_check_interval:
+            self._checked_at = now
+            hostname = socket.gethostname()
+            return hostname != self._facts["hostname"] or get_ip_address(hostname) != self._facts["ip_address"]
+        return False
+    
+    def get(self) -> Dict[str, Any]:
+        """
+        Devuelve los datos invariables, recalculándolos si corresponde.
+        
+        Returns:
+            Diccionario con hostname, ip_address, cpu_info y os_info (no debe modificarse)
+        """
+        with self._lock:
+            now = time.monotonic()
+            boot_time = psutil.boot_time()
+            if self._is_stale(now, boot_time):
+                facts = self._load()
+                if facts != self._facts:
+                    self.generation += 1
+                self._facts = facts
+                self._boot_time = boot_time
+                self._loaded_at = self._checked_at = now
+            return self._facts
+    
+    def invalidate(self) -> None:
+        """Fuerza a recalcular los datos en la próxima lectura."""
+        with self._lock:
+            self._facts = None
+    
+    def mark_sent(self) -> None:
+        """Registra que la generación actual ya llegó al servidor."""
+        self.sent_generation = self.generation
+
+
+# Datos invariables compartidos por las recolecciones del proceso
+host_facts = HostFacts()
+
+
+# Duración en milisegundos de cada recolector en la última llamada a collect_all
+last_timings: Dict[str, float] = {}
+
+
+def _timed(timings: Dict[str, float], name: str, collector: Callable[[], Any]) -> Any:
+    """Ejecuta un recolector registrando su duración en `timings`."""
+    start = time.perf_counter()
+    try:
+        return collector()
+    finally:
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def collect_all(static_facts: str = "always", facts: Optional[HostFacts] = None,
+                executor: Optional[Executor] = None,
+                groups: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Recopila toda la información del sistema.
+    
+    Los datos invariables (hostname, IP, núcleos y modelo de CPU, sistema operativo)
+    salen de la caché HostFacts, por lo que una recolección estable solo mide CPU,
+    procesos y usuarios.
+    
+    Args:
+        static_facts: "always" incluye siempre os_info y los datos fijos de la CPU;
+            "on-change" solo si cambiaron desde el último snapshot enviado
+            (ver HostFacts.mark_sent)
+        facts: Caché a utilizar (predeterminado: la compartida del módulo)
+        executor: Pool de hilos en el que ejecutar los recolectores a la vez
+            (predeterminado: uno tras otro en el hilo actual)
+        groups: Grupos a recolectar ("facts", "cpu", "processes", "users"); el
+            snapshot solo incluye sus campos, además del hostname, la IP y el
+            timestamp (predeterminado: todos)
+    
+    Returns:
+        Diccionario con toda la información recopilada.
+    """
+    facts = facts or host_facts
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    timings: Dict[str, float] = {}
+    collectors = {
+        "facts": facts.get,
+        "cpu": cpu_sampler.read,
+        "processes": get_process_list,
+        "users": get_logged_users
+    }
+    if groups is not None:
+        # Los datos fijos salen de la caché y siempre hacen falta para identificar al host
+        selected = set(groups) | {"facts"}
+        collectors = {name: collector for name, collector in collectors.items() if name in selected}
+    if executor is None:
+        results = {name: _timed(timings, name, collector) for name, collector in collectors.items()}
+    else:
+        futures = {name: executor.submit(_timed, timings, name, collector) for name, collector in collectors.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    last_timings.clear()
+    last_timings.update(timings)
+    
+    static = results["facts"]
+    if groups is None or "facts" in groups:
+        include_static = static_facts == "always" or facts.generation != facts.sent_generation
+    else:
+        # Fuera de su turno, los datos fijos solo viajan si cambiaron
+        include_static = facts.generation != facts.sent_generation
     
-    system_info = {
-        "hostname": hostname,
-        "ip_address": ip_address,
-        "timestamp": timestamp,
-        "cpu_info": get_cpu_info(),
-        "processes": get_process_list(),
-        "logged_users": get_logged_users(),
-        "os_info": get_os_info()
+    system_info: Dict[str, Any] = {
+        "hostname": static["hostname"],
+        "ip_address": static["ip_address"],
+        "timestamp": timestamp
     }
+    if include_static or "cpu" in results:
+        cpu_info: Dict[str, Any] = {}
+        if include_static:
+            cpu_info.update(static["cpu_info"])
+        cpu_info.update(results.get("cpu", {}))
+        system_info["cpu_info"] = cpu_info
+    if "processes" in results:
+        system_info["processes"] = results["processes"]
+    if "users" in results:
+        system_info["logged_users"] = results["users"]
+    if include_static:
+        system_info["os_info"] = dict(static["os_info"])
     
     return system_info
 
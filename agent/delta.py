@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Módulo de codificación delta para el agente de Prex Challenge.
+Define el protocolo con el que el agente envía un snapshot completo (keyframe)
+seguido de diferencias contra el último snapshot confirmado por el servidor.
+El servidor usa apply_delta para reconstruir cada snapshot.
+
+Formato de un mensaje delta:
+
+    {
+        "hostname": ..., "ip_address": ..., "timestamp": ...,
+        "delta": {"session": "<id>", "seq": 8, "base": 7},
+        "set": {"cpu_info": {...}},
+        "unset": ["os_info"],
+        "processes": {"changed": [{"pid": 10, "cpu_percent": 3.5}, {...proceso nuevo...}],
+                      "removed": [42]}
+    }
+
+Un keyframe es el snapshot completo con "delta": {"session", "seq", "keyframe": true}.
+"""
+
+import uuid
+import copy
+from typing import Dict, List, Any, Optional
+
+
+# Clave que identifica un mensaje del protocolo delta
+DELTA_KEY = 'delta'
+
+# Campos que viajan completos en cada mensaje (el servidor los exige en /upload)
+IDENTITY_FIELDS = ('hostname', 'ip_address', 'timestamp')
+
+
+def _processes_by_pid(processes: List[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+    """Indexa la lista de procesos por PID."""
+    return {process.get('pid'): process for process in processes}
+
+
+def make_delta(base: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Calcula las diferencias entre dos snapshots.
+
+    Las claves de primer nivel que cambian viajan completas en "set"; los procesos
+    se comparan por PID y de cada proceso existente solo viajan los campos que cambiaron.
+
+    Args:
+        base: Snapshot confirmado por el servidor
+        current: Snapshot nuevo
+
+    Returns:
+        Diccionario con "set", "unset" y "processes"
+    """
+    changed_keys = {
+        key: value for key, value in current.items()
+        if key != 'processes' and key not in IDENTITY_FIELDS and base.get(key) != value
+    }
+    removed_keys = [key for key in base if key not in current and key not in IDENTITY_FIELDS]
+
+    base_processes = _processes_by_pid(base.get('processes', []))
+    changed = []
+    current_pids = set()
+    for process in current.get('processes', []):
+        pid = process.get('pid')
+        current_pids.add(pid)
+        previous = base_processes.get(pid)
+        if previous is None:
+            changed.append(process)
+            continue
+        fields = {field: value for field, value in process.items() if previous.get(field) != value}
+        if fields:
+            fields['pid'] = pid
+            changed.append(fields)
+    removed = [pid for pid in base_processes if pid not in current_pids]
+
+    return {
+        "set": changed_keys,
+        "unset": removed_keys,
+        "processes": {"changed": changed, "removed": removed}
+    }
+
+
+def apply_delta(base: Dict[str, Any], message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reconstruye un snapshot a partir de la base y un mensaje delta, sin modificar la base.
+
+    Los procesos del snapshot reconstruido quedan ordenados por PID, el mismo orden
+    en que los enumera el recolector.
+
+    Args:
+        base: Snapshot base (el último confirmado)
+        message: Mensaje delta
+
+    Returns:
+        Snapshot completo
+    """
+    snapshot = {key: value for key, value in base.items() if key not in message.get('unset', [])}
+    for field in IDENTITY_FIELDS:
+        if field in message:
+            snapshot[field] = message[field]
+    snapshot.update(copy.deepcopy(message.get('set', {})))
+
+    changes = message.get('processes', {})
+    processes = {pid: dict(process) for pid, process in _processes_by_pid(base.get('processes', [])).items()}
+    for pid in changes.get('removed', []):
+        processes.pop(pid, None)
+    for fields in changes.get('changed', []):
+        pid = fields.get('pid')
+        if pid in processes:
+            processes[pid].update(fields)
+        else:
+            processes[pid] = dict(fields)
+    if processes or 'processes' in base:
+        snapshot['processes'] = [processes[pid] for pid in sorted(processes, key=lambda pid: (pid is None, pid))]
+
+    return snapshot
+
+
+def strip_delta(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Devuelve un keyframe sin la clave del protocolo, tal como se almacena."""
+    return {key: value for key, value in message.items() if key != DELTA_KEY}
+
+
+class DeltaEncoder:
+    """
+    Codificador del lado del agente.
+
+    Mantiene el último snapshot confirmado por el servidor. `encode` genera un
+    keyframe al comienzo de la sesión, tras `reset` (el servidor perdió la base) y
+    cada `keyframe_interval` mensajes; en otro caso, un delta contra la base. Solo
+    `acknowledge` avanza la base, de modo que un envío fallido nunca la desincroniza.
+    """
+
+    def __init__(self, keyframe_interval: int = 60):
+        """
+        Inicializa el codificador.
+
+        Args:
+            keyframe_interval: Mensajes entre keyframes forzados (acota el costo de una resincronización)
+        """
+        self.keyframe_interval = keyframe_interval
+        self.session = uuid.uuid4().hex
+        self.seq = 0
+        self._base: Optional[Dict[str, Any]] = None
+        self._base_seq = 0
+        self._since_keyframe = 0
+        self._pending: Optional[Dict[str, Any]] = None
+        self._pending_seq = 0
+        self._pending_keyframe = False
+
+    def encode(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Codifica un snapshot como keyframe o como delta.
+
+        Args:
+            snapshot: Snapshot completo recopilado
+
+        Returns:
+            Mensaje a enviar a /upload
+        """
+        self.seq += 1
+        keyframe = self._base is None or self._since_keyframe >= self.keyframe_interval
+        self._pending = snapshot
+        self._pending_seq = self.seq
+        self._pending_keyframe = keyframe
+
+        if keyframe:
+            message = dict(snapshot)
+            message[DELTA_KEY] = {"session": self.session, "seq": self.seq, "keyframe": True}
+            return message
+
+        message = {field: snapshot[field] for field in IDENTITY_FIELDS if field in snapshot}
+        message[DELTA_KEY] = {"session": self.session, "seq": self.seq, "base": self._base_seq}
+        message.update(make_delta(self._base, snapshot))
+        return message
+
+    def acknowledge(self) -> None:
+        """Registra que el servidor confirmó el último mensaje codificado."""
+        if self._pending is None:
+            return
+        self._base = self._pending
+        self._base_seq = self._pending_seq
+        self._since_keyframe = 0 if self._pending_keyframe else self._since_keyframe + 1
+        self._pending = None
+
+    def reset(self) -> None:
+        """Descarta la base: el próximo mensaje será un keyframe."""
+        self._base = None
+        self._pending = None
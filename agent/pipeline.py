@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Módulo de pipeline para el agente de Prex Challenge.
+Separa la recolección, la serialización y el envío en etapas conectadas por colas
+acotadas, de modo que una API lenta no retrasa la próxima recolección y una
+recolección lenta no frena los envíos pendientes.
+
+    collect_once()  ->  [cola]  ->  hilo de serialización  ->  [cola]  ->  hilo de envío
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, Tuple
+
+
+DEFAULT_QUEUE_SIZE = 4
+DEFAULT_COLLECTOR_THREADS = 4
+
+logger = logging.getLogger('agent')
+
+# Marca de fin que recorre las etapas al detener el pipeline
+_STOP = object()
+
+Prepared = Tuple[bytes, Dict[str, str]]
+
+
+class AgentPipeline:
+    """
+    Pipeline de tres etapas con un hilo por etapa.
+
+    La recolección corre en el hilo que llama a `collect_once` (el del planificador)
+    y ejecuta cada recolector en un pool de hilos. Si la cola de salida está llena,
+    el snapshot se entrega a `overflow` (por ejemplo, el spool) en lugar de bloquear
+    la recolección. Cada snapshot lleva sus tiempos por etapa, que se registran al
+    terminar el envío.
+    """
+
+    def __init__(self, collect: Callable[[Optional[ThreadPoolExecutor]], Dict[str, Any]],
+                 deliver: Callable[[Dict[str, Any], Optional[Prepared]], Dict[str, Any]],
+                 prepare: Optional[Callable[[Dict[str, Any]], Prepared]] = None,
+                 overflow: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 timings: Optional[Callable[[], Dict[str, float]]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 collector_threads: int = DEFAULT_COLLECTOR_THREADS):
+        """
+        Inicializa el pipeline.
+
+        Args:
+            collect: Recolecta un snapshot usando el pool de hilos recibido
+            deliver: Envía un snapshot (y su versión serializada, si la hay)
+            prepare: Serializa un snapshot; None omite la etapa (por ejemplo, con
+                codificación delta, que debe hacerse en orden junto con el envío)
+            overflow: Recibe los snapshots que no caben en la cola (None: se descartan)
+            timings: Devuelve la duración de cada recolector en la última recolección
+            queue_size: Capacidad de cada cola entre etapas
+            collector_threads: Hilos del pool de recolectores
+        """
+        self._collect = collect
+        self._deliver = deliver
+        self._prepare = prepare
+        self._overflow = overflow
+        self._timings = timings
+        self._serialize_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._send_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=collector_threads, thread_name_prefix='prex-collect')
+        self._threads = [
+            threading.Thread(target=self._serialize_loop, name='prex-serialize', daemon=True),
+            threading.Thread(target=self._send_loop, name='prex-send', daemon=True)
+        ]
+        self.overflowed = 0
+
+    def start(self) -> 'AgentPipeline':
+        """Arranca los hilos de serialización y envío."""
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def collect_once(self) -> bool:
+        """
+        Recolecta un snapshot y lo encola para serializarlo y enviarlo.
+
+        Returns:
+            True si quedó encolado; False si la cola estaba llena
+        """
+        started = time.perf_counter()
+        data = self._collect(self._executor)
+        item = {
+            "data": data,
+            "prepared": None,
+            "timings": {"collect_ms": _elapsed_ms(started)},
+            "collectors": dict(self._timings()) if self._timings else {},
+            "queued_at": time.perf_counter()
+        }
+        try:
+            self._serialize_queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.overflowed += 1
+            logger.warning("Pipeline queue is full, the API is slower than the collection interval")
+            if self._overflow is not None:
+                self._overflow(data)
+            return False
+
+    def _serialize_loop(self) -> None:
+        """Etapa de serialización: JSON y compresión fuera del hilo que envía."""
+        while True:
+            item = self._serialize_queue.get()
+            if item is _STOP:
+                self._send_queue.put(_STOP)
+                return
+            item["timings"]["serialize_wait_ms"] = _elapsed_ms(item["queued_at"])
+            if self._prepare is not None:
+                started = time.perf_counter()
+                try:
+                    item["prepared"] = self._prepare(item["data"])
+                except Exception as e:
+                    # Se envía sin serializar: deliver lo hará por su cuenta
+                    logger.error(f"Error serializing snapshot: {str(e)}")
+                item["timings"]["serialize_ms"] = _elapsed_ms(started)
+            item["queued_at"] = time.perf_counter()
+            self._send_queue.put(item)
+
+    def _send_loop(self) -> None:
+        """Etapa de envío: un snapshot por vez, en orden de recolección."""
+        while True:
+            item = self._send_queue.get()
+            if item is _STOP:
+                return
+            timings = item["timings"]
+            timings["send_wait_ms"] = _elapsed_ms(item["queued_at"])
+            started = time.perf_counter()
+            try:
+                self._deliver(item["data"], item["prepared"])
+            except Exception as e:
+                logger.error(f"Unhandled error sending snapshot: {str(e)}")
+            timings["send_ms"] = _elapsed_ms(started)
+
+            collectors = ', '.join(f"{name} {ms}" for name, ms in item["collectors"].items())
+            stages = ', '.join(f"{name[:-3]} {ms}" for name, ms in timings.items())
+            logger.info(f"Pipeline timings (ms): {stages}" + (f" [collectors: {collectors}]" if collectors else ""))
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """
+        Detiene el pipeline después de enviar los snapshots ya encolados.
+
+        Args:
+            timeout: Segundos máximos de espera por cada etapa
+        """
+        try:
+            self._serialize_queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Pipeline did not drain before stopping")
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+
+def _elapsed_ms(started: float) -> float:
+    """Milisegundos transcurridos desde un instante de perf_counter."""
+    return round((time.perf_counter() - started) * 1000, 1)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Módulo de perfiles de recolección para el agente de Prex Challenge.
+Permite recolectar cada grupo de métricas a su propio ritmo (por ejemplo, CPU cada
+10 segundos, procesos cada minuto y sistema operativo y usuarios cada hora). Cada
+ciclo envía un snapshot parcial con los grupos que tocaban, y el servidor lo
+completa con los últimos valores conocidos del host (ver merge_partial).
+
+Formato del archivo de perfil (JSON, intervalos en segundos):
+
+    {
+        "collectors": {"cpu": 10, "processes": 60, "facts": 3600, "users": 3600}
+    }
+
+Los grupos que no figuran se recolectan cada `--interval` segundos.
+"""
+
+import json
+import math
+import time
+from typing import Callable, Dict, List, Any, Optional
+
+
+# Grupos de recolección y los campos del snapshot que aporta cada uno
+COLLECTOR_GROUPS = {
+    "facts": ("os_info", "cpu_info"),
+    "cpu": ("cpu_info",),
+    "processes": ("processes",),
+    "users": ("logged_users",)
+}
+
+# Clave con los grupos recolectados en un snapshot parcial
+COLLECTED_KEY = 'collected'
+
+
+def merge_partial(base: Optional[Dict[str, Any]], message: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Completa un snapshot parcial con los valores de un snapshot anterior, sin modificarlo.
+
+    Los campos del mensaje reemplazan a los de la base, salvo los diccionarios,
+    que se combinan clave a clave: así el `cpu_info` del grupo "cpu" (uso) conserva
+    los datos fijos (núcleos, modelo) que aportó el grupo "facts".
+
+    Args:
+        base: Último snapshot completo del host (None si no hay)
+        message: Snapshot parcial
+
+    Returns:
+        Snapshot completo
+    """
+    snapshot = dict(base or {})
+    for key, value in message.items():
+        previous = snapshot.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            snapshot[key] = {**previous, **value}
+        else:
+            snapshot[key] = value
+    return snapshot
+
+
+def load_profile(path: str, default_interval: int) -> Dict[str, int]:
+    """
+    Lee un archivo de perfil.
+
+    Args:
+        path: Ruta del archivo JSON
+        default_interval: Intervalo de los grupos que el perfil no menciona
+
+    Returns:
+        Intervalo en segundos de cada grupo
+
+    Raises:
+        ValueError: Si el archivo no es válido
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    collectors = config.get('collectors') if isinstance(config, dict) else None
+    if not isinstance(collectors, dict):
+        raise ValueError("Profile must be a JSON object with a 'collectors' object")
+
+    intervals = {group: default_interval for group in COLLECTOR_GROUPS}
+    for group, interval in collectors.items():
+        if group not in COLLECTOR_GROUPS:
+            raise ValueError(f"Unknown collector group: {group}. Use one of: {', '.join(COLLECTOR_GROUPS)}")
+        if not isinstance(interval, int) or isinstance(interval, bool) or interval <= 0:
+            raise ValueError(f"Interval for {group} must be a positive integer number of seconds")
+        intervals[group] = interval
+    return intervals
+
+
+class CollectionProfile:
+    """
+    Calendario de recolección por grupo.
+
+    El agente se despierta cada `interval` segundos (el máximo común divisor de los
+    intervalos del perfil) y `due` indica qué grupos tocan en ese ciclo. El primer
+    ciclo recolecta todos los grupos. Además guarda el último valor de cada grupo
+    para completar los snapshots que van al spool.
+    """
+
+    def __init__(self, intervals: Dict[str, int], clock: Callable[[], float] = time.monotonic):
+        """
+        Inicializa el perfil.
+
+        Args:
+            intervals: Intervalo en segundos de cada grupo (ver load_profile)
+            clock: Reloj monotónico (reemplazable en pruebas)
+        """
+        self.intervals = dict(intervals)
+        self.interval = math.gcd(*self.intervals.values())
+        self._clock = clock
+        self._next: Dict[str, float] = {}
+        self.last: Dict[str, Any] = {}
+
+    def due(self) -> List[str]:
+        """
+        Devuelve los grupos a recolectar en este ciclo y programa el siguiente de cada uno.
+
+        Se tolera medio ciclo de adelanto o retraso, de modo que la deriva del
+        planificador no hace saltar un grupo; si un grupo se atrasó más de su
+        intervalo, se recolecta una vez y se vuelve a su calendario.
+        """
+        now = self._clock()
+        tolerance = self.interval / 2
+        groups = []
+        for group, interval in self.intervals.items():
+            next_run = self._next.get(group)
+            if next_run is not None and now + tolerance < next_run:
+                continue
+            groups.append(group)
+            if next_run is None:
+                next_run = now
+            while next_run <= now + tolerance:
+                next_run += interval
+            self._next[group] = next_run
+        return groups
+
+    def remember(self, data: Dict[str, Any]) -> None:
+        """Actualiza los últimos valores conocidos con un snapshot recolectado."""
+        self.last = merge_partial(self.last, data)
+
+    def complete(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Completa un snapshot parcial con los últimos valores conocidos de los demás grupos."""
+        return merge_partial(self.last, data)
@@ -6,19 +6,28 @@ Recopila información del sistema y la envía al servidor API.
 
 import os
 import sys
-import time
 import json
 import argparse
 import logging
-from typing import Dict, Any, Optional
+from concurrent.futures import Executor
+from typing import Dict, Any, Optional, Tuple
 
 # Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from agent.collector import collect_all
-from agent.sender import APISender
+from agent.collector import collect_all, cpu_sampler, host_facts, process_collector, last_timings
+from agent.sender import (
+    APISender, COMPRESSION_METHODS, DEFAULT_COMPRESSION_THRESHOLD,
+    DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT, DEFAULT_MAX_RETRIES,
+    DEFAULT_BACKOFF_BASE, DEFAULT_BACKOFF_MAX, DEFAULT_RETRY_BUDGET
+)
+from agent.delta import DeltaEncoder
+from agent.scheduler import Scheduler, MISSED_POLICIES
+from agent.pipeline import AgentPipeline, DEFAULT_QUEUE_SIZE, DEFAULT_COLLECTOR_THREADS
+from agent.profiles import CollectionProfile, COLLECTED_KEY, COLLECTOR_GROUPS, load_profile
+from agent.spool import Spool, DEFAULT_MAX_BYTES, DEFAULT_MAX_AGE, DEFAULT_REPLAY_BATCH_SIZE
 
 
 # Configurar registro de logs
@@ -33,32 +42,168 @@ logging.basicConfig(
 logger = logging.getLogger('agent')
 
 
-def run_once(api_url: str) -> Dict[str, Any]:
+def send_snapshot(sender: APISender, data: Dict[str, Any], encoder: Optional[DeltaEncoder] = None,
+                  prepared: Optional[Tuple[bytes, Dict[str, str]]] = None) -> Dict[str, Any]:
+    """
+    Envía un snapshot, como delta si hay un codificador.
+    
+    Si el servidor no tiene la base del delta (HTTP 409), se reenvía como keyframe.
+    
+    Args:
+        sender: Emisor configurado
+        data: Snapshot completo
+        encoder: Codificador delta o None para enviar el snapshot completo
+        prepared: Snapshot ya serializado con sender.prepare (solo sin codificador)
+    
+    Returns:
+        Resultado del envío
+    """
+    if encoder is None:
+        return sender.send_prepared(prepared) if prepared is not None else sender.send_data(data)
+    
+    result = sender.send_data(encoder.encode(data))
+    if not result['success'] and result.get('status_code') == 409:
+        logger.info("Server requested a delta resync, sending keyframe")
+        encoder.reset()
+        result = sender.send_data(encoder.encode(data))
+    if result['success']:
+        encoder.acknowledge()
+    return result
+
+
+def should_spool(result: Dict[str, Any]) -> bool:
+    """
+    Indica si un envío fallido debe guardarse en el spool para reenviarlo.
+    
+    Se guardan los fallos de conexión, timeouts y errores del servidor (5xx, 429);
+    un 4xx indica un snapshot que el servidor nunca aceptará.
+    """
+    status = result.get('status_code')
+    return status is None or status >= 500 or status == 429
+
+
+def deliver(sender: APISender, data: Dict[str, Any], encoder: Optional[DeltaEncoder] = None,
+            spool: Optional[Spool] = None, replay_batch_size: int = DEFAULT_REPLAY_BATCH_SIZE,
+            prepared: Optional[Tuple[bytes, Dict[str, str]]] = None,
+            profile: Optional[CollectionProfile] = None) -> Dict[str, Any]:
+    """
+    Envía un snapshot recopilado, lo guarda en el spool si falla y, si se envió,
+    reenvía lo que quedó pendiente.
+    
+    Args:
+        sender: Emisor configurado
+        data: Snapshot completo (o parcial, con un perfil de recolección)
+        encoder: Codificador delta (opcional)
+        spool: Spool donde guardar el snapshot si no se puede enviar (None: se descarta)
+        replay_batch_size: Snapshots por solicitud al reenviar el spool
+        prepared: Snapshot ya serializado con sender.prepare (opcional)
+        profile: Perfil de recolección con el que se recopiló el snapshot (opcional)
+    
+    Returns:
+        Resultado del envío
+    """
+    # Cada ciclo tiene su propio presupuesto de reintentos (envío y reenvío del spool)
+    sender.new_cycle()
+    try:
+        result = send_snapshot(sender, data, encoder, prepared)
+    except ConnectionError as e:
+        result = {"success": False, "message": str(e)}
+    
+    if result['success']:
+        logger.info(f"Data sent successfully to API in {result.get('latency_ms')} ms")
+        # Los datos fijos ya llegaron: no se reenvían hasta que cambien
+        host_facts.mark_sent()
+        # La API volvió a responder: reenviar lo que quedó pendiente
+        if spool is not None and len(spool):
+            replay = spool.replay(sender, replay_batch_size)
+            if replay['success']:
+                logger.info(f"Replayed {replay['sent']} spooled snapshots")
+            else:
+                logger.error(f"Spool replay stopped after {replay['sent']} snapshots "
+                             f"({replay['pending']} pending): {replay['message']}")
+    else:
+        logger.error(f"Failed to send data: {result['message']}")
+        # El spool guarda el snapshot completo: /upload/batch no acepta deltas
+        if spool is not None and should_spool(result):
+            spool_snapshot(spool, data, profile)
+    
+    return result
+
+
+def spool_snapshot(spool: Spool, data: Dict[str, Any], profile: Optional[CollectionProfile] = None) -> None:
+    """
+    Guarda un snapshot en el spool registrando el resultado.
+    
+    Con un perfil de recolección, el snapshot parcial se completa con los últimos
+    valores de los demás grupos: al reenviarlo, el servidor ya tiene un estado más
+    nuevo del host y no podría completarlo.
+    """
+    if profile is not None:
+        data = profile.complete(data)
+    if spool.put(data):
+        stats = spool.stats()
+        logger.info(f"Snapshot spooled ({stats['pending']} pending, {stats['bytes']} bytes)")
+    else:
+        logger.error("Snapshot too large for the spool, discarding it")
+
+
+def collect(static_facts: str = "always", executor: Optional[Executor] = None,
+            profile: Optional[CollectionProfile] = None) -> Dict[str, Any]:
+    """
+    Recopila un snapshot y registra el resultado del recorrido de procesos.
+    
+    Args:
+        static_facts: "always" o "on-change" (ver collector.collect_all)
+        executor: Pool de hilos para ejecutar los recolectores a la vez (opcional)
+        profile: Perfil de recolección; el snapshot solo incluye los grupos que
+            tocan en este ciclo y los enumera en "collected" (opcional)
+    """
+    logger.info(f"Starting data collection...")
+    if profile is None:
+        data = collect_all(static_facts, executor=executor)
+        logger.info(f"Data collected for {data['hostname']} ({data['ip_address']})")
+    else:
+        groups = profile.due()
+        data = collect_all(static_facts, executor=executor, groups=groups)
+        # Los datos fijos también viajan fuera de su turno si cambiaron
+        if 'os_info' in data and 'facts' not in groups:
+            groups.append('facts')
+        data[COLLECTED_KEY] = [group for group in COLLECTOR_GROUPS if group in groups]
+        profile.remember(data)
+        logger.info(f"Data collected for {data['hostname']} ({data['ip_address']}): {', '.join(data[COLLECTED_KEY])}")
+    stats = process_collector.last_stats
+    if stats:
+        logger.info(f"Process scan: {stats['processes']} processes ({stats['new_processes']} new) in {stats['duration_ms']} ms")
+    return data
+
+
+def run_once(api_url: str, static_facts: str = "always", encoder: Optional[DeltaEncoder] = None,
+             sender: Optional[APISender] = None, spool: Optional[Spool] = None,
+             replay_batch_size: int = DEFAULT_REPLAY_BATCH_SIZE,
+             profile: Optional[CollectionProfile] = None) -> Dict[str, Any]:
     """
     Ejecuta el agente una vez, recopilando y enviando datos.
     
     Args:
         api_url: URL del servidor API
+        static_facts: "always" o "on-change" (ver collector.collect_all)
+        encoder: Codificador delta (opcional) que se conserva entre ejecuciones
+        sender: Emisor a reutilizar (None: se crea uno para esta ejecución)
+        spool: Spool donde guardar el snapshot si no se puede enviar (None: se descarta)
+        replay_batch_size: Snapshots por solicitud al reenviar el spool
+        profile: Perfil de recolección por grupo (opcional)
     
     Returns:
         Diccionario con el estado del resultado
     """
-    logger.info(f"Starting data collection...")
     try:
         # Recopilar información del sistema
-        data = collect_all()
-        logger.info(f"Data collected for {data['hostname']} ({data['ip_address']})")
+        data = collect(static_facts, profile=profile)
         
         # Enviar datos a la API
-        sender = APISender(api_url)
-        result = sender.send_data(data)
-        
-        if result['success']:
-            logger.info("Data sent successfully to API")
-        else:
-            logger.error(f"Failed to send data: {result['message']}")
-            
-        return result
+        if sender is None:
+            sender = APISender(api_url)
+        return deliver(sender, data, encoder, spool, replay_batch_size, profile=profile)
     
     except Exception as e:
         logger.error(f"Error in agent execution: {str(e)}")
@@ -68,24 +213,69 @@ def run_once(api_url: str) -> Dict[str, Any]:
         }
 
 
-def run_scheduled(api_url: str, interval: int) -> None:
+def run_scheduled(api_url: str, interval: int, static_facts: str = "always",
+                  encoder: Optional[DeltaEncoder] = None,
+                  sender: Optional[APISender] = None,
+                  spool: Optional[Spool] = None,
+                  replay_batch_size: int = DEFAULT_REPLAY_BATCH_SIZE,
+                  phase: bool = True, missed: str = 'skip',
+                  pipeline: bool = False, queue_size: int = DEFAULT_QUEUE_SIZE,
+                  collector_threads: int = DEFAULT_COLLECTOR_THREADS,
+                  profile: Optional[CollectionProfile] = None) -> None:
     """
-    Ejecuta el agente según un cronograma.
+    Ejecuta el agente según un cronograma de ritmo fijo (ver scheduler.Scheduler).
     
     Args:
         api_url: URL del servidor API
         interval: Intervalo en segundos entre ejecuciones
+        static_facts: "always" o "on-change" (ver collector.collect_all)
+        encoder: Codificador delta (opcional)
+        sender: Emisor a reutilizar (None: se crea uno para todo el cronograma)
+        spool: Spool para los snapshots que no se puedan enviar (opcional)
+        replay_batch_size: Snapshots por solicitud al reenviar el spool
+        phase: Si es True, los ciclos se desfasan según el hostname para repartir
+            los agentes a lo largo del intervalo; si es False, el primero es inmediato
+        missed: Política para los ciclos perdidos ('skip' o 'coalesce')
+        pipeline: Si es True, recolección, serialización y envío corren como etapas
+            separadas (ver pipeline.AgentPipeline)
+        queue_size: Capacidad de las colas entre etapas del pipeline
+        collector_threads: Hilos para ejecutar los recolectores a la vez en el pipeline
+        profile: Perfil de recolección por grupo; reemplaza `interval` por el ciclo
+            del perfil (ver profiles.CollectionProfile)
     """
-    logger.info(f"Starting scheduled monitoring every {interval} seconds")
+    # Un único emisor para todas las ejecuciones: su sesión mantiene la conexión abierta
+    if sender is None:
+        sender = APISender(api_url)
     
-    while True:
-        try:
-            run_once(api_url)
-        except Exception as e:
-            logger.error(f"Unhandled error in scheduled run: {str(e)}")
-            
-        logger.info(f"Sleeping for {interval} seconds...")
-        time.sleep(interval)
+    if profile is not None:
+        interval = profile.interval
+        logger.info("Collection profile: " + ', '.join(f"{group} every {seconds}s" for group, seconds in profile.intervals.items()))
+    
+    if phase:
+        scheduler = Scheduler.for_host(interval, host_facts.get()['hostname'], missed=missed)
+    else:
+        scheduler = Scheduler(interval, offset=None, missed=missed)
+    logger.info(f"Starting scheduled monitoring every {interval} seconds "
+                f"(first run in {scheduler.next_delay():.1f}s, missed ticks: {missed})")
+    
+    if not pipeline:
+        scheduler.run(lambda: run_once(api_url, static_facts, encoder, sender, spool, replay_batch_size, profile))
+        return
+    
+    agent_pipeline = AgentPipeline(
+        collect=lambda executor: collect(static_facts, executor, profile),
+        deliver=lambda data, prepared: deliver(sender, data, encoder, spool, replay_batch_size, prepared, profile),
+        # Con deltas la codificación depende del último envío confirmado: se hace al enviar
+        prepare=sender.prepare if encoder is None else None,
+        overflow=(lambda data: spool_snapshot(spool, data, profile)) if spool is not None else None,
+        timings=lambda: last_timings,
+        queue_size=queue_size,
+        collector_threads=collector_threads
+    ).start()
+    try:
+        scheduler.run(agent_pipeline.collect_once)
+    finally:
+        agent_pipeline.stop()
 
 
 def parse_arguments():
@@ -106,27 +296,239 @@ def parse_arguments():
         help='Intervalo en segundos para ejecuciones programadas (predeterminado: 300)'
     )
     
+    parser.add_argument(
+        '--profile',
+        type=str,
+        default=None,
+        help='Archivo JSON con el intervalo de cada grupo de recolección (cpu, processes, users, facts); los grupos que no figuran usan --interval (predeterminado: ninguno)'
+    )
+    
+    parser.add_argument(
+        '--missed-ticks',
+        type=str,
+        choices=MISSED_POLICIES,
+        default='skip',
+        help='Si una ejecución se pasa del intervalo: skip espera al próximo ciclo, coalesce ejecuta una vez de inmediato (predeterminado: skip)'
+    )
+    
+    parser.add_argument(
+        '--no-phase-offset',
+        action='store_true',
+        help='No desfasar los ciclos según el hostname: el primero se ejecuta al arrancar (predeterminado: false)'
+    )
+    
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        help='Recolectar, serializar y enviar en etapas separadas para que una API lenta no retrase la recolección (predeterminado: false)'
+    )
+    
+    parser.add_argument(
+        '--queue-size',
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help=f'Snapshots que pueden esperar entre etapas del pipeline (predeterminado: {DEFAULT_QUEUE_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--collector-threads',
+        type=int,
+        default=DEFAULT_COLLECTOR_THREADS,
+        help=f'Hilos para ejecutar los recolectores a la vez en el pipeline (predeterminado: {DEFAULT_COLLECTOR_THREADS})'
+    )
+    
+    parser.add_argument(
+        '--cpu-sample-period',
+        type=float,
+        default=0,
+        help='Segundos entre muestras de CPU de fondo para reportar mín/máx/promedio del intervalo; 0 lo desactiva (predeterminado: 0)'
+    )
+    
+    parser.add_argument(
+        '--static-facts',
+        type=str,
+        choices=['always', 'on-change'],
+        default='always',
+        help='Enviar os_info y los datos fijos de la CPU en cada snapshot o solo cuando cambian (predeterminado: always)'
+    )
+    
+    parser.add_argument(
+        '--delta',
+        action='store_true',
+        help='Enviar un keyframe y luego solo las diferencias con el último snapshot confirmado (predeterminado: false)'
+    )
+    
+    parser.add_argument(
+        '--keyframe-interval',
+        type=int,
+        default=60,
+        help='Snapshots delta entre keyframes completos (predeterminado: 60)'
+    )
+    
+    parser.add_argument(
+        '--compression',
+        type=str,
+        choices=COMPRESSION_METHODS,
+        default='none',
+        help='Compresión del cuerpo de las subidas; zstd requiere el paquete zstandard (predeterminado: none)'
+    )
+    
+    parser.add_argument(
+        '--compression-level',
+        type=int,
+        default=None,
+        help='Nivel de compresión (predeterminado: 6 para gzip, 3 para zstd)'
+    )
+    
+    parser.add_argument(
+        '--compression-threshold',
+        type=int,
+        default=DEFAULT_COMPRESSION_THRESHOLD,
+        help=f'Tamaño mínimo en bytes de un snapshot para comprimirlo (predeterminado: {DEFAULT_COMPRESSION_THRESHOLD})'
+    )
+    
+    parser.add_argument(
+        '--connect-timeout',
+        type=float,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help=f'Segundos máximos para conectar con la API (predeterminado: {DEFAULT_CONNECT_TIMEOUT:g})'
+    )
+    
+    parser.add_argument(
+        '--read-timeout',
+        type=float,
+        default=DEFAULT_READ_TIMEOUT,
+        help=f'Segundos máximos de espera de la respuesta de la API (predeterminado: {DEFAULT_READ_TIMEOUT:g})'
+    )
+    
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help=f'Reintentos máximos de cada envío ante fallos transitorios (predeterminado: {DEFAULT_MAX_RETRIES})'
+    )
+    
+    parser.add_argument(
+        '--backoff-base',
+        type=float,
+        default=DEFAULT_BACKOFF_BASE,
+        help=f'Espera base en segundos del backoff exponencial con jitter (predeterminado: {DEFAULT_BACKOFF_BASE:g})'
+    )
+    
+    parser.add_argument(
+        '--backoff-max',
+        type=float,
+        default=DEFAULT_BACKOFF_MAX,
+        help=f'Espera máxima en segundos entre reintentos (predeterminado: {DEFAULT_BACKOFF_MAX:g})'
+    )
+    
+    parser.add_argument(
+        '--retry-budget',
+        type=int,
+        default=DEFAULT_RETRY_BUDGET,
+        help=f'Reintentos totales permitidos en cada ciclo (predeterminado: {DEFAULT_RETRY_BUDGET})'
+    )
+    
+    parser.add_argument(
+        '--spool-dir',
+        type=str,
+        default='spool',
+        help='Directorio donde guardar los snapshots que no se pudieron enviar (predeterminado: spool)'
+    )
+    
+    parser.add_argument(
+        '--no-spool',
+        action='store_true',
+        help='Descartar los snapshots que no se pudieron enviar en lugar de guardarlos (predeterminado: false)'
+    )
+    
+    parser.add_argument(
+        '--spool-max-mb',
+        type=float,
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help=f'Tamaño máximo del spool en MB; se descartan los más antiguos (predeterminado: {DEFAULT_MAX_BYTES // (1024 * 1024)})'
+    )
+    
+    parser.add_argument(
+        '--spool-max-age',
+        type=float,
+        default=DEFAULT_MAX_AGE / 3600,
+        help=f'Horas que un snapshot puede esperar en el spool (predeterminado: {DEFAULT_MAX_AGE // 3600})'
+    )
+    
+    parser.add_argument(
+        '--replay-batch-size',
+        type=int,
+        default=DEFAULT_REPLAY_BATCH_SIZE,
+        help=f'Snapshots por solicitud al reenviar el spool (predeterminado: {DEFAULT_REPLAY_BATCH_SIZE})'
+    )
+    
     parser.add_argument(
         '--once',
         action='store_true',
         help='Ejecutar una vez y salir (predeterminado: false)'
     )
     
-    return parser.parse_args()
+    args = parser.parse_args()
+    if args.profile and args.delta:
+        # Un delta contra un snapshot parcial daría por eliminados los grupos ausentes
+        parser.error("--profile cannot be combined with --delta")
+    return args
 
 
 if __name__ == "__main__":
     args = parse_arguments()
+    profile = None
+    if args.profile:
+        try:
+            profile = CollectionProfile(load_profile(args.profile, args.interval))
+        except (OSError, ValueError) as e:
+            logger.error(f"Invalid collection profile {args.profile}: {str(e)}")
+            sys.exit(2)
+    sender = APISender(
+        args.url,
+        compression=args.compression,
+        compression_level=args.compression_level,
+        compression_threshold=args.compression_threshold,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        max_retries=args.max_retries,
+        backoff_base=args.backoff_base,
+        backoff_max=args.backoff_max,
+        retry_budget=args.retry_budget
+    )
+    spool = None
+    if not args.no_spool:
+        spool = Spool(
+            args.spool_dir,
+            max_bytes=int(args.spool_max_mb * 1024 * 1024),
+            max_age=args.spool_max_age * 3600
+        )
     
     if args.once:
         # Ejecutar una vez y salir
         logger.info("Running agent in single-run mode")
-        result = run_once(args.url)
+        result = run_once(args.url, args.static_facts, sender=sender, spool=spool,
+                          replay_batch_size=args.replay_batch_size, profile=profile)
         print(json.dumps(result, indent=2))
     else:
+        # Muestreo de CPU de fondo: cada snapshot resume la ventana desde el anterior
+        if args.cpu_sample_period > 0:
+            cpu_sampler.start(args.cpu_sample_period)
+        
         # Ejecutar según cronograma hasta que se detenga
         try:
-            run_scheduled(args.url, args.interval)
+            encoder = None
+            if args.delta:
+                # Los deltas ya omiten lo que no cambió: los datos fijos viajan completos
+                # en cada keyframe y así el servidor siempre reconstruye el snapshot entero
+                encoder = DeltaEncoder(args.keyframe_interval)
+                args.static_facts = 'always'
+            run_scheduled(args.url, args.interval, args.static_facts, encoder, sender,
+                          spool, args.replay_batch_size,
+                          phase=not args.no_phase_offset, missed=args.missed_ticks,
+                          pipeline=args.pipeline, queue_size=args.queue_size,
+                          collector_threads=args.collector_threads, profile=profile)
         except KeyboardInterrupt:
             logger.info("Agent stopped by user")
             sys.exit(0)
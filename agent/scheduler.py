@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Módulo de planificación para el agente de Prex Challenge.
+Ejecuta una tarea a un ritmo fijo medido con el reloj monotónico, de modo que el
+tiempo de recolección y envío no desplaza los ciclos siguientes, y reparte los
+agentes a lo largo del intervalo con un desfase determinista por host.
+"""
+
+import time
+import math
+import socket
+import hashlib
+import logging
+import threading
+from typing import Callable, Dict, Any, Optional
+
+
+# Qué hacer con los ciclos perdidos cuando una ejecución tarda más que el intervalo
+MISSED_POLICIES = ('skip', 'coalesce')
+
+logger = logging.getLogger('agent')
+
+
+def phase_offset(key: str, interval: float) -> float:
+    """
+    Devuelve un desfase determinista en [0, interval) a partir de una clave.
+
+    El mismo host obtiene siempre el mismo desfase y los desfases de distintos hosts
+    se distribuyen de forma uniforme, repartiendo la carga a lo largo del intervalo.
+
+    Args:
+        key: Identificador del host (por ejemplo, su hostname)
+        interval: Intervalo en segundos
+    """
+    digest = hashlib.sha256(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64 * interval
+
+
+class Scheduler:
+    """
+    Planificador de ritmo fijo.
+
+    Los ciclos caen en los instantes `offset + k * interval` del reloj de pared,
+    por lo que todos los agentes con el mismo intervalo y hostname distinto quedan
+    repartidos, y un reinicio no cambia el desfase del host. Entre ciclos se mide
+    con el reloj monotónico, inmune a los ajustes de hora del sistema.
+
+    Si una ejecución se pasa de uno o más ciclos, con 'skip' se espera al próximo
+    ciclo del calendario y con 'coalesce' se ejecuta una sola vez de inmediato en
+    lugar de todos los perdidos; en ambos casos se vuelve al calendario original.
+    """
+
+    def __init__(self, interval: float, offset: Optional[float] = 0.0, missed: str = 'skip',
+                 clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], float] = time.time,
+                 wait: Optional[Callable[[float], bool]] = None):
+        """
+        Inicializa el planificador.
+
+        Args:
+            interval: Segundos entre ciclos
+            offset: Desfase en segundos dentro del intervalo (ver phase_offset);
+                None ancla el calendario al arranque y ejecuta el primer ciclo de inmediato
+            missed: Política para los ciclos perdidos ('skip' o 'coalesce')
+            clock: Reloj monotónico (reemplazable en pruebas)
+            wall_clock: Reloj de pared usado solo para alinear el primer ciclo
+            wait: Espera interrumpible que devuelve True si se pidió detener
+                (predeterminado: la del evento de stop())
+        """
+        if interval <= 0:
+            raise ValueError("Interval must be positive")
+        if missed not in MISSED_POLICIES:
+            raise ValueError(f"Invalid missed-tick policy: {missed}. Use one of: {', '.join(MISSED_POLICIES)}")
+
+        self.interval = interval
+        self.offset = None if offset is None else offset % interval
+        self.missed = missed
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._stop = threading.Event()
+        self._wait = wait or self._stop.wait
+        self._next: Optional[float] = None
+        self.ticks = 0
+        self.skipped = 0
+
+    @classmethod
+    def for_host(cls, interval: float, hostname: Optional[str] = None, **options: Any) -> 'Scheduler':
+        """Crea un planificador con el desfase propio del host (por defecto, el local)."""
+        return cls(interval, phase_offset(hostname or socket.gethostname(), interval), **options)
+
+    def first_delay(self) -> float:
+        """Segundos hasta el primer ciclo alineado con el desfase."""
+        if self.offset is None:
+            return 0.0
+        return (self.offset - self._wall_clock()) % self.interval
+
+    def _advance(self, now: float) -> None:
+        """Calcula el próximo ciclo después de una ejecución que terminó en `now`."""
+        self._next += self.interval
+        if now <= self._next:
+            return
+
+        # Ciclos perdidos: los que ya pasaron mientras se ejecutaba la tarea
+        missed = math.floor((now - self._next) / self.interval) + 1
+        if self.missed == 'coalesce':
+            # Una ejecución inmediata en lugar de todas las perdidas
+            self._next += (missed - 1) * self.interval
+            self.skipped += missed - 1
+            logger.warning(f"Run overran the interval, coalescing {missed} missed ticks into one")
+        else:
+            self._next += missed * self.interval
+            self.skipped += missed
+            logger.warning(f"Run overran the interval, skipping {missed} ticks")
+
+    def next_delay(self) -> float:
+        """Segundos que faltan para el próximo ciclo (0 si ya debía ejecutarse)."""
+        if self._next is None:
+            return self.first_delay()
+        return max(0.0, self._next - self._clock())
+
+    def run(self, task: Callable[[], Any], max_ticks: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Ejecuta la tarea en cada ciclo hasta que se llame a stop().
+
+        Args:
+            task: Función sin argumentos a ejecutar en cada ciclo
+            max_ticks: Máximo de ejecuciones (None: sin límite)
+
+        Returns:
+            Diccionario con "ticks" (ejecuciones) y "skipped" (ciclos perdidos)
+        """
+        self._next = self._clock() + self.first_delay()
+        while not self._stop.is_set() and (max_ticks is None or self.ticks < max_ticks):
+            delay = self._next - self._clock()
+            if delay > 0 and self._wait(delay):
+                break
+
+            try:
+                task()
+            except Exception as e:
+                logger.error(f"Unhandled error in scheduled run: {str(e)}")
+            self.ticks += 1
+            self._advance(self._clock())
+            logger.info(f"Next run in {self.next_delay():.1f} seconds")
+        return {"ticks": self.ticks, "skipped": self.skipped}
+
+    def stop(self) -> None:
+        """Detiene el planificador (interrumpe la espera en curso)."""
+        self._stop.set()
@@ -5,72 +5,345 @@ Maneja el envío de la información recopilada del sistema al servidor API.
 """
 
 import json
+import gzip
+import time
+import random
+import logging
+import datetime
 import requests
-from typing import Dict, Any
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Any, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete solo se ofrece gzip
+    zstandard = None
+
+
+# Algoritmos de compresión del cuerpo de las subidas
+COMPRESSION_METHODS = ('none', 'gzip', 'zstd')
+
+# Nivel predeterminado de cada algoritmo
+DEFAULT_COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3}
+
+# Por debajo de este tamaño (bytes) comprimir no compensa el costo
+DEFAULT_COMPRESSION_THRESHOLD = 1024
+
+# Timeouts predeterminados (segundos) de conexión y de lectura de la respuesta
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+# Tipo de contenido de las subidas por lotes (un snapshot JSON por línea)
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Conexiones que el pool mantiene abiertas por servidor
+DEFAULT_POOL_SIZE = 2
+
+# Reintentos: por envío, espera base y máxima del backoff exponencial (segundos)
+# y reintentos totales permitidos en cada ciclo del agente
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_RETRY_BUDGET = 10
+
+# Respuestas que indican una sobrecarga o falla transitoria del servidor
+RETRY_STATUSES = (429, 502, 503, 504)
+
+logger = logging.getLogger('agent')
 
 
 class APISender:
     """
     Clase para manejar el envío de datos al servidor API.
+    
+    Cada emisor mantiene una sesión HTTP con keep-alive: conviene crear uno solo y
+    reutilizarlo en cada envío para no pagar un handshake TCP (y TLS) por subida.
+    
+    Los fallos transitorios (conexión, timeout, 429 y 5xx de sobrecarga) se reintentan
+    con backoff exponencial y jitter completo, respetando Retry-After. Además del
+    máximo por envío, los reintentos de todo un ciclo están acotados por un
+    presupuesto que `new_cycle` renueva: así miles de agentes no multiplican la
+    carga de un servidor que se está recuperando.
     """
     
-    def __init__(self, api_url: str):
+    def __init__(self, api_url: str, compression: str = 'none', compression_level: Optional[int] = None,
+                 compression_threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 pool_size: int = DEFAULT_POOL_SIZE,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX,
+                 retry_budget: int = DEFAULT_RETRY_BUDGET):
         """
         Inicializa el emisor con la URL de la API.
         
         Args:
             api_url: URL base del servidor API
+            compression: Compresión del cuerpo ('none', 'gzip' o 'zstd')
+            compression_level: Nivel de compresión (None: el predeterminado del algoritmo)
+            compression_threshold: Tamaño mínimo en bytes del JSON para comprimirlo
+            connect_timeout: Segundos máximos para establecer la conexión
+            read_timeout: Segundos máximos de espera de la respuesta
+            pool_size: Conexiones persistentes que se mantienen abiertas
+            max_retries: Reintentos máximos de un envío
+            backoff_base: Espera base del backoff exponencial en segundos
+            backoff_max: Espera máxima entre reintentos; un Retry-After mayor no se espera
+            retry_budget: Reintentos permitidos por ciclo (ver new_cycle)
         """
+        if compression not in COMPRESSION_METHODS:
+            raise ValueError(f"Invalid compression: {compression}. Use one of: {', '.join(COMPRESSION_METHODS)}")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        
         self.api_url = api_url
         if not self.api_url.endswith('/'):
             self.api_url += '/'
+        self.compression = compression
+        self.compression_level = compression_level
+        if compression_level is None:
+            self.compression_level = DEFAULT_COMPRESSION_LEVELS.get(compression)
+        self.compression_threshold = compression_threshold
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_budget = retry_budget
+        self._retries_left = retry_budget
+        
+        # Sesión persistente: reutiliza la conexión entre envíos (keep-alive)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
-    def send_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+    def new_cycle(self) -> None:
+        """Renueva el presupuesto de reintentos (llamar al comenzar cada ciclo del agente)."""
+        self._retries_left = self.retry_budget
+    
+    def close(self) -> None:
+        """Cierra las conexiones abiertas de la sesión."""
+        self.session.close()
+    
+    def _encode_body(self, payload: str, content_type: str = 'application/json') -> Tuple[bytes, Dict[str, str]]:
         """
-        Envía información del sistema al servidor API.
+        Prepara el cuerpo y las cabeceras de una subida, comprimiendo si corresponde.
         
         Args:
-            data: Diccionario que contiene información del sistema
+            payload: Datos ya serializados (JSON o NDJSON)
+            content_type: Tipo de contenido de los datos
         
         Returns:
-            Diccionario con estado de respuesta y mensaje
+            Tupla (cuerpo, cabeceras)
+        """
+        headers = {'Content-Type': content_type}
+        if self.compression == 'none' or len(payload) < self.compression_threshold:
+            return payload, headers
+        
+        body = payload.encode('utf-8')
+        if self.compression == 'gzip':
+            # mtime=0 hace que el mismo JSON produzca siempre los mismos bytes
+            body = gzip.compress(body, compresslevel=self.compression_level, mtime=0)
+        else:
+            body = zstandard.ZstdCompressor(level=self.compression_level).compress(body)
+        headers['Content-Encoding'] = self.compression
+        return body, headers
+    
+    @staticmethod
+    def _retry_after(response) -> Optional[float]:
+        """Devuelve los segundos indicados por la cabecera Retry-After, si la hay."""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            moment = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (moment - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+    
+    def _attempt(self, endpoint: str, body: bytes, headers: Dict[str, str]) -> Tuple[Dict[str, Any], bool, Optional[float]]:
+        """
+        Realiza un único intento de envío.
+        
+        Returns:
+            Tupla (resultado, si el fallo es transitorio, segundos de Retry-After)
         
         Raises:
             ConnectionError: Si no es posible conectar con la API
         """
-        upload_endpoint = f"{self.api_url}upload"
-        
         try:
-            # Convertir datos a JSON
-            json_data = json.dumps(data)
-            
-            # Enviar solicitud POST
-            headers = {'Content-Type': 'application/json'}
-            response = requests.post(upload_endpoint, data=json_data, headers=headers)
+            # Enviar solicitud POST por la sesión persistente
+            started = time.perf_counter()
+            response = self.session.post(endpoint, data=body, headers=headers, timeout=self.timeout)
+            latency_ms = round((time.perf_counter() - started) * 1000, 1)
             
             # Verificar estado de la respuesta
             if response.status_code == 200:
                 return {
                     "success": True,
                     "message": "Data sent successfully",
-                    "response": response.json()
-                }
+                    "response": response.json(),
+                    "status_code": response.status_code,
+                    "latency_ms": latency_ms
+                }, False, None
             else:
+                retryable = response.status_code in RETRY_STATUSES
                 return {
                     "success": False,
                     "message": f"Error sending data: HTTP {response.status_code}",
-                    "response": response.text
-                }
+                    "response": response.text,
+                    "status_code": response.status_code,
+                    "latency_ms": latency_ms
+                }, retryable, self._retry_after(response) if retryable else None
                 
         except requests.exceptions.ConnectionError:
-            raise ConnectionError(f"Could not connect to API at {upload_endpoint}")
+            raise ConnectionError(f"Could not connect to API at {endpoint}")
+        except requests.exceptions.Timeout as e:
+            return {
+                "success": False,
+                "message": f"Error sending data: timeout ({str(e)})",
+                "response": None
+            }, True, None
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error sending data: {str(e)}",
+                "response": None
+            }, False, None
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """
+        Calcula la espera antes del siguiente reintento.
+        
+        Args:
+            attempt: Reintentos ya realizados para este envío
+            retry_after: Segundos pedidos por el servidor, si los indicó
+        
+        Returns:
+            Segundos a esperar o None si no hay que reintentar
+        """
+        if attempt >= self.max_retries or self._retries_left <= 0:
+            return None
+        if retry_after is not None:
+            if retry_after > self.backoff_max:
+                # El servidor pide más de lo que el ciclo puede esperar
+                return None
+            # Jitter sobre el Retry-After para que los agentes no vuelvan todos a la vez
+            return retry_after + random.uniform(0, self.backoff_base)
+        # Jitter completo: espera aleatoria entre 0 y el backoff exponencial
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+    
+    def _post(self, path: str, payload: str, content_type: str) -> Dict[str, Any]:
+        """
+        Envía una carga serializada a un endpoint de la API, reintentando los fallos transitorios.
+        
+        Args:
+            path: Ruta del endpoint relativa a la URL base
+            payload: Datos serializados
+            content_type: Tipo de contenido de los datos
+        
+        Returns:
+            Diccionario con estado de respuesta, mensaje y número de intentos
+        
+        Raises:
+            ConnectionError: Si no es posible conectar con la API tras los reintentos
+        """
+        try:
+            # Comprimir si está configurado
+            body, headers = self._encode_body(payload, content_type)
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Error sending data: {str(e)}",
                 "response": None
             }
-
+        return self._send(path, body, headers)
+    
+    def _send(self, path: str, body: bytes, headers: Dict[str, str]) -> Dict[str, Any]:
+        """Envía un cuerpo ya codificado (ver _post)."""
+        endpoint = f"{self.api_url}{path}"
+        
+        attempt = 0
+        while True:
+            error = None
+            try:
+                result, retryable, retry_after = self._attempt(endpoint, body, headers)
+            except ConnectionError as e:
+                error, result, retryable, retry_after = e, None, True, None
+            
+            delay = self._retry_delay(attempt, retry_after) if retryable else None
+            if delay is None:
+                break
+            attempt += 1
+            self._retries_left -= 1
+            reason = str(error) if error is not None else result['message']
+            logger.warning(f"{reason}; retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
+        
+        if error is not None:
+            raise error
+        result['attempts'] = attempt + 1
+        return result
+    
+    def send_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Envía información del sistema al servidor API.
+        
+        Args:
+            data: Diccionario que contiene información del sistema
+        
+        Returns:
+            Diccionario con estado de respuesta y mensaje; si hubo respuesta incluye
+            `latency_ms`, el tiempo desde el envío hasta recibirla
+        
+        Raises:
+            ConnectionError: Si no es posible conectar con la API
+        """
+        return self._post('upload', json.dumps(data), 'application/json')
+    
+    def prepare(self, data: Dict[str, Any]) -> Tuple[bytes, Dict[str, str]]:
+        """
+        Serializa (y comprime si corresponde) un snapshot para enviarlo luego con
+        send_prepared; permite hacer este trabajo fuera del hilo que envía.
+        
+        Returns:
+            Tupla (cuerpo, cabeceras)
+        """
+        return self._encode_body(json.dumps(data), 'application/json')
+    
+    def send_prepared(self, prepared: Tuple[bytes, Dict[str, str]]) -> Dict[str, Any]:
+        """
+        Envía a /upload un snapshot preparado con prepare.
+        
+        Returns:
+            Diccionario con estado de respuesta y mensaje (ver send_data)
+        
+        Raises:
+            ConnectionError: Si no es posible conectar con la API
+        """
+        body, headers = prepared
+        return self._send('upload', body, headers)
+    
+    def send_batch(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Envía varios snapshots en una sola solicitud a /upload/batch (NDJSON).
+        
+        Args:
+            records: Snapshots completos, del más antiguo al más nuevo
+        
+        Returns:
+            Diccionario con estado de respuesta y mensaje (ver send_data)
+        
+        Raises:
+            ConnectionError: Si no es posible conectar con la API
+        """
+        payload = ''.join(json.dumps(record) + '\n' for record in records)
+        return self._post('upload/batch', payload, NDJSON_CONTENT_TYPE)
 
 if __name__ == "__main__":
     # Ejemplo de uso
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Módulo de spool en disco para el agente de Prex Challenge.
+Guarda los snapshots que no se pudieron enviar (API caída, errores del servidor)
+y los reenvía en lotes por /upload/batch cuando vuelve la conectividad.
+
+Cada snapshot se guarda en su propio archivo `<timestamp_ns>-<pid>-<n>.json`, de
+modo que el nombre ordena el spool cronológicamente y sirve para descartar por
+antigüedad sin abrir los archivos.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_MAX_AGE = 3 * 24 * 3600
+DEFAULT_REPLAY_BATCH_SIZE = 100
+
+SPOOL_SUFFIX = '.json'
+
+logger = logging.getLogger('agent')
+
+
+class Spool:
+    """
+    Cola FIFO de snapshots pendientes de envío, acotada por tamaño y antigüedad.
+
+    Al superar `max_bytes` se descartan los snapshots más antiguos; los que superan
+    `max_age` segundos se descartan al guardar o reenviar.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE):
+        """
+        Inicializa el spool, creando el directorio si no existe.
+
+        Args:
+            directory: Directorio donde se guardan los snapshots pendientes
+            max_bytes: Tamaño máximo total del spool en bytes
+            max_age: Antigüedad máxima de un snapshot en segundos
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._counter = 0
+        self.dropped = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # Tamaño de cada archivo, en orden cronológico
+        self._entries: Dict[str, int] = {}
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(SPOOL_SUFFIX):
+                self._entries[name] = os.path.getsize(path)
+            elif name.endswith('.tmp'):
+                # Escritura interrumpida: el snapshot nunca llegó a encolarse
+                os.remove(path)
+        self._bytes = sum(self._entries.values())
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    @staticmethod
+    def _created_at(name: str) -> float:
+        """Instante (epoch) en que se guardó un snapshot, según su nombre."""
+        try:
+            return int(name.split('-', 1)[0]) / 1e9
+        except ValueError:
+            return 0.0
+
+    def _remove(self, name: str) -> None:
+        """Elimina un archivo del spool (llamar con el bloqueo tomado)."""
+        size = self._entries.pop(name, 0)
+        self._bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def _expire(self, now: float) -> None:
+        """Descarta los snapshots más antiguos que max_age (llamar con el bloqueo tomado)."""
+        for name in list(self._entries):
+            if now - self._created_at(name) <= self.max_age:
+                break
+            self._remove(name)
+            self.dropped += 1
+
+    def put(self, data: Dict[str, Any]) -> bool:
+        """
+        Guarda un snapshot al final del spool.
+
+        Returns:
+            True si quedó guardado; False si por sí solo supera max_bytes
+        """
+        payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        if len(payload) > self.max_bytes:
+            return False
+
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            # Hacer lugar descartando los más antiguos
+            while self._entries and self._bytes + len(payload) > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.dropped += 1
+
+            self._counter += 1
+            name = f"{time.time_ns():020d}-{os.getpid()}-{self._counter}{SPOOL_SUFFIX}"
+            path = os.path.join(self.directory, name)
+            with open(path + '.tmp', 'wb') as f:
+                f.write(payload)
+            os.replace(path + '.tmp', path)
+            self._entries[name] = len(payload)
+            self._bytes += len(payload)
+        return True
+
+    def peek(self, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Devuelve hasta `limit` snapshots pendientes, del más antiguo al más nuevo.
+
+        Returns:
+            Lista de tuplas (nombre, snapshot); los archivos ilegibles se descartan
+        """
+        with self._lock:
+            self._expire(time.time())
+            names = list(self._entries)[:limit]
+
+        batch = []
+        for name in names:
+            try:
+                with open(os.path.join(self.directory, name), 'r') as f:
+                    batch.append((name, json.load(f)))
+            except (OSError, ValueError) as e:
+                logger.error(f"Discarding unreadable spool entry {name}: {str(e)}")
+                self.remove([name])
+        return batch
+
+    def remove(self, names: List[str]) -> None:
+        """Elimina del spool los snapshots ya entregados."""
+        with self._lock:
+            for name in names:
+                self._remove(name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve el estado del spool para el log."""
+        with self._lock:
+            oldest = next(iter(self._entries), None)
+            return {
+                "pending": len(self._entries),
+                "bytes": self._bytes,
+                "dropped": self.dropped,
+                "oldest_age_seconds": round(time.time() - self._created_at(oldest), 1) if oldest else 0.0
+            }
+
+    @staticmethod
+    def _delivered(batch: List[Tuple[str, Dict[str, Any]]], response: Any) -> List[str]:
+        """
+        Devuelve los nombres de los snapshots de un lote que no hay que reenviar.
+
+        Usa el estado por línea de /upload/batch (la línea N es el snapshot N del lote);
+        sin ese detalle, una respuesta exitosa cubre el lote entero.
+        """
+        if not isinstance(response, dict) or not isinstance(response.get('results'), list):
+            return [name for name, _ in batch]
+        done = set()
+        for result in response['results']:
+            if result.get('status') in ('stored', 'rejected'):
+                done.add(result.get('line'))
+        return [name for line, (name, _) in enumerate(batch, start=1) if line in done]
+
+    def replay(self, sender, batch_size: int = DEFAULT_REPLAY_BATCH_SIZE,
+               max_batches: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Reenvía los snapshots pendientes en lotes con `sender.send_batch`.
+
+        Se detiene en el primer lote que falla, dejándolo en el spool para el
+        próximo intento. Si el servidor informa el estado de cada línea, solo quedan
+        en el spool los snapshots que no pudo almacenar; los rechazados por inválidos
+        se descartan porque nunca serán aceptados.
+
+        Args:
+            sender: APISender con el método send_batch
+            batch_size: Snapshots por solicitud
+            max_batches: Máximo de lotes a enviar (None: hasta vaciar el spool)
+
+        Returns:
+            Diccionario con "success", "sent" y "pending"
+        """
+        sent = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            batch = self.peek(batch_size)
+            if not batch:
+                break
+            try:
+                result = sender.send_batch([record for _, record in batch])
+            except ConnectionError as e:
+                result = {"success": False, "message": str(e)}
+            if not result['success']:
+                return {"success": False, "message": result['message'], "sent": sent, "pending": len(self)}
+            
+            delivered = self._delivered(batch, result.get('response'))
+            self.remove(delivered)
+            sent += len(delivered)
+            batches += 1
+            if len(delivered) < len(batch):
+                message = (result.get('response') or {}).get('message', 'Some snapshots were not stored')
+                return {"success": False, "message": message, "sent": sent, "pending": len(self)}
+        return {"success": True, "message": "Spool replayed", "sent": sent, "pending": len(self)}
@@ -7,20 +7,129 @@ Proporciona endpoints para subir y consultar información del sistema.
 import os
 import sys
 import json
-from flask import Flask, request, jsonify, abort
+import math
+import atexit
+import datetime
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from flask import Flask, Response, request, jsonify, abort
 
 # Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
-from api_server.storage import JSONStorage
+from api_server.storage import create_storage, parse_timestamp, resolve_date, date_span
+from api_server.ingest import IngestQueue
+from api_server.delta_sessions import DeltaSessions, DELTA_KEY
+from api_server.partial_snapshots import PartialSnapshots, COLLECTED_KEY
+from api_server.metrics_store import MetricsStore
+from api_server.query_cache import QueryCache, make_etag
+from api_server.catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_cursor
+from api_server.rollups import Rollups, choose_resolution, DEFAULT_MAX_POINTS
+from api_server.compression import PayloadError, decode_body, iter_body_lines, DEFAULT_MAX_DECOMPRESSED_SIZE
+from api_server.query_filters import QueryFilterError, apply_query, parse_fields, parse_predicates
+
+# Máxima amplitud permitida para consultas por rango de tiempo
+MAX_QUERY_RANGE = datetime.timedelta(days=31)
+
+# Máxima amplitud de /metrics con agregados (resolution distinta de raw)
+MAX_ROLLUP_RANGE = datetime.timedelta(days=366)
+
+# Tamaño máximo de una carga de /upload una vez descomprimida (bytes)
+MAX_UPLOAD_SIZE = int(os.environ.get("PREX_MAX_UPLOAD_SIZE", DEFAULT_MAX_DECOMPRESSED_SIZE))
+
+# Tipo de contenido para respuestas NDJSON (un registro por línea)
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Campos que todo snapshot debe incluir
+REQUIRED_FIELDS = ['hostname', 'ip_address', 'timestamp']
+
+# /upload/batch escribe un grupo (IP, día) al reunir este número de snapshots...
+BATCH_GROUP_SIZE = 500
+
+# ...y todos los grupos cuando el total retenido en memoria llega a este número
+BATCH_MAX_PENDING = 2000
+
+logger = logging.getLogger('api_server')
 
 # Inicializar aplicación Flask
 app = Flask(__name__)
 
-# Inicializar manejador de almacenamiento
-storage = JSONStorage(data_dir="data")
+# Inicializar manejador de almacenamiento (backend seleccionable por variables de entorno)
+storage = create_storage(
+    os.environ.get("PREX_STORAGE_BACKEND", "json"),
+    data_dir=os.environ.get("PREX_DATA_DIR", "data"),
+    layout=os.environ.get("PREX_STORAGE_LAYOUT")
+)
+
+# Bases de reconstrucción de los agentes que usan el protocolo delta
+delta_sessions = DeltaSessions(os.environ.get("PREX_DATA_DIR", "data"))
+
+# Últimos snapshots de los agentes con perfil de recolección (snapshots parciales)
+partial_snapshots = PartialSnapshots(os.environ.get("PREX_DATA_DIR", "data"))
+
+# Series numéricas por host para /metrics (None: desactivadas)
+metrics_store: Optional[MetricsStore] = None
+if os.environ.get("PREX_METRICS", "1").lower() not in ("0", "false", "no"):
+    metrics_store = MetricsStore(os.environ.get("PREX_DATA_DIR", "data"))
+
+# Agregados de las series por minuto, hora y día (None: desactivados con las series)
+rollups: Optional[Rollups] = Rollups(metrics_store) if metrics_store is not None else None
+
+# Caché de respuestas de /query y /list (None: desactivada)
+query_cache: Optional[QueryCache] = None
+if int(os.environ.get("PREX_QUERY_CACHE_MB", 64)) > 0:
+    query_cache = QueryCache(max_bytes=int(os.environ.get("PREX_QUERY_CACHE_MB", 64)) * 1024 * 1024)
+
+# Cola de escritura diferida (None: cada subida se almacena de forma síncrona)
+ingest_queue: Optional[IngestQueue] = None
+
+
+def configure_ingest(enabled: bool = True, **options: Any) -> Optional[IngestQueue]:
+    """
+    Activa o desactiva la escritura diferida de /upload sobre el almacenamiento actual.
+    
+    Args:
+        enabled: Si es False, las subidas vuelven a almacenarse de forma síncrona
+        **options: Parámetros de IngestQueue (batch_size, flush_interval, fsync, ...)
+    
+    Returns:
+        La cola configurada o None
+    """
+    global ingest_queue
+    if ingest_queue is not None:
+        # Escribir lo pendiente antes de reemplazar la cola
+        ingest_queue.stop()
+    ingest_queue = IngestQueue(storage, on_stored=record_metrics, **options) if enabled else None
+    return ingest_queue
+
+
+def record_metrics(records: List[Dict[str, Any]]) -> None:
+    """
+    Añade a las series numéricas los snapshots ya almacenados.
+    
+    Un error aquí no afecta a la subida: los snapshots ya están guardados y las
+    series pueden reconstruirse con metrics_store.py.
+    """
+    if metrics_store is None:
+        return
+    try:
+        metrics_store.append(records)
+    except Exception as e:
+        logger.error(f"Error recording metrics: {str(e)}")
+
+
+def shutdown_ingest() -> None:
+    """Escribe los registros pendientes de la cola (cierre ordenado del proceso)."""
+    if ingest_queue is not None and not ingest_queue.stop():
+        logger.error("Ingest queue stopped with records still pending")
+
+
+atexit.register(shutdown_ingest)
+
+if os.environ.get("PREX_WRITE_BEHIND", "").lower() in ("1", "true", "yes"):
+    configure_ingest(fsync=os.environ.get("PREX_FSYNC", "never"))
 
 
 @app.route('/upload', methods=['POST'])
@@ -28,7 +137,8 @@ def upload():
     """
     Endpoint para recibir información del sistema desde los agentes.
     
-    Espera un payload JSON con información del sistema.
+    Espera un payload JSON con información del sistema, opcionalmente comprimido
+    con gzip o zstd (cabecera Content-Encoding).
     Devuelve una respuesta JSON con el estado.
     """
     if not request.is_json:
@@ -37,20 +147,73 @@ def upload():
             "message": "Request must be JSON"
         }), 400
     
-    data = request.get_json()
+    try:
+        body = decode_body(request.get_data(cache=False), request.headers.get('Content-Encoding'), MAX_UPLOAD_SIZE)
+        data = json.loads(body)
+    except PayloadError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), e.status
+    except ValueError:
+        return jsonify({
+            "success": False,
+            "message": "Invalid JSON payload"
+        }), 400
+    
+    if not isinstance(data, dict):
+        return jsonify({
+            "success": False,
+            "message": "Payload must be a JSON object"
+        }), 400
     
     # Validar campos requeridos
-    required_fields = ['hostname', 'ip_address', 'timestamp']
-    if not all(field in data for field in required_fields):
+    if not all(field in data for field in REQUIRED_FIELDS):
         return jsonify({
             "success": False,
-            "message": f"Missing required fields: {', '.join(required_fields)}"
+            "message": f"Missing required fields: {', '.join(REQUIRED_FIELDS)}"
         }), 400
     
+    # Protocolo delta: reconstruir el snapshot completo a partir de la base del host.
+    # Si la base no coincide, el agente debe reenviar un keyframe (409)
+    if DELTA_KEY in data:
+        data, error = delta_sessions.apply(data)
+        if data is None:
+            return jsonify({
+                "success": False,
+                "message": error,
+                "resync": True
+            }), 409
+    
+    # Snapshot parcial (perfil de recolección): completarlo con los últimos valores del host
+    if COLLECTED_KEY in data:
+        data, error = partial_snapshots.merge(data)
+        if data is None:
+            return jsonify({
+                "success": False,
+                "message": error
+            }), 400
+    
+    # Con escritura diferida se responde en cuanto el registro queda encolado
+    if ingest_queue is not None:
+        if not ingest_queue.submit(data):
+            # Cola llena: almacenar ahora adelantaría este registro a los de la misma IP
+            # y día que siguen en cola, por lo que se pide al agente que reintente
+            return jsonify({
+                "success": False,
+                "message": "Ingest queue is full, retry later"
+            }), 503, {"Retry-After": str(max(1, math.ceil(ingest_queue.flush_interval)))}
+        return jsonify({
+            "success": True,
+            "message": "Data received and queued for storage",
+            "queued": True
+        })
+    
     # Almacenar datos
     result = storage.store_data(data)
     
     if result['success']:
+        record_metrics([data])
         return jsonify({
             "success": True,
             "message": "Data received and stored successfully",
@@ -63,6 +226,194 @@ def upload():
         }), 500
 
 
+@app.route('/upload/batch', methods=['POST'])
+def upload_batch():
+    """
+    Endpoint para recibir varios snapshots en una sola solicitud.
+    
+    Espera NDJSON (un snapshot JSON completo por línea), opcionalmente comprimido
+    como en /upload. El cuerpo se lee y valida línea a línea; los snapshots válidos
+    se agrupan por IP y día (el de su timestamp) y cada grupo se escribe con una
+    sola llamada a `storage.store_batch`. La respuesta informa el estado de cada línea.
+    Los snapshots parciales se completan como en /upload.
+    """
+    if request.mimetype != NDJSON_MIMETYPE:
+        return jsonify({
+            "success": False,
+            "message": f"Request must be {NDJSON_MIMETYPE}"
+        }), 400
+    
+    results = []
+    groups: Dict[Tuple[str, str], List[Tuple[int, Dict[str, Any]]]] = {}
+    pending = 0
+    
+    def flush_groups(keys) -> None:
+        """Escribe los grupos indicados y registra el estado de sus líneas."""
+        nonlocal pending
+        for key in list(keys):
+            group = groups.pop(key)
+            pending -= len(group)
+            result = storage.store_batch([record for _, record in group], date=key[1])
+            if result['success']:
+                record_metrics([record for _, record in group])
+            for index, _ in group:
+                if result['success']:
+                    results[index] = {"line": results[index]['line'], "status": "stored"}
+                else:
+                    results[index] = {"line": results[index]['line'], "status": "failed", "message": result['message']}
+    
+    error = None
+    try:
+        lines = iter_body_lines(request.stream, request.headers.get('Content-Encoding'), MAX_UPLOAD_SIZE)
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                results.append({"line": line_number, "status": "rejected", "message": "Invalid JSON"})
+                continue
+            if not isinstance(data, dict) or not all(field in data for field in REQUIRED_FIELDS):
+                results.append({"line": line_number, "status": "rejected",
+                                "message": f"Missing required fields: {', '.join(REQUIRED_FIELDS)}"})
+                continue
+            if DELTA_KEY in data:
+                results.append({"line": line_number, "status": "rejected",
+                                "message": "Delta messages are not accepted in batches"})
+                continue
+            timestamp = parse_timestamp(data.get('timestamp'))
+            if timestamp is None:
+                results.append({"line": line_number, "status": "rejected", "message": "Invalid timestamp"})
+                continue
+            if COLLECTED_KEY in data:
+                data, merge_error = partial_snapshots.merge(data)
+                if data is None:
+                    results.append({"line": line_number, "status": "rejected", "message": merge_error})
+                    continue
+            
+            # Los snapshots reenviados pueden ser de días anteriores: se guardan en el
+            # archivo del día de su timestamp para que /query por fecha los encuentre
+            key = (data['ip_address'], timestamp.strftime("%Y-%m-%d"))
+            groups.setdefault(key, []).append((len(results), data))
+            results.append({"line": line_number, "status": "pending"})
+            pending += 1
+            
+            if len(groups[key]) >= BATCH_GROUP_SIZE:
+                flush_groups([key])
+            elif pending >= BATCH_MAX_PENDING:
+                flush_groups(list(groups))
+    except PayloadError as e:
+        # Las líneas ya leídas se almacenan igual; el resto no figura en la respuesta
+        if not results:
+            return jsonify({
+                "success": False,
+                "message": str(e)
+            }), e.status
+        error = str(e)
+    
+    flush_groups(list(groups))
+    
+    counts = {status: 0 for status in ("stored", "rejected", "failed")}
+    for result in results:
+        counts[result['status']] += 1
+    message = f"Stored {counts['stored']} snapshots, rejected {counts['rejected']}, failed {counts['failed']}"
+    if error is not None:
+        message += f"; payload truncated: {error}"
+    
+    return jsonify({
+        "success": error is None and counts['stored'] == len(results),
+        "message": message,
+        "stored": counts['stored'],
+        "rejected": counts['rejected'],
+        "failed": counts['failed'],
+        "truncated": error is not None,
+        "results": results
+    })
+
+
+def _stream_json_array(message: str, records: Iterable[Any]) -> Iterator[str]:
+    """
+    Genera la respuesta de /query por partes: la misma estructura JSON que antes,
+    pero serializando un registro por vez para no mantener el resultado en memoria.
+    
+    Si la lectura falla a mitad de camino, los encabezados (y el 200) ya se enviaron:
+    el documento se cierra con `"success":false` y `"error"` después de los datos,
+    de modo que el cliente no confunda un resultado truncado con uno completo
+    (los parsers JSON conservan el último valor de una clave repetida).
+    """
+    yield '{"success":true,"message":' + json.dumps(message) + ',"data":['
+    try:
+        for i, record in enumerate(records):
+            yield (',' if i else '') + json.dumps(record, separators=(',', ':'))
+    except Exception as e:
+        logger.error(f"Error streaming query results: {str(e)}")
+        yield '],"success":false,"error":' + json.dumps(f"Error reading data: {str(e)}") + '}'
+        return
+    yield ']}'
+
+
+def _watch_errors(records: Iterable[Any], errors: List[Exception]) -> Iterator[Any]:
+    """Recorre los registros anotando en `errors` si la lectura falla (y propagando el error)."""
+    try:
+        yield from records
+    except Exception as e:
+        errors.append(e)
+        raise
+
+
+def _cache_stream(chunks: Iterable[str], errors: List[Exception], key: Tuple[Any, ...], etag: str,
+                  mimetype: str, headers: Dict[str, str]) -> Iterator[str]:
+    """
+    Reenvía las partes de una respuesta y, si se generó completa y sin errores, la
+    guarda en la caché. Deja de acumularla al superar el tamaño máximo de una entrada.
+    """
+    parts: Optional[List[bytes]] = []
+    size = 0
+    for chunk in chunks:
+        if parts is not None:
+            data = chunk.encode('utf-8')
+            size += len(data)
+            parts.append(data)
+            if size > query_cache.max_entry_bytes:
+                parts = None
+        yield chunk
+    if parts is not None and not errors:
+        query_cache.put(key, etag, b''.join(parts), mimetype, headers)
+
+
+def _cached_response(key: Tuple[Any, ...], etag: str) -> Optional[Response]:
+    """
+    Responde desde la caché: 304 si el cliente ya tiene la versión vigente
+    (If-None-Match) o la respuesta guardada; None si hay que generarla.
+    """
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        query_cache.record_not_modified()
+        response = Response(status=304)
+    else:
+        cached = query_cache.get(key, etag)
+        if cached is None:
+            return None
+        response = Response(cached[1], mimetype=cached[2], headers=cached[3])
+        response.headers['X-Cache'] = 'HIT'
+    response.headers['ETag'] = etag
+    return response
+
+
+def _stream_ndjson(records: Iterable[Any]) -> Iterator[str]:
+    """
+    Genera un registro JSON por línea.
+    
+    Si la lectura falla a mitad de camino, la última línea es
+    `{"success":false,"error":...}` para indicar que el resultado está incompleto.
+    """
+    try:
+        for record in records:
+            yield json.dumps(record, separators=(',', ':')) + '\n'
+    except Exception as e:
+        logger.error(f"Error streaming query results: {str(e)}")
+        yield json.dumps({"success": False, "error": f"Error reading data: {str(e)}"}, separators=(',', ':')) + '\n'
+
+
 @app.route('/query', methods=['GET'])
 def query():
     """
@@ -71,11 +422,28 @@ def query():
     Parámetros de consulta:
     - ip: Dirección IP a consultar (requerido)
     - date: Fecha en formato YYYY-MM-DD (opcional, por defecto es hoy)
+    - from: Inicio del rango de tiempo, ISO 8601 o epoch (opcional)
+    - to: Fin del rango de tiempo, ISO 8601 o epoch (opcional, por defecto es ahora)
+    
+    - fields: Campos a devolver separados por comas, p. ej. cpu_info.avg_usage,timestamp (opcional)
+    - filter: Predicado <campo><op><valor> con op en =, !=, >, >=, <, <= (opcional, repetible)
+    
+    Si se indica `from` o `to` se devuelven los snapshots del rango, que puede
+    abarcar varios días, y se ignora `date`. Los filtros sobre campos dentro de una
+    lista (p. ej. processes.cpu_percent>10) filtran los elementos de esa lista; el
+    resto decide si se incluye cada snapshot.
     
-    Devuelve una respuesta JSON con los datos consultados.
+    Los resultados se envían por partes (chunked). Con `Accept: application/x-ndjson`
+    se devuelve un registro por línea; en otro caso, un documento JSON con los datos.
+    
+    Las consultas de un día o de un rango con `to` explícito llevan un ETag que
+    depende de la versión de los datos que leen: con If-None-Match se responde 304
+    y las respuestas se guardan en la caché de consultas (ver query_cache.py).
     """
     ip_address = request.args.get('ip')
     date = request.args.get('date')
+    start_param = request.args.get('from')
+    end_param = request.args.get('to')
     
     if not ip_address:
         return jsonify({
@@ -83,15 +451,63 @@ def query():
             "message": "IP address is required"
         }), 400
     
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        predicates = parse_predicates(request.args.getlist('filter'))
+    except QueryFilterError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
+    
+    ndjson = request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+    
     # Consultar datos
-    result = storage.query_data(ip_address, date)
+    key = etag = None
+    if start_param or end_param:
+        start, end, error = _time_range(start_param, end_param)
+        if error:
+            return jsonify({
+                "success": False,
+                "message": error
+            }), 400
+        if query_cache is not None and end_param:
+            # Sin `to` el rango termina ahora y cada consulta es distinta: no se guarda
+            key = ('query', ip_address, start.isoformat(), end.isoformat())
+            version = [storage.data_version(ip_address, date_str) for date_str in date_span(start, end)]
+    else:
+        date_str, error = resolve_date(date)
+        if query_cache is not None and not error:
+            key = ('query', ip_address, date_str)
+            version = storage.data_version(ip_address, date_str)
+    if key is not None:
+        key += (request.args.get('fields', ''), tuple(request.args.getlist('filter')), ndjson)
+        etag = make_etag(key, version)
+        cached = _cached_response(key, etag)
+        if cached is not None:
+            return cached
+    
+    if start_param or end_param:
+        result = storage.query_range(ip_address, start, end, stream=True)
+    else:
+        result = storage.query_data(ip_address, date, stream=True)
     
     if result['success']:
-        return jsonify({
-            "success": True,
-            "message": result['message'],
-            "data": result['data']
-        })
+        errors: List[Exception] = []
+        records = _watch_errors(result['data'], errors)
+        if fields or predicates:
+            # Filtrar y proyectar cada registro a medida que se lee del almacenamiento
+            records = apply_query(records, predicates, fields)
+        if ndjson:
+            mimetype, headers = NDJSON_MIMETYPE, {'X-Query-Message': result['message']}
+            chunks = _stream_ndjson(records)
+        else:
+            mimetype, headers = 'application/json', {}
+            chunks = _stream_json_array(result['message'], records)
+        if key is None:
+            return Response(chunks, mimetype=mimetype, headers=headers)
+        return Response(_cache_stream(chunks, errors, key, etag, mimetype, headers), mimetype=mimetype,
+                        headers=dict(headers, **{'ETag': etag, 'X-Cache': 'MISS'}))
     else:
         return jsonify({
             "success": False,
@@ -99,21 +515,170 @@ def query():
         }), 404
 
 
+def _time_range(start_param: Optional[str], end_param: Optional[str],
+                max_range: datetime.timedelta = MAX_QUERY_RANGE) -> Tuple[Optional[datetime.datetime], Optional[datetime.datetime], Optional[str]]:
+    """
+    Interpreta los parámetros `from` y `to` de una consulta por rango.
+    
+    Sin `to` el rango termina ahora; sin `from`, comienza al inicio del día de `to`.
+    El rango no puede superar `max_range`.
+    
+    Returns:
+        Tupla (inicio, fin, mensaje de error); el error es None si el rango es válido
+    """
+    start = parse_timestamp(start_param) if start_param else None
+    end = parse_timestamp(end_param) if end_param else datetime.datetime.now()
+    if (start_param and start is None) or end is None:
+        return None, None, "Invalid time range. Use ISO 8601 timestamps or epoch seconds."
+    if start is None:
+        start = datetime.datetime.combine(end.date(), datetime.time.min)
+    if start > end or end - start > max_range:
+        return None, None, f"Invalid time range: 'from' must precede 'to' by at most {max_range.days} days"
+    return start, end, None
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Endpoint para consultar las series numéricas de un host (ver metrics_store.py).
+    
+    Parámetros de consulta:
+    - ip: Dirección IP a consultar (requerido)
+    - from, to: Rango de tiempo como en /query (opcional, por defecto el día de hoy)
+    - columns: Métricas a devolver separadas por comas, p. ej. cpu_avg,process_count
+      (opcional, por defecto todas)
+    - resolution: raw (predeterminado, un punto por snapshot), 1m, 1h, 1d o auto
+      (la más detallada que no supera max_points puntos; ver rollups.py)
+    - max_points: Puntos máximos con resolution=auto (opcional)
+    
+    Devuelve una lista por métrica alineada con "ts" (timestamps epoch); los valores
+    ausentes son null. No lee ningún snapshot: solo las columnas del rango. Con
+    agregados, "ts" es el inicio de cada bucket, "count" sus snapshots y cada métrica
+    se devuelve como <métrica>_min, _max, _avg y _p95; el rango puede llegar a
+    MAX_ROLLUP_RANGE.
+    """
+    ip_address = request.args.get('ip')
+    if not ip_address:
+        return jsonify({
+            "success": False,
+            "message": "IP address is required"
+        }), 400
+    if metrics_store is None:
+        return jsonify({
+            "success": False,
+            "message": "Metrics store is disabled on this server"
+        }), 404
+    
+    resolution = request.args.get('resolution', 'raw')
+    max_range = MAX_QUERY_RANGE if resolution == 'raw' else MAX_ROLLUP_RANGE
+    start_param = request.args.get('from')
+    end_param = request.args.get('to')
+    if start_param or end_param:
+        start, end, error = _time_range(start_param, end_param, max_range)
+    else:
+        start, end, error = _time_range(None, None)
+        end = datetime.datetime.combine(end.date(), datetime.time.max)
+    columns_param = request.args.get('columns')
+    columns = [name.strip() for name in columns_param.split(',') if name.strip()] if columns_param else None
+    if not error and resolution == 'auto':
+        try:
+            max_points = int(request.args.get('max_points', DEFAULT_MAX_POINTS))
+        except ValueError:
+            max_points = 0
+        if max_points <= 0:
+            error = "max_points must be a positive integer"
+        else:
+            resolution = choose_resolution(start, end, max_points)
+    if not error:
+        try:
+            if resolution == 'raw':
+                series = metrics_store.read(ip_address, start, end, columns)
+            elif rollups is not None:
+                series = rollups.read(ip_address, start, end, resolution, columns)
+            else:
+                error = "Rollups are disabled on this server"
+        except ValueError as e:
+            error = str(e)
+    if error:
+        return jsonify({
+            "success": False,
+            "message": error
+        }), 400
+    
+    count = len(series['ts'])
+    if not count:
+        return jsonify({
+            "success": False,
+            "message": f"No metrics found for IP {ip_address} between {start} and {end}"
+        }), 404
+    return jsonify({
+        "success": True,
+        "message": f"Metrics retrieved for IP {ip_address} between {start} and {end}",
+        "ip_address": ip_address,
+        "resolution": resolution,
+        "count": count,
+        "columns": series
+    })
+
+
 @app.route('/list', methods=['GET'])
 def list_data():
     """
-    Endpoint para listar todos los archivos de datos disponibles.
+    Endpoint para listar los días con datos disponibles, por páginas.
     
-    Devuelve una respuesta JSON con una lista de archivos de datos disponibles.
+    Parámetros de consulta:
+    - limit: Entradas por página (opcional, por defecto DEFAULT_PAGE_SIZE, máximo MAX_PAGE_SIZE)
+    - cursor: Valor de "next_cursor" de la página anterior (opcional)
+    - ip: Solo los días de esta IP (opcional)
+    - from, to: Solo las fechas del rango, YYYY-MM-DD inclusive (opcionales)
+    
+    Devuelve una respuesta JSON con una página del catálogo del almacenamiento
+    (registros, bytes y primer y último timestamp de cada IP y día) y el cursor de
+    la página siguiente, null en la última. La respuesta lleva un ETag y se guarda
+    en la caché de consultas hasta que cambie el catálogo.
     """
-    result = storage.list_available_data()
+    ip_address = request.args.get('ip') or None
+    cursor = request.args.get('cursor') or None
+    start_date, end_date = request.args.get('from'), request.args.get('to')
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        if not 0 < limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        for value in (start_date, end_date):
+            error = resolve_date(value)[1] if value else None
+            if error:
+                raise ValueError(error)
+        if cursor:
+            decode_cursor(cursor)
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
+    
+    key = etag = None
+    if query_cache is not None:
+        key = ('list', limit, cursor, ip_address, start_date, end_date)
+        etag = make_etag(key, storage.listing_version())
+        cached = _cached_response(key, etag)
+        if cached is not None:
+            return cached
+    
+    result = storage.list_available_data(limit=limit, cursor=cursor, ip_address=ip_address,
+                                         start_date=start_date, end_date=end_date)
     
     if result['success']:
-        return jsonify({
+        response = jsonify({
             "success": True,
             "message": result['message'],
-            "available_data": result['available_data']
+            "available_data": result['available_data'],
+            "next_cursor": result.get('next_cursor')
         })
+        if key is not None:
+            query_cache.put(key, etag, response.get_data(), response.mimetype)
+            response.headers['ETag'] = etag
+            response.headers['X-Cache'] = 'MISS'
+        return response
     else:
         return jsonify({
             "success": False,
@@ -126,11 +691,15 @@ def health_check():
     """
     Endpoint de verificación de salud.
     
-    Devuelve una respuesta JSON con el estado.
+    Devuelve una respuesta JSON con el estado. Con escritura diferida incluye
+    la profundidad de la cola y el retraso de escritura (`ingest`); con la caché de
+    consultas, sus aciertos, fallos y desalojos (`query_cache`).
     """
     return jsonify({
         "status": "ok",
-        "message": "API server is running"
+        "message": "API server is running",
+        "ingest": ingest_queue.stats() if ingest_queue is not None else None,
+        "query_cache": query_cache.stats() if query_cache is not None else None
     })
 
 
@@ -146,8 +715,13 @@ def index():
         "version": "1.0.0",
         "endpoints": [
             {"method": "POST", "path": "/upload", "description": "Subir información del sistema"},
+            {"method": "POST", "path": "/upload/batch", "description": "Subir varios snapshots en NDJSON"},
             {"method": "GET", "path": "/query?ip=<IP>&date=<YYYY-MM-DD>", "description": "Consultar información del sistema"},
-            {"method": "GET", "path": "/list", "description": "Listar archivos de datos disponibles"},
+            {"method": "GET", "path": "/query?ip=<IP>&from=<TIMESTAMP>&to=<TIMESTAMP>", "description": "Consultar un rango de tiempo"},
+            {"method": "GET", "path": "/query?ip=<IP>&fields=<CAMPOS>&filter=<PREDICADO>", "description": "Proyectar campos y filtrar registros"},
+            {"method": "GET", "path": "/metrics?ip=<IP>&from=<TIMESTAMP>&to=<TIMESTAMP>&columns=<MÉTRICAS>", "description": "Consultar series numéricas"},
+            {"method": "GET", "path": "/metrics?ip=<IP>&from=<TIMESTAMP>&to=<TIMESTAMP>&resolution=auto", "description": "Consultar agregados por minuto, hora o día"},
+            {"method": "GET", "path": "/list?limit=<N>&cursor=<CURSOR>&ip=<IP>&from=<YYYY-MM-DD>&to=<YYYY-MM-DD>", "description": "Listar por páginas los días con datos disponibles"},
             {"method": "GET", "path": "/health", "description": "Verificación de salud"}
         ]
     })
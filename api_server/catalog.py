@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Módulo de catálogo para el servidor API de Prex Challenge.
+Mantiene una tabla con una fila por IP y día almacenados (registros, bytes, primer
+y último timestamp), actualizada en cada escritura, de modo que /list se responde
+por páginas con una consulta indexada en lugar de recorrer el directorio de datos
+e interpretar cada nombre de archivo.
+
+Los backends de archivos (json, jsonl) guardan el catálogo en data/.catalog.db;
+el backend sqlite lo guarda en su propia base, en la misma transacción que los
+snapshots. En ambos casos puede reconstruirse a partir de los datos:
+
+    python api_server/catalog.py --data-dir data --storage json
+"""
+
+import os
+import sys
+import json
+import math
+import base64
+import logging
+import sqlite3
+import argparse
+import threading
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from api_server.record_index import record_timestamp
+
+
+CATALOG_DB = '.catalog.db'
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    ip_address TEXT NOT NULL,
+    date TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    first_timestamp REAL,
+    last_timestamp REAL,
+    segments INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ip_address, date)
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_date ON catalog (date, ip_address);
+"""
+
+# Suma los registros y bytes de una escritura a la fila de su IP y día
+UPSERT_SQL = """
+INSERT INTO catalog (ip_address, date, records, bytes, first_timestamp, last_timestamp, segments)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (ip_address, date) DO UPDATE SET
+    records = records + excluded.records,
+    bytes = bytes + excluded.bytes,
+    first_timestamp = MIN(COALESCE(first_timestamp, excluded.first_timestamp),
+                          COALESCE(excluded.first_timestamp, first_timestamp)),
+    last_timestamp = MAX(COALESCE(last_timestamp, excluded.last_timestamp),
+                         COALESCE(excluded.last_timestamp, last_timestamp)),
+    segments = MAX(segments, excluded.segments)
+"""
+
+REPLACE_SQL = "INSERT OR REPLACE INTO catalog VALUES (?, ?, ?, ?, ?, ?, ?)"
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+
+# Fila del catálogo: (IP, fecha, registros, bytes, primer timestamp, último timestamp, segmentos)
+CatalogRow = Tuple[str, str, int, int, Optional[float], Optional[float], int]
+
+logger = logging.getLogger('api_server')
+
+
+def timestamp_bounds(records: Iterable[Dict[str, Any]]) -> Tuple[int, Optional[float], Optional[float]]:
+    """
+    Cantidad de registros y primer y último timestamp (epoch) de una lista de snapshots.
+
+    Los timestamps inválidos no cuentan para los extremos; sin ninguno válido son None.
+    """
+    count = 0
+    first = last = None
+    for record in records:
+        count += 1
+        timestamp = record_timestamp(record)
+        if math.isnan(timestamp):
+            continue
+        first = timestamp if first is None else min(first, timestamp)
+        last = timestamp if last is None else max(last, timestamp)
+    return count, first, last
+
+
+def encode_cursor(date_str: str, ip_address: str) -> str:
+    """Cursor opaco de /list: la posición de la última fila devuelta."""
+    return base64.urlsafe_b64encode(json.dumps([date_str, ip_address]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    Interpreta un cursor de encode_cursor.
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    try:
+        date_str, ip_address = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(date_str, str) or not isinstance(ip_address, str):
+            raise ValueError
+        return date_str, ip_address
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def upsert(conn: sqlite3.Connection, ip_address: str, date_str: str, records: int, size: int,
+           first: Optional[float], last: Optional[float], segments: int = 0) -> None:
+    """Suma una escritura a la fila de su IP y día (dentro de la transacción del llamador)."""
+    conn.execute(UPSERT_SQL, [ip_address, date_str, records, size, first, last, segments])
+
+
+def select_page(conn: sqlite3.Connection, limit: Optional[int] = None, cursor: Optional[str] = None,
+                ip_address: Optional[str] = None, start_date: Optional[str] = None,
+                end_date: Optional[str] = None) -> Tuple[List[CatalogRow], Optional[str]]:
+    """
+    Devuelve una página del catálogo ordenada por fecha e IP.
+
+    La página se busca por clave (la fecha e IP del cursor) sobre un índice, por lo
+    que su costo depende del tamaño de la página y no de su posición.
+
+    Args:
+        conn: Conexión con la tabla catalog
+        limit: Filas por página (None: todas)
+        cursor: Cursor devuelto con la página anterior
+        ip_address: Solo las filas de esta IP
+        start_date, end_date: Solo las fechas del rango (YYYY-MM-DD, inclusive)
+
+    Returns:
+        Tupla (filas, cursor de la página siguiente o None si no hay más)
+
+    Raises:
+        ValueError: Si el cursor no es válido
+    """
+    conditions, params = [], []
+    if ip_address is not None:
+        conditions.append("ip_address = ?")
+        params.append(ip_address)
+    if start_date:
+        conditions.append("date >= ?")
+        params.append(start_date)
+    if end_date:
+        conditions.append("date <= ?")
+        params.append(end_date)
+    if cursor:
+        conditions.append("(date, ip_address) > (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    sql = "SELECT * FROM catalog"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY date, ip_address"
+    if limit is not None:
+        # Una fila de más indica si hay otra página
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1][1], rows[-1][0])
+    return rows, None
+
+
+class Catalog:
+    """
+    Catálogo de los backends de archivos, en una base SQLite propia del directorio de datos.
+
+    Las escrituras de una IP y día se registran bajo el mismo bloqueo que el archivo
+    que modifican, por lo que el catálogo sigue el orden de los datos. Si el proceso
+    se interrumpe entre el archivo y el catálogo, `rebuild` del backend lo corrige.
+    """
+
+    def __init__(self, data_dir: str = "data"):
+        """
+        Inicializa el catálogo, creando la base si no existe.
+
+        Args:
+            data_dir: Directorio de datos (el catálogo se guarda en data_dir/.catalog.db)
+        """
+        self.db_path = os.path.join(data_dir, CATALOG_DB)
+        # True si la base no existía: el backend debe llenarla a partir de los datos
+        self.created = not os.path.exists(self.db_path)
+        # Una conexión por hilo: sqlite3 no permite compartirlas entre hilos
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(CATALOG_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Devuelve la conexión del hilo actual, creándola si es necesario."""
+        conn = getattr(self._local, 'conn', None)
+        # Tras un fork (workers de gunicorn) la conexión heredada no puede reutilizarse
+        if conn is not None and getattr(self._local, 'pid', None) != os.getpid():
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def add(self, ip_address: str, date_str: str, records: List[Dict[str, Any]], size: int,
+            segments: int = 0) -> None:
+        """
+        Registra una escritura.
+
+        Args:
+            ip_address: IP de los registros
+            date_str: Fecha (YYYY-MM-DD) del archivo en el que se escribieron
+            records: Registros escritos
+            size: Bytes que la escritura añadió al día
+            segments: Segmentos del día después de la escritura (jsonl)
+        """
+        count, first, last = timestamp_bounds(records)
+        with self._connect() as conn:
+            upsert(conn, ip_address, date_str, count, size, first, last, segments)
+
+    def set(self, row: CatalogRow) -> None:
+        """Reemplaza la fila de una IP y día (por ejemplo, tras reescribir sus archivos)."""
+        with self._connect() as conn:
+            conn.execute(REPLACE_SQL, row)
+
+    def remove(self, ip_address: str, date_str: str) -> None:
+        """Elimina la fila de una IP y día."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM catalog WHERE ip_address = ? AND date = ?", [ip_address, date_str])
+
+    def replace_all(self, rows: Iterable[CatalogRow]) -> int:
+        """Reemplaza el catálogo completo en una sola transacción y devuelve las filas escritas."""
+        rows = list(rows)
+        with self._connect() as conn:
+            conn.execute("DELETE FROM catalog")
+            conn.executemany(REPLACE_SQL, rows)
+        return len(rows)
+
+    def page(self, **options: Any) -> Tuple[List[CatalogRow], Optional[str]]:
+        """Devuelve una página del catálogo (ver select_page)."""
+        return select_page(self._connect(), **options)
+
+    def version(self) -> List[Tuple[int, int]]:
+        """Firma del catálogo: tamaño y mtime de la base y de su WAL."""
+        version = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            version.append((stat.st_size, stat.st_mtime_ns))
+        return version
+
+
+def parse_arguments():
+    """Analiza los argumentos de línea de comandos."""
+    from api_server.storage import STORAGE_BACKENDS
+
+    parser = argparse.ArgumentParser(description='Rebuild the Prex Challenge data catalog from stored data')
+
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default=os.environ.get('PREX_DATA_DIR', os.path.join(parent_dir, 'data')),
+        help='Directorio de datos (predeterminado: data/)'
+    )
+
+    parser.add_argument(
+        '--storage',
+        type=str,
+        choices=sorted(STORAGE_BACKENDS),
+        default=os.environ.get('PREX_STORAGE_BACKEND', 'json'),
+        help='Backend de almacenamiento (predeterminado: json)'
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from api_server.storage import create_storage
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_arguments()
+    rows = create_storage(args.storage, data_dir=args.data_dir).rebuild_catalog()
+    logger.info(f"Rebuilt catalog with {rows} entries")
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Módulo de compactación para el servidor API de Prex Challenge.
+Guarda los registros de un día cerrado en un único archivo IP_YYYY-MM-DD.jsonl.gz:
+JSON Lines comprimido con gzip en bloques independientes (un miembro gzip por
+bloque de ~256 KB sin comprimir), de modo que el archivo se puede leer completo
+con cualquier herramienta gzip y, a la vez, leer un registro suelto
+descomprimiendo solo su bloque.
+
+Cada archivo compactado tiene dos archivos laterales:
+
+    <archivo>.idx     índice de record_index.py, con los desplazamientos de los
+                      registros en el contenido sin comprimir
+    <archivo>.blocks  tabla de bloques: desplazamiento sin comprimir, desplazamiento
+                      y longitud comprimidos de cada miembro gzip
+
+Si faltan o no corresponden al archivo, se reconstruyen recorriendo sus miembros.
+"""
+
+import os
+import gzip
+import json
+import zlib
+import bisect
+import struct
+import threading
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+from api_server.record_index import (
+    IndexEntry, index_path, read_index, write_index, remove_index, record_timestamp
+)
+
+
+COMPACTED_SUFFIX = '.jsonl.gz'
+BLOCKS_SUFFIX = '.blocks'
+
+# Cabecera de la tabla de bloques: firma, tamaño del archivo comprimido que describe y
+# bytes de su contenido sin comprimir
+BLOCKS_HEADER = struct.Struct('<4sQQ')
+BLOCKS_MAGIC = b'PXB1'
+
+# Bloque: desplazamiento sin comprimir, desplazamiento y longitud del miembro gzip
+BLOCK = struct.Struct('<QQI')
+
+Block = Tuple[int, int, int]
+
+# Bytes sin comprimir por bloque: cuanto más chico, menos se descomprime por registro
+DEFAULT_BLOCK_SIZE = 256 * 1024
+DEFAULT_COMPRESS_LEVEL = 6
+
+# Tamaño de los bloques leídos al recorrer un archivo compactado sin tabla
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def blocks_path(data_path: str) -> str:
+    """Devuelve la ruta de la tabla de bloques de un archivo compactado."""
+    return data_path + BLOCKS_SUFFIX
+
+
+def temp_path(data_path: str) -> str:
+    """Devuelve la ruta temporal en la que write_compacted escribe un archivo compactado."""
+    return data_path + '.tmp'
+
+
+def write_blocks(data_path: str, blocks: List[Block], size: int, content_size: int) -> None:
+    """
+    Escribe de forma atómica la tabla de bloques de un archivo compactado de `size`
+    bytes cuyo contenido sin comprimir ocupa `content_size` bytes.
+    """
+    path = blocks_path(data_path)
+    temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp, 'wb') as f:
+        f.write(BLOCKS_HEADER.pack(BLOCKS_MAGIC, size, content_size))
+        for block in blocks:
+            f.write(BLOCK.pack(*block))
+    os.replace(temp, path)
+
+
+def read_blocks(data_path: str) -> Optional[Tuple[List[Block], int]]:
+    """
+    Lee la tabla de bloques de un archivo compactado.
+
+    Returns:
+        Tupla (bloques, bytes sin comprimir), o None si la tabla no existe o no
+        corresponde al tamaño actual del archivo
+    """
+    try:
+        with open(blocks_path(data_path), 'rb') as f:
+            raw = f.read()
+        size = os.path.getsize(data_path)
+    except FileNotFoundError:
+        return None
+    if len(raw) < BLOCKS_HEADER.size:
+        return None
+    magic, covered, content_size = BLOCKS_HEADER.unpack_from(raw, 0)
+    if magic != BLOCKS_MAGIC or covered != size or (len(raw) - BLOCKS_HEADER.size) % BLOCK.size:
+        return None
+    return list(BLOCK.iter_unpack(raw[BLOCKS_HEADER.size:])), content_size
+
+
+def remove_sidecars(data_path: str) -> None:
+    """Elimina el índice y la tabla de bloques de un archivo compactado si existen."""
+    remove_index(data_path)
+    try:
+        os.remove(blocks_path(data_path))
+    except FileNotFoundError:
+        pass
+
+
+def _line_entries(data: bytes, offset: int, entries: List[IndexEntry]) -> None:
+    """Añade las entradas de índice de las líneas de un bloque que empieza en `offset`."""
+    for line in data.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped:
+            try:
+                entries.append((record_timestamp(json.loads(stripped)), offset, len(line)))
+            except json.JSONDecodeError:
+                pass
+        offset += len(line)
+
+
+def write_compacted(data_path: str, records: Iterable[Dict[str, Any]],
+                    block_size: int = DEFAULT_BLOCK_SIZE, level: int = DEFAULT_COMPRESS_LEVEL) -> int:
+    """
+    Escribe un archivo compactado en temp_path(data_path) junto con los archivos
+    laterales de `data_path`.
+
+    El llamador lo pone en su lugar con os.replace(temp_path(data_path), data_path):
+    hasta entonces los lectores siguen viendo los archivos anteriores. La tabla de
+    bloques registra el tamaño del archivo nuevo, por lo que si un lector la
+    encuentra junto al archivo anterior la descarta y la reconstruye.
+
+    Args:
+        data_path: Ruta final del archivo compactado
+        records: Registros en el orden en que deben quedar
+        block_size: Bytes sin comprimir por miembro gzip
+        level: Nivel de compresión gzip (1-9)
+
+    Returns:
+        Cantidad de registros escritos
+    """
+    temp = temp_path(data_path)
+    entries: List[IndexEntry] = []
+    blocks: List[Block] = []
+    pending: List[bytes] = []
+    pending_size = 0
+    offset = compressed_offset = 0
+
+    def flush(f) -> None:
+        nonlocal pending, pending_size, compressed_offset
+        member = gzip.compress(b''.join(pending), compresslevel=level, mtime=0)
+        f.write(member)
+        blocks.append((offset - pending_size, compressed_offset, len(member)))
+        compressed_offset += len(member)
+        pending, pending_size = [], 0
+
+    try:
+        with open(temp, 'wb') as f:
+            for record in records:
+                line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+                # Cada bloque termina en un fin de línea: ningún registro queda repartido
+                if pending and pending_size + len(line) > block_size:
+                    flush(f)
+                entries.append((record_timestamp(record), offset, len(line)))
+                pending.append(line)
+                pending_size += len(line)
+                offset += len(line)
+            if pending:
+                flush(f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+    write_blocks(data_path, blocks, compressed_offset, offset)
+    write_index(data_path, entries, offset)
+    return len(entries)
+
+
+def scan_compacted(data_path: str) -> Tuple[List[IndexEntry], List[Block], int]:
+    """
+    Reconstruye el índice y la tabla de bloques recorriendo los miembros gzip del archivo.
+
+    Returns:
+        Tupla (entradas del índice, bloques, bytes sin comprimir)
+    """
+    entries: List[IndexEntry] = []
+    blocks: List[Block] = []
+    offset = compressed_offset = 0
+    decompressor = zlib.decompressobj(wbits=31)
+    member_start = 0
+    output: List[bytes] = []
+
+    with open(data_path, 'rb') as f:
+        data = f.read(READ_CHUNK_SIZE)
+        while data:
+            output.append(decompressor.decompress(data))
+            if decompressor.eof:
+                # Fin de un miembro: lo que sobra del bloque leído es el comienzo del siguiente
+                unused = decompressor.unused_data
+                member_end = compressed_offset + len(data) - len(unused)
+                content = b''.join(output)
+                _line_entries(content, offset, entries)
+                blocks.append((offset, member_start, member_end - member_start))
+                offset += len(content)
+                member_start, output = member_end, []
+                decompressor = zlib.decompressobj(wbits=31)
+                compressed_offset = member_end
+                data = unused or f.read(READ_CHUNK_SIZE)
+                continue
+            compressed_offset += len(data)
+            data = f.read(READ_CHUNK_SIZE)
+    return entries, blocks, offset
+
+
+def load_compacted_index(data_path: str) -> List[IndexEntry]:
+    """Devuelve el índice de un archivo compactado, reconstruyendo sus archivos laterales si no coinciden."""
+    table = read_blocks(data_path)
+    if table is not None and os.path.exists(index_path(data_path)):
+        covered, entries = read_index(data_path)
+        if covered == table[1]:
+            return entries
+
+    entries, blocks, size = scan_compacted(data_path)
+    # El tamaño comprimido sale de lo recorrido y no de un stat: el archivo pudo
+    # reemplazarse por una nueva compactación mientras se leía
+    write_blocks(data_path, blocks, blocks[-1][1] + blocks[-1][2] if blocks else 0, size)
+    write_index(data_path, entries, size)
+    return entries
+
+
+def iter_compacted(data_path: str) -> Iterator[Dict[str, Any]]:
+    """Recorre los registros de un archivo compactado en orden, descomprimiéndolo por bloques."""
+    with gzip.open(data_path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+class CompactedFile:
+    """
+    Lectura por posición del contenido sin comprimir de un archivo compactado.
+
+    Ofrece seek/read/close como un archivo binario, para que record_index.read_record
+    funcione igual que con los archivos sin comprimir; solo se descomprime el bloque
+    que contiene la posición pedida, y el último bloque leído se conserva en memoria.
+    """
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        table = read_blocks(data_path)
+        if table is None:
+            load_compacted_index(data_path)
+            table = read_blocks(data_path) or ([], 0)
+        self.blocks = table[0]
+        self._starts = [block[0] for block in self.blocks]
+        self._file = open(data_path, 'rb')
+        self._position = 0
+        self._cached_index: Optional[int] = None
+        self._cached: bytes = b''
+
+    def _block(self, index: int) -> bytes:
+        """Devuelve el contenido descomprimido de un bloque."""
+        if self._cached_index != index:
+            _, compressed_offset, compressed_length = self.blocks[index]
+            self._file.seek(compressed_offset)
+            self._cached = gzip.decompress(self._file.read(compressed_length))
+            self._cached_index = index
+        return self._cached
+
+    def seek(self, offset: int) -> None:
+        self._position = offset
+
+    def read(self, length: int) -> bytes:
+        """Lee `length` bytes del contenido sin comprimir desde la posición actual."""
+        parts = []
+        index = bisect.bisect_right(self._starts, self._position) - 1
+        while length > 0 and 0 <= index < len(self.blocks):
+            data = self._block(index)
+            start = self._position - self.blocks[index][0]
+            part = data[start:start + length]
+            if not part:
+                break
+            parts.append(part)
+            self._position += len(part)
+            length -= len(part)
+            index += 1
+        return b''.join(parts)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def open_data(data_path: str):
+    """Abre un archivo de datos para leer registros por posición, compactado o no."""
+    if data_path.endswith(COMPACTED_SUFFIX):
+        return CompactedFile(data_path)
+    return open(data_path, 'rb')
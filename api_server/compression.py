@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Módulo de descompresión de cargas para el servidor API de Prex Challenge.
+Decodifica el cuerpo de las subidas según su cabecera Content-Encoding, con un
+límite de tamaño descomprimido que protege frente a cargas diseñadas para
+expandirse sin control (zip bombs).
+"""
+
+import io
+import gzip
+import zlib
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete solo se acepta gzip
+    zstandard = None
+
+
+# Tamaño máximo predeterminado de una carga, una vez descomprimida (bytes)
+DEFAULT_MAX_DECOMPRESSED_SIZE = 32 * 1024 * 1024
+
+# Tamaño de los bloques leídos al descomprimir
+READ_CHUNK_SIZE = 64 * 1024
+
+# Excepciones que indican datos comprimidos corruptos
+_DECODE_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+class PayloadError(ValueError):
+    """Carga que no se puede decodificar; `status` es el código HTTP a devolver."""
+
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def supported_encodings() -> tuple:
+    """Devuelve las codificaciones aceptadas en Content-Encoding."""
+    return ('identity', 'gzip', 'zstd') if zstandard is not None else ('identity', 'gzip')
+
+
+def _read_limited(stream, max_size: int) -> bytes:
+    """Lee un flujo descomprimido sin superar max_size bytes."""
+    chunks = []
+    total = 0
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            return b''.join(chunks)
+        total += len(chunk)
+        if total > max_size:
+            raise PayloadError(f"Decompressed payload exceeds {max_size} bytes", 413)
+        chunks.append(chunk)
+
+
+def decode_body(body: bytes, encoding: Optional[str],
+                max_size: int = DEFAULT_MAX_DECOMPRESSED_SIZE) -> bytes:
+    """
+    Decodifica el cuerpo de una solicitud según su Content-Encoding.
+
+    Args:
+        body: Cuerpo recibido
+        encoding: Valor de la cabecera Content-Encoding (None o vacío: sin compresión)
+        max_size: Tamaño máximo permitido del cuerpo decodificado
+
+    Returns:
+        Cuerpo descomprimido
+
+    Raises:
+        PayloadError: 413 si supera max_size, 415 si la codificación no está
+            soportada y 400 si los datos comprimidos no son válidos
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding not in supported_encodings():
+        raise PayloadError(
+            f"Unsupported Content-Encoding: {encoding}. Use one of: {', '.join(supported_encodings())}", 415
+        )
+
+    if encoding == 'identity':
+        if len(body) > max_size:
+            raise PayloadError(f"Payload exceeds {max_size} bytes", 413)
+        return body
+
+    try:
+        if encoding == 'gzip':
+            with gzip.GzipFile(fileobj=io.BytesIO(body)) as stream:
+                return _read_limited(stream, max_size)
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)) as stream:
+            return _read_limited(stream, max_size)
+    except _DECODE_ERRORS as e:
+        raise PayloadError(f"Invalid {encoding} payload: {str(e)}", 400)
+
+
+def iter_body_lines(stream: BinaryIO, encoding: Optional[str],
+                    max_size: int = DEFAULT_MAX_DECOMPRESSED_SIZE) -> Iterator[bytes]:
+    """
+    Lee un cuerpo NDJSON por bloques y devuelve sus líneas a medida que llegan,
+    descomprimiendo según Content-Encoding, sin cargarlo entero en memoria.
+
+    Args:
+        stream: Flujo de entrada de la solicitud
+        encoding: Valor de la cabecera Content-Encoding
+        max_size: Tamaño máximo permitido del cuerpo decodificado
+
+    Yields:
+        Cada línea, sin el salto de línea final
+
+    Raises:
+        PayloadError: Como decode_body; puede ocurrir después de haber devuelto
+            algunas líneas si el límite se supera o los datos se corrompen a mitad
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding not in supported_encodings():
+        raise PayloadError(
+            f"Unsupported Content-Encoding: {encoding}. Use one of: {', '.join(supported_encodings())}", 415
+        )
+
+    if encoding == 'gzip':
+        reader = gzip.GzipFile(fileobj=stream)
+    elif encoding == 'zstd':
+        reader = zstandard.ZstdDecompressor().stream_reader(stream)
+    else:
+        reader = stream
+
+    total = 0
+    # Partes de la línea en curso: se unen solo al encontrar el salto de línea,
+    # para no copiar una línea larga en cada bloque
+    parts = []
+    try:
+        while True:
+            chunk = reader.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > max_size:
+                raise PayloadError(f"Payload exceeds {max_size} bytes", 413)
+            start = 0
+            while True:
+                end = chunk.find(b'\n', start)
+                if end < 0:
+                    parts.append(chunk[start:])
+                    break
+                parts.append(chunk[start:end])
+                yield b''.join(parts)
+                parts = []
+                start = end + 1
+    except _DECODE_ERRORS as e:
+        raise PayloadError(f"Invalid {encoding} payload: {str(e)}", 400)
+    last = b''.join(parts)
+    if last:
+        yield last
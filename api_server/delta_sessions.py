@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Módulo de sesiones delta para el servidor API de Prex Challenge.
+Reconstruye los snapshots que los agentes envían con el protocolo delta
+(agent/delta.py) a partir de la última base de cada host.
+
+Las bases se guardan en data/.delta/ (ver host_state.HostStateStore) para que
+cualquier worker de gunicorn pueda aplicar el siguiente delta de un host.
+"""
+
+import os
+import sys
+from typing import Dict, Any, Optional, Tuple
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from agent.delta import DELTA_KEY, apply_delta, strip_delta
+from api_server.host_state import HostStateStore
+
+
+DELTA_DIRNAME = '.delta'
+
+
+class DeltaSessions(HostStateStore):
+    """
+    Bases de reconstrucción por host (IP y hostname).
+
+    `apply` devuelve el snapshot completo de un keyframe o de un delta cuya base
+    coincide con la guardada; si no coincide (servidor reiniciado, base perdida o
+    mensajes fuera de orden) devuelve un error para que el agente envíe un keyframe.
+    """
+
+    def __init__(self, data_dir: str = "data", max_cached: int = 1024):
+        """
+        Inicializa las sesiones.
+
+        Args:
+            data_dir: Directorio de datos (las bases se guardan en data_dir/.delta)
+            max_cached: Bases que se mantienen en memoria
+        """
+        super().__init__(data_dir, DELTA_DIRNAME, 'delta_', max_cached)
+
+    def apply(self, message: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Reconstruye el snapshot de un mensaje del protocolo delta y actualiza la base.
+
+        Args:
+            message: Keyframe o delta recibido en /upload
+
+        Returns:
+            Tupla (snapshot, mensaje de error); uno de los dos es None
+        """
+        header = message.get(DELTA_KEY)
+        if not isinstance(header, dict) or 'session' not in header or 'seq' not in header:
+            return None, "Invalid delta header: session and seq are required"
+
+        key = self._key(message)
+        with self._locked(key):
+            if header.get('keyframe'):
+                snapshot = strip_delta(message)
+            else:
+                state = self._load(key)
+                if state is None:
+                    return None, "No base snapshot for this host, send a keyframe"
+                if state['session'] != header['session'] or state['seq'] != header.get('base'):
+                    return None, f"Base mismatch (server has seq {state['seq']}), send a keyframe"
+                snapshot = apply_delta(state['snapshot'], message)
+
+            self._save(key, {"session": header['session'], "seq": header['seq'], "snapshot": snapshot})
+        return snapshot, None
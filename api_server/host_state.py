@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Módulo de estado por host para el servidor API de Prex Challenge.
+Guarda el último snapshot conocido de cada host en un subdirectorio de datos, de
+modo que cualquier worker de gunicorn pueda continuar el flujo de un agente
+(protocolo delta, snapshots parciales); una caché en memoria evita releerlo
+mientras el archivo no cambie.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Tuple
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from api_server.locking import KeyedLocks, key_lock
+
+
+class HostStateStore:
+    """
+    Estado persistente por host (IP y hostname), uno por archivo en data_dir/<dirname>.
+
+    Las subclases leen y escriben el estado de un host con `_load` y `_save`
+    dentro de `_locked`, que excluye a los demás hilos y procesos.
+    """
+
+    def __init__(self, data_dir: str, dirname: str, prefix: str, max_cached: int = 1024):
+        """
+        Inicializa el almacén.
+
+        Args:
+            data_dir: Directorio de datos
+            dirname: Subdirectorio donde se guarda el estado (se crea al primer guardado)
+            prefix: Prefijo de las claves; sin el guion bajo final es el ámbito de sus bloqueos en data_dir/.locks
+            max_cached: Estados que se mantienen en memoria
+        """
+        self.data_dir = data_dir
+        self.base_dir = os.path.join(data_dir, dirname)
+        self.prefix = prefix
+        self.max_cached = max_cached
+        self._locks = KeyedLocks()
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Any]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _key(self, message: Dict[str, Any]) -> str:
+        """Clave del estado de un host (válida como nombre de archivo)."""
+        identity = f"{message.get('ip_address')}|{message.get('hostname')}"
+        return self.prefix + hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        """Ruta del archivo con el estado de un host."""
+        return os.path.join(self.base_dir, f"{key}.json")
+
+    @contextmanager
+    def _locked(self, key: str) -> Iterator[None]:
+        """Bloqueo exclusivo del estado de un host."""
+        with key_lock(self._locks, self.data_dir, key, scope=self.prefix.rstrip('_')):
+            yield
+
+    def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Lee el estado guardado, usando la caché si el archivo no cambió."""
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(key)
+                return cached[1]
+        with open(path, 'r') as f:
+            state = json.load(f)
+        self._remember(key, signature, state)
+        return state
+
+    def _save(self, key: str, state: Dict[str, Any]) -> None:
+        """Guarda el estado con un rename atómico."""
+        os.makedirs(self.base_dir, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, separators=(',', ':'))
+        os.replace(temp_path, path)
+        stat = os.stat(path)
+        self._remember(key, (stat.st_mtime_ns, stat.st_size), state)
+
+    def _remember(self, key: str, signature: Tuple[int, int], state: Dict[str, Any]) -> None:
+        """Guarda un estado en la caché en memoria, descartando el menos usado si está llena."""
+        with self._cache_lock:
+            self._cache[key] = (signature, state)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Módulo de ingesta diferida (write-behind) para el servidor API de Prex Challenge.
+Encola los snapshots recibidos por /upload y los escribe en el almacenamiento en
+lotes por IP y día, de modo que la respuesta al agente no espera la escritura a disco.
+"""
+
+import os
+import time
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+
+# Políticas de fsync: nunca, en cada lote o como máximo una vez por intervalo
+FSYNC_POLICIES = ('never', 'batch', 'interval')
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 10000
+
+logger = logging.getLogger('api_server')
+
+GroupKey = Tuple[str, str]
+
+
+class IngestQueue:
+    """
+    Cola de escritura diferida agrupada por (IP, fecha de recepción).
+
+    Un hilo de fondo escribe cada grupo con `storage.store_batch` cuando alcanza
+    `batch_size` registros o cuando su registro más antiguo lleva `flush_interval`
+    segundos en la cola. Si la cola está llena, `submit` devuelve False y el
+    llamador debe pedir que se reintente más tarde: almacenarlo de forma síncrona
+    lo adelantaría a los registros de la misma IP y día que siguen en cola.
+    """
+
+    def __init__(self, storage, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 fsync: str = 'never', fsync_interval: float = 1.0,
+                 on_stored: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        """
+        Inicializa la cola.
+
+        Args:
+            storage: Backend con el método store_batch(records, date, fsync)
+            batch_size: Registros por grupo que disparan una escritura inmediata
+            flush_interval: Segundos máximos que un registro espera en la cola
+            max_pending: Registros pendientes a partir de los cuales se rechazan nuevos
+            fsync: Política de fsync ('never', 'batch' o 'interval')
+            fsync_interval: Segundos mínimos entre fsync con la política 'interval'
+            on_stored: Se llama con los registros de cada grupo escrito con éxito
+        """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Invalid fsync policy: {fsync}. Use one of: {', '.join(FSYNC_POLICIES)}")
+
+        self.storage = storage
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.on_stored = on_stored
+
+        self._cond = threading.Condition()
+        self._reset()
+
+    def _reset(self) -> None:
+        """Inicializa el estado de la cola (también en el proceso hijo tras un fork)."""
+        self._groups: "OrderedDict[GroupKey, List[Dict[str, Any]]]" = OrderedDict()
+        # Instante (monotónico) en que entró el registro más antiguo de cada grupo
+        self._first_at: Dict[GroupKey, float] = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._force = False
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._last_fsync = 0.0
+        self._flushed_records = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._last_flush_at: Optional[str] = None
+        self._last_error: Optional[str] = None
+
+    def _ensure_started(self) -> None:
+        """Arranca el hilo de escritura en el proceso actual (llamar con el bloqueo tomado)."""
+        # Los workers de gunicorn heredan la cola del proceso maestro, pero no su hilo
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='prex-ingest', daemon=True)
+            self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        """
+        Encola un snapshot para escribirlo en segundo plano.
+
+        Returns:
+            True si quedó encolado; False si la cola está llena o detenida
+        """
+        key = (record.get('ip_address', 'unknown'), datetime.datetime.now().strftime("%Y-%m-%d"))
+        with self._cond:
+            if self._stopping or self._pending >= self.max_pending:
+                return False
+            self._ensure_started()
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = []
+                self._first_at[key] = time.monotonic()
+            group.append(record)
+            self._pending += 1
+            if len(group) >= self.batch_size:
+                self._cond.notify_all()
+        return True
+
+    def _ready_groups(self, now: float) -> List[GroupKey]:
+        """Devuelve los grupos que deben escribirse ahora."""
+        if self._force or self._stopping:
+            return list(self._groups)
+        return [
+            key for key, group in self._groups.items()
+            if len(group) >= self.batch_size or now - self._first_at[key] >= self.flush_interval
+        ]
+
+    def _run(self) -> None:
+        """Bucle del hilo de escritura."""
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    ready = self._ready_groups(now)
+                    if ready:
+                        break
+                    self._force = False
+                    self._cond.notify_all()
+                    if self._stopping:
+                        return
+                    timeout = None
+                    if self._first_at:
+                        timeout = max(0.0, min(self._first_at.values()) + self.flush_interval - now)
+                    self._cond.wait(timeout)
+
+                batches = []
+                for key in ready:
+                    records = self._groups.pop(key)
+                    self._first_at.pop(key)
+                    self._pending -= len(records)
+                    self._in_flight += len(records)
+                    batches.append((key, records))
+
+            for key, records in batches:
+                self._flush_group(key, records)
+
+    def _flush_group(self, key: GroupKey, records: List[Dict[str, Any]]) -> None:
+        """Escribe un grupo; si falla, lo vuelve a encolar para reintentarlo más tarde."""
+        now = time.monotonic()
+        fsync = self.fsync == 'batch' or (self.fsync == 'interval' and now - self._last_fsync >= self.fsync_interval)
+
+        try:
+            result = self.storage.store_batch(records, date=key[1], fsync=fsync)
+        except Exception as e:
+            result = {"success": False, "message": f"Error storing data: {str(e)}"}
+
+        # Antes de descontar los registros en vuelo, para que flush() también lo espere
+        if result['success'] and self.on_stored is not None:
+            self.on_stored(records)
+
+        with self._cond:
+            self._in_flight -= len(records)
+            if result['success']:
+                if fsync:
+                    self._last_fsync = now
+                self._flushes += 1
+                self._flushed_records += len(records)
+                self._last_flush_at = datetime.datetime.now().isoformat(timespec='seconds')
+            else:
+                self._failed_flushes += 1
+                self._last_error = result['message']
+                if self._stopping:
+                    logger.error(f"Dropping {len(records)} queued records for {key[0]} on {key[1]}: {result['message']}")
+                else:
+                    logger.error(f"Flush failed for {key[0]} on {key[1]}, will retry: {result['message']}")
+                    # Sin forzar: el reintento respeta el intervalo aunque haya un flush() en curso
+                    self._force = False
+                    # Reencolar delante de los registros nuevos y esperar un intervalo antes de reintentar
+                    self._groups[key] = records + self._groups.get(key, [])
+                    self._groups.move_to_end(key, last=False)
+                    self._first_at[key] = now
+                    self._pending += len(records)
+            self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Escribe todos los registros pendientes y espera a que terminen.
+
+        Returns:
+            True si la cola quedó vacía antes del timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if self._pid != os.getpid() or self._thread is None:
+                return self._pending == 0
+            self._force = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def stop(self, timeout: Optional[float] = 30.0) -> bool:
+        """
+        Detiene la cola tras escribir los registros pendientes (cierre ordenado).
+
+        Returns:
+            True si no quedaron registros sin escribir
+        """
+        with self._cond:
+            if self._pid != os.getpid():
+                return True
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        with self._cond:
+            return self._pending == 0 and self._in_flight == 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Devuelve el estado de la cola para /health.
+
+        `flush_lag_seconds` es la antigüedad del registro pendiente más antiguo.
+        """
+        with self._cond:
+            now = time.monotonic()
+            lag = now - min(self._first_at.values()) if self._first_at else 0.0
+            return {
+                "queue_depth": self._pending + self._in_flight,
+                "pending_groups": len(self._groups),
+                "flush_lag_seconds": round(lag, 3),
+                "flushed_records": self._flushed_records,
+                "flushes": self._flushes,
+                "failed_flushes": self._failed_flushes,
+                "last_flush_at": self._last_flush_at,
+                "last_error": self._last_error,
+                "batch_size": self.batch_size,
+                "flush_interval": self.flush_interval,
+                "fsync": self.fsync
+            }
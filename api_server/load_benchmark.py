@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark de carga local para el servidor API de Prex Challenge.
+Envía subidas concurrentes a /upload durante un tiempo fijo y verifica que el
+servidor alcance el objetivo de throughput documentado en docs/run_api_doc_es.md.
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import datetime
+from typing import Dict, List, Any
+
+import requests
+
+
+# Objetivo documentado: subidas por segundo con gunicorn (4 workers) y backend jsonl
+DEFAULT_TARGET_RPS = 200.0
+
+
+def make_snapshot(index: int, hosts: int, processes: int) -> Dict[str, Any]:
+    """Genera un snapshot con la forma de collect_all para una de `hosts` IPs simuladas."""
+    host = index % hosts
+    return {
+        "hostname": f"bench-host-{host}",
+        "ip_address": f"10.99.{host // 256}.{host % 256}",
+        "timestamp": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "cpu_info": {
+            "physical_cores": 4,
+            "logical_cores": 8,
+            "usage_percent": [round(random.uniform(0, 100), 1) for _ in range(8)],
+            "avg_usage": round(random.uniform(0, 100), 1),
+            "model": "Benchmark CPU"
+        },
+        "processes": [
+            {
+                "pid": pid,
+                "name": f"process-{pid}",
+                "username": "bench",
+                "memory_percent": round(random.uniform(0, 5), 2),
+                "cpu_percent": round(random.uniform(0, 10), 2)
+            }
+            for pid in range(1, processes + 1)
+        ],
+        "logged_users": [],
+        "os_info": {"name": "Linux", "release": "bench"}
+    }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentil por rango más cercano de una lista ordenada."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run_benchmark(url: str, duration: float, concurrency: int, hosts: int, processes: int) -> Dict[str, Any]:
+    """
+    Ejecuta el benchmark.
+
+    Args:
+        url: URL base del servidor API
+        duration: Duración en segundos
+        concurrency: Clientes concurrentes (un hilo y una sesión keep-alive por cliente)
+        hosts: Cantidad de IPs simuladas
+        processes: Procesos por snapshot
+
+    Returns:
+        Diccionario con throughput, latencias y errores
+    """
+    upload_endpoint = url.rstrip('/') + '/upload'
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(worker: int) -> None:
+        session = requests.Session()
+        index = worker
+        local_latencies = []
+        local_errors = 0
+        while time.monotonic() < deadline:
+            body = json.dumps(make_snapshot(index, hosts, processes))
+            index += concurrency
+            started = time.monotonic()
+            try:
+                response = session.post(upload_endpoint, data=body,
+                                        headers={'Content-Type': 'application/json'}, timeout=30)
+                if response.status_code >= 300:
+                    local_errors += 1
+                    continue
+            except requests.exceptions.RequestException:
+                local_errors += 1
+                continue
+            local_latencies.append(time.monotonic() - started)
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1)
+        }
+    }
+
+
+def parse_arguments():
+    """Analiza los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description='Benchmark de carga para /upload')
+
+    parser.add_argument('--url', type=str, default='http://localhost:5000/',
+                        help='URL del servidor API (predeterminado: http://localhost:5000/)')
+    parser.add_argument('--duration', type=float, default=20,
+                        help='Duración en segundos (predeterminado: 20)')
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help='Clientes concurrentes (predeterminado: 32)')
+    parser.add_argument('--hosts', type=int, default=50,
+                        help='IPs simuladas (predeterminado: 50)')
+    parser.add_argument('--processes', type=int, default=200,
+                        help='Procesos por snapshot (predeterminado: 200)')
+    parser.add_argument('--target-rps', type=float, default=DEFAULT_TARGET_RPS,
+                        help=f'Throughput mínimo esperado (predeterminado: {DEFAULT_TARGET_RPS})')
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    result = run_benchmark(args.url, args.duration, args.concurrency, args.hosts, args.processes)
+    result["target_rps"] = args.target_rps
+    result["passed"] = result["throughput_rps"] >= args.target_rps and result["errors"] == 0
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["passed"] else 1)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Módulo de bloqueos para el servidor API de Prex Challenge.
+Serializa las escrituras sobre un mismo archivo de datos entre hilos (bloqueos
+en proceso por clave) y entre procesos (bloqueos de archivo fcntl), de modo que
+solo compiten las escrituras de la misma IP y fecha.
+"""
+
+import os
+import zlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows no tiene fcntl: solo se admite un proceso servidor
+    fcntl = None
+
+
+LOCKS_DIRNAME = '.locks'
+
+# Archivos de bloqueo por ámbito: las claves se reparten entre ellos, de modo que
+# data/.locks no crece con cada IP y fecha (y no hay que borrar archivos de bloqueo,
+# lo que no es seguro mientras otro proceso puede tenerlos abiertos)
+LOCK_STRIPES = 1024
+
+DEFAULT_SCOPE = 'data'
+
+
+def lock_path(data_dir: str, key: str, scope: str = DEFAULT_SCOPE) -> str:
+    """
+    Devuelve la ruta del archivo de bloqueo de una clave dentro del directorio de datos.
+
+    Claves distintas pueden compartir archivo y entonces se excluyen entre procesos,
+    lo que solo cuesta alguna espera ocasional. Cada ámbito usa sus propios archivos,
+    para que un bloqueo tomado dentro de otro (los agregados de rollups.py leen las
+    series de metrics_store.py) nunca espere por el archivo que ya tiene tomado.
+    """
+    stripe = zlib.crc32(key.encode('utf-8')) % LOCK_STRIPES
+    return os.path.join(data_dir, LOCKS_DIRNAME, f"{scope}_{stripe:04d}.lock")
+
+
+class KeyedLocks:
+    """
+    Bloqueos en proceso por clave. Cada clave tiene su propio threading.Lock, que se
+    crea bajo demanda y se descarta cuando ningún hilo lo usa, para que el
+    diccionario no crezca con cada IP y fecha vista.
+    """
+    
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks: Dict[str, List[Any]] = {}
+    
+    @contextmanager
+    def hold(self, key: str) -> Iterator[None]:
+        """Obtiene el bloqueo de `key` durante el bloque with."""
+        with self._guard:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+    
+    def __len__(self) -> int:
+        with self._guard:
+            return len(self._locks)
+
+
+@contextmanager
+def key_lock(locks: KeyedLocks, data_dir: str, key: str, scope: str = DEFAULT_SCOPE) -> Iterator[None]:
+    """
+    Obtiene el bloqueo completo de una clave: primero el bloqueo en proceso, para que
+    los hilos del mismo worker no compitan por el archivo, y luego el de archivo,
+    para excluir a los demás procesos. Dentro de un ámbito no se deben anidar
+    bloqueos de claves distintas (ver lock_path).
+    """
+    with locks.hold(key):
+        with file_lock(lock_path(data_dir, key, scope)):
+            yield
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """
+    Obtiene un bloqueo exclusivo entre procesos sobre el archivo `path`.
+
+    El archivo de bloqueo es independiente del archivo de datos, de modo que el
+    bloqueo sigue siendo válido aunque el archivo de datos se reemplace.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
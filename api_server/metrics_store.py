@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Módulo de series numéricas para el servidor API de Prex Challenge.
+Extrae de cada snapshot almacenado las métricas numéricas (CPU promedio y por
+núcleo, cantidad de procesos y los N procesos con más CPU y memoria) y las guarda
+en formato columnar: un archivo de float64 por métrica, por host y por día,
+
+    data/.metrics/<IP>/<YYYY-MM-DD>/ts.f64
+    data/.metrics/<IP>/<YYYY-MM-DD>/cpu_avg.f64
+    ...
+
+La fila N de cada archivo corresponde al snapshot N del día, ordenados por
+timestamp. Las lecturas mapean los archivos en memoria (mmap) y obtienen el rango
+con una búsqueda binaria sobre la columna de timestamps y rebanadas de memoryview,
+sin deserializar ningún snapshot. Los valores ausentes se guardan como NaN.
+
+Reconstruir las series a partir de los datos ya almacenados:
+
+    python api_server/metrics_store.py --data-dir data --storage json
+"""
+
+import os
+import re
+import sys
+import math
+import mmap
+import heapq
+import shutil
+import bisect
+import logging
+import argparse
+import datetime
+from array import array
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from api_server.locking import KeyedLocks, key_lock
+from api_server.record_index import record_timestamp
+
+
+METRICS_DIRNAME = '.metrics'
+COLUMN_SUFFIX = '.f64'
+
+# Columna con el timestamp (epoch) de cada fila; se escribe la última, de modo
+# que su longitud indica las filas completas
+TIMESTAMP_COLUMN = 'ts'
+
+# Procesos con más CPU y memoria que se guardan por snapshot
+DEFAULT_TOP_N = 5
+
+# Nombres de columna válidos (también son nombres de archivo)
+COLUMN_PATTERN = re.compile(r'^[a-z0-9_]+$')
+
+ITEM_SIZE = array('d').itemsize
+
+logger = logging.getLogger('api_server')
+
+
+def _is_number(value: Any) -> bool:
+    """Indica si un valor es un número (los booleanos no cuentan)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def extract_metrics(record: Dict[str, Any], top_n: int = DEFAULT_TOP_N) -> Optional[Dict[str, float]]:
+    """
+    Extrae las métricas numéricas de un snapshot.
+
+    Columnas: `cpu_avg`, `cpu_core_<i>`, `process_count`, `top_cpu_<n>` y
+    `top_mem_<n>` (el uso de CPU y memoria del n-ésimo proceso que más consume).
+
+    Args:
+        record: Snapshot completo
+        top_n: Procesos a guardar en las columnas top_cpu y top_mem
+
+    Returns:
+        Diccionario columna -> valor, con el timestamp en "ts"; None si el
+        snapshot no tiene un timestamp válido
+    """
+    timestamp = record_timestamp(record)
+    if math.isnan(timestamp):
+        return None
+    row = {TIMESTAMP_COLUMN: timestamp}
+
+    cpu_info = record.get('cpu_info')
+    if isinstance(cpu_info, dict):
+        per_core = cpu_info.get('usage_percent')
+        per_core = per_core if isinstance(per_core, list) else []
+        for index, value in enumerate(per_core):
+            if _is_number(value):
+                row[f'cpu_core_{index}'] = float(value)
+        average = cpu_info.get('avg_usage')
+        numbers = [value for value in per_core if _is_number(value)]
+        if _is_number(average):
+            row['cpu_avg'] = float(average)
+        elif numbers:
+            row['cpu_avg'] = sum(numbers) / len(numbers)
+
+    processes = record.get('processes')
+    if isinstance(processes, list):
+        row['process_count'] = float(len(processes))
+        for field, prefix in (('cpu_percent', 'top_cpu'), ('memory_percent', 'top_mem')):
+            values = (process.get(field) for process in processes if isinstance(process, dict))
+            top = heapq.nlargest(top_n, (value for value in values if _is_number(value)))
+            for rank, value in enumerate(top, start=1):
+                row[f'{prefix}_{rank}'] = float(value)
+    return row
+
+
+@contextmanager
+def _mapped(path: str) -> Iterator[memoryview]:
+    """Mapea un archivo de columna en memoria y devuelve sus valores como memoryview de float64."""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size // ITEM_SIZE * ITEM_SIZE
+        if size == 0:
+            yield memoryview(array('d'))
+            return
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped).cast('d')
+            try:
+                yield view
+            finally:
+                view.release()
+
+
+class MetricsStore:
+    """
+    Series numéricas por host en archivos columnares por día.
+
+    Las escrituras de un mismo host y día se serializan con el bloqueo por clave
+    (entre hilos y entre procesos) de locking.py. Los snapshots que llegan en orden
+    se añaden al final de cada columna; uno anterior al último del día (por ejemplo,
+    reenviado desde el spool de un agente) reescribe las columnas de ese día
+    ordenadas, lo que mantiene válida la búsqueda binaria.
+    """
+
+    def __init__(self, data_dir: str = "data", top_n: int = DEFAULT_TOP_N):
+        """
+        Inicializa el almacén.
+
+        Args:
+            data_dir: Directorio de datos (las series se guardan en data_dir/.metrics)
+            top_n: Procesos a guardar en las columnas top_cpu y top_mem
+        """
+        self.data_dir = data_dir
+        self.base_dir = os.path.join(data_dir, METRICS_DIRNAME)
+        self.top_n = top_n
+        self._locks = KeyedLocks()
+
+    def partition_dir(self, ip_address: str, date_str: str) -> str:
+        """Directorio con las columnas de una IP y fecha."""
+        return os.path.join(self.base_dir, ip_address, date_str)
+
+    def _lock(self, ip_address: str, date_str: str):
+        """Bloqueo de las columnas de una IP y fecha."""
+        return key_lock(self._locks, self.data_dir, f"metrics_{ip_address}_{date_str}", scope='metrics')
+
+    @staticmethod
+    def _column_path(directory: str, name: str) -> str:
+        return os.path.join(directory, name + COLUMN_SUFFIX)
+
+    @staticmethod
+    def _columns(directory: str) -> List[str]:
+        """Columnas existentes en un directorio de día (sin la de timestamps)."""
+        return sorted(
+            name[:-len(COLUMN_SUFFIX)] for name in os.listdir(directory)
+            if name.endswith(COLUMN_SUFFIX) and name != TIMESTAMP_COLUMN + COLUMN_SUFFIX
+        )
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Extrae y guarda las métricas de los snapshots almacenados.
+
+        Args:
+            records: Snapshots completos
+
+        Returns:
+            Cantidad de filas añadidas
+        """
+        groups: Dict[tuple, List[Dict[str, float]]] = {}
+        for record in records:
+            row = extract_metrics(record, self.top_n)
+            if row is None:
+                continue
+            date_str = datetime.datetime.fromtimestamp(row[TIMESTAMP_COLUMN]).strftime("%Y-%m-%d")
+            groups.setdefault((record.get('ip_address', 'unknown'), date_str), []).append(row)
+
+        for (ip_address, date_str), rows in groups.items():
+            with self._lock(ip_address, date_str):
+                self._append_rows(self.partition_dir(ip_address, date_str), rows)
+        return sum(len(rows) for rows in groups.values())
+
+    def _append_rows(self, directory: str, rows: List[Dict[str, float]]) -> None:
+        """Añade filas a las columnas de un día (llamar con el bloqueo tomado)."""
+        os.makedirs(directory, exist_ok=True)
+        rows.sort(key=lambda row: row[TIMESTAMP_COLUMN])
+        ts_path = self._column_path(directory, TIMESTAMP_COLUMN)
+        count = os.path.getsize(ts_path) // ITEM_SIZE if os.path.exists(ts_path) else 0
+        names = sorted(set(self._columns(directory)).union(*rows) - {TIMESTAMP_COLUMN})
+
+        last = None
+        if count:
+            with open(ts_path, 'rb') as f:
+                f.seek((count - 1) * ITEM_SIZE)
+                last = array('d', f.read(ITEM_SIZE))[0]
+        if last is not None and rows[0][TIMESTAMP_COLUMN] < last:
+            self._rewrite_sorted(directory, names, count, rows)
+            return
+
+        for name in names + [TIMESTAMP_COLUMN]:
+            path = self._column_path(directory, name)
+            values = array('d', (row.get(name, math.nan) for row in rows))
+            with open(path, 'ab') as f:
+                # Una escritura interrumpida puede haber dejado valores sin su timestamp;
+                # una columna nueva se completa con NaN en las filas anteriores
+                size = f.tell()
+                if size > count * ITEM_SIZE:
+                    f.truncate(count * ITEM_SIZE)
+                    f.seek(0, os.SEEK_END)
+                elif size < count * ITEM_SIZE:
+                    f.write(array('d', [math.nan]).tobytes() * (count - size // ITEM_SIZE))
+                f.write(values.tobytes())
+
+    def _load_column(self, directory: str, name: str, count: int) -> array:
+        """Lee las primeras `count` filas de una columna (NaN si faltan)."""
+        values = array('d')
+        path = self._column_path(directory, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                values.frombytes(f.read(count * ITEM_SIZE))
+        values.extend([math.nan] * (count - len(values)))
+        return values
+
+    def _rewrite_sorted(self, directory: str, names: List[str], count: int,
+                        rows: List[Dict[str, float]]) -> None:
+        """Reescribe las columnas de un día con filas fuera de orden intercaladas."""
+        columns = {}
+        for name in names + [TIMESTAMP_COLUMN]:
+            values = self._load_column(directory, name, count)
+            values.extend(row.get(name, math.nan) for row in rows)
+            columns[name] = values
+        timestamps = columns[TIMESTAMP_COLUMN]
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+
+        # Cada columna se reemplaza con un rename atómico; la de timestamps, al final
+        for name in names + [TIMESTAMP_COLUMN]:
+            path = self._column_path(directory, name)
+            values = columns[name]
+            with open(path + '.tmp', 'wb') as f:
+                f.write(array('d', (values[index] for index in order)).tobytes())
+            os.replace(path + '.tmp', path)
+
+    def hosts(self) -> List[str]:
+        """IPs con series guardadas."""
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(os.listdir(self.base_dir))
+
+    def days(self, ip_address: str) -> List[str]:
+        """Fechas con series guardadas de una IP, en orden."""
+        directory = os.path.join(self.base_dir, ip_address)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(os.listdir(directory))
+
+    def signature(self, ip_address: str, date_str: str) -> Optional[List[int]]:
+        """
+        Firma (tamaño y mtime) de la columna de timestamps de un día; cambia con
+        cada escritura, por lo que sirve para saber si un derivado está al día.
+        """
+        try:
+            stat = os.stat(self._column_path(self.partition_dir(ip_address, date_str), TIMESTAMP_COLUMN))
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def load_day(self, ip_address: str, date_str: str,
+                 columns: List[str]) -> Tuple[Optional[List[int]], Dict[str, array]]:
+        """
+        Lee completas las columnas de un día, de forma consistente con su firma.
+
+        Returns:
+            Tupla (firma, columnas); la firma es None si el día no tiene datos
+        """
+        directory = self.partition_dir(ip_address, date_str)
+        with self._lock(ip_address, date_str):
+            signature = self.signature(ip_address, date_str)
+            if signature is None:
+                return None, {}
+            count = signature[0] // ITEM_SIZE
+            names = [TIMESTAMP_COLUMN] + [name for name in columns if name != TIMESTAMP_COLUMN]
+            return signature, {name: self._load_column(directory, name, count) for name in names}
+
+    def read(self, ip_address: str, start: datetime.datetime, end: datetime.datetime,
+             columns: Optional[List[str]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        Lee las series de una IP entre `start` y `end` (inclusive).
+
+        Args:
+            ip_address: Dirección IP
+            start: Inicio del rango
+            end: Fin del rango
+            columns: Columnas a devolver (None: todas las disponibles)
+
+        Returns:
+            Diccionario columna -> valores, con los timestamps en "ts"; los valores
+            ausentes son None
+
+        Raises:
+            ValueError: Si el nombre de una columna no es válido
+        """
+        for name in columns or []:
+            if not COLUMN_PATTERN.match(name):
+                raise ValueError(f"Invalid metric name: {name}")
+
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        result: Dict[str, List[Optional[float]]] = {TIMESTAMP_COLUMN: []}
+        for name in columns or []:
+            result.setdefault(name, [])
+
+        day = start.date()
+        while day <= end.date():
+            date_str = day.strftime("%Y-%m-%d")
+            day += datetime.timedelta(days=1)
+            directory = self.partition_dir(ip_address, date_str)
+            if not os.path.isdir(directory):
+                continue
+            with self._lock(ip_address, date_str):
+                self._read_partition(directory, start_ts, end_ts, columns, result)
+        return result
+
+    def _read_partition(self, directory: str, start_ts: float, end_ts: float,
+                        columns: Optional[List[str]], result: Dict[str, List[Optional[float]]]) -> None:
+        """Añade a `result` las filas del rango de un día."""
+        ts_path = self._column_path(directory, TIMESTAMP_COLUMN)
+        if not os.path.exists(ts_path):
+            return
+        previous = len(result[TIMESTAMP_COLUMN])
+        with _mapped(ts_path) as timestamps:
+            low = bisect.bisect_left(timestamps, start_ts)
+            high = bisect.bisect_right(timestamps, end_ts)
+            if low >= high:
+                return
+            with timestamps[low:high] as selected:
+                result[TIMESTAMP_COLUMN].extend(selected.tolist())
+
+        names = self._columns(directory) if columns is None else [name for name in columns if name != TIMESTAMP_COLUMN]
+        for name in names:
+            values = result.setdefault(name, [None] * previous)
+            path = self._column_path(directory, name)
+            if not os.path.exists(path):
+                values.extend([None] * (high - low))
+                continue
+            with _mapped(path) as column:
+                with column[low:high] as selected:
+                    values.extend(None if value != value else value for value in selected.tolist())
+                # Una columna más corta que los timestamps no debería existir, pero no descuadra la salida
+                values.extend([None] * (previous + high - low - len(values)))
+
+        # Columnas vistas en días anteriores que este día no tiene
+        for name, values in result.items():
+            values.extend([None] * (previous + high - low - len(values)))
+
+
+def rebuild(storage, metrics: MetricsStore, batch_size: int = 1000) -> int:
+    """
+    Reconstruye las series a partir de los snapshots almacenados.
+
+    Args:
+        storage: Backend de almacenamiento con list_available_data y query_data
+        metrics: Almacén de series (se vacía antes de reconstruir)
+        batch_size: Snapshots por escritura
+
+    Returns:
+        Cantidad de filas escritas
+    """
+    shutil.rmtree(metrics.base_dir, ignore_errors=True)
+    listing = storage.list_available_data()
+    if not listing['success']:
+        raise RuntimeError(listing['message'])
+
+    total = 0
+    for entry in listing['available_data']:
+        result = storage.query_data(entry['ip_address'], entry['date'], stream=True)
+        if not result['success']:
+            logger.error(f"Skipping {entry['ip_address']} on {entry['date']}: {result['message']}")
+            continue
+        batch = []
+        for record in result['data']:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                total += metrics.append(batch)
+                batch = []
+        total += metrics.append(batch)
+    return total
+
+
+def parse_arguments():
+    """Analiza los argumentos de línea de comandos."""
+    from api_server.storage import STORAGE_BACKENDS
+
+    parser = argparse.ArgumentParser(description='Rebuild the Prex Challenge metrics store from stored snapshots')
+
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default=os.environ.get('PREX_DATA_DIR', os.path.join(parent_dir, 'data')),
+        help='Directorio de datos (predeterminado: data/)'
+    )
+
+    parser.add_argument(
+        '--storage',
+        type=str,
+        choices=sorted(STORAGE_BACKENDS),
+        default=os.environ.get('PREX_STORAGE_BACKEND', 'json'),
+        help='Backend de almacenamiento (predeterminado: json)'
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    from api_server.storage import create_storage
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_arguments()
+    rows = rebuild(create_storage(args.storage, data_dir=args.data_dir), MetricsStore(args.data_dir))
+    logger.info(f"Rebuilt metrics store with {rows} rows")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Herramienta de migración de almacenamiento para el servidor API de Prex Challenge.
+Convierte los archivos heredados IP_YYYY-MM-DD.json (una lista JSON por archivo)
+en segmentos JSON Lines IP_YYYY-MM-DD.NNNN.jsonl usados por JSONLinesStorage.
+
+Debe ejecutarse con el servidor detenido para que no haya escrituras concurrentes.
+"""
+
+import os
+import sys
+import json
+import argparse
+from typing import Dict, List, Any
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from api_server.storage import JSONLinesStorage, LEGACY_PATTERN, SEGMENT_PATTERN, DEFAULT_SEGMENT_MAX_BYTES, fsync_dir
+from api_server.record_index import remove_index
+
+
+# Marcador de una migración cuyos segmentos temporales ya están completos
+MARKER_SUFFIX = '.migrating'
+
+
+def marker_path(source_path: str) -> str:
+    """Devuelve la ruta del marcador de una migración en curso."""
+    return source_path + MARKER_SUFFIX
+
+
+def migrate_file(storage: JSONLinesStorage, filename: str, keep_source: bool = False) -> Dict[str, Any]:
+    """
+    Migra un archivo heredado a segmentos JSON Lines.
+
+    Si ya existen segmentos para la misma IP y fecha (escrituras posteriores al cambio
+    de backend), los registros heredados se colocan antes que ellos para conservar el orden.
+
+    La migración es segura ante interrupciones: los segmentos nuevos se escriben
+    primero en archivos temporales y, antes de reemplazar ningún segmento, se guarda
+    un marcador `<archivo>.migrating`. Si el proceso se interrumpe antes del marcador,
+    nada cambió y la migración se repite; si se interrumpe después, la siguiente
+    ejecución completa los reemplazos pendientes en lugar de volver a leer el
+    archivo heredado (lo que duplicaría sus registros).
+
+    Args:
+        storage: Instancia de JSONLinesStorage sobre el directorio de datos
+        filename: Ruta del archivo heredado relativa al directorio de datos (IP_YYYY-MM-DD.json
+            o, con la distribución diaria, YYYY/MM/DD/IP_YYYY-MM-DD.json)
+        keep_source: Si es True, conserva el archivo original renombrado a .json.migrated
+
+    Returns:
+        Diccionario con estado y número de registros migrados
+    """
+    match = LEGACY_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return {
+            "success": False,
+            "message": f"Not a legacy data file: {filename}",
+            "records": 0
+        }
+
+    ip_address, date_str = match.group('ip'), match.group('date')
+    source_path = os.path.join(storage.data_dir, filename)
+
+    try:
+        if not os.path.exists(marker_path(source_path)):
+            # iter_records devuelve primero el archivo heredado y luego los segmentos existentes
+            records = 0
+            temp_paths: List[str] = []
+            current: List[str] = []
+            current_size = 0
+            for record in storage.iter_records(ip_address, date_str):
+                line = json.dumps(record, separators=(',', ':')) + '\n'
+                if current and current_size + len(line) > storage.max_segment_bytes:
+                    temp_paths.append(_write_temp_segment(storage, ip_address, date_str, len(temp_paths), current))
+                    current, current_size = [], 0
+                current.append(line)
+                current_size += len(line)
+                records += 1
+            if current:
+                temp_paths.append(_write_temp_segment(storage, ip_address, date_str, len(temp_paths), current))
+            # Los temporales deben estar en disco antes que el marcador que los da por completos
+            for directory in sorted({os.path.dirname(path) for path in temp_paths}):
+                fsync_dir(directory)
+
+            # A partir del marcador, los temporales son la versión completa de los datos
+            _write_marker(source_path, {"segments": len(temp_paths), "records": records})
+
+        with open(marker_path(source_path)) as f:
+            marker = json.load(f)
+        _complete_migration(storage, ip_address, date_str, source_path, marker['segments'], keep_source)
+        storage.refresh_catalog(ip_address, date_str)
+
+        return {
+            "success": True,
+            "message": f"Migrated {filename} into {marker['segments']} segment(s)",
+            "records": marker['records']
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "message": f"Error migrating {filename}: {str(e)}",
+            "records": 0
+        }
+
+
+def _write_marker(source_path: str, content: Dict[str, Any]) -> None:
+    """Escribe el marcador de migración de forma atómica."""
+    temp_path = marker_path(source_path) + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(content, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, marker_path(source_path))
+    fsync_dir(os.path.dirname(source_path))
+
+
+def _complete_migration(storage: JSONLinesStorage, ip_address: str, date_str: str, source_path: str,
+                        segments: int, keep_source: bool) -> None:
+    """
+    Coloca los segmentos temporales en su lugar y retira el archivo heredado.
+
+    Cada paso puede repetirse sin efectos adicionales, de modo que una ejecución
+    interrumpida se completa volviendo a llamar a esta función.
+    """
+    for index in range(segments):
+        path = storage.segment_path(ip_address, date_str, index)
+        if os.path.exists(path + '.tmp'):
+            # El índice lateral del segmento reemplazado ya no corresponde al contenido;
+            # se reconstruye en la próxima consulta por rango
+            remove_index(path)
+            os.replace(path + '.tmp', path)
+    # Los reemplazos deben estar en disco antes de retirar el archivo heredado
+    fsync_dir(storage.day_dir(ip_address, date_str))
+
+    # Segmentos anteriores que no fueron reemplazados (sus registros ya están en los nuevos)
+    for path in storage.segment_paths(ip_address, date_str):
+        match = SEGMENT_PATTERN.match(os.path.basename(path))
+        if int(match.group('index')) >= segments:
+            os.remove(path)
+            remove_index(path)
+
+    remove_index(source_path)
+    if os.path.exists(source_path):
+        if keep_source:
+            os.replace(source_path, source_path + '.migrated')
+        else:
+            os.remove(source_path)
+    os.remove(marker_path(source_path))
+
+
+def _write_temp_segment(storage: JSONLinesStorage, ip_address: str, date_str: str,
+                        index: int, lines: List[str]) -> str:
+    """Escribe las líneas de un segmento en un archivo temporal, lo fuerza a disco y devuelve su ruta."""
+    temp_path = storage.segment_path(ip_address, date_str, index) + '.tmp'
+    with open(temp_path, 'w') as f:
+        f.writelines(lines)
+        f.flush()
+        os.fsync(f.fileno())
+    return temp_path
+
+
+def migrate_directory(data_dir: str, keep_source: bool = False,
+                      max_segment_bytes: int = DEFAULT_SEGMENT_MAX_BYTES) -> Dict[str, Any]:
+    """
+    Migra todos los archivos heredados de un directorio de datos.
+
+    Args:
+        data_dir: Directorio de datos
+        keep_source: Si es True, conserva los archivos originales renombrados
+        max_segment_bytes: Tamaño máximo de cada segmento generado
+
+    Returns:
+        Diccionario con estado, archivos migrados y errores
+    """
+    storage = JSONLinesStorage(data_dir, max_segment_bytes=max_segment_bytes)
+    migrated = []
+    errors = []
+
+    # Incluir las migraciones interrumpidas cuyo archivo heredado ya se retiró
+    filenames = set()
+    for directory in storage.data_directories():
+        for filename in os.listdir(directory):
+            if filename.endswith(MARKER_SUFFIX):
+                filename = filename[:-len(MARKER_SUFFIX)]
+            if LEGACY_PATTERN.match(filename):
+                filenames.add(os.path.relpath(os.path.join(directory, filename), data_dir))
+
+    for filename in sorted(filenames):
+        result = migrate_file(storage, filename, keep_source=keep_source)
+        if result['success']:
+            migrated.append({"filename": filename, "records": result['records']})
+        else:
+            errors.append(result['message'])
+
+    return {
+        "success": not errors,
+        "message": f"Migrated {len(migrated)} files with {len(errors)} errors",
+        "migrated": migrated,
+        "errors": errors
+    }
+
+
+def parse_arguments():
+    """Analiza los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description='Migra archivos JSON heredados a segmentos JSON Lines')
+
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default=os.path.join(parent_dir, 'data'),
+        help='Directorio de datos (predeterminado: data/)'
+    )
+
+    parser.add_argument(
+        '--keep-source',
+        action='store_true',
+        help='Conservar los archivos originales con extensión .json.migrated (predeterminado: false)'
+    )
+
+    parser.add_argument(
+        '--max-segment-bytes',
+        type=int,
+        default=DEFAULT_SEGMENT_MAX_BYTES,
+        help=f'Tamaño máximo de cada segmento (predeterminado: {DEFAULT_SEGMENT_MAX_BYTES})'
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    result = migrate_directory(args.data_dir, keep_source=args.keep_source,
+                               max_segment_bytes=args.max_segment_bytes)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['success'] else 1)
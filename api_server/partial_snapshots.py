@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Módulo de snapshots parciales para el servidor API de Prex Challenge.
+Completa los snapshots de los agentes con perfil de recolección (agent/profiles.py),
+que solo traen los grupos medidos en cada ciclo, con los últimos valores conocidos
+del host, de modo que cada registro almacenado es un snapshot completo.
+
+El último snapshot de cada host se guarda en data/.partial/ (ver
+host_state.HostStateStore) para que cualquier worker de gunicorn pueda completar
+el siguiente.
+"""
+
+import os
+import sys
+from typing import Dict, Any, Optional, Tuple
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from agent.profiles import COLLECTED_KEY, merge_partial
+from api_server.host_state import HostStateStore
+from api_server.storage import parse_timestamp
+
+
+PARTIAL_DIRNAME = '.partial'
+
+
+class PartialSnapshots(HostStateStore):
+    """
+    Último snapshot completo por host (IP y hostname).
+
+    `merge` completa un snapshot parcial con el último del host y lo guarda como
+    nuevo estado. Un snapshot más antiguo que el estado (por ejemplo, reenviado
+    desde el spool del agente, que ya lo completó) se devuelve tal cual, porque
+    completarlo con valores posteriores alteraría la serie.
+    """
+
+    def __init__(self, data_dir: str = "data", max_cached: int = 1024):
+        """
+        Inicializa el almacén.
+
+        Args:
+            data_dir: Directorio de datos (los estados se guardan en data_dir/.partial)
+            max_cached: Estados que se mantienen en memoria
+        """
+        super().__init__(data_dir, PARTIAL_DIRNAME, 'partial_', max_cached)
+
+    def merge(self, message: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Completa un snapshot parcial y actualiza el estado del host.
+
+        Args:
+            message: Snapshot con la clave "collected" (lista de grupos medidos)
+
+        Returns:
+            Tupla (snapshot, mensaje de error); uno de los dos es None
+        """
+        collected = message.get(COLLECTED_KEY)
+        if not isinstance(collected, list) or not all(isinstance(group, str) for group in collected):
+            return None, f"Invalid {COLLECTED_KEY}: must be a list of collector groups"
+        timestamp = parse_timestamp(message.get('timestamp'))
+        if timestamp is None:
+            return None, "Invalid timestamp"
+
+        key = self._key(message)
+        with self._locked(key):
+            state = self._load(key)
+            latest = parse_timestamp(state.get('timestamp')) if state is not None else None
+            if latest is not None and timestamp < latest:
+                return message, None
+            snapshot = merge_partial(state, message)
+            self._save(key, snapshot)
+        return snapshot, None
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Módulo de caché de consultas para el servidor API de Prex Challenge.
+Guarda en memoria las respuestas ya serializadas de /query y /list, de modo que
+los paneles que consultan una y otra vez el día de hoy no vuelven a leer ni a
+deserializar los archivos mientras no cambien.
+
+Cada respuesta se guarda junto con un ETag calculado a partir de la consulta y de
+la versión de los datos que lee (ver `data_version` y `listing_version` en los
+backends de almacenamiento). Una escritura en una IP y día cambia solo la versión
+de ese día, por lo que invalida exactamente las respuestas que dependen de él,
+incluso si la hizo otro worker.
+"""
+
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Respuesta guardada: (ETag, cuerpo, tipo de contenido, cabeceras)
+CachedResponse = Tuple[str, bytes, str, Dict[str, str]]
+
+
+def make_etag(key: Tuple[Any, ...], version: Any) -> str:
+    """ETag (entre comillas, como en la cabecera HTTP) de una consulta y la versión de sus datos."""
+    payload = json.dumps([list(key), version], separators=(',', ':'), default=str)
+    return '"' + hashlib.sha1(payload.encode('utf-8')).hexdigest() + '"'
+
+
+class QueryCache:
+    """
+    Caché LRU de respuestas acotada por cantidad de entradas y por bytes.
+
+    Una entrada cuyo ETag ya no coincide con el de sus datos actuales se descarta
+    al consultarla (invalidación); las respuestas más grandes que `max_entry_bytes`
+    no se guardan, para que una sola no desplace a todas las demás.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_entry_bytes: Optional[int] = None):
+        """
+        Inicializa la caché.
+
+        Args:
+            max_entries: Respuestas máximas en memoria
+            max_bytes: Tamaño máximo total de los cuerpos guardados
+            max_entry_bytes: Tamaño máximo de una respuesta (predeterminado: max_bytes / 4)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self._entries: "OrderedDict[Tuple[Any, ...], CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.not_modified = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _remove(self, key: Tuple[Any, ...]) -> None:
+        """Elimina una entrada (llamar con el bloqueo tomado)."""
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[1])
+
+    def get(self, key: Tuple[Any, ...], etag: str) -> Optional[CachedResponse]:
+        """
+        Devuelve la respuesta guardada de una consulta si sigue vigente.
+
+        Args:
+            key: Clave de la consulta
+            etag: ETag de la consulta con la versión actual de sus datos
+
+        Returns:
+            La respuesta guardada o None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] != etag:
+                # Los datos cambiaron desde que se guardó
+                self._remove(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[Any, ...], etag: str, body: bytes, mimetype: str,
+            headers: Optional[Dict[str, str]] = None) -> bool:
+        """
+        Guarda la respuesta de una consulta, descartando las menos usadas si hace falta.
+
+        Returns:
+            True si quedó guardada; False si supera max_entry_bytes
+        """
+        if len(body) > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (etag, body, mimetype, dict(headers or {}))
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def record_not_modified(self) -> None:
+        """Cuenta una respuesta 304 (el cliente ya tenía la versión vigente)."""
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self) -> None:
+        """Vacía la caché (los contadores se conservan)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve los contadores de la caché para /health."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "not_modified": self.not_modified
+            }
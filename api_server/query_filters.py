@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Módulo de filtros de consulta para el servidor API de Prex Challenge.
+Implementa la proyección de campos (`fields=`) y los predicados simples (`filter=`)
+que /query evalúa sobre cada registro a medida que se lee del almacenamiento.
+"""
+
+import re
+import json
+import operator
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+
+PREDICATE_PATTERN = re.compile(r'^\s*(?P<path>[A-Za-z0-9_]+(?:\.[A-Za-z0-9_]+)*)\s*(?P<op>>=|<=|!=|=|>|<)(?P<value>.*)$')
+
+OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+class QueryFilterError(ValueError):
+    """Error en la sintaxis de `fields` o `filter`."""
+
+
+class Predicate:
+    """
+    Predicado `ruta operador valor`, por ejemplo `processes.cpu_percent>10`.
+
+    Si la ruta atraviesa una lista (como `processes`), el predicado filtra los
+    elementos de esa lista; si solo atraviesa diccionarios, decide si el
+    snapshot completo se incluye en la respuesta.
+    """
+
+    def __init__(self, path: List[str], op: str, value: str):
+        self.path = path
+        self.op = op
+        self.compare = OPERATORS[op]
+        self.value = value
+        try:
+            self.number: Optional[float] = float(value)
+        except ValueError:
+            self.number = None
+
+    def matches(self, field: Any) -> bool:
+        """
+        Compara el valor de un campo con el valor del predicado: numéricamente si el
+        campo es un número y como texto en otro caso (por ejemplo, timestamps ISO).
+        """
+        if isinstance(field, (int, float)) and not isinstance(field, bool):
+            return self.number is not None and self.compare(field, self.number)
+        if field is None or isinstance(field, bool):
+            field = json.dumps(field)
+        return self.compare(str(field), self.value)
+
+    def apply(self, value: Any, depth: int = 0) -> Tuple[Any, bool]:
+        """
+        Aplica el predicado a un valor sin modificarlo.
+
+        Returns:
+            Tupla (valor, se conserva). Las listas se devuelven filtradas y siempre se conservan.
+        """
+        if isinstance(value, list):
+            kept = []
+            for element in value:
+                new_element, keep = self.apply(element, depth)
+                if keep:
+                    kept.append(new_element)
+            return kept, True
+
+        if depth == len(self.path):
+            return value, self.matches(value)
+
+        if not isinstance(value, dict) or self.path[depth] not in value:
+            return value, False
+
+        key = self.path[depth]
+        child, keep = self.apply(value[key], depth + 1)
+        if not keep:
+            return value, False
+        if child is value[key]:
+            return value, True
+        # Copia superficial: los registros pueden ser compartidos (por ejemplo, en caché)
+        new_value = dict(value)
+        new_value[key] = child
+        return new_value, True
+
+
+def parse_predicates(expressions: Iterable[str]) -> List[Predicate]:
+    """
+    Convierte expresiones `ruta<op>valor` en predicados.
+
+    Raises:
+        QueryFilterError: Si alguna expresión no es válida
+    """
+    predicates = []
+    for expression in expressions:
+        match = PREDICATE_PATTERN.match(expression)
+        if not match:
+            raise QueryFilterError(
+                f"Invalid filter: {expression}. Use <field><op><value> with op in {', '.join(OPERATORS)}"
+            )
+        predicates.append(Predicate(match.group('path').split('.'), match.group('op'), match.group('value').strip()))
+    return predicates
+
+
+def parse_fields(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Convierte una lista de campos separados por comas (`cpu_info.avg_usage,timestamp`)
+    en un árbol de proyección. Devuelve None si no se pidió proyección.
+
+    Raises:
+        QueryFilterError: Si algún campo no es válido
+    """
+    if not value:
+        return None
+    tree: Dict[str, Any] = {}
+    for field in value.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        parts = field.split('.')
+        if not all(re.match(r'^[A-Za-z0-9_]+$', part) for part in parts):
+            raise QueryFilterError(f"Invalid field: {field}")
+        node = tree
+        for part in parts:
+            # Un campo más corto ya seleccionado incluye a los más específicos
+            if part in node and not node[part]:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node.clear()
+    return tree or None
+
+
+def project(value: Any, tree: Dict[str, Any]) -> Any:
+    """Devuelve solo los campos del árbol de proyección, aplicándolo a cada elemento de las listas."""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(element, tree) for element in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+
+def apply_query(records: Iterable[Dict[str, Any]], predicates: List[Predicate],
+                fields: Optional[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Aplica los predicados y la proyección a cada registro a medida que se lee.
+
+    Args:
+        records: Registros de la consulta (lista o iterador)
+        predicates: Predicados que deben cumplirse (AND)
+        fields: Árbol de proyección o None para devolver los registros completos
+    """
+    for record in records:
+        keep = True
+        for predicate in predicates:
+            record, keep = predicate.apply(record)
+            if not keep:
+                break
+        if not keep:
+            continue
+        yield project(record, fields) if fields else record
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Módulo de índices laterales para el servidor API de Prex Challenge.
+Cada archivo de datos puede tener un archivo <archivo>.idx con una entrada binaria
+por registro (timestamp, desplazamiento en bytes y longitud), de modo que las
+consultas por rango de tiempo lean solo los registros necesarios.
+"""
+
+import os
+import re
+import json
+import math
+import struct
+import datetime
+import threading
+from typing import Dict, List, Any, Optional, Tuple
+
+
+INDEX_SUFFIX = '.idx'
+
+# Cabecera: firma y cantidad de bytes del archivo de datos cubiertos por el índice
+HEADER = struct.Struct('<4sQ')
+MAGIC = b'PXI1'
+
+# Entrada: timestamp (epoch, NaN si se desconoce), desplazamiento y longitud del registro
+ENTRY = struct.Struct('<dQI')
+
+IndexEntry = Tuple[float, int, int]
+
+# Tamaño de bloque al indexar archivos con una lista JSON
+SCAN_CHUNK_SIZE = 1024 * 1024
+
+# Patrones del recorrido incremental de listas JSON
+_SKIP = re.compile(rb'(?:[^"\[\]{}]+|"(?:[^"\\]|\\.)*")*', re.DOTALL)
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"', re.DOTALL)
+_VALUE_START = re.compile(rb'[^\s,]')
+_SCALAR_END = re.compile(rb'[\s,\]}]')
+_OPEN_LIST, _CLOSE_LIST, _QUOTE = ord('['), ord(']'), ord('"')
+_OPENERS = (ord('['), ord('{'))
+
+
+def parse_timestamp(value: Any) -> Optional[datetime.datetime]:
+    """
+    Convierte un timestamp a datetime.
+
+    Acepta cadenas ISO 8601 ("YYYY-MM-DD HH:MM:SS" o "YYYY-MM-DDTHH:MM:SS") y
+    segundos desde epoch (número o cadena numérica). Los timestamps con zona
+    horaria ("Z" o "+00:00") se convierten a la hora local sin zona, la misma
+    referencia que usan los snapshots de los agentes, para poder compararlos.
+
+    Args:
+        value: Valor a convertir
+
+    Returns:
+        datetime correspondiente o None si no se puede interpretar
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        # Fuera del rango de la plataforma (1e20) o NaN: timestamp no válido
+        try:
+            return datetime.datetime.fromtimestamp(value)
+        except (TypeError, ValueError, OverflowError, OSError):
+            return None
+    try:
+        return datetime.datetime.fromtimestamp(float(value))
+    except (TypeError, ValueError, OverflowError, OSError):
+        pass
+    text = str(value).strip()
+    if text.endswith(('Z', 'z')):
+        # fromisoformat no acepta el sufijo Z antes de Python 3.11
+        text = text[:-1] + '+00:00'
+    try:
+        parsed = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def index_path(data_path: str) -> str:
+    """Devuelve la ruta del índice lateral de un archivo de datos."""
+    return data_path + INDEX_SUFFIX
+
+
+def record_timestamp(record: Dict[str, Any]) -> float:
+    """Devuelve el timestamp de un registro en segundos desde epoch (NaN si no es válido)."""
+    timestamp = parse_timestamp(record.get('timestamp')) if isinstance(record, dict) else None
+    return timestamp.timestamp() if timestamp else math.nan
+
+
+def read_covered(data_path: str) -> int:
+    """Devuelve cuántos bytes del archivo de datos cubre su índice lateral (0 si no existe)."""
+    try:
+        with open(index_path(data_path), 'rb') as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return 0
+    if len(header) < HEADER.size:
+        return 0
+    magic, covered = HEADER.unpack(header)
+    return covered if magic == MAGIC else 0
+
+
+def read_index(data_path: str) -> Tuple[int, List[IndexEntry]]:
+    """
+    Lee el índice lateral de un archivo de datos.
+
+    Returns:
+        Tupla (bytes cubiertos, entradas). Si el índice no existe o es inválido devuelve (0, []).
+    """
+    path = index_path(data_path)
+    if not os.path.exists(path):
+        return 0, []
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    if len(raw) < HEADER.size:
+        return 0, []
+    magic, covered = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC:
+        return 0, []
+
+    body = raw[HEADER.size:]
+    body = body[:len(body) - len(body) % ENTRY.size]
+    # Las entradas más allá de los bytes cubiertos provienen de una escritura interrumpida
+    entries = [entry for entry in ENTRY.iter_unpack(body) if entry[1] < covered]
+    return covered, entries
+
+
+def write_index(data_path: str, entries: List[IndexEntry], covered: int) -> None:
+    """Reescribe por completo el índice lateral de un archivo de datos de forma atómica."""
+    path = index_path(data_path)
+    # Nombre temporal único para que dos lectores que reconstruyen el índice no se pisen
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, covered))
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+    os.replace(temp_path, path)
+
+
+def append_index(data_path: str, entries: List[IndexEntry], covered: int) -> None:
+    """
+    Añade entradas al final del índice lateral y actualiza los bytes cubiertos.
+
+    Las entradas se escriben antes que la cabecera: si el proceso se interrumpe entre
+    ambas escrituras, las entradas sobrantes se descartan al leer el índice.
+    """
+    path = index_path(data_path)
+    if not os.path.exists(path):
+        write_index(data_path, entries, covered)
+        return
+
+    with open(path, 'r+b') as f:
+        f.seek(0, os.SEEK_END)
+        for entry in entries:
+            f.write(ENTRY.pack(*entry))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, covered))
+
+
+def remove_index(data_path: str) -> None:
+    """Elimina el índice lateral de un archivo de datos si existe."""
+    try:
+        os.remove(index_path(data_path))
+    except FileNotFoundError:
+        pass
+
+
+def scan_lines(data_path: str, offset: int = 0) -> Tuple[List[IndexEntry], int]:
+    """
+    Construye las entradas de índice de un archivo JSON Lines a partir de `offset`.
+
+    Returns:
+        Tupla (entradas, posición final de la última línea completa)
+    """
+    entries = []
+    with open(data_path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                # Línea final incompleta: se indexará cuando termine de escribirse
+                break
+            stripped = line.strip()
+            if stripped:
+                try:
+                    entries.append((record_timestamp(json.loads(stripped)), offset, len(line)))
+                except json.JSONDecodeError:
+                    pass
+            offset += len(line)
+    return entries, offset
+
+
+class _ArrayScanner:
+    """
+    Recorre por bloques un archivo con una lista JSON y delimita cada elemento.
+
+    Solo sigue la profundidad de anidamiento (saltando el contenido de las cadenas);
+    el búfer conserva únicamente los bytes del elemento en curso, de modo que la
+    memoria depende del registro más grande y no del tamaño del archivo.
+    """
+
+    def __init__(self, entries: List[IndexEntry]):
+        self.entries = entries
+        self.buffer = bytearray()
+        # Desplazamiento absoluto del primer byte del búfer y posición de lectura en él
+        self.offset = 0
+        self.pos = 0
+        self.depth = 0
+        # Profundidad de los registros: 1 dentro de la lista, 0 si el archivo es un único objeto
+        self.element_depth: Optional[int] = None
+        # Posición en el búfer del elemento en curso y si es un valor escalar
+        self.start: Optional[int] = None
+        self.scalar = False
+        self.done = False
+
+    def feed(self, data: bytes) -> None:
+        """Procesa el siguiente bloque del archivo."""
+        buffer = self.buffer
+        buffer += data
+        pos = self.pos
+        length = len(buffer)
+        while pos < length and not self.done:
+            if self.start is None:
+                # Buscar el comienzo del siguiente valor (saltando espacios y comas)
+                match = _VALUE_START.search(buffer, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.start()
+                char = buffer[pos]
+                if self.element_depth is None:
+                    if char == _OPEN_LIST:
+                        self.element_depth = self.depth = 1
+                        pos += 1
+                        continue
+                    self.element_depth = 0
+                elif char == _CLOSE_LIST:
+                    self.done = True
+                    break
+                self.start = pos
+                if char in _OPENERS:
+                    self.depth += 1
+                    pos += 1
+                elif char == _QUOTE:
+                    match = _STRING.match(buffer, pos)
+                    if match is None:
+                        break
+                    pos = match.end()
+                    self._end(pos)
+                else:
+                    self.scalar = True
+                continue
+
+            if self.scalar:
+                match = _SCALAR_END.search(buffer, pos)
+                if match is None:
+                    break
+                pos = match.start()
+                self._end(pos)
+                continue
+
+            # Saltar todo hasta el próximo corchete o llave fuera de una cadena
+            pos = _SKIP.match(buffer, pos).end()
+            if pos >= length or buffer[pos] == _QUOTE:
+                # Cadena sin cerrar en este bloque: esperar al siguiente
+                break
+            char = buffer[pos]
+            pos += 1
+            if char in _OPENERS:
+                self.depth += 1
+            else:
+                self.depth -= 1
+                if self.depth == self.element_depth:
+                    self._end(pos)
+
+        # Descartar lo ya procesado, salvo los bytes del elemento en curso
+        keep = pos if self.start is None else self.start
+        del buffer[:keep]
+        self.offset += keep
+        self.pos = pos - keep
+        if self.start is not None:
+            self.start -= keep
+
+    def finish(self) -> None:
+        """Cierra un valor escalar que termina justo al final del archivo."""
+        if self.start is not None and self.scalar:
+            self._end(len(self.buffer))
+
+    def _end(self, end: int) -> None:
+        """Decodifica el elemento en curso, que termina en la posición `end` del búfer."""
+        raw = bytes(self.buffer[self.start:end])
+        record = json.loads(raw)
+        self.entries.append((record_timestamp(record), self.offset + self.start, len(raw)))
+        self.start = None
+        self.scalar = False
+        if self.element_depth == 0:
+            self.done = True
+
+
+def scan_array(data_path: str) -> List[IndexEntry]:
+    """
+    Construye las entradas de índice de un archivo que contiene una lista JSON.
+
+    El archivo se lee por bloques de SCAN_CHUNK_SIZE bytes, sin cargarlo completo.
+    """
+    entries: List[IndexEntry] = []
+    scanner = _ArrayScanner(entries)
+    with open(data_path, 'rb') as f:
+        while not scanner.done:
+            chunk = f.read(SCAN_CHUNK_SIZE)
+            if not chunk:
+                break
+            scanner.feed(chunk)
+    scanner.finish()
+    return entries
+
+
+def load_lines_index(data_path: str) -> List[IndexEntry]:
+    """
+    Devuelve el índice de un archivo JSON Lines, completándolo si quedó desactualizado.
+
+    Como los archivos JSON Lines solo crecen, basta con indexar los bytes añadidos
+    después de la última posición cubierta.
+    """
+    size = os.path.getsize(data_path)
+    covered, entries = read_index(data_path)
+
+    if covered == size:
+        return entries
+    if covered > size:
+        entries, covered = scan_lines(data_path)
+        write_index(data_path, entries, covered)
+        return entries
+
+    new_entries, new_covered = scan_lines(data_path, covered)
+    if new_covered != covered:
+        append_index(data_path, new_entries, new_covered)
+    return entries + new_entries
+
+
+def load_array_index(data_path: str) -> List[IndexEntry]:
+    """Devuelve el índice de un archivo con una lista JSON, reconstruyéndolo si no coincide."""
+    size = os.path.getsize(data_path)
+    covered, entries = read_index(data_path)
+
+    if covered == size and os.path.exists(index_path(data_path)):
+        return entries
+
+    entries = scan_array(data_path)
+    write_index(data_path, entries, size)
+    return entries
+
+
+def read_record(f, offset: int, length: int) -> Dict[str, Any]:
+    """Lee y decodifica un registro desde un archivo binario abierto."""
+    f.seek(offset)
+    return json.loads(f.read(length))
+
+
+def in_range(timestamp: float, start: float, end: float) -> bool:
+    """Indica si un timestamp del índice está dentro del rango (los NaN nunca lo están)."""
+    return start <= timestamp <= end
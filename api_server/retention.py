@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Módulo de retención y compactación para el servidor API de Prex Challenge.
+Elimina los días más antiguos del almacenamiento por antigüedad o por tamaño
+total, y compacta los días cerrados (ver JSONStorage.compact_day), de modo que el
+directorio de datos no crece sin límite.
+
+Los días y sus tamaños se obtienen del catálogo (list_available_data), sin recorrer
+el directorio de datos. Las series de /metrics y sus agregados no se eliminan:
+ocupan una fracción de los snapshots y son las que permiten ver meses de historia.
+
+Aplicar la política una vez (por ejemplo, desde cron):
+
+    python api_server/retention.py --data-dir data --storage jsonl --max-age-days 30 --compact-after-days 1
+"""
+
+import os
+import sys
+import json
+import logging
+import argparse
+import datetime
+import threading
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from api_server.catalog import MAX_PAGE_SIZE
+from api_server.storage import STORAGE_BACKENDS, LAYOUTS, create_storage
+
+
+# Segundos entre dos pasadas del worker
+DEFAULT_INTERVAL = 3600.0
+
+# Días ya revisados que se vuelven a compactar: la escritura diferida puede guardar
+# registros del día anterior poco después de medianoche
+RECHECK_DAYS = 1
+
+# Día del catálogo: (IP, fecha, bytes)
+StoredDay = Tuple[str, str, int]
+
+logger = logging.getLogger('api_server')
+
+
+def select_expired(days: List[StoredDay], today: datetime.date, max_age_days: Optional[int] = None,
+                   max_bytes: Optional[int] = None) -> List[Tuple[str, str]]:
+    """
+    Elige los días a eliminar.
+
+    Primero los que tienen `max_age_days` días o más; después, si el resto sigue
+    ocupando más de `max_bytes`, los más antiguos hasta quedar por debajo. El día de
+    hoy nunca se elige: es el que está recibiendo escrituras.
+
+    Args:
+        days: Días almacenados ordenados por fecha
+        today: Fecha actual
+        max_age_days: Antigüedad máxima en días (None: sin límite)
+        max_bytes: Tamaño total máximo (None: sin límite)
+
+    Returns:
+        (IP, fecha) de los días a eliminar, del más antiguo al más reciente
+    """
+    today_str = today.strftime("%Y-%m-%d")
+    cutoff = None
+    if max_age_days is not None:
+        cutoff = (today - datetime.timedelta(days=max_age_days)).strftime("%Y-%m-%d")
+
+    expired, kept = [], []
+    for ip_address, date_str, size in days:
+        if cutoff is not None and date_str <= cutoff:
+            expired.append((ip_address, date_str))
+        else:
+            kept.append((ip_address, date_str, size))
+
+    if max_bytes is not None:
+        total = sum(size for _, _, size in kept)
+        for ip_address, date_str, size in kept:
+            if total <= max_bytes or date_str >= today_str:
+                break
+            expired.append((ip_address, date_str))
+            total -= size
+    return expired
+
+
+class RetentionWorker:
+    """
+    Aplica la retención y la compactación del almacenamiento cada `interval` segundos
+    en un hilo de fondo (o una vez con run_once).
+
+    Las eliminaciones y compactaciones toman el mismo bloqueo por IP y fecha que las
+    escrituras, por lo que el worker puede ejecutarse junto al servidor. Conviene un
+    único worker por directorio de datos (run_api.py lo arranca en el proceso
+    principal, no en cada worker de gunicorn).
+    """
+
+    def __init__(self, storage, max_age_days: Optional[int] = None, max_bytes: Optional[int] = None,
+                 compact_after_days: Optional[int] = None, interval: float = DEFAULT_INTERVAL):
+        """
+        Inicializa el worker.
+
+        Args:
+            storage: Backend con list_available_data y delete_day (y compact_day para compactar)
+            max_age_days: Se eliminan los días con esta antigüedad o más (None: sin límite)
+            max_bytes: Tamaño total máximo de los datos según el catálogo (None: sin límite)
+            compact_after_days: Se compactan los días con esta antigüedad o más (None: no compactar)
+            interval: Segundos entre pasadas del hilo de fondo
+
+        Raises:
+            ValueError: Si algún límite no es válido
+        """
+        if max_age_days is not None and max_age_days < 1:
+            raise ValueError("max_age_days must be at least 1")
+        if max_bytes is not None and max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+        if compact_after_days is not None and compact_after_days < 1:
+            raise ValueError("compact_after_days must be at least 1 (today is still being written)")
+
+        self.storage = storage
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self.compact_after_days = compact_after_days
+        self.interval = interval
+
+        if compact_after_days is not None and not hasattr(storage, 'compact_day'):
+            logger.warning(f"Storage backend {type(storage).__name__} does not support compaction")
+            self.compact_after_days = None
+
+        # Fecha hasta la que todos los días quedaron compactados en la última pasada
+        self._compacted_through: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+
+    def _stored_days(self, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> Iterator[StoredDay]:
+        """Recorre el catálogo por páginas, ordenado por fecha e IP."""
+        cursor = None
+        while True:
+            result = self.storage.list_available_data(limit=MAX_PAGE_SIZE, cursor=cursor,
+                                                      start_date=start_date, end_date=end_date)
+            if not result['success']:
+                raise RuntimeError(result['message'])
+            for entry in result['available_data']:
+                yield entry['ip_address'], entry['date'], entry['bytes']
+            cursor = result['next_cursor']
+            if cursor is None:
+                return
+
+    def enforce_retention(self, today: datetime.date) -> Dict[str, Any]:
+        """
+        Elimina los días que superan la antigüedad o el tamaño máximos.
+
+        Returns:
+            Diccionario con días eliminados, bytes liberados y errores
+        """
+        deleted, freed, errors = 0, 0, []
+        if self.max_age_days is None and self.max_bytes is None:
+            return {"deleted": deleted, "freed_bytes": freed, "errors": errors}
+
+        for ip_address, date_str in select_expired(list(self._stored_days()), today,
+                                                   self.max_age_days, self.max_bytes):
+            result = self.storage.delete_day(ip_address, date_str)
+            if result['success']:
+                deleted += 1
+                freed += result['bytes']
+            else:
+                errors.append(result['message'])
+        return {"deleted": deleted, "freed_bytes": freed, "errors": errors}
+
+    def compact(self, today: datetime.date) -> Dict[str, Any]:
+        """
+        Compacta los días cerrados con `compact_after_days` días de antigüedad o más.
+
+        La primera pasada revisa todo el catálogo; las siguientes solo los días
+        posteriores a la última fecha compactada (menos RECHECK_DAYS).
+
+        Returns:
+            Diccionario con días compactados, bytes ahorrados y errores
+        """
+        compacted, saved, errors = 0, 0, []
+        if self.compact_after_days is None:
+            return {"compacted": compacted, "saved_bytes": saved, "errors": errors}
+
+        cutoff = (today - datetime.timedelta(days=self.compact_after_days)).strftime("%Y-%m-%d")
+        start_date = None
+        if self._compacted_through is not None:
+            start_date = (datetime.datetime.strptime(self._compacted_through, "%Y-%m-%d")
+                          - datetime.timedelta(days=RECHECK_DAYS)).strftime("%Y-%m-%d")
+
+        for ip_address, date_str, _ in list(self._stored_days(start_date=start_date, end_date=cutoff)):
+            result = self.storage.compact_day(ip_address, date_str)
+            if not result['success']:
+                errors.append(result['message'])
+            elif result['records']:
+                compacted += 1
+                saved += result['bytes_before'] - result['bytes_after']
+
+        if not errors:
+            self._compacted_through = cutoff
+        return {"compacted": compacted, "saved_bytes": saved, "errors": errors}
+
+    def run_once(self, today: Optional[datetime.date] = None) -> Dict[str, Any]:
+        """
+        Aplica la retención y luego la compactación (así no se compactan días que se van a eliminar).
+
+        Args:
+            today: Fecha actual (predeterminado: hoy)
+
+        Returns:
+            Diccionario con estado, días eliminados y compactados, bytes y errores
+        """
+        today = today or datetime.date.today()
+        try:
+            retention = self.enforce_retention(today)
+            compaction = self.compact(today)
+            errors = retention['errors'] + compaction['errors']
+            result = {
+                "success": not errors,
+                "message": (f"Deleted {retention['deleted']} days ({retention['freed_bytes']} bytes), "
+                            f"compacted {compaction['compacted']} days ({compaction['saved_bytes']} bytes saved)"),
+                "deleted": retention['deleted'],
+                "freed_bytes": retention['freed_bytes'],
+                "compacted": compaction['compacted'],
+                "saved_bytes": compaction['saved_bytes'],
+                "errors": errors
+            }
+        except Exception as e:
+            result = {
+                "success": False,
+                "message": f"Error applying retention: {str(e)}",
+                "deleted": 0,
+                "freed_bytes": 0,
+                "compacted": 0,
+                "saved_bytes": 0,
+                "errors": [str(e)]
+            }
+
+        self.last_result = result
+        if not result['success']:
+            logger.error(f"Retention pass finished with errors: {result['message']}; {result['errors'][:5]}")
+        elif result['deleted'] or result['compacted']:
+            logger.info(f"Retention pass: {result['message']}")
+        return result
+
+    def start(self) -> None:
+        """Arranca el hilo de fondo: una pasada inmediata y luego una cada `interval` segundos."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='prex-retention', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        """Bucle del hilo de fondo."""
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+    def stop(self, timeout: Optional[float] = 30.0) -> None:
+        """Detiene el hilo de fondo al terminar la pasada en curso."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def parse_arguments():
+    """Analiza los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description='Apply retention and compaction to the Prex Challenge data directory')
+
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default=os.environ.get('PREX_DATA_DIR', os.path.join(parent_dir, 'data')),
+        help='Directorio de datos (predeterminado: data/)'
+    )
+
+    parser.add_argument(
+        '--storage',
+        type=str,
+        choices=sorted(STORAGE_BACKENDS),
+        default=os.environ.get('PREX_STORAGE_BACKEND', 'json'),
+        help='Backend de almacenamiento (predeterminado: json)'
+    )
+
+    parser.add_argument(
+        '--layout',
+        type=str,
+        choices=LAYOUTS,
+        default=os.environ.get('PREX_STORAGE_LAYOUT', 'flat'),
+        help='Distribución de los archivos nuevos: flat (data/) o daily (data/YYYY/MM/DD/) (predeterminado: flat)'
+    )
+
+    parser.add_argument(
+        '--max-age-days',
+        type=int,
+        default=None,
+        help='Eliminar los días con esta antigüedad o más (predeterminado: sin límite)'
+    )
+
+    parser.add_argument(
+        '--max-gb',
+        type=float,
+        default=None,
+        help='Eliminar los días más antiguos mientras los datos superen este tamaño en GB (predeterminado: sin límite)'
+    )
+
+    parser.add_argument(
+        '--compact-after-days',
+        type=int,
+        default=None,
+        help='Compactar los días con esta antigüedad o más; 1 compacta desde ayer (predeterminado: no compactar)'
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_arguments()
+    worker = RetentionWorker(
+        create_storage(args.storage, data_dir=args.data_dir, layout=args.layout),
+        max_age_days=args.max_age_days,
+        max_bytes=int(args.max_gb * 1024 ** 3) if args.max_gb is not None else None,
+        compact_after_days=args.compact_after_days
+    )
+    result = worker.run_once()
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result['success'] else 1)
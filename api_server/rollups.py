@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Módulo de agregados (rollups) para el servidor API de Prex Challenge.
+Resume las series numéricas de metrics_store.py en buckets de 1 minuto, 1 hora y
+1 día con el mínimo, el máximo, el promedio y el percentil 95 de la CPU promedio y
+de la cantidad de procesos, de modo que una vista de un mes lee unos cientos de
+filas en lugar de decenas de miles de snapshots.
+
+Cada día y resolución se guarda en un archivo de float64 con una fila por bucket,
+
+    data/.rollups/<IP>/<YYYY-MM-DD>/1m.f64
+    data/.rollups/<IP>/<YYYY-MM-DD>/1h.f64
+    data/.rollups/<IP>/<YYYY-MM-DD>/1d.f64
+    data/.rollups/<IP>/<YYYY-MM-DD>/source.json
+
+donde cada fila es [inicio del bucket, snapshots, <métrica>_min, _max, _avg, _p95, ...].
+`source.json` guarda la firma de la columna de timestamps a partir de la que se
+calcularon; un día con escrituras posteriores se recalcula al consultarlo, por lo
+que solo se recalculan los días que cambiaron.
+
+Precalcular los agregados de todos los días pendientes:
+
+    python api_server/rollups.py --data-dir data
+"""
+
+import os
+import sys
+import json
+import math
+import bisect
+import logging
+import argparse
+import datetime
+from array import array
+from typing import Dict, List, Optional
+
+# Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
+parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from api_server.locking import KeyedLocks, key_lock
+from api_server.metrics_store import MetricsStore, TIMESTAMP_COLUMN, COLUMN_SUFFIX
+
+
+ROLLUPS_DIRNAME = '.rollups'
+SOURCE_FILENAME = 'source.json'
+
+# Resoluciones disponibles y su amplitud en segundos
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+# Métricas agregadas y estadísticos de cada una
+ROLLUP_METRICS = ('cpu_avg', 'process_count')
+ROLLUP_STATS = ('min', 'max', 'avg', 'p95')
+
+# Columna con la cantidad de snapshots de cada bucket
+COUNT_COLUMN = 'count'
+
+# Puntos máximos por serie al elegir la resolución automáticamente
+DEFAULT_MAX_POINTS = 1500
+
+ROLLUP_COLUMNS = [TIMESTAMP_COLUMN, COUNT_COLUMN] + [
+    f'{metric}_{stat}' for metric in ROLLUP_METRICS for stat in ROLLUP_STATS
+]
+
+logger = logging.getLogger('api_server')
+
+
+def choose_resolution(start: datetime.datetime, end: datetime.datetime,
+                      max_points: int = DEFAULT_MAX_POINTS) -> str:
+    """
+    Elige la resolución más detallada que no supera `max_points` buckets en el
+    rango; si ninguna alcanza, la diaria.
+    """
+    span = max((end - start).total_seconds(), 0.0)
+    for name, seconds in sorted(RESOLUTIONS.items(), key=lambda item: item[1]):
+        if span / seconds <= max_points:
+            return name
+    return '1d'
+
+
+def _summarize(values: List[float]) -> List[float]:
+    """Mínimo, máximo, promedio y percentil 95 (rango más cercano) sin los NaN."""
+    present = sorted(value for value in values if value == value)
+    if not present:
+        return [math.nan] * len(ROLLUP_STATS)
+    p95 = present[max(math.ceil(0.95 * len(present)) - 1, 0)]
+    return [present[0], present[-1], sum(present) / len(present), p95]
+
+
+def aggregate(timestamps: array, columns: Dict[str, array], midnight: float, seconds: int) -> array:
+    """
+    Agrupa las filas de un día (ordenadas por timestamp) en buckets de `seconds`.
+
+    Args:
+        timestamps: Timestamps del día
+        columns: Valores de cada métrica de ROLLUP_METRICS, alineados con los timestamps
+        midnight: Epoch de la medianoche local del día (inicio del primer bucket)
+        seconds: Amplitud del bucket
+
+    Returns:
+        Filas de ROLLUP_COLUMNS concatenadas, una por bucket con datos
+    """
+    rows = array('d')
+    start = 0
+    while start < len(timestamps):
+        bucket = math.floor((timestamps[start] - midnight) / seconds)
+        end = start
+        while end < len(timestamps) and math.floor((timestamps[end] - midnight) / seconds) == bucket:
+            end += 1
+        rows.append(midnight + bucket * seconds)
+        rows.append(end - start)
+        for metric in ROLLUP_METRICS:
+            rows.extend(_summarize(columns[metric][start:end]))
+        start = end
+    return rows
+
+
+class Rollups:
+    """
+    Agregados por host, día y resolución, calculados a partir de un MetricsStore.
+
+    Los días se recalculan completos cuando cambia la firma de sus series (un día
+    tiene a lo sumo 1440 buckets, por lo que recalcularlo es barato) bajo un bloqueo
+    por clave entre hilos y procesos, como el resto de los archivos por host.
+    """
+
+    def __init__(self, metrics: MetricsStore):
+        """
+        Inicializa los agregados.
+
+        Args:
+            metrics: Series numéricas de origen (los agregados se guardan en data_dir/.rollups)
+        """
+        self.metrics = metrics
+        self.data_dir = metrics.data_dir
+        self.base_dir = os.path.join(metrics.data_dir, ROLLUPS_DIRNAME)
+        self._locks = KeyedLocks()
+
+    def partition_dir(self, ip_address: str, date_str: str) -> str:
+        """Directorio con los agregados de una IP y fecha."""
+        return os.path.join(self.base_dir, ip_address, date_str)
+
+    def _lock(self, ip_address: str, date_str: str):
+        """Bloqueo de los agregados de una IP y fecha."""
+        return key_lock(self._locks, self.data_dir, f"rollups_{ip_address}_{date_str}", scope='rollups')
+
+    def _source(self, directory: str) -> Optional[List[int]]:
+        """Firma de las series con la que se calcularon los agregados de un día."""
+        try:
+            with open(os.path.join(directory, SOURCE_FILENAME), 'r') as f:
+                return json.load(f).get('signature')
+        except (OSError, ValueError):
+            return None
+
+    def refresh(self, ip_address: str, date_str: str) -> bool:
+        """
+        Recalcula los agregados de un día si sus series cambiaron.
+
+        Returns:
+            True si el día tiene agregados al día; False si no tiene series
+        """
+        directory = self.partition_dir(ip_address, date_str)
+        signature = self.metrics.signature(ip_address, date_str)
+        if signature is None:
+            return False
+        if self._source(directory) == signature:
+            return True
+
+        with self._lock(ip_address, date_str):
+            # Otro hilo o proceso pudo haberlo recalculado mientras se esperaba el bloqueo
+            signature, columns = self.metrics.load_day(ip_address, date_str, list(ROLLUP_METRICS))
+            if signature is None:
+                return False
+            if self._source(directory) == signature:
+                return True
+
+            os.makedirs(directory, exist_ok=True)
+            midnight = datetime.datetime.strptime(date_str, "%Y-%m-%d").timestamp()
+            timestamps = columns.pop(TIMESTAMP_COLUMN)
+            for name, seconds in RESOLUTIONS.items():
+                path = os.path.join(directory, name + COLUMN_SUFFIX)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(aggregate(timestamps, columns, midnight, seconds).tobytes())
+                os.replace(path + '.tmp', path)
+
+            # La firma se escribe al final: si se interrumpe antes, el día se recalcula
+            source_path = os.path.join(directory, SOURCE_FILENAME)
+            with open(source_path + '.tmp', 'w') as f:
+                json.dump({"signature": signature, "columns": ROLLUP_COLUMNS}, f)
+            os.replace(source_path + '.tmp', source_path)
+        return True
+
+    def refresh_all(self) -> int:
+        """
+        Recalcula los agregados de todos los días cuyas series cambiaron.
+
+        Returns:
+            Cantidad de días con agregados
+        """
+        days = 0
+        for ip_address in self.metrics.hosts():
+            for date_str in self.metrics.days(ip_address):
+                days += self.refresh(ip_address, date_str)
+        return days
+
+    def read(self, ip_address: str, start: datetime.datetime, end: datetime.datetime,
+             resolution: str, metrics: Optional[List[str]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        Lee los buckets de una IP que se solapan con el rango [start, end].
+
+        Args:
+            ip_address: Dirección IP
+            start: Inicio del rango
+            end: Fin del rango
+            resolution: Resolución ('1m', '1h' o '1d')
+            metrics: Métricas de ROLLUP_METRICS a devolver (None: todas)
+
+        Returns:
+            Diccionario columna -> valores, con el inicio de cada bucket en "ts" y la
+            cantidad de snapshots en "count"; los valores ausentes son None
+
+        Raises:
+            ValueError: Si la resolución o una métrica no son válidas
+        """
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Invalid resolution: {resolution}. Use one of: {', '.join(RESOLUTIONS)}")
+        for name in metrics or []:
+            if name not in ROLLUP_METRICS:
+                raise ValueError(f"Metric {name} has no rollups. Use one of: {', '.join(ROLLUP_METRICS)}")
+
+        seconds = RESOLUTIONS[resolution]
+        width = len(ROLLUP_COLUMNS)
+        names = [
+            (index, name) for index, name in enumerate(ROLLUP_COLUMNS)
+            if index < 2 or metrics is None or name.rsplit('_', 1)[0] in metrics
+        ]
+        result: Dict[str, List[Optional[float]]] = {name: [] for _, name in names}
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+
+        day = start.date()
+        while day <= end.date():
+            date_str = day.strftime("%Y-%m-%d")
+            day += datetime.timedelta(days=1)
+            if not self.refresh(ip_address, date_str):
+                continue
+            rows = array('d')
+            try:
+                with open(os.path.join(self.partition_dir(ip_address, date_str), resolution + COLUMN_SUFFIX), 'rb') as f:
+                    rows.frombytes(f.read())
+            except FileNotFoundError:
+                continue
+
+            bucket_starts = rows[0::width]
+            low = bisect.bisect_right(bucket_starts, start_ts - seconds)
+            high = bisect.bisect_right(bucket_starts, end_ts)
+            for index, name in names:
+                values = rows[low * width + index:high * width:width]
+                result[name].extend(None if value != value else value for value in values)
+        return result
+
+
+def parse_arguments():
+    """Analiza los argumentos de línea de comandos."""
+    parser = argparse.ArgumentParser(description='Precompute the Prex Challenge metric rollups')
+
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default=os.environ.get('PREX_DATA_DIR', os.path.join(parent_dir, 'data')),
+        help='Directorio de datos (predeterminado: data/)'
+    )
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    args = parse_arguments()
+    days = Rollups(MetricsStore(args.data_dir)).refresh_all()
+    logger.info(f"Rollups up to date for {days} host-days")
@@ -1,19 +1,32 @@
 #!/usr/bin/env python3
 """
 Punto de entrada para ejecutar el servidor API de Prex Challenge.
+Puede usar el servidor de desarrollo de Flask o gunicorn con varios workers.
 """
 
 import os
 import sys
+import signal
 import argparse
 import logging
+import multiprocessing
+from typing import Dict, Any
 
 # Añadir directorio padre a la ruta para importar módulos correctamente si se ejecuta desde un subdirectorio
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
+import api_server.app as api_app
 from api_server.app import app
+from api_server.storage import STORAGE_BACKENDS, LAYOUTS, create_storage
+from api_server.delta_sessions import DeltaSessions
+from api_server.partial_snapshots import PartialSnapshots
+from api_server.metrics_store import MetricsStore
+from api_server.rollups import Rollups
+from api_server.query_cache import QueryCache
+from api_server.ingest import FSYNC_POLICIES, DEFAULT_BATCH_SIZE, DEFAULT_FLUSH_INTERVAL
+from api_server.retention import RetentionWorker, DEFAULT_INTERVAL as DEFAULT_RETENTION_INTERVAL
 
 # Configurar registro de logs
 logging.basicConfig(
@@ -27,6 +40,39 @@ logging.basicConfig(
 logger = logging.getLogger('api_server')
 
 
+def default_workers() -> int:
+    """Cantidad de workers recomendada por gunicorn: 2 x núcleos + 1."""
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def run_gunicorn(options: Dict[str, Any]) -> None:
+    """
+    Ejecuta la aplicación con gunicorn sin necesidad de un archivo de configuración.
+    
+    Args:
+        options: Configuración de gunicorn (bind, workers, threads, keepalive, backlog, ...)
+    """
+    # Importación diferida: gunicorn no está disponible en Windows
+    from gunicorn.app.base import BaseApplication
+    
+    class PrexGunicornApplication(BaseApplication):
+        """Aplicación gunicorn que sirve la app Flask ya configurada."""
+        
+        def __init__(self, application, settings: Dict[str, Any]):
+            self.application = application
+            self.settings = settings
+            super().__init__()
+        
+        def load_config(self):
+            for key, value in self.settings.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return self.application
+    
+    PrexGunicornApplication(app, options).run()
+
+
 def parse_arguments():
     """Analiza los argumentos de línea de comandos."""
     parser = argparse.ArgumentParser(description='Prex Challenge API Server')
@@ -45,6 +91,144 @@ def parse_arguments():
         help='Puerto al que vincular el servidor (predeterminado: 5000)'
     )
     
+    parser.add_argument(
+        '--storage',
+        type=str,
+        choices=sorted(STORAGE_BACKENDS),
+        default=os.environ.get('PREX_STORAGE_BACKEND', 'json'),
+        help='Backend de almacenamiento (predeterminado: json)'
+    )
+    
+    parser.add_argument(
+        '--data-dir',
+        type=str,
+        default=os.environ.get('PREX_DATA_DIR', os.path.join(parent_dir, 'data')),
+        help='Directorio de datos (predeterminado: data/)'
+    )
+    
+    parser.add_argument(
+        '--layout',
+        type=str,
+        choices=LAYOUTS,
+        default=os.environ.get('PREX_STORAGE_LAYOUT', 'flat'),
+        help='Distribución de los archivos nuevos de json y jsonl: flat (data/) o daily (data/YYYY/MM/DD/) (predeterminado: flat)'
+    )
+    
+    parser.add_argument(
+        '--server',
+        type=str,
+        choices=['dev', 'gunicorn'],
+        default='dev',
+        help='Servidor a utilizar: dev (Flask, un proceso) o gunicorn (producción) (predeterminado: dev)'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=default_workers(),
+        help='Procesos worker de gunicorn (predeterminado: 2 x núcleos + 1)'
+    )
+    
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=4,
+        help='Hilos por worker de gunicorn (predeterminado: 4)'
+    )
+    
+    parser.add_argument(
+        '--keepalive',
+        type=int,
+        default=5,
+        help='Segundos que se mantiene abierta una conexión keep-alive (predeterminado: 5)'
+    )
+    
+    parser.add_argument(
+        '--backlog',
+        type=int,
+        default=2048,
+        help='Conexiones pendientes máximas en la cola del socket (predeterminado: 2048)'
+    )
+    
+    parser.add_argument(
+        '--timeout',
+        type=int,
+        default=60,
+        help='Segundos antes de reiniciar un worker bloqueado (predeterminado: 60)'
+    )
+    
+    parser.add_argument(
+        '--write-behind',
+        action='store_true',
+        default=os.environ.get('PREX_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes'),
+        help='Responder a /upload al encolar y escribir en lotes en segundo plano (predeterminado: false)'
+    )
+    
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help=f'Registros por IP y día que disparan una escritura diferida (predeterminado: {DEFAULT_BATCH_SIZE})'
+    )
+    
+    parser.add_argument(
+        '--flush-interval',
+        type=float,
+        default=DEFAULT_FLUSH_INTERVAL,
+        help=f'Segundos máximos que un registro espera en la cola (predeterminado: {DEFAULT_FLUSH_INTERVAL})'
+    )
+    
+    parser.add_argument(
+        '--fsync',
+        type=str,
+        choices=FSYNC_POLICIES,
+        default=os.environ.get('PREX_FSYNC', 'never'),
+        help='Política de fsync de la escritura diferida: never, batch o interval (predeterminado: never)'
+    )
+    
+    parser.add_argument(
+        '--no-metrics',
+        dest='metrics',
+        action='store_false',
+        default=os.environ.get('PREX_METRICS', '1').lower() not in ('0', 'false', 'no'),
+        help='No extraer las series numéricas de /metrics al almacenar (predeterminado: activado)'
+    )
+    
+    parser.add_argument(
+        '--query-cache-mb',
+        type=int,
+        default=int(os.environ.get('PREX_QUERY_CACHE_MB', 64)),
+        help='Memoria máxima de la caché de /query y /list por worker en MB; 0 la desactiva (predeterminado: 64)'
+    )
+    
+    parser.add_argument(
+        '--retention-days',
+        type=int,
+        default=int(os.environ['PREX_RETENTION_DAYS']) if os.environ.get('PREX_RETENTION_DAYS') else None,
+        help='Eliminar los días con esta antigüedad o más (predeterminado: sin límite)'
+    )
+    
+    parser.add_argument(
+        '--max-data-gb',
+        type=float,
+        default=float(os.environ['PREX_MAX_DATA_GB']) if os.environ.get('PREX_MAX_DATA_GB') else None,
+        help='Eliminar los días más antiguos mientras los datos superen este tamaño en GB (predeterminado: sin límite)'
+    )
+    
+    parser.add_argument(
+        '--compact-after-days',
+        type=int,
+        default=int(os.environ['PREX_COMPACT_AFTER_DAYS']) if os.environ.get('PREX_COMPACT_AFTER_DAYS') else None,
+        help='Compactar los días con esta antigüedad o más; 1 compacta desde ayer (predeterminado: no compactar)'
+    )
+    
+    parser.add_argument(
+        '--retention-interval',
+        type=float,
+        default=DEFAULT_RETENTION_INTERVAL,
+        help=f'Segundos entre pasadas de retención y compactación (predeterminado: {DEFAULT_RETENTION_INTERVAL:.0f})'
+    )
+    
     parser.add_argument(
         '--debug',
         action='store_true',
@@ -58,17 +242,70 @@ if __name__ == "__main__":
     args = parse_arguments()
     
     # Asegurar que el directorio de datos existe
-    data_dir = os.path.join(parent_dir, "data")
+    data_dir = args.data_dir
     if not os.path.exists(data_dir):
         os.makedirs(data_dir)
         logger.info(f"Created data directory: {data_dir}")
     
-    # Registrar información de inicio
-    logger.info(f"Starting API server on {args.host}:{args.port}")
+    # Configurar el backend de almacenamiento seleccionado
+    api_app.storage = create_storage(args.storage, data_dir=data_dir, layout=args.layout)
+    api_app.delta_sessions = DeltaSessions(data_dir)
+    api_app.partial_snapshots = PartialSnapshots(data_dir)
+    api_app.metrics_store = MetricsStore(data_dir) if args.metrics else None
+    api_app.rollups = Rollups(api_app.metrics_store) if args.metrics else None
+    api_app.query_cache = QueryCache(max_bytes=args.query_cache_mb * 1024 * 1024) if args.query_cache_mb > 0 else None
     
-    # Ejecutar aplicación Flask
-    app.run(
-        host=args.host,
-        port=args.port,
-        debug=args.debug
+    # La cola de escritura diferida se crea sobre el backend ya configurado
+    api_app.configure_ingest(
+        enabled=args.write_behind,
+        batch_size=args.batch_size,
+        flush_interval=args.flush_interval,
+        fsync=args.fsync
     )
+    if args.write_behind:
+        logger.info(f"Write-behind enabled (batch: {args.batch_size}, interval: {args.flush_interval}s, fsync: {args.fsync})")
+    
+    # Retención y compactación en un hilo del proceso principal: una sola vez por
+    # directorio de datos aunque haya varios workers. Usa su propia instancia del
+    # backend para que los workers creados con fork no hereden bloqueos tomados
+    if args.retention_days is not None or args.max_data_gb is not None or args.compact_after_days is not None:
+        retention = RetentionWorker(
+            create_storage(args.storage, data_dir=data_dir, layout=args.layout),
+            max_age_days=args.retention_days,
+            max_bytes=int(args.max_data_gb * 1024 ** 3) if args.max_data_gb is not None else None,
+            compact_after_days=args.compact_after_days,
+            interval=args.retention_interval
+        )
+        retention.start()
+        logger.info(f"Retention enabled (max age: {args.retention_days} days, max size: {args.max_data_gb} GB, "
+                    f"compact after: {args.compact_after_days} days, interval: {args.retention_interval}s)")
+    
+    # Registrar información de inicio
+    logger.info(f"Starting API server on {args.host}:{args.port} (storage: {args.storage}, layout: {args.layout}, data: {data_dir})")
+    
+    if args.server == 'gunicorn':
+        # Los workers heredan el backend configurado; las escrituras de los backends
+        # de archivos usan bloqueos entre procesos y SQLite usa modo WAL
+        logger.info(f"Using gunicorn with {args.workers} workers x {args.threads} threads")
+        run_gunicorn({
+            'bind': f"{args.host}:{args.port}",
+            'workers': args.workers,
+            'threads': args.threads,
+            'worker_class': 'gthread' if args.threads > 1 else 'sync',
+            'keepalive': args.keepalive,
+            'backlog': args.backlog,
+            'timeout': args.timeout,
+            'loglevel': 'debug' if args.debug else 'info',
+            # Cada worker escribe su cola pendiente antes de terminar
+            'worker_exit': lambda server, worker: api_app.shutdown_ingest(),
+        })
+    else:
+        # SIGTERM termina el intérprete de forma ordenada para que atexit escriba la cola
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        
+        # Ejecutar aplicación Flask
+        app.run(
+            host=args.host,
+            port=args.port,
+            debug=args.debug
+        )
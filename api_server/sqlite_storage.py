@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Módulo de almacenamiento SQLite para el servidor API de Prex Challenge.
+Guarda cada snapshot como una fila indexada por IP, hostname y timestamp.
+"""
+
+import os
+import json
+import sqlite3
+import datetime
+import threading
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+
+from api_server.storage import parse_timestamp, resolve_date
+from api_server.catalog import CATALOG_SCHEMA, select_page, upsert
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ip_address TEXT NOT NULL,
+    hostname TEXT,
+    date TEXT NOT NULL,
+    timestamp REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_ip_date ON snapshots (ip_address, date);
+CREATE INDEX IF NOT EXISTS idx_snapshots_ip_timestamp ON snapshots (ip_address, timestamp);
+CREATE INDEX IF NOT EXISTS idx_snapshots_hostname_timestamp ON snapshots (hostname, timestamp);
+CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp ON snapshots (timestamp);
+"""
+
+
+class SQLiteStorage:
+    """
+    Clase para manejar el almacenamiento y recuperación de información del sistema en SQLite.
+    Ofrece la misma interfaz que JSONStorage (store_data, query_data, list_available_data)
+    y además consultas por rango de tiempo respaldadas por índices.
+    """
+
+    def __init__(self, data_dir: str = "data", db_name: str = "prex.db"):
+        """
+        Inicializa el manejador de almacenamiento.
+
+        Args:
+            data_dir: Directorio donde se crea la base de datos (predeterminado: "data")
+            db_name: Nombre del archivo de base de datos (predeterminado: "prex.db")
+        """
+        self.data_dir = data_dir
+
+        # Crear directorio de datos si no existe
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+        self.db_path = os.path.join(self.data_dir, db_name)
+        # Una conexión por hilo: sqlite3 no permite compartirlas entre hilos
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            created = conn.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'catalog'"
+            ).fetchone()[0] == 0
+            conn.executescript(SCHEMA + CATALOG_SCHEMA)
+        # Bases anteriores al catálogo: se llena con los snapshots existentes
+        if created:
+            self.rebuild_catalog()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Devuelve la conexión del hilo actual, creándola si es necesario."""
+        conn = getattr(self._local, 'conn', None)
+        # Tras un fork (workers de gunicorn) la conexión heredada no puede reutilizarse
+        if conn is not None and getattr(self._local, 'pid', None) != os.getpid():
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def store_batch(self, records: List[Dict[str, Any]], date: Optional[str] = None,
+                    fsync: bool = False) -> Dict[str, Any]:
+        """
+        Almacena varios snapshots en una sola transacción.
+
+        Args:
+            records: Lista de diccionarios con información del sistema
+            date: Fecha YYYY-MM-DD a la que se asignan (predeterminado: hoy)
+            fsync: Si es True, la transacción se confirma con synchronous=FULL
+
+        Returns:
+            Diccionario con estado, ruta de la base de datos y cantidad almacenada
+        """
+        try:
+            date_str = date or datetime.datetime.now().strftime("%Y-%m-%d")
+            rows = []
+            # Registros, bytes y timestamps extremos de cada IP para el catálogo
+            totals: Dict[str, List[Any]] = {}
+            for record in records:
+                timestamp = parse_timestamp(record.get('timestamp'))
+                epoch = timestamp.timestamp() if timestamp else None
+                data = json.dumps(record, separators=(',', ':'))
+                ip_address = record.get('ip_address', 'unknown')
+                rows.append((ip_address, record.get('hostname'), date_str, epoch, data))
+
+                total = totals.setdefault(ip_address, [0, 0, None, None])
+                total[0] += 1
+                total[1] += len(data.encode('utf-8'))
+                if epoch is not None:
+                    total[2] = epoch if total[2] is None else min(total[2], epoch)
+                    total[3] = epoch if total[3] is None else max(total[3], epoch)
+
+            conn = self._connect()
+            if fsync:
+                conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO snapshots (ip_address, hostname, date, timestamp, data) VALUES (?, ?, ?, ?, ?)",
+                        rows
+                    )
+                    for ip_address, (count, size, first, last) in totals.items():
+                        upsert(conn, ip_address, date_str, count, size, first, last)
+            finally:
+                if fsync:
+                    conn.execute("PRAGMA synchronous=NORMAL")
+
+            return {
+                "success": True,
+                "message": f"Stored {len(rows)} records",
+                "file_path": self.db_path,
+                "stored": len(rows)
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error storing data: {str(e)}",
+                "file_path": None,
+                "stored": 0
+            }
+
+    def store_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Almacena información del sistema en la base de datos.
+
+        Args:
+            data: Diccionario que contiene información del sistema
+
+        Returns:
+            Diccionario con estado y ruta del archivo
+        """
+        result = self.store_batch([data])
+        if result['success']:
+            result['message'] = "Data stored successfully"
+        return result
+
+    def _select(self, sql: str, params: List[Any], stream: bool):
+        """
+        Ejecuta una consulta que devuelve la columna `data`.
+
+        Returns:
+            Lista de registros, o un iterador que los lee por bloques si `stream` es True.
+            None si la consulta no devuelve filas.
+        """
+        cursor = self._connect().execute(sql, params)
+        first = cursor.fetchone()
+        if first is None:
+            cursor.close()
+            return None
+        if not stream:
+            return [json.loads(first[0])] + [json.loads(row[0]) for row in cursor.fetchall()]
+        return self._iter_rows(first, cursor)
+
+    @staticmethod
+    def _iter_rows(first, cursor: sqlite3.Cursor, batch_size: int = 256) -> Iterator[Dict[str, Any]]:
+        """Recorre el cursor por bloques para no materializar todo el resultado."""
+        try:
+            yield json.loads(first[0])
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            cursor.close()
+
+    def query_data(self, ip_address: str, date: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
+        """
+        Consulta información del sistema para una dirección IP específica.
+
+        Args:
+            ip_address: Dirección IP a consultar
+            date: Fecha opcional en formato YYYY-MM-DD. Si es None, devuelve datos de hoy.
+            stream: Si es True, "data" es un iterador que lee los registros por bloques
+
+        Returns:
+            Diccionario con estado y datos recuperados
+        """
+        try:
+            date_str, error = resolve_date(date)
+            if error:
+                return {
+                    "success": False,
+                    "message": error,
+                    "data": None
+                }
+
+            data = self._select(
+                "SELECT data FROM snapshots WHERE ip_address = ? AND date = ? ORDER BY id",
+                [ip_address, date_str],
+                stream
+            )
+
+            if data is None:
+                return {
+                    "success": False,
+                    "message": f"No data found for IP {ip_address} on {date_str}",
+                    "data": None
+                }
+
+            return {
+                "success": True,
+                "message": f"Data retrieved for IP {ip_address} on {date_str}",
+                "data": data
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error querying data: {str(e)}",
+                "data": None
+            }
+
+    def query_range(self, ip_address: Optional[str], start: datetime.datetime, end: datetime.datetime,
+                    hostname: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
+        """
+        Consulta los snapshots cuyo timestamp está entre `start` y `end` (inclusive).
+
+        Args:
+            ip_address: Dirección IP a consultar (None para no filtrar por IP)
+            start: Inicio del rango
+            end: Fin del rango
+            hostname: Hostname opcional por el que filtrar
+            stream: Si es True, "data" es un iterador que lee los registros por bloques
+
+        Returns:
+            Diccionario con estado y datos recuperados
+        """
+        try:
+            clauses = ["timestamp BETWEEN ? AND ?"]
+            params: List[Any] = [start.timestamp(), end.timestamp()]
+            if ip_address is not None:
+                clauses.append("ip_address = ?")
+                params.append(ip_address)
+            if hostname is not None:
+                clauses.append("hostname = ?")
+                params.append(hostname)
+
+            data = self._select(
+                f"SELECT data FROM snapshots WHERE {' AND '.join(clauses)} ORDER BY timestamp, id",
+                params,
+                stream
+            )
+
+            target = ip_address if ip_address is not None else hostname
+            if data is None:
+                return {
+                    "success": False,
+                    "message": f"No data found for {target} between {start} and {end}",
+                    "data": None
+                }
+
+            return {
+                "success": True,
+                "message": f"Data retrieved for {target} between {start} and {end}",
+                "data": data
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error querying data: {str(e)}",
+                "data": None
+            }
+
+    def data_version(self, ip_address: str, date_str: str) -> Tuple[int, Optional[int]]:
+        """
+        Devuelve una firma de los datos de una IP y fecha que cambia con cada escritura
+        (cantidad de registros e id del último), también las de otros procesos.
+        """
+        return tuple(self._connect().execute(
+            "SELECT COUNT(*), MAX(id) FROM snapshots WHERE ip_address = ? AND date = ?",
+            [ip_address, date_str]
+        ).fetchone())
+
+    def listing_version(self) -> List[Tuple[int, int]]:
+        """
+        Devuelve una firma del listado de datos: tamaño y mtime de la base y de su WAL,
+        que cambian con cada transacción confirmada.
+        """
+        version = []
+        for path in (self.db_path, self.db_path + '-wal'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            version.append((stat.st_size, stat.st_mtime_ns))
+        return version
+
+    def rebuild_catalog(self) -> int:
+        """
+        Reconstruye el catálogo a partir de la tabla de snapshots.
+
+        Returns:
+            Cantidad de días catalogados
+        """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM catalog")
+            conn.execute(
+                "INSERT INTO catalog (ip_address, date, records, bytes, first_timestamp, last_timestamp) "
+                "SELECT ip_address, date, COUNT(*), SUM(LENGTH(CAST(data AS BLOB))), MIN(timestamp), MAX(timestamp) "
+                "FROM snapshots GROUP BY ip_address, date"
+            )
+            return conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+
+    def delete_day(self, ip_address: str, date_str: str) -> Dict[str, Any]:
+        """
+        Elimina los snapshots de una IP y fecha y su fila del catálogo en una sola transacción.
+
+        Las páginas liberadas quedan en la base para las escrituras siguientes: el
+        archivo no se achica, pero deja de crecer mientras la retención libere espacio.
+
+        Returns:
+            Diccionario con estado y bytes liberados
+        """
+        try:
+            with self._connect() as conn:
+                freed = conn.execute(
+                    "SELECT COALESCE(SUM(LENGTH(CAST(data AS BLOB))), 0) FROM snapshots WHERE ip_address = ? AND date = ?",
+                    [ip_address, date_str]
+                ).fetchone()[0]
+                deleted = conn.execute(
+                    "DELETE FROM snapshots WHERE ip_address = ? AND date = ?", [ip_address, date_str]
+                ).rowcount
+                conn.execute("DELETE FROM catalog WHERE ip_address = ? AND date = ?", [ip_address, date_str])
+
+            return {
+                "success": True,
+                "message": f"Deleted {deleted} records for IP {ip_address} on {date_str}",
+                "bytes": freed
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error deleting data: {str(e)}",
+                "bytes": 0
+            }
+
+    def list_available_data(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                            ip_address: Optional[str] = None, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lista las combinaciones de IP y fecha con datos almacenados a partir del
+        catálogo, ordenadas por fecha e IP.
+
+        Args:
+            limit: Entradas por página (None: todas)
+            cursor: Valor de "next_cursor" de la página anterior
+            ip_address: Solo los días de esta IP
+            start_date, end_date: Solo las fechas del rango (YYYY-MM-DD, inclusive)
+
+        Returns:
+            Diccionario con estado, lista de datos disponibles y cursor de la página
+            siguiente (None si no hay más)
+        """
+        try:
+            rows, next_cursor = select_page(self._connect(), limit=limit, cursor=cursor, ip_address=ip_address,
+                                            start_date=start_date, end_date=end_date)
+
+            filename = os.path.basename(self.db_path)
+            available_data = [
+                {"ip_address": ip, "date": date_str, "filename": filename, "records": count, "bytes": size,
+                 "first_timestamp": first, "last_timestamp": last}
+                for ip, date_str, count, size, first, last, _ in rows
+            ]
+
+            return {
+                "success": True,
+                "message": f"Found {len(available_data)} data files",
+                "available_data": available_data,
+                "next_cursor": next_cursor
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error listing data: {str(e)}",
+                "available_data": [],
+                "next_cursor": None
+            }
@@ -5,29 +5,136 @@ Maneja el almacenamiento y recuperación de información del sistema en archivos
 """
 
 import os
+import re
+import glob
 import json
 import datetime
-from typing import Dict, List, Any, Optional
+import threading
+from typing import Dict, List, Any, Optional, Iterator, Tuple
+
+from api_server.locking import KeyedLocks, key_lock
+from api_server.catalog import Catalog, CatalogRow
+from api_server.record_index import (
+    IndexEntry, parse_timestamp, record_timestamp, read_covered, write_index, append_index,
+    load_array_index, load_lines_index, read_record, in_range
+)
+from api_server.compaction import (
+    COMPACTED_SUFFIX, DEFAULT_BLOCK_SIZE, DEFAULT_COMPRESS_LEVEL, write_compacted, temp_path,
+    load_compacted_index, iter_compacted, open_data, remove_sidecars
+)
+
+
+# Tamaño máximo de un segmento JSON Lines antes de rotar al siguiente (64 MB)
+DEFAULT_SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+# Nombre de segmento: IP_YYYY-MM-DD.NNNN.jsonl
+SEGMENT_PATTERN = re.compile(r'^(?P<ip>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.(?P<index>\d{4})\.jsonl$')
+
+# Nombre de archivo heredado: IP_YYYY-MM-DD.json
+LEGACY_PATTERN = re.compile(r'^(?P<ip>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.json$')
+
+# Nombre de archivo compactado: IP_YYYY-MM-DD.jsonl.gz
+COMPACTED_PATTERN = re.compile(r'^(?P<ip>.+)_(?P<date>\d{4}-\d{2}-\d{2})\.jsonl\.gz$')
+
+# Marcador de una compactación cuyo archivo compactado ya está completo
+COMPACTING_SUFFIX = '.compacting'
+
+# Distribuciones del directorio de datos: todos los archivos en data/ o uno por día en data/YYYY/MM/DD/
+LAYOUTS = ('flat', 'daily')
+
+# Subdirectorios de la distribución diaria, relativos al directorio de datos
+SHARD_GLOB = os.path.join('[0-9][0-9][0-9][0-9]', '[0-9][0-9]', '[0-9][0-9]')
+
+
+def resolve_date(date: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Valida una fecha YYYY-MM-DD o devuelve la fecha de hoy si es None.
+    
+    Args:
+        date: Fecha opcional en formato YYYY-MM-DD
+    
+    Returns:
+        Tupla (fecha, mensaje de error); uno de los dos es None
+    """
+    if date is None:
+        return datetime.datetime.now().strftime("%Y-%m-%d"), None
+    try:
+        datetime.datetime.strptime(date, "%Y-%m-%d")
+        return date, None
+    except ValueError:
+        return None, f"Invalid date format: {date}. Use YYYY-MM-DD."
+
+
+def fsync_dir(path: str) -> None:
+    """Fuerza a disco las entradas de un directorio (por ejemplo, tras un rename)."""
+    try:
+        fd = os.open(path or '.', os.O_RDONLY)
+    except OSError:
+        # Algunas plataformas (Windows) no permiten abrir directorios
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def date_span(start: datetime.datetime, end: datetime.datetime) -> List[str]:
+    """
+    Devuelve las fechas YYYY-MM-DD de los archivos que pueden contener registros del rango.
+    
+    Los archivos se nombran por la fecha de recepción, que puede ser posterior al
+    timestamp del registro (por ejemplo, un snapshot tomado antes de medianoche y
+    recibido después), por lo que se incluye también el día siguiente al final del rango.
+    """
+    dates = []
+    day = start.date()
+    last = end.date() + datetime.timedelta(days=1)
+    while day <= last:
+        dates.append(day.strftime("%Y-%m-%d"))
+        day += datetime.timedelta(days=1)
+    return dates
 
 
 class JSONStorage:
     """
     Clase para manejar el almacenamiento y recuperación de información del sistema en archivos JSON.
     Los archivos se nombran basándose en la dirección IP y la fecha: IP_YYYY-MM-DD.json
+    
+    Con la distribución "daily" los archivos de cada fecha se guardan en
+    data/YYYY/MM/DD/ en lugar de directamente en data/, de modo que ningún directorio
+    acumula los archivos de todos los días. Los días cerrados pueden compactarse en
+    IP_YYYY-MM-DD.jsonl.gz (ver compact_day) y se siguen leyendo de forma transparente.
     """
     
-    def __init__(self, data_dir: str = "data"):
+    # Nombres de archivo de datos que reconoce el backend (ver _stored_days)
+    FILE_PATTERNS = (LEGACY_PATTERN, COMPACTED_PATTERN)
+    
+    def __init__(self, data_dir: str = "data", layout: str = "flat"):
         """
         Inicializa el manejador de almacenamiento.
         
         Args:
             data_dir: Directorio para almacenar los archivos JSON (predeterminado: "data")
+            layout: Distribución de los archivos nuevos: "flat" (data/) o "daily" (data/YYYY/MM/DD/)
+        
+        Raises:
+            ValueError: Si la distribución no existe
         """
+        if layout not in LAYOUTS:
+            raise ValueError(f"Invalid layout: {layout}. Use one of: {', '.join(LAYOUTS)}")
         self.data_dir = data_dir
+        self.layout = layout
+        # Bloqueos por IP y fecha: escrituras de IPs distintas nunca compiten
+        self._locks = KeyedLocks()
         
         # Crear directorio de datos si no existe
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
+        
+        # Catálogo de IPs y días para /list; si no existía, se llena con los datos actuales
+        self.catalog = Catalog(self.data_dir)
+        if self.catalog.created:
+            self.rebuild_catalog()
     
     def store_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -46,13 +153,78 @@ class JSONStorage:
             # Obtener fecha actual para el nombre del archivo
             date_str = datetime.datetime.now().strftime("%Y-%m-%d")
             
-            # Create filename
-            filename = f"{ip_address}_{date_str}.json"
-            file_path = os.path.join(self.data_dir, filename)
+            file_path = self._append_group(ip_address, date_str, [data])
+            
+            return {
+                "success": True,
+                "message": "Data stored successfully",
+                "file_path": file_path
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error storing data: {str(e)}",
+                "file_path": None
+            }
+    
+    def store_batch(self, records: List[Dict[str, Any]], date: Optional[str] = None,
+                    fsync: bool = False) -> Dict[str, Any]:
+        """
+        Almacena varios snapshots con una sola escritura por IP.
+        
+        Args:
+            records: Lista de diccionarios con información del sistema
+            date: Fecha YYYY-MM-DD a la que se asignan (predeterminado: hoy)
+            fsync: Si es True, fuerza los datos a disco antes de devolver
+        
+        Returns:
+            Diccionario con estado, ruta del último archivo escrito y cantidad almacenada
+        """
+        try:
+            date_str = date or datetime.datetime.now().strftime("%Y-%m-%d")
+            
+            # Agrupar por IP: cada grupo se escribe bajo un único bloqueo
+            groups: Dict[str, List[Dict[str, Any]]] = {}
+            for record in records:
+                groups.setdefault(record.get('ip_address', 'unknown'), []).append(record)
+            
+            file_path = None
+            for ip_address, group in groups.items():
+                file_path = self._append_group(ip_address, date_str, group, fsync=fsync)
+            
+            return {
+                "success": True,
+                "message": f"Stored {len(records)} records",
+                "file_path": file_path,
+                "stored": len(records)
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error storing data: {str(e)}",
+                "file_path": None,
+                "stored": 0
+            }
+    
+    def _append_group(self, ip_address: str, date_str: str, records: List[Dict[str, Any]],
+                      fsync: bool = False) -> str:
+        """
+        Añade registros de una misma IP y fecha a su archivo y devuelve la ruta.
+        
+        La lectura y reescritura se hacen bajo bloqueo para que otro proceso
+        (por ejemplo, otro worker) no pierda registros ni trunque el archivo.
+        """
+        with self._lock(ip_address, date_str):
+            directory = self._ensure_day_dir(ip_address, date_str)
+            file_path = os.path.join(directory, f"{ip_address}_{date_str}.json")
             
             # Verificar si el archivo existe y cargar datos existentes
             existing_data = []
+            previous_size = 0
             if os.path.exists(file_path):
+                previous_size = os.path.getsize(file_path)
                 with open(file_path, 'r') as f:
                     existing_data = json.load(f)
                     
@@ -61,67 +233,480 @@ class JSONStorage:
                         existing_data = [existing_data]
             
             # Añadir nuevos datos a los datos existentes
-            existing_data.append(data)
+            existing_data.extend(records)
             
-            # Escribir datos en el archivo
-            with open(file_path, 'w') as f:
-                json.dump(existing_data, f, indent=2)
+            # Escribir datos en el archivo junto con su índice lateral
+            self._write_records(file_path, existing_data, fsync=fsync)
+            self.catalog.add(ip_address, date_str, records, os.path.getsize(file_path) - previous_size)
+        return file_path
+    
+    def _lock(self, ip_address: str, date_str: str):
+        """Devuelve el bloqueo (entre hilos y entre procesos) de los archivos de una IP y fecha."""
+        return key_lock(self._locks, self.data_dir, f"{ip_address}_{date_str}")
+    
+    def _date_dirs(self, date_str: str) -> List[str]:
+        """Directorios en los que pueden estar los archivos de una fecha, primero el de la distribución configurada."""
+        shard = os.path.join(self.data_dir, *date_str.split('-'))
+        return [shard, self.data_dir] if self.layout == 'daily' else [self.data_dir, shard]
+    
+    def _day_filenames(self, ip_address: str, date_str: str) -> List[str]:
+        """Nombres de los archivos cuya existencia indica dónde están los datos de una IP y fecha."""
+        return [f"{ip_address}_{date_str}.json", f"{ip_address}_{date_str}{COMPACTED_SUFFIX}"]
+    
+    def day_dir(self, ip_address: str, date_str: str) -> str:
+        """
+        Devuelve el directorio de los archivos de una IP y fecha.
+        
+        Los archivos de un día quedan siempre juntos: si ya existen se usa su directorio,
+        aunque se hayan escrito con la otra distribución (por ejemplo, antes de cambiarla);
+        si el día es nuevo, el de la distribución configurada.
+        """
+        dirs = self._date_dirs(date_str)
+        for directory in dirs:
+            for filename in self._day_filenames(ip_address, date_str):
+                if os.path.exists(os.path.join(directory, filename)):
+                    return directory
+        return dirs[0]
+    
+    def _ensure_day_dir(self, ip_address: str, date_str: str) -> str:
+        """Devuelve el directorio de una IP y fecha, creándolo si es necesario (llamar con el bloqueo tomado)."""
+        directory = self.day_dir(ip_address, date_str)
+        if directory != self.data_dir:
+            os.makedirs(directory, exist_ok=True)
+        return directory
+    
+    def data_directories(self) -> List[str]:
+        """Devuelve el directorio de datos y los subdirectorios YYYY/MM/DD existentes."""
+        return [self.data_dir] + sorted(glob.glob(os.path.join(glob.escape(self.data_dir), SHARD_GLOB)))
+    
+    def _write_records(self, file_path: str, records: List[Dict[str, Any]], fsync: bool = False) -> None:
+        """
+        Escribe la lista de registros con el mismo formato que json.dump(indent=2) y
+        guarda en el índice lateral la posición y el timestamp de cada registro.
+        
+        El contenido se escribe en un archivo temporal que luego reemplaza al original
+        con un rename atómico: los lectores ven el archivo anterior o el nuevo, nunca
+        uno truncado o a medio escribir. Con `fsync` el contenido y el rename se
+        fuerzan a disco antes de devolver.
+        """
+        entries: List[IndexEntry] = []
+        temp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                if not records:
+                    f.write(b'[]')
+                else:
+                    f.write(b'[\n')
+                    offset = 2
+                    for i, record in enumerate(records):
+                        if i:
+                            f.write(b',\n')
+                            offset += 2
+                        chunk = json.dumps(record, indent=2).replace('\n', '\n  ').encode('utf-8')
+                        f.write(b'  ' + chunk)
+                        entries.append((record_timestamp(record), offset + 2, len(chunk)))
+                        offset += len(chunk) + 2
+                    f.write(b'\n]')
+                size = f.tell()
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temp_path, file_path)
+            if fsync:
+                fsync_dir(os.path.dirname(file_path))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        write_index(file_path, entries, size)
+    
+    def _data_files(self, ip_address: str, date_str: str) -> List[Tuple[str, str]]:
+        """
+        Devuelve los archivos de datos de una IP y fecha, en el orden en que se
+        escribieron, junto con su formato ("gzip", "array" o "lines").
+        """
+        return self._files_in(self.day_dir(ip_address, date_str), ip_address, date_str)
+    
+    def _files_in(self, directory: str, ip_address: str, date_str: str) -> List[Tuple[str, str]]:
+        """Archivos de datos de una IP y fecha dentro de un directorio: el compactado y luego el JSON."""
+        files = []
+        compacted = os.path.join(directory, f"{ip_address}_{date_str}{COMPACTED_SUFFIX}")
+        if os.path.exists(compacted):
+            files.append((compacted, "gzip"))
+        file_path = os.path.join(directory, f"{ip_address}_{date_str}.json")
+        if os.path.exists(file_path):
+            files.append((file_path, "array"))
+        return files
+    
+    def has_data(self, ip_address: str, date_str: str) -> bool:
+        """Indica si existen archivos de datos para una IP y fecha."""
+        return bool(self._data_files(ip_address, date_str))
+    
+    def data_version(self, ip_address: str, date_str: str) -> List[Tuple[str, int, int]]:
+        """
+        Devuelve una firma de los datos de una IP y fecha que cambia con cada escritura
+        (tamaño y mtime de cada archivo), también las de otros procesos.
+        """
+        version = []
+        for path, _ in self._data_files(ip_address, date_str):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            version.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+        return version
+    
+    def listing_version(self) -> List[Tuple[int, int]]:
+        """Devuelve una firma del listado de datos, que cambia con cada escritura del catálogo."""
+        return self.catalog.version()
+    
+    def _stored_days(self) -> List[Tuple[str, str]]:
+        """IPs y fechas con archivos de datos, según los nombres de los directorios de datos."""
+        days = set()
+        for directory in self.data_directories():
+            for filename in os.listdir(directory):
+                for pattern in self.FILE_PATTERNS:
+                    match = pattern.match(filename)
+                    if match:
+                        days.add((match.group('ip'), match.group('date')))
+                        break
+        return sorted(days)
+    
+    def _catalog_row(self, ip_address: str, date_str: str) -> Optional[CatalogRow]:
+        """Calcula a partir de los archivos (y sus índices laterales) la fila del catálogo de un día."""
+        records = size = segments = 0
+        first = last = None
+        for path, kind in self._data_files(ip_address, date_str):
+            entries = self._file_entries(path, kind)
+            size += os.path.getsize(path)
+            segments += kind == "lines"
+            records += len(entries)
+            for timestamp, _, _, _ in entries:
+                if timestamp != timestamp:
+                    continue
+                first = timestamp if first is None else min(first, timestamp)
+                last = timestamp if last is None else max(last, timestamp)
+        if not records and not size:
+            return None
+        return (ip_address, date_str, records, size, first, last, segments)
+    
+    def refresh_catalog(self, ip_address: str, date_str: str) -> None:
+        """
+        Recalcula la fila del catálogo de un día tras modificar sus archivos fuera de
+        store_* (migración, retención); el día no debe estar recibiendo escrituras.
+        """
+        row = self._catalog_row(ip_address, date_str)
+        if row is None:
+            self.catalog.remove(ip_address, date_str)
+        else:
+            self.catalog.set(row)
+    
+    def rebuild_catalog(self) -> int:
+        """
+        Reconstruye el catálogo recorriendo el directorio de datos.
+        
+        Returns:
+            Cantidad de días catalogados
+        """
+        rows = (self._catalog_row(ip_address, date_str) for ip_address, date_str in self._stored_days())
+        return self.catalog.replace_all(row for row in rows if row is not None)
+    
+    def delete_day(self, ip_address: str, date_str: str) -> Dict[str, Any]:
+        """
+        Elimina los archivos de una IP y fecha, sus índices laterales y su fila del catálogo.
+        
+        Returns:
+            Diccionario con estado y bytes liberados
+        """
+        try:
+            freed = 0
+            with self._lock(ip_address, date_str):
+                files = self._data_files(ip_address, date_str)
+                for path, _ in files:
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+                    remove_sidecars(path)
+                self.catalog.remove(ip_address, date_str)
+            if files:
+                self._prune_dirs(os.path.dirname(files[0][0]))
             
             return {
                 "success": True,
-                "message": "Data stored successfully",
-                "file_path": file_path
+                "message": f"Deleted {len(files)} files for IP {ip_address} on {date_str}",
+                "bytes": freed
             }
             
         except Exception as e:
             return {
                 "success": False,
-                "message": f"Error storing data: {str(e)}",
-                "file_path": None
+                "message": f"Error deleting data: {str(e)}",
+                "bytes": 0
+            }
+    
+    def _prune_dirs(self, directory: str) -> None:
+        """Elimina el subdirectorio YYYY/MM/DD de una fecha y sus padres si quedaron vacíos."""
+        root = os.path.abspath(self.data_dir)
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                # No está vacío (u otro proceso escribió en él): se conserva
+                break
+            directory = os.path.dirname(directory)
+    
+    def compact_day(self, ip_address: str, date_str: str, block_size: int = DEFAULT_BLOCK_SIZE,
+                    level: int = DEFAULT_COMPRESS_LEVEL) -> Dict[str, Any]:
+        """
+        Reescribe los archivos de un día cerrado en un único IP_YYYY-MM-DD.jsonl.gz
+        con índice por bloques (ver compaction.py), que las consultas leen de forma
+        transparente. Si después llegan escrituras para el mismo día, se guardan en
+        archivos nuevos junto al compactado y se incorporan en la siguiente compactación.
+        
+        Es segura ante interrupciones, como la migración: antes de reemplazar nada se
+        guarda un marcador `<archivo>.compacting` con los archivos de origen, y la
+        siguiente llamada completa los reemplazos pendientes en lugar de volver a
+        leer los orígenes junto con el compactado (lo que duplicaría sus registros).
+        
+        Args:
+            ip_address: Dirección IP
+            date_str: Fecha en formato YYYY-MM-DD (no debería ser la de hoy)
+            block_size: Bytes sin comprimir por bloque
+            level: Nivel de compresión gzip (1-9)
+        
+        Returns:
+            Diccionario con estado, registros compactados y tamaño antes y después
+        """
+        try:
+            directory = self.day_dir(ip_address, date_str)
+            path = os.path.join(directory, f"{ip_address}_{date_str}{COMPACTED_SUFFIX}")
+            marker = path + COMPACTING_SUFFIX
+            nothing = {
+                "success": True,
+                "message": f"Nothing to compact for IP {ip_address} on {date_str}",
+                "records": 0,
+                "bytes_before": 0,
+                "bytes_after": 0
+            }
+            
+            # Días ya compactados (el caso habitual): sin bloqueo ni escrituras
+            if not os.path.exists(marker) and self._data_files(ip_address, date_str) in ([], [(path, "gzip")]):
+                return nothing
+            
+            with self._lock(ip_address, date_str):
+                recovered = os.path.exists(marker)
+                if recovered:
+                    self._complete_compaction(path, marker)
+                
+                files = self._data_files(ip_address, date_str)
+                if not files or files == [(path, "gzip")]:
+                    if recovered:
+                        self.refresh_catalog(ip_address, date_str)
+                    return nothing
+                
+                before = sum(os.path.getsize(file_path) for file_path, _ in files)
+                records = write_compacted(path, self.iter_records(ip_address, date_str), block_size, level)
+                
+                # A partir del marcador, el temporal es la versión completa de los datos
+                sources = [os.path.basename(file_path) for file_path, _ in files if file_path != path]
+                temp_marker = marker + '.tmp'
+                with open(temp_marker, 'w') as f:
+                    json.dump({"sources": sources, "records": records}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_marker, marker)
+                self._complete_compaction(path, marker)
+                
+                # Solo queda el archivo compactado, cuyo índice se lee sin bloqueo
+                self.refresh_catalog(ip_address, date_str)
+                after = os.path.getsize(path)
+            
+            return {
+                "success": True,
+                "message": f"Compacted {records} records for IP {ip_address} on {date_str}",
+                "records": records,
+                "bytes_before": before,
+                "bytes_after": after
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error compacting data: {str(e)}",
+                "records": 0,
+                "bytes_before": 0,
+                "bytes_after": 0
+            }
+    
+    def _complete_compaction(self, path: str, marker: str) -> None:
+        """
+        Pone en su lugar un archivo compactado y elimina sus archivos de origen.
+        
+        Cada paso puede repetirse sin efectos adicionales, de modo que una compactación
+        interrumpida se completa volviendo a llamar a esta función.
+        """
+        with open(marker) as f:
+            sources = json.load(f)['sources']
+        
+        if os.path.exists(temp_path(path)):
+            os.replace(temp_path(path), path)
+            # El rename debe llegar a disco antes de eliminar los orígenes
+            fsync_dir(os.path.dirname(path))
+        
+        for filename in sources:
+            source = os.path.join(os.path.dirname(path), filename)
+            if os.path.exists(source):
+                os.remove(source)
+            remove_sidecars(source)
+        os.remove(marker)
+    
+    def _file_entries(self, path: str, kind: str) -> List[Tuple[float, str, int, int]]:
+        """Devuelve las entradas del índice lateral de un archivo junto con su ruta."""
+        if kind == "array":
+            entries = load_array_index(path)
+        elif kind == "gzip":
+            # Los archivos compactados no se modifican: su índice no necesita bloqueo
+            entries = load_compacted_index(path)
+        else:
+            # Completar el índice de un segmento modifica el .idx: se hace bajo el mismo
+            # bloqueo que las escrituras del segmento
+            match = SEGMENT_PATTERN.match(os.path.basename(path))
+            with self._lock(match.group('ip'), match.group('date')):
+                entries = load_lines_index(path)
+        return [(timestamp, path, offset, length) for timestamp, offset, length in entries]
+    
+    def _range_entries(self, ip_address: str, start: datetime.datetime,
+                       end: datetime.datetime) -> List[Tuple[float, str, int, int]]:
+        """Selecciona, usando los índices laterales, los registros cuyo timestamp está en el rango."""
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        selected = []
+        for date_str in date_span(start, end):
+            for path, kind in self._data_files(ip_address, date_str):
+                selected.extend(
+                    entry for entry in self._file_entries(path, kind)
+                    if in_range(entry[0], start_ts, end_ts)
+                )
+        # Orden estable: los registros con el mismo timestamp conservan el orden de los archivos
+        selected.sort(key=lambda entry: entry[0])
+        return selected
+    
+    def iter_records(self, ip_address: str, date_str: str) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre los registros de una IP y fecha sin cargar los archivos completos.
+        
+        Devuelve los registros de cada archivo del día en el orden en que se
+        escribieron: el compactado, el JSON (o heredado) y luego cada segmento.
+        """
+        for path, kind in self._data_files(ip_address, date_str):
+            if kind == "gzip":
+                yield from iter_compacted(path)
+            elif kind == "array":
+                yield from self._read_entries(self._file_entries(path, "array"))
+            else:
+                with open(path, 'r') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            # Línea incompleta (por ejemplo, escritura interrumpida): se omite
+                            continue
+    
+    def _read_entries(self, selected: List[Tuple[float, str, int, int]]) -> Iterator[Dict[str, Any]]:
+        """Lee solo los registros seleccionados, sin deserializar el resto del archivo."""
+        handles = {}
+        try:
+            for _, path, offset, length in selected:
+                f = handles.get(path)
+                if f is None:
+                    f = handles[path] = open_data(path)
+                yield read_record(f, offset, length)
+        finally:
+            for f in handles.values():
+                f.close()
+    
+    def query_range(self, ip_address: str, start: datetime.datetime, end: datetime.datetime,
+                    stream: bool = False) -> Dict[str, Any]:
+        """
+        Consulta los snapshots de una IP cuyo timestamp está entre `start` y `end` (inclusive).
+        
+        El rango puede abarcar varios días. Solo se leen del disco los registros
+        seleccionados a partir de los índices laterales de cada archivo.
+        
+        Args:
+            ip_address: Dirección IP a consultar
+            start: Inicio del rango
+            end: Fin del rango
+            stream: Si es True, "data" es un iterador que lee los registros de a uno
+        
+        Returns:
+            Diccionario con estado y datos recuperados
+        """
+        try:
+            selected = self._range_entries(ip_address, start, end)
+            
+            if not selected:
+                return {
+                    "success": False,
+                    "message": f"No data found for IP {ip_address} between {start} and {end}",
+                    "data": None
+                }
+            
+            records = self._read_entries(selected)
+            return {
+                "success": True,
+                "message": f"Data retrieved for IP {ip_address} between {start} and {end}",
+                "data": records if stream else list(records)
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Error querying data: {str(e)}",
+                "data": None
             }
     
-    def query_data(self, ip_address: str, date: Optional[str] = None) -> Dict[str, Any]:
+    def query_data(self, ip_address: str, date: Optional[str] = None, stream: bool = False) -> Dict[str, Any]:
         """
         Consulta información del sistema para una dirección IP específica.
         
         Args:
             ip_address: Dirección IP a consultar
             date: Fecha opcional en formato YYYY-MM-DD. Si es None, devuelve datos de hoy.
+            stream: Si es True, "data" es un iterador que lee los registros de a uno
         
         Returns:
             Diccionario con estado y datos recuperados
         """
         try:
             # Obtener fecha del parámetro o usar la fecha de hoy
-            if date is None:
-                date_str = datetime.datetime.now().strftime("%Y-%m-%d")
-            else:
-                # Validar formato de fecha
-                try:
-                    datetime.datetime.strptime(date, "%Y-%m-%d")
-                    date_str = date
-                except ValueError:
-                    return {
-                        "success": False,
-                        "message": f"Invalid date format: {date}. Use YYYY-MM-DD.",
-                        "data": None
-                    }
-            
-            # Create filename
-            filename = f"{ip_address}_{date_str}.json"
-            file_path = os.path.join(self.data_dir, filename)
-            
-            # Check if file exists
-            if not os.path.exists(file_path):
+            date_str, error = resolve_date(date)
+            if error:
+                return {
+                    "success": False,
+                    "message": error,
+                    "data": None
+                }
+            
+            # Check if the day has data files
+            files = self._data_files(ip_address, date_str)
+            if not files:
                 return {
                     "success": False,
                     "message": f"No data found for IP {ip_address} on {date_str}",
                     "data": None
                 }
             
-            # Leer datos del archivo
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+            # Leer datos de los archivos (registro a registro si se pide streaming)
+            if stream:
+                data = self.iter_records(ip_address, date_str)
+            elif len(files) == 1 and files[0][1] == "array":
+                with open(files[0][0], 'r') as f:
+                    data = json.load(f)
+            else:
+                data = list(self.iter_records(ip_address, date_str))
             
             return {
                 "success": True,
@@ -136,42 +721,233 @@ class JSONStorage:
                 "data": None
             }
     
-    def list_available_data(self) -> Dict[str, Any]:
+    def _entry_filename(self, row: CatalogRow) -> str:
+        """Nombre del primer archivo de un día del catálogo (el JSON o, si se compactó, el .jsonl.gz)."""
+        files = self._data_files(row[0], row[1])
+        return os.path.basename(files[0][0]) if files else f"{row[0]}_{row[1]}.json"
+    
+    def _catalog_entry(self, row: CatalogRow) -> Dict[str, Any]:
+        """Convierte una fila del catálogo en una entrada de list_available_data."""
+        ip_address, date_str, records, size, first, last, _ = row
+        return {
+            "ip_address": ip_address,
+            "date": date_str,
+            "filename": self._entry_filename(row),
+            "records": records,
+            "bytes": size,
+            "first_timestamp": first,
+            "last_timestamp": last
+        }
+    
+    def list_available_data(self, limit: Optional[int] = None, cursor: Optional[str] = None,
+                            ip_address: Optional[str] = None, start_date: Optional[str] = None,
+                            end_date: Optional[str] = None) -> Dict[str, Any]:
         """
-        Lista todos los archivos de datos disponibles.
+        Lista los días con datos disponibles a partir del catálogo, ordenados por fecha e IP.
+        
+        Args:
+            limit: Entradas por página (None: todas)
+            cursor: Valor de "next_cursor" de la página anterior
+            ip_address: Solo los días de esta IP
+            start_date, end_date: Solo las fechas del rango (YYYY-MM-DD, inclusive)
         
         Returns:
-            Diccionario con estado y lista de archivos de datos disponibles
+            Diccionario con estado, lista de datos disponibles y cursor de la página
+            siguiente (None si no hay más)
         """
         try:
-            available_data = []
-            
-            for filename in os.listdir(self.data_dir):
-                if filename.endswith('.json'):
-                    # Extraer IP y fecha del nombre del archivo
-                    parts = filename.replace('.json', '').split('_')
-                    if len(parts) == 2:
-                        ip_address, date_str = parts
-                        available_data.append({
-                            "ip_address": ip_address,
-                            "date": date_str,
-                            "filename": filename
-                        })
+            rows, next_cursor = self.catalog.page(limit=limit, cursor=cursor, ip_address=ip_address,
+                                                  start_date=start_date, end_date=end_date)
+            available_data = [self._catalog_entry(row) for row in rows]
             
             return {
                 "success": True,
                 "message": f"Found {len(available_data)} data files",
-                "available_data": available_data
+                "available_data": available_data,
+                "next_cursor": next_cursor
             }
             
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Error listing data: {str(e)}",
-                "available_data": []
+                "available_data": [],
+                "next_cursor": None
             }
 
 
+
+class JSONLinesStorage(JSONStorage):
+    """
+    Almacenamiento append-only en formato JSON Lines (un registro por línea).
+    Los registros de cada IP y día se escriben en segmentos rotativos
+    IP_YYYY-MM-DD.NNNN.jsonl, de modo que cada escritura cuesta O(1) en lugar de
+    reescribir el archivo completo. Los archivos heredados IP_YYYY-MM-DD.json se
+    siguen leyendo de forma transparente hasta que se migren.
+    """
+    
+    FILE_PATTERNS = (SEGMENT_PATTERN, LEGACY_PATTERN, COMPACTED_PATTERN)
+    
+    def __init__(self, data_dir: str = "data", max_segment_bytes: int = DEFAULT_SEGMENT_MAX_BYTES,
+                 layout: str = "flat"):
+        """
+        Inicializa el manejador de almacenamiento JSON Lines.
+        
+        Args:
+            data_dir: Directorio para almacenar los segmentos (predeterminado: "data")
+            max_segment_bytes: Tamaño a partir del cual se rota a un nuevo segmento
+            layout: Distribución de los archivos nuevos: "flat" (data/) o "daily" (data/YYYY/MM/DD/)
+        """
+        super().__init__(data_dir, layout=layout)
+        self.max_segment_bytes = max_segment_bytes
+    
+    @staticmethod
+    def _segment_name(ip_address: str, date_str: str, index: int) -> str:
+        """Nombre del segmento número `index` para una IP y fecha."""
+        return f"{ip_address}_{date_str}.{index:04d}.jsonl"
+    
+    def _day_filenames(self, ip_address: str, date_str: str) -> List[str]:
+        """El primer segmento indica el directorio del día antes que el archivo heredado y el compactado."""
+        return [self._segment_name(ip_address, date_str, 0)] + super()._day_filenames(ip_address, date_str)
+    
+    def segment_path(self, ip_address: str, date_str: str, index: int) -> str:
+        """Devuelve la ruta del segmento número `index` para una IP y fecha."""
+        return os.path.join(self.day_dir(ip_address, date_str), self._segment_name(ip_address, date_str, index))
+    
+    def legacy_path(self, ip_address: str, date_str: str) -> str:
+        """Devuelve la ruta del archivo JSON heredado para una IP y fecha."""
+        return os.path.join(self.day_dir(ip_address, date_str), f"{ip_address}_{date_str}.json")
+    
+    def segment_paths(self, ip_address: str, date_str: str) -> List[str]:
+        """Devuelve las rutas de los segmentos existentes para una IP y fecha, en orden."""
+        return self._segments_in(self.day_dir(ip_address, date_str), ip_address, date_str)
+    
+    @staticmethod
+    def _segments_in(directory: str, ip_address: str, date_str: str) -> List[str]:
+        """Rutas de los segmentos de una IP y fecha dentro de un directorio, en orden."""
+        prefix = glob.escape(os.path.join(directory, f"{ip_address}_{date_str}."))
+        return sorted(glob.glob(prefix + '[0-9][0-9][0-9][0-9].jsonl'))
+    
+    def _current_segment(self, directory: str, ip_address: str, date_str: str) -> int:
+        """
+        Obtiene el índice del segmento activo, rotando si superó el tamaño máximo.
+        
+        Debe llamarse con el bloqueo de la IP y fecha tomado. No se guarda en caché:
+        otro worker puede haber rotado el segmento desde la última escritura de este
+        proceso, así que se busca siempre el último segmento existente. Los segmentos
+        se crean en orden, por lo que basta con probar índices consecutivos.
+        """
+        index = 0
+        while os.path.exists(os.path.join(directory, self._segment_name(ip_address, date_str, index + 1))):
+            index += 1
+        
+        path = os.path.join(directory, self._segment_name(ip_address, date_str, index))
+        if os.path.exists(path) and os.path.getsize(path) >= self.max_segment_bytes:
+            index += 1
+        return index
+    
+    def append_records(self, ip_address: str, date_str: str, records: List[Dict[str, Any]],
+                       fsync: bool = False) -> str:
+        """
+        Añade registros al segmento activo de una IP y fecha.
+        
+        Args:
+            ip_address: Dirección IP de los registros
+            date_str: Fecha en formato YYYY-MM-DD
+            records: Lista de registros a añadir
+            fsync: Si es True, fuerza el segmento a disco antes de devolver
+        
+        Returns:
+            Ruta del segmento en el que se escribió el último registro
+        """
+        lines = [(json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8') for record in records]
+        
+        # Bloqueo entre procesos: la rotación del segmento y el índice lateral
+        # deben actualizarse de forma consistente con el contenido
+        with self._lock(ip_address, date_str):
+            directory = self._ensure_day_dir(ip_address, date_str)
+            index = self._current_segment(directory, ip_address, date_str)
+            path = os.path.join(directory, self._segment_name(ip_address, date_str, index))
+            
+            entries: List[IndexEntry] = []
+            with open(path, 'ab') as f:
+                start = offset = f.tell()
+                for record, line in zip(records, lines):
+                    entries.append((record_timestamp(record), offset, len(line)))
+                    offset += len(line)
+                f.write(b''.join(lines))
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            
+            # Mantener el índice lateral al día solo si ya cubría todo el segmento;
+            # si no, se completa la próxima vez que se consulte el rango
+            if read_covered(path) == start:
+                append_index(path, entries, offset)
+            self.catalog.add(ip_address, date_str, records, offset - start, segments=index + 1)
+        return path
+    
+    def _files_in(self, directory: str, ip_address: str, date_str: str) -> List[Tuple[str, str]]:
+        """Archivos de una IP y fecha dentro de un directorio: compactado, heredado y segmentos."""
+        files = super()._files_in(directory, ip_address, date_str)
+        files.extend((path, "lines") for path in self._segments_in(directory, ip_address, date_str))
+        return files
+    
+    def _append_group(self, ip_address: str, date_str: str, records: List[Dict[str, Any]],
+                      fsync: bool = False) -> str:
+        """Añade registros de una misma IP y fecha al segmento activo del día."""
+        return self.append_records(ip_address, date_str, records, fsync=fsync)
+    
+    def _entry_filename(self, row: CatalogRow) -> str:
+        """Los días con segmentos se nombran por el primero, sin consultar el disco."""
+        if row[6]:
+            return self._segment_name(row[0], row[1], 0)
+        return super()._entry_filename(row)
+    
+    def _catalog_entry(self, row: CatalogRow) -> Dict[str, Any]:
+        """Convierte una fila del catálogo en una entrada de list_available_data, con sus segmentos."""
+        entry = super()._catalog_entry(row)
+        entry["segments"] = row[6]
+        return entry
+
+
+def _sqlite_backend(**kwargs: Any):
+    """Crea un SQLiteStorage importándolo solo cuando se selecciona."""
+    from api_server.sqlite_storage import SQLiteStorage
+    return SQLiteStorage(**kwargs)
+
+
+# Backends de almacenamiento seleccionables por nombre
+STORAGE_BACKENDS = {
+    "json": JSONStorage,
+    "jsonl": JSONLinesStorage,
+    "sqlite": _sqlite_backend,
+}
+
+
+def create_storage(backend: str = "json", data_dir: str = "data", layout: Optional[str] = None,
+                   **kwargs: Any):
+    """
+    Crea un manejador de almacenamiento a partir del nombre del backend.
+    
+    Args:
+        backend: Nombre del backend ("json", "jsonl" o "sqlite")
+        data_dir: Directorio de datos
+        layout: Distribución de los archivos ("flat" o "daily"); el backend sqlite la ignora
+        **kwargs: Opciones adicionales específicas del backend
+    
+    Returns:
+        Instancia del backend de almacenamiento
+    
+    Raises:
+        ValueError: Si el backend no existe
+    """
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown storage backend: {backend}. Use one of: {', '.join(STORAGE_BACKENDS)}")
+    if layout is not None and backend != "sqlite":
+        kwargs["layout"] = layout
+    return STORAGE_BACKENDS[backend](data_dir=data_dir, **kwargs)
+
 if __name__ == "__main__":
     # Prueba del almacenamiento
     storage = JSONStorage()
@@ -51,7 +51,7 @@ ssh -i "$KEY_PATH" "$REMOTE_USER@$EC2_HOST" << EOF
     pkill -f "python3 api_server/run_api.py" || true
     
     # Start API server in background
-    nohup python3 api_server/run_api.py --host 0.0.0.0 --port 5000 > api_server.log 2>&1 &
+    nohup python3 api_server/run_api.py --host 0.0.0.0 --port 5000 --server gunicorn --workers 4 --storage jsonl > api_server.log 2>&1 &
     
     # Set up firewall to allow access to port 5000
     sudo ufw allow 5000/tcp
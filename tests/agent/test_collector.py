@@ -2,12 +2,13 @@ import unittest
 import os
 import sys
 import json
+import time
 from unittest.mock import patch, MagicMock
 
 # Añadir directorio padre a la ruta para importar módulos
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from agent.collector import get_cpu_info, get_process_list, get_logged_users, get_os_info, collect_all
+from agent.collector import CPUSampler, HostFacts, ProcessCollector, PROCESS_ATTRS, get_cpu_info, get_process_list, get_logged_users, get_os_info, collect_all
 
 class TestCollector(unittest.TestCase):
     
@@ -15,20 +16,52 @@ class TestCollector(unittest.TestCase):
     @patch('agent.collector.psutil.cpu_count')
     def test_get_cpu_info(self, mock_cpu_count, mock_cpu_percent):
         # Configurar mocks
-        mock_cpu_percent.side_effect = [[5.0, 6.0, 7.0, 8.0], 25.0]  # First call for per-cpu, second for avg
+        mock_cpu_percent.return_value = [5.0, 6.0, 7.0, 8.0]  # Una sola medición por núcleo
         mock_cpu_count.side_effect = [4, 8]  # Physical and logical
         
         # Llamar a la función
-        result = get_cpu_info()
+        result = get_cpu_info(CPUSampler(prime_interval=0))
         
-        # Verificar resultados
+        # Verificar resultados: el promedio sale de la misma medición por núcleo
         self.assertEqual(result['physical_cores'], 4)
         self.assertEqual(result['logical_cores'], 8)
-        self.assertEqual(result['avg_usage'], 25.0)
+        self.assertEqual(result['avg_usage'], 6.5)
         self.assertEqual(len(result['usage_percent']), 4)
+        # Nunca se bloquea esperando un intervalo
+        for call in mock_cpu_percent.call_args_list:
+            self.assertEqual(call.kwargs, {'interval': None, 'percpu': True})
+    
+    @patch('agent.collector.psutil.cpu_percent')
+    def test_cpu_sampler_keeps_state_between_reads(self, mock_cpu_percent):
+        mock_cpu_percent.side_effect = [[0.0, 0.0], [10.0, 20.0], [30.0, 50.0]]
+        sampler = CPUSampler(prime_interval=0)
+        
+        # La primera lectura descarta la medición inicial de psutil (siempre ceros)
+        self.assertEqual(sampler.read(), {'usage_percent': [10.0, 20.0], 'avg_usage': 15.0})
+        # Las siguientes miden desde la lectura anterior con una sola llamada
+        self.assertEqual(sampler.read(), {'usage_percent': [30.0, 50.0], 'avg_usage': 40.0})
+        self.assertEqual(mock_cpu_percent.call_count, 3)
+    
+    @patch('agent.collector.psutil.cpu_percent')
+    def test_cpu_sampler_background_window(self, mock_cpu_percent):
+        samples = iter([[0.0, 0.0], [10.0, 10.0]] + [[90.0, 70.0]] * 1000)
+        mock_cpu_percent.side_effect = lambda **kwargs: next(samples)
+        sampler = CPUSampler(prime_interval=0)
+        sampler.start(period=0.01)
+        self.addCleanup(sampler.stop)
+        time.sleep(0.1)
+        
+        result = sampler.read()
+        
+        window = result['usage_window']
+        self.assertEqual(window['min'], 10.0)
+        self.assertEqual(window['max'], 80.0)
+        self.assertGreater(window['samples'], 1)
+        self.assertEqual(result['usage_percent'], [90.0, 70.0])
     
-    @patch('agent.collector.psutil.process_iter')
-    def test_get_process_list(self, mock_process_iter):
+    @patch('agent.collector.psutil.Process')
+    @patch('agent.collector.psutil.pids')
+    def test_get_process_list(self, mock_pids, mock_process):
         # Crear diccionarios de procesos simulados
         process1 = {
             'pid': 1,
@@ -49,19 +82,16 @@ class TestCollector(unittest.TestCase):
         # Crear procesos simulados
         mock_proc1 = MagicMock()
         mock_proc1.as_dict.return_value = process1
-        mock_proc1.__getitem__ = lambda self, key: process1[key]
-        mock_proc1.get = lambda key, default=None: process1.get(key, default)
         
         mock_proc2 = MagicMock()
         mock_proc2.as_dict.return_value = process2
-        mock_proc2.__getitem__ = lambda self, key: process2[key]
-        mock_proc2.get = lambda key, default=None: process2.get(key, default)
         
         # Configurar mock para devolver nuestros procesos de prueba
-        mock_process_iter.return_value = [mock_proc1, mock_proc2]
+        mock_pids.return_value = [1, 2]
+        mock_process.side_effect = [mock_proc1, mock_proc2]
         
         # Llamar a la función
-        result = get_process_list()
+        result = ProcessCollector().collect()
         
         # Verificar resultados
         self.assertEqual(len(result), 2)
@@ -74,6 +104,42 @@ class TestCollector(unittest.TestCase):
         # Verificar que los valores None se manejen correctamente
         self.assertEqual(result[1]['memory_percent'], 0)
         self.assertEqual(result[1]['cpu_percent'], 0)
+        
+        # Solo se piden los atributos necesarios
+        mock_proc1.as_dict.assert_called_once_with(attrs=PROCESS_ATTRS)
+    
+    @patch('agent.collector.psutil.Process')
+    @patch('agent.collector.psutil.pids')
+    def test_process_collector_reuses_process_objects(self, mock_pids, mock_process):
+        procs = {}
+        def make_process(pid):
+            proc = MagicMock()
+            proc.as_dict.return_value = {'pid': pid, 'name': f'p{pid}', 'username': 'u',
+                                         'memory_percent': 1.0, 'cpu_percent': 2.0}
+            procs.setdefault(pid, []).append(proc)
+            return proc
+        mock_process.side_effect = make_process
+        collector = ProcessCollector()
+        
+        mock_pids.return_value = [1, 2]
+        collector.collect()
+        self.assertEqual(collector.last_stats['new_processes'], 2)
+        
+        # El PID 2 terminó, el 3 es nuevo y el 1 se reutiliza para medir CPU real
+        mock_pids.return_value = [1, 3]
+        result = collector.collect()
+        
+        self.assertEqual([p['pid'] for p in result], [1, 3])
+        self.assertEqual(len(procs[1]), 1)
+        self.assertEqual(procs[1][0].as_dict.call_count, 2)
+        self.assertEqual(collector.last_stats['processes'], 2)
+        self.assertEqual(collector.last_stats['new_processes'], 1)
+        self.assertIn('duration_ms', collector.last_stats)
+        
+        # Un PID reutilizado por otro proceso crea un objeto nuevo
+        procs[1][0].is_running.return_value = False
+        collector.collect()
+        self.assertEqual(len(procs[1]), 2)
     
     @patch('agent.collector.psutil.users')
     @patch('agent.collector.datetime.datetime')
@@ -132,7 +198,9 @@ class TestCollector(unittest.TestCase):
         self.assertEqual(result['machine'], 'x86_64')
         self.assertEqual(result['processor'], 'Intel Core i7')
     
-    @patch('agent.collector.get_cpu_info')
+    @patch('agent.collector.cpu_sampler')
+    @patch('agent.collector.get_cpu_model')
+    @patch('agent.collector.psutil.cpu_count')
     @patch('agent.collector.get_process_list')
     @patch('agent.collector.get_logged_users')
     @patch('agent.collector.get_os_info')
@@ -141,13 +209,15 @@ class TestCollector(unittest.TestCase):
     @patch('agent.collector.datetime.datetime')
     def test_collect_all(self, mock_datetime, mock_gethostbyname, mock_gethostname, 
                         mock_get_os_info, mock_get_logged_users, mock_get_process_list, 
-                        mock_get_cpu_info):
+                        mock_cpu_count, mock_get_cpu_model, mock_cpu_sampler):
         # Configurar mocks
         mock_datetime_now = MagicMock()
         mock_datetime_now.strftime.return_value = '2025-06-27 12:00:00'
         mock_datetime.now.return_value = mock_datetime_now
         
-        mock_get_cpu_info.return_value = {'physical_cores': 4, 'logical_cores': 8, 'avg_usage': 25.0}
+        mock_cpu_count.side_effect = lambda logical=True: 8 if logical else 4
+        mock_get_cpu_model.return_value = 'Test CPU'
+        mock_cpu_sampler.read.return_value = {'usage_percent': [25.0], 'avg_usage': 25.0}
         mock_get_process_list.return_value = [{'pid': 1, 'name': 'test_process'}]
         mock_get_logged_users.return_value = [{'name': 'test_user'}]
         mock_get_os_info.return_value = {'name': 'Linux', 'version': '1.0'}
@@ -161,16 +231,76 @@ class TestCollector(unittest.TestCase):
         self.addCleanup(mock_socket_patcher.stop)
         
         # Llamar función
-        result = collect_all()
+        result = collect_all(facts=HostFacts())
         
         # Verificar resultados
         self.assertEqual(result['ip_address'], '192.168.1.1')
         self.assertEqual(result['hostname'], 'test-host')
         self.assertEqual(result['cpu_info']['physical_cores'], 4)
+        self.assertEqual(result['cpu_info']['model'], 'Test CPU')
+        self.assertEqual(result['cpu_info']['avg_usage'], 25.0)
         self.assertEqual(len(result['processes']), 1)
         self.assertEqual(len(result['logged_users']), 1)
         self.assertEqual(result['os_info']['name'], 'Linux')
         self.assertEqual(result['timestamp'], '2025-06-27 12:00:00')
+    
+    @patch('agent.collector.psutil.boot_time')
+    @patch('agent.collector.get_ip_address')
+    @patch('agent.collector.get_os_info')
+    @patch('agent.collector.socket.gethostname')
+    def test_host_facts_cache(self, mock_gethostname, mock_get_os_info, mock_get_ip_address, mock_boot_time):
+        mock_gethostname.return_value = 'test-host'
+        mock_get_os_info.return_value = {'name': 'Linux'}
+        mock_get_ip_address.return_value = '10.0.0.1'
+        mock_boot_time.return_value = 1000.0
+        facts = HostFacts(ttl=3600, ip_check_interval=3600)
+        
+        first = facts.get()
+        facts.get()
+        
+        # Una lectura estable no recalcula nada
+        self.assertEqual(mock_get_os_info.call_count, 1)
+        self.assertEqual(first['ip_address'], '10.0.0.1')
+        self.assertEqual(facts.generation, 1)
+        
+        # Un reinicio invalida la caché; si los datos no cambian, la generación se mantiene
+        mock_boot_time.return_value = 2000.0
+        facts.get()
+        self.assertEqual(mock_get_os_info.call_count, 2)
+        self.assertEqual(facts.generation, 1)
+        
+        # Un cambio de IP se detecta en la siguiente comprobación
+        facts.ip_check_interval = 0
+        mock_get_ip_address.return_value = '10.0.0.2'
+        self.assertEqual(facts.get()['ip_address'], '10.0.0.2')
+        self.assertEqual(facts.generation, 2)
+    
+    @patch('agent.collector.cpu_sampler')
+    @patch('agent.collector.get_process_list')
+    @patch('agent.collector.get_logged_users')
+    def test_collect_all_sends_static_facts_on_change(self, mock_get_logged_users,
+                                                      mock_get_process_list, mock_cpu_sampler):
+        mock_cpu_sampler.read.return_value = {'usage_percent': [25.0], 'avg_usage': 25.0}
+        mock_get_process_list.return_value = []
+        mock_get_logged_users.return_value = []
+        facts = MagicMock(generation=1, sent_generation=None)
+        facts.get.return_value = {
+            'hostname': 'test-host', 'ip_address': '10.0.0.1',
+            'cpu_info': {'physical_cores': 4, 'logical_cores': 8, 'model': 'Test CPU'},
+            'os_info': {'name': 'Linux'}
+        }
+        
+        # Primer snapshot de la sesión: incluye los datos fijos
+        result = collect_all(static_facts='on-change', facts=facts)
+        self.assertIn('os_info', result)
+        self.assertEqual(result['cpu_info']['model'], 'Test CPU')
+        
+        # Una vez enviados, los siguientes solo llevan los datos dinámicos
+        facts.sent_generation = 1
+        result = collect_all(static_facts='on-change', facts=facts)
+        self.assertNotIn('os_info', result)
+        self.assertEqual(result['cpu_info'], {'usage_percent': [25.0], 'avg_usage': 25.0})
+        self.assertEqual(result['hostname'], 'test-host')
 
 if __name__ == '__main__':
     unittest.main()
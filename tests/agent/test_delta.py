@@ -0,0 +1,115 @@
+import unittest
+import os
+import sys
+import json
+from unittest.mock import MagicMock
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent.delta import DeltaEncoder, make_delta, apply_delta, strip_delta, DELTA_KEY
+from agent.run_agent import send_snapshot
+
+
+def make_snapshot(process_count=200, timestamp='2025-06-27T10:00:00'):
+    """Snapshot de prueba con la forma del que genera el recolector."""
+    return {
+        'hostname': 'test-host',
+        'ip_address': '192.168.1.100',
+        'timestamp': timestamp,
+        'cpu_info': {'physical_cores': 4, 'usage_per_core': [10.0, 20.0, 30.0, 40.0]},
+        'os_info': {'name': 'Linux', 'release': '5.4.0'},
+        'processes': [
+            {'pid': pid, 'name': f'proc{pid}', 'username': 'root',
+             'cpu_percent': 0.0, 'memory_percent': 0.5}
+            for pid in range(1, process_count + 1)
+        ],
+        'logged_users': [{'name': 'user1', 'terminal': 'tty1'}]
+    }
+
+
+class TestDelta(unittest.TestCase):
+    
+    def test_round_trip(self):
+        base = make_snapshot(10)
+        current = make_snapshot(10, timestamp='2025-06-27T10:01:00')
+        current['cpu_info'] = {'physical_cores': 4, 'usage_per_core': [90.0, 20.0, 30.0, 40.0]}
+        current['processes'][2]['cpu_percent'] = 55.0
+        del current['processes'][5]
+        current['processes'].append({'pid': 99, 'name': 'new', 'username': 'user1',
+                                     'cpu_percent': 1.0, 'memory_percent': 0.1})
+        del current['logged_users']
+        
+        message = {field: current[field] for field in ('hostname', 'ip_address', 'timestamp')}
+        message.update(make_delta(base, current))
+        
+        self.assertEqual(apply_delta(base, message), current)
+        # Solo viajan el campo cambiado y el PID del proceso existente
+        self.assertIn({'pid': 3, 'cpu_percent': 55.0}, message['processes']['changed'])
+        self.assertEqual(message['processes']['removed'], [6])
+        self.assertEqual(message['unset'], ['logged_users'])
+        # La base no se modifica
+        self.assertEqual(base, make_snapshot(10))
+    
+    def test_delta_is_much_smaller_than_snapshot(self):
+        base = make_snapshot(200)
+        current = make_snapshot(200, timestamp='2025-06-27T10:01:00')
+        for process in current['processes'][:5]:
+            process['cpu_percent'] = 12.5
+        
+        encoder = DeltaEncoder()
+        encoder.encode(base)
+        encoder.acknowledge()
+        message = encoder.encode(current)
+        
+        full_size = len(json.dumps(current))
+        delta_size = len(json.dumps(message))
+        self.assertGreaterEqual(full_size / delta_size, 10)
+    
+    def test_encoder_keyframes(self):
+        encoder = DeltaEncoder(keyframe_interval=2)
+        snapshot = make_snapshot(3)
+        
+        first = encoder.encode(snapshot)
+        self.assertTrue(first[DELTA_KEY]['keyframe'])
+        self.assertEqual(strip_delta(first), snapshot)
+        
+        # Sin confirmación la base no avanza y se repite el keyframe
+        self.assertTrue(encoder.encode(snapshot)[DELTA_KEY]['keyframe'])
+        encoder.acknowledge()
+        
+        second = encoder.encode(snapshot)
+        self.assertNotIn('keyframe', second[DELTA_KEY])
+        self.assertEqual(second[DELTA_KEY]['base'], 2)
+        encoder.acknowledge()
+        encoder.encode(snapshot)
+        encoder.acknowledge()
+        
+        # Tras keyframe_interval deltas se fuerza un keyframe
+        self.assertTrue(encoder.encode(snapshot)[DELTA_KEY]['keyframe'])
+        
+        # reset descarta la base
+        encoder.acknowledge()
+        encoder.reset()
+        self.assertTrue(encoder.encode(snapshot)[DELTA_KEY]['keyframe'])
+    
+    def test_send_snapshot_resyncs_on_conflict(self):
+        encoder = DeltaEncoder()
+        encoder.encode(make_snapshot(3))
+        encoder.acknowledge()
+        
+        sender = MagicMock()
+        sender.send_data.side_effect = [
+            {'success': False, 'message': 'Error sending data: HTTP 409', 'status_code': 409},
+            {'success': True, 'message': 'Data sent successfully', 'status_code': 200}
+        ]
+        result = send_snapshot(sender, make_snapshot(3), encoder)
+        
+        self.assertTrue(result['success'])
+        delta_message, keyframe_message = [call.args[0] for call in sender.send_data.call_args_list]
+        self.assertNotIn('keyframe', delta_message[DELTA_KEY])
+        self.assertTrue(keyframe_message[DELTA_KEY]['keyframe'])
+
+
+if __name__ == '__main__':
+    unittest.main()
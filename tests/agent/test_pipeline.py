@@ -0,0 +1,130 @@
+import unittest
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent.pipeline import AgentPipeline
+from agent.collector import collect_all, last_timings
+
+
+class TestAgentPipeline(unittest.TestCase):
+    
+    def test_snapshots_flow_through_stages_in_order(self):
+        counter = iter(range(100))
+        delivered = []
+        done = threading.Event()
+        
+        def deliver(data, prepared):
+            delivered.append((data, prepared))
+            if len(delivered) == 3:
+                done.set()
+        
+        pipeline = AgentPipeline(
+            collect=lambda executor: {"n": next(counter)},
+            deliver=deliver,
+            prepare=lambda data: (str(data["n"]).encode(), {"Content-Type": "application/json"})
+        ).start()
+        try:
+            for _ in range(3):
+                self.assertTrue(pipeline.collect_once())
+            self.assertTrue(done.wait(5))
+        finally:
+            pipeline.stop()
+        
+        # Cada snapshot llega con su versión serializada y en el orden de recolección
+        self.assertEqual([data["n"] for data, _ in delivered], [0, 1, 2])
+        self.assertEqual([prepared[0] for _, prepared in delivered], [b'0', b'1', b'2'])
+    
+    def test_without_prepare_deliver_serializes(self):
+        delivered = []
+        pipeline = AgentPipeline(collect=lambda executor: {"n": 1},
+                                 deliver=lambda data, prepared: delivered.append(prepared)).start()
+        pipeline.collect_once()
+        # stop() espera a que se envíe lo ya encolado
+        pipeline.stop()
+        self.assertEqual(delivered, [None])
+    
+    def test_full_queue_overflows_without_blocking_collection(self):
+        release = threading.Event()
+        overflow = []
+        pipeline = AgentPipeline(
+            collect=lambda executor: {"n": 1},
+            deliver=lambda data, prepared: release.wait(5),
+            overflow=overflow.append,
+            queue_size=1
+        ).start()
+        try:
+            # Con el envío bloqueado, las colas se llenan y el resto va a overflow
+            results = [pipeline.collect_once() for _ in range(6)]
+        finally:
+            release.set()
+            pipeline.stop()
+        
+        self.assertFalse(all(results))
+        self.assertEqual(pipeline.overflowed, results.count(False))
+        self.assertEqual(len(overflow), pipeline.overflowed)
+    
+    def test_stage_timings_are_logged(self):
+        pipeline = AgentPipeline(
+            collect=lambda executor: {"n": 1},
+            deliver=lambda data, prepared: None,
+            prepare=lambda data: (b'{}', {}),
+            timings=lambda: {"cpu": 1.5, "processes": 2.0}
+        ).start()
+        with self.assertLogs('agent', level='INFO') as logs:
+            pipeline.collect_once()
+            pipeline.stop()
+        
+        line = next(message for message in logs.output if 'Pipeline timings' in message)
+        for stage in ('collect', 'serialize_wait', 'serialize', 'send_wait', 'send'):
+            self.assertIn(stage, line)
+        self.assertIn('cpu 1.5', line)
+    
+    def test_deliver_errors_do_not_stop_the_pipeline(self):
+        delivered = []
+        
+        def deliver(data, prepared):
+            if data["n"] == 0:
+                raise RuntimeError("boom")
+            delivered.append(data["n"])
+        
+        counter = iter(range(100))
+        pipeline = AgentPipeline(collect=lambda executor: {"n": next(counter)}, deliver=deliver).start()
+        with self.assertLogs('agent', level='ERROR'):
+            pipeline.collect_once()
+            pipeline.collect_once()
+            pipeline.stop()
+        self.assertEqual(delivered, [1])
+
+
+class TestConcurrentCollection(unittest.TestCase):
+    
+    @patch('agent.collector.cpu_sampler')
+    @patch('agent.collector.get_process_list')
+    @patch('agent.collector.get_logged_users')
+    def test_collect_all_with_executor(self, mock_get_logged_users, mock_get_process_list, mock_cpu_sampler):
+        mock_cpu_sampler.read.return_value = {'usage_percent': [25.0], 'avg_usage': 25.0}
+        mock_get_process_list.return_value = [{'pid': 1, 'name': 'init'}]
+        mock_get_logged_users.return_value = []
+        facts = MagicMock(generation=1, sent_generation=1)
+        facts.get.return_value = {
+            'hostname': 'test-host', 'ip_address': '10.0.0.1',
+            'cpu_info': {'physical_cores': 4}, 'os_info': {'name': 'Linux'}
+        }
+        
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result = collect_all(facts=facts, executor=executor)
+        
+        # Mismo snapshot que la recolección en serie, más la duración de cada recolector
+        self.assertEqual(result['processes'], [{'pid': 1, 'name': 'init'}])
+        self.assertEqual(result['cpu_info']['physical_cores'], 4)
+        self.assertEqual(set(last_timings), {'facts', 'cpu', 'processes', 'users'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import sys
+import json
+import tempfile
+from unittest.mock import patch, MagicMock
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent.profiles import CollectionProfile, load_profile, merge_partial
+from agent.collector import collect_all
+
+
+class FakeClock:
+    """Reloj simulado que avanza a mano."""
+    
+    def __init__(self):
+        self.now = 100.0
+    
+    def __call__(self):
+        return self.now
+
+
+class TestProfiles(unittest.TestCase):
+    
+    def write_profile(self, config):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f)
+        self.addCleanup(os.remove, path)
+        return path
+    
+    def test_load_profile(self):
+        path = self.write_profile({'collectors': {'cpu': 10, 'processes': 60}})
+        # Los grupos que no figuran usan el intervalo predeterminado
+        self.assertEqual(load_profile(path, 3600), {'facts': 3600, 'cpu': 10, 'processes': 60, 'users': 3600})
+        
+        for config in ({'collectors': {'disk': 10}}, {'collectors': {'cpu': 0}},
+                       {'collectors': {'cpu': 2.5}}, {'cpu': 10}):
+            with self.assertRaises(ValueError):
+                load_profile(self.write_profile(config), 60)
+    
+    def test_due_groups_follow_their_intervals(self):
+        clock = FakeClock()
+        profile = CollectionProfile({'facts': 3600, 'cpu': 10, 'processes': 60, 'users': 3600}, clock=clock)
+        self.assertEqual(profile.interval, 10)
+        
+        # El primer ciclo recolecta todo; luego cada grupo a su ritmo
+        schedule = []
+        for _ in range(13):
+            schedule.append(profile.due())
+            # Una deriva pequeña del planificador no hace saltar ciclos
+            clock.now += 10.02
+        self.assertEqual(schedule[0], ['facts', 'cpu', 'processes', 'users'])
+        self.assertTrue(all('cpu' in groups for groups in schedule))
+        self.assertEqual([n for n, groups in enumerate(schedule) if 'processes' in groups], [0, 6, 12])
+        self.assertEqual([n for n, groups in enumerate(schedule) if 'users' in groups], [0])
+    
+    def test_merge_partial_combines_dicts(self):
+        base = {'hostname': 'h', 'timestamp': 't0', 'cpu_info': {'model': 'X', 'avg_usage': 1.0}, 'processes': [1]}
+        merged = merge_partial(base, {'timestamp': 't1', 'cpu_info': {'avg_usage': 9.0}, 'collected': ['cpu']})
+        self.assertEqual(merged['cpu_info'], {'model': 'X', 'avg_usage': 9.0})
+        self.assertEqual(merged['processes'], [1])
+        self.assertEqual(merged['timestamp'], 't1')
+        # La base no se modifica
+        self.assertEqual(base['cpu_info']['avg_usage'], 1.0)
+    
+    @patch('agent.collector.cpu_sampler')
+    @patch('agent.collector.get_process_list')
+    @patch('agent.collector.get_logged_users')
+    def test_collect_all_only_requested_groups(self, mock_get_logged_users, mock_get_process_list, mock_cpu_sampler):
+        mock_cpu_sampler.read.return_value = {'avg_usage': 25.0}
+        facts = MagicMock(generation=1, sent_generation=1)
+        facts.get.return_value = {
+            'hostname': 'test-host', 'ip_address': '10.0.0.1',
+            'cpu_info': {'model': 'Test CPU'}, 'os_info': {'name': 'Linux'}
+        }
+        
+        result = collect_all(facts=facts, groups=['cpu'])
+        self.assertEqual(set(result), {'hostname', 'ip_address', 'timestamp', 'cpu_info'})
+        self.assertEqual(result['cpu_info'], {'avg_usage': 25.0})
+        mock_get_process_list.assert_not_called()
+        mock_get_logged_users.assert_not_called()
+        
+        # Los datos fijos viajan fuera de su turno si cambiaron
+        facts.generation = 2
+        result = collect_all(facts=facts, groups=['cpu'])
+        self.assertEqual(result['os_info'], {'name': 'Linux'})
+        self.assertEqual(result['cpu_info'], {'model': 'Test CPU', 'avg_usage': 25.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent.run_agent import run_once
+from agent.spool import Spool
+from agent.profiles import CollectionProfile
+
+
+class TestRunAgent(unittest.TestCase):
+    
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+        self.snapshot = {'hostname': 'test-host', 'ip_address': '192.168.1.100',
+                         'timestamp': '2025-06-27T10:00:00', 'processes': []}
+        self.patcher = patch('agent.run_agent.collect_all', return_value=self.snapshot)
+        self.patcher.start()
+    
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.spool_dir)
+    
+    def test_run_once_spools_and_replays(self):
+        spool = Spool(self.spool_dir)
+        sender = MagicMock()
+        
+        # API caída: el snapshot se guarda en el spool
+        sender.send_data.side_effect = ConnectionError("Could not connect to API")
+        result = run_once('http://test-api.com', sender=sender, spool=spool)
+        self.assertFalse(result['success'])
+        self.assertEqual(len(spool), 1)
+        
+        # Un 400 no se reintenta nunca
+        sender.send_data.side_effect = None
+        sender.send_data.return_value = {'success': False, 'message': 'HTTP 400', 'status_code': 400}
+        run_once('http://test-api.com', sender=sender, spool=spool)
+        self.assertEqual(len(spool), 1)
+        
+        # La API vuelve: se envía el snapshot actual y luego se reenvía el spool en lote
+        sender.send_data.return_value = {'success': True, 'message': 'Data sent successfully', 'status_code': 200}
+        sender.send_batch.return_value = {'success': True, 'message': 'Data sent successfully', 'status_code': 200}
+        result = run_once('http://test-api.com', sender=sender, spool=spool)
+        self.assertTrue(result['success'])
+        sender.send_batch.assert_called_once_with([self.snapshot])
+        self.assertEqual(len(spool), 0)
+
+    
+    def test_run_once_with_profile_spools_complete_snapshots(self):
+        clock = MagicMock(return_value=100.0)
+        profile = CollectionProfile({'facts': 60, 'cpu': 10, 'processes': 60, 'users': 60}, clock=clock)
+        spool = Spool(self.spool_dir)
+        sender = MagicMock()
+        sender.send_data.return_value = {'success': True, 'message': 'Data sent successfully', 'status_code': 200}
+        
+        def fake_collect_all(static_facts, executor=None, groups=None):
+            data = dict(self.snapshot)
+            if 'processes' not in groups:
+                del data['processes']
+            data['cpu_info'] = {'avg_usage': clock()}
+            return data
+        
+        with patch('agent.run_agent.collect_all', side_effect=fake_collect_all):
+            run_once('http://test-api.com', sender=sender, spool=spool, profile=profile)
+            self.assertEqual(sender.send_data.call_args.args[0]['collected'], ['facts', 'cpu', 'processes', 'users'])
+            
+            # Solo toca la CPU: se envía un parcial, pero el spool guarda el snapshot completo
+            clock.return_value = 110.0
+            sender.send_data.return_value = {'success': False, 'message': 'HTTP 503', 'status_code': 503}
+            run_once('http://test-api.com', sender=sender, spool=spool, profile=profile)
+        
+        sent = sender.send_data.call_args.args[0]
+        self.assertEqual(sent['collected'], ['cpu'])
+        self.assertNotIn('processes', sent)
+        (_, spooled), = spool.peek(10)
+        self.assertEqual(spooled['processes'], [])
+        self.assertEqual(spooled['cpu_info'], {'avg_usage': 110.0})
+        self.assertEqual(spooled['collected'], ['cpu'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import os
+import sys
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent.scheduler import Scheduler, phase_offset
+
+
+class FakeClock:
+    """Reloj simulado: esperar y ejecutar tareas solo avanza el tiempo."""
+    
+    def __init__(self, start=1000.0):
+        self.now = start
+    
+    def __call__(self):
+        return self.now
+    
+    def wait(self, seconds):
+        self.now += seconds
+        return False
+
+
+class TestScheduler(unittest.TestCase):
+    
+    def test_phase_offset_is_deterministic_and_spread(self):
+        self.assertEqual(phase_offset('host-1', 60), phase_offset('host-1', 60))
+        offsets = [phase_offset(f'host-{n}', 60) for n in range(1000)]
+        self.assertTrue(all(0 <= offset < 60 for offset in offsets))
+        # Aproximadamente uniformes: cada cuarto del intervalo recibe cerca de 250 hosts
+        quarters = [sum(1 for offset in offsets if q * 15 <= offset < (q + 1) * 15) for q in range(4)]
+        self.assertTrue(all(200 < count < 300 for count in quarters))
+    
+    def test_fixed_cadence_without_drift(self):
+        clock = FakeClock()
+        scheduler = Scheduler(60, offset=15, clock=clock, wall_clock=clock, wait=clock.wait)
+        starts = []
+        
+        def task():
+            starts.append(clock.now)
+            clock.now += 7.5  # la recolección y el envío no desplazan los ciclos
+        
+        scheduler.run(task, max_ticks=4)
+        # Primer ciclo alineado con el desfase y luego exactamente cada 60 segundos
+        self.assertEqual(starts, [1035.0, 1095.0, 1155.0, 1215.0])
+        self.assertEqual(scheduler.skipped, 0)
+    
+    def test_missed_ticks_skip(self):
+        clock = FakeClock(0.0)
+        scheduler = Scheduler(10, clock=clock, wall_clock=clock, wait=clock.wait)
+        starts = []
+        durations = iter([25, 1, 1])
+        
+        def task():
+            starts.append(clock.now)
+            clock.now += next(durations)
+        
+        scheduler.run(task, max_ticks=3)
+        # La primera ejecución se pasa de los ciclos 10 y 20: se retoma en 30
+        self.assertEqual(starts, [0.0, 30.0, 40.0])
+        self.assertEqual(scheduler.skipped, 2)
+    
+    def test_missed_ticks_coalesce(self):
+        clock = FakeClock(0.0)
+        scheduler = Scheduler(10, missed='coalesce', clock=clock, wall_clock=clock, wait=clock.wait)
+        starts = []
+        durations = iter([25, 1, 1])
+        
+        def task():
+            starts.append(clock.now)
+            clock.now += next(durations)
+        
+        scheduler.run(task, max_ticks=3)
+        # Los ciclos 10 y 20 se resumen en una ejecución inmediata y se vuelve al calendario
+        self.assertEqual(starts, [0.0, 25.0, 30.0])
+        self.assertEqual(scheduler.skipped, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
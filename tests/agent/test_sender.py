@@ -1,5 +1,7 @@
 import unittest
 import json
+import gzip
+import requests
 import os
 import sys
 from unittest.mock import patch, MagicMock
@@ -11,7 +13,7 @@ from agent.sender import APISender
 
 class TestSender(unittest.TestCase):
     
-    @patch('agent.sender.requests.post')
+    @patch('agent.sender.requests.Session.post')
     def test_send_data_success(self, mock_post):
         # Configurar respuesta simulada para caso de éxito
         mock_response = MagicMock()
@@ -32,9 +34,10 @@ class TestSender(unittest.TestCase):
         # Verificar resultados
         self.assertTrue(result['success'])
         self.assertEqual(result['message'], 'Data sent successfully')
-        mock_post.assert_called_once_with(f'{test_url}/upload', data=json.dumps(test_data), headers={'Content-Type': 'application/json'})
+        mock_post.assert_called_once_with(f'{test_url}/upload', data=json.dumps(test_data), headers={'Content-Type': 'application/json'}, timeout=(5.0, 30.0))
+        self.assertIn('latency_ms', result)
     
-    @patch('agent.sender.requests.post')
+    @patch('agent.sender.requests.Session.post')
     def test_send_data_failure(self, mock_post):
         # Configurar respuesta simulada para caso de fallo
         mock_response = MagicMock()
@@ -56,7 +59,7 @@ class TestSender(unittest.TestCase):
         self.assertFalse(result['success'])
         self.assertIn('HTTP 500', result['message'])
     
-    @patch('agent.sender.requests.post')
+    @patch('agent.sender.requests.Session.post')
     def test_send_data_exception(self, mock_post):
         # Configurar mock para lanzar una excepción
         mock_post.side_effect = Exception("Connection error")
@@ -75,6 +78,128 @@ class TestSender(unittest.TestCase):
         self.assertFalse(result['success'])
         self.assertIn('Error', result['message'])
         self.assertIsNone(result['response'])
+    
+    @patch('agent.sender.requests.Session.post')
+    def test_send_data_gzip(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'status': 'ok'}
+        mock_post.return_value = mock_response
+        
+        test_data = {'ip_address': '192.168.1.1',
+                     'processes': [{'pid': pid, 'name': 'worker'} for pid in range(200)]}
+        sender = APISender('http://test-api.com', compression='gzip')
+        result = sender.send_data(test_data)
+        
+        # El cuerpo viaja comprimido y declara su codificación
+        self.assertTrue(result['success'])
+        kwargs = mock_post.call_args.kwargs
+        self.assertEqual(kwargs['headers']['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(kwargs['data'])), test_data)
+        self.assertLess(len(kwargs['data']), len(json.dumps(test_data)) / 5)
+        
+        # Por debajo del umbral se envía sin comprimir
+        small_data = {'ip_address': '192.168.1.1'}
+        sender.send_data(small_data)
+        kwargs = mock_post.call_args.kwargs
+        self.assertNotIn('Content-Encoding', kwargs['headers'])
+        self.assertEqual(kwargs['data'], json.dumps(small_data))
+    
+    @patch('agent.sender.requests.Session.post')
+    def test_session_is_reused(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'status': 'ok'}
+        mock_post.return_value = mock_response
+        
+        # Todos los envíos de un emisor usan la misma sesión (y su pool de conexiones)
+        sender = APISender('http://test-api.com', connect_timeout=2, read_timeout=10)
+        session = sender.session
+        for _ in range(3):
+            sender.send_data({'ip_address': '192.168.1.1'})
+        
+        self.assertIs(sender.session, session)
+        self.assertEqual(mock_post.call_count, 3)
+        self.assertEqual(mock_post.call_args.kwargs['timeout'], (2, 10))
+        adapter = session.get_adapter('http://test-api.com/upload')
+        self.assertEqual(adapter.max_retries.total, 0)
+        sender.close()
+    
+    @patch('agent.sender.requests.Session.post')
+    def test_send_batch(self, mock_post):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'success': True, 'stored': 2}
+        mock_post.return_value = mock_response
+        
+        records = [{'ip_address': '192.168.1.1', 'n': 1}, {'ip_address': '192.168.1.1', 'n': 2}]
+        result = APISender('http://test-api.com').send_batch(records)
+        
+        # Un snapshot por línea en una única solicitud
+        self.assertTrue(result['success'])
+        args, kwargs = mock_post.call_args
+        self.assertEqual(args[0], 'http://test-api.com/upload/batch')
+        self.assertEqual(kwargs['headers']['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in kwargs['data'].splitlines()], records)
+    
+    @patch('agent.sender.time.sleep')
+    @patch('agent.sender.requests.Session.post')
+    def test_retries_transient_errors(self, mock_post, mock_sleep):
+        overloaded = MagicMock(status_code=503, text='busy', headers={'Retry-After': '2'})
+        ok = MagicMock(status_code=200, headers={})
+        ok.json.return_value = {'success': True}
+        mock_post.side_effect = [overloaded, requests.exceptions.ReadTimeout('slow'), ok]
+        
+        sender = APISender('http://test-api.com', backoff_base=0.5)
+        result = sender.send_data({'ip_address': '192.168.1.1'})
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['attempts'], 3)
+        # Retry-After más jitter y luego backoff exponencial con jitter completo
+        first, second = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertTrue(2 <= first <= 2.5)
+        self.assertTrue(0 <= second <= 1.0)
+    
+    @patch('agent.sender.time.sleep')
+    @patch('agent.sender.requests.Session.post')
+    def test_does_not_retry_permanent_errors(self, mock_post, mock_sleep):
+        mock_post.return_value = MagicMock(status_code=400, text='bad request', headers={})
+        result = APISender('http://test-api.com').send_data({'ip_address': '192.168.1.1'})
+        self.assertFalse(result['success'])
+        self.assertEqual(result['attempts'], 1)
+        
+        # Un Retry-After mayor que la espera máxima tampoco se espera
+        mock_post.return_value = MagicMock(status_code=429, text='slow down', headers={'Retry-After': '600'})
+        result = APISender('http://test-api.com', backoff_max=30).send_data({'ip_address': '192.168.1.1'})
+        self.assertEqual(result['attempts'], 1)
+        mock_sleep.assert_not_called()
+    
+    @patch('agent.sender.time.sleep')
+    @patch('agent.sender.requests.Session.post')
+    def test_retry_budget_per_cycle(self, mock_post, mock_sleep):
+        mock_post.side_effect = requests.exceptions.ConnectionError('refused')
+        sender = APISender('http://test-api.com', max_retries=3, retry_budget=4)
+        
+        # El primer envío agota sus 3 reintentos y el segundo solo dispone de 1
+        with self.assertRaises(ConnectionError):
+            sender.send_data({'ip_address': '192.168.1.1'})
+        with self.assertRaises(ConnectionError):
+            sender.send_data({'ip_address': '192.168.1.1'})
+        self.assertEqual(mock_post.call_count, 4 + 2)
+        
+        # Sin presupuesto no se reintenta hasta el próximo ciclo
+        with self.assertRaises(ConnectionError):
+            sender.send_data({'ip_address': '192.168.1.1'})
+        self.assertEqual(mock_post.call_count, 7)
+        sender.new_cycle()
+        with self.assertRaises(ConnectionError):
+            sender.send_data({'ip_address': '192.168.1.1'})
+        self.assertEqual(mock_post.call_count, 11)
+    
+    def test_invalid_compression(self):
+        with self.assertRaises(ValueError):
+            APISender('http://test-api.com', compression='brotli')
+
 
 if __name__ == '__main__':
     unittest.main()
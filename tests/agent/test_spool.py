@@ -0,0 +1,109 @@
+import unittest
+import os
+import sys
+import time
+import shutil
+import tempfile
+from unittest.mock import MagicMock, patch
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from agent.spool import Spool
+
+
+def make_snapshot(n):
+    return {'hostname': 'test-host', 'ip_address': '192.168.1.100',
+            'timestamp': f'2025-06-27T10:{n:02d}:00', 'processes': [{'pid': n}]}
+
+
+class TestSpool(unittest.TestCase):
+    
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir)
+    
+    def test_put_peek_remove_in_order(self):
+        spool = Spool(self.spool_dir)
+        for n in range(5):
+            self.assertTrue(spool.put(make_snapshot(n)))
+        
+        batch = spool.peek(3)
+        self.assertEqual([record for _, record in batch], [make_snapshot(n) for n in range(3)])
+        spool.remove([name for name, _ in batch])
+        
+        # El spool sobrevive a un reinicio del agente
+        reloaded = Spool(self.spool_dir)
+        self.assertEqual(len(reloaded), 2)
+        self.assertEqual([record for _, record in reloaded.peek(10)], [make_snapshot(3), make_snapshot(4)])
+    
+    def test_bounded_by_size(self):
+        spool = Spool(self.spool_dir, max_bytes=300)
+        for n in range(10):
+            spool.put(make_snapshot(n))
+        
+        # Se descartan los más antiguos para respetar el límite
+        stats = spool.stats()
+        self.assertLessEqual(stats['bytes'], 300)
+        self.assertGreater(stats['dropped'], 0)
+        records = [record for _, record in spool.peek(10)]
+        self.assertEqual(records[-1], make_snapshot(9))
+        self.assertNotIn(make_snapshot(0), records)
+    
+    def test_bounded_by_age(self):
+        spool = Spool(self.spool_dir, max_age=60)
+        with patch('agent.spool.time.time_ns', return_value=int((time.time() - 120) * 1e9)):
+            spool.put(make_snapshot(0))
+        spool.put(make_snapshot(1))
+        
+        self.assertEqual([record for _, record in spool.peek(10)], [make_snapshot(1)])
+        self.assertEqual(spool.stats()['dropped'], 1)
+    
+    def test_replay_in_batches(self):
+        spool = Spool(self.spool_dir)
+        for n in range(5):
+            spool.put(make_snapshot(n))
+        
+        sender = MagicMock()
+        sender.send_batch.side_effect = [
+            {'success': True, 'message': 'Data sent successfully'},
+            {'success': False, 'message': 'Error sending data: HTTP 503'}
+        ]
+        result = spool.replay(sender, batch_size=2)
+        
+        # El primer lote se entrega; el que falla queda para el próximo intento
+        self.assertFalse(result['success'])
+        self.assertEqual(result['sent'], 2)
+        self.assertEqual(result['pending'], 3)
+        self.assertEqual(sender.send_batch.call_args_list[0].args[0], [make_snapshot(0), make_snapshot(1)])
+        
+        sender.send_batch.side_effect = None
+        sender.send_batch.return_value = {'success': True, 'message': 'Data sent successfully'}
+        result = spool.replay(sender, batch_size=2)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['sent'], 3)
+        self.assertEqual(len(spool), 0)
+    
+    def test_replay_keeps_failed_records(self):
+        spool = Spool(self.spool_dir)
+        for n in range(3):
+            spool.put(make_snapshot(n))
+        
+        # El servidor almacenó la línea 1, rechazó la 2 y no pudo escribir la 3
+        sender = MagicMock()
+        sender.send_batch.return_value = {'success': True, 'message': 'Data sent successfully', 'response': {
+            'success': False, 'message': 'Stored 1 snapshots, rejected 1, failed 1',
+            'results': [{'line': 1, 'status': 'stored'}, {'line': 2, 'status': 'rejected'},
+                        {'line': 3, 'status': 'failed'}]
+        }}
+        result = spool.replay(sender)
+        
+        self.assertFalse(result['success'])
+        self.assertEqual(result['sent'], 2)
+        self.assertEqual([record for _, record in spool.peek(10)], [make_snapshot(2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,13 +3,19 @@ import os
 import sys
 import json
 import shutil
+import gzip
 import tempfile
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
 
 # Añadir directorio padre a la ruta para importar módulos
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
 from api_server.app import app
+from api_server.metrics_store import MetricsStore
+from api_server.rollups import Rollups
+from api_server.query_cache import QueryCache
+from api_server.storage import JSONStorage
 
 class TestAPIApp(unittest.TestCase):
     
@@ -24,6 +30,14 @@ class TestAPIApp(unittest.TestCase):
         self.storage_mock = MagicMock()
         self.patcher = patch('api_server.app.storage', self.storage_mock)
         self.patcher.start()
+        # Las series numéricas se escriben en el directorio temporal
+        metrics_store = MetricsStore(self.test_data_dir)
+        self.metrics_patcher = patch('api_server.app.metrics_store', metrics_store)
+        self.metrics_patcher.start()
+        self.rollups_patcher = patch('api_server.app.rollups', Rollups(metrics_store))
+        self.rollups_patcher.start()
+        self.cache_patcher = patch('api_server.app.query_cache', QueryCache())
+        self.cache_patcher.start()
         
         # Datos de prueba de ejemplo
         self.test_data = {
@@ -44,6 +58,9 @@ class TestAPIApp(unittest.TestCase):
     def tearDown(self):
         # Eliminar el directorio temporal después de las pruebas
         self.patcher.stop()
+        self.metrics_patcher.stop()
+        self.rollups_patcher.stop()
+        self.cache_patcher.stop()
         shutil.rmtree(self.test_data_dir)
     
     def test_root_endpoint(self):
@@ -81,6 +98,256 @@ class TestAPIApp(unittest.TestCase):
         # Verificar que el mock fue llamado con los datos correctos
         self.storage_mock.store_data.assert_called_once_with(self.test_data)
     
+    def test_upload_endpoint_gzip(self):
+        self.storage_mock.store_data.return_value = {'success': True, 'message': 'Data stored successfully', 'file_path': 'x.json'}
+        body = gzip.compress(json.dumps(self.test_data).encode('utf-8'))
+        response = self.app.post('/upload', data=body, content_type='application/json',
+                                 headers={'Content-Encoding': 'gzip'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.storage_mock.store_data.assert_called_once_with(self.test_data)
+    
+    def test_upload_endpoint_compression_errors(self):
+        # Una carga que se expande por encima del límite se rechaza sin descomprimirla entera
+        bomb = gzip.compress(b' ' * (2 * 1024 * 1024))
+        with patch('api_server.app.MAX_UPLOAD_SIZE', 1024 * 1024):
+            response = self.app.post('/upload', data=bomb, content_type='application/json',
+                                     headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 413)
+        
+        response = self.app.post('/upload', data=b'{}', content_type='application/json',
+                                 headers={'Content-Encoding': 'br'})
+        self.assertEqual(response.status_code, 415)
+        
+        response = self.app.post('/upload', data=b'not gzip', content_type='application/json',
+                                 headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+        self.storage_mock.store_data.assert_not_called()
+    
+    def test_upload_batch_endpoint(self):
+        self.storage_mock.store_batch.side_effect = lambda records, date=None: {
+            'success': True, 'message': f'Stored {len(records)} records', 'stored': len(records)
+        }
+        second = dict(self.test_data, timestamp='2025-06-27T10:05:00')
+        previous_day = dict(self.test_data, timestamp='2025-06-26T23:55:00')
+        other_host = dict(self.test_data, ip_address='192.168.1.101')
+        lines = [self.test_data, 'not json', {'hostname': 'x'}, second, previous_day, other_host]
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines) + '\n'
+        response = self.app.post('/upload/batch', data=body, content_type='application/x-ndjson')
+        
+        # Las líneas inválidas se informan sin abortar el lote
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual((data['stored'], data['rejected'], data['failed']), (4, 2, 0))
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['stored', 'rejected', 'rejected', 'stored', 'stored', 'stored'])
+        
+        # Una escritura por IP y día (el del timestamp de cada snapshot)
+        calls = sorted((call.kwargs['date'], call.args[0][0]['ip_address'], len(call.args[0]))
+                       for call in self.storage_mock.store_batch.call_args_list)
+        self.assertEqual(calls, [('2025-06-26', '192.168.1.100', 1), ('2025-06-27', '192.168.1.100', 2),
+                                 ('2025-06-27', '192.168.1.101', 1)])
+        self.storage_mock.store_data.assert_not_called()
+        
+        # Solo acepta NDJSON
+        response = self.app.post('/upload/batch', json=self.test_data)
+        self.assertEqual(response.status_code, 400)
+    
+    def test_upload_batch_endpoint_partial_failures(self):
+        # Falla la escritura de un grupo: solo sus líneas quedan como "failed"
+        self.storage_mock.store_batch.side_effect = lambda records, date=None: (
+            {'success': False, 'message': 'Error storing data: disk full', 'stored': 0}
+            if records[0]['ip_address'] == '192.168.1.101'
+            else {'success': True, 'message': 'ok', 'stored': len(records)}
+        )
+        other_host = dict(self.test_data, ip_address='192.168.1.101')
+        body = (json.dumps(self.test_data) + '\n' + json.dumps(other_host) + '\n').encode('utf-8')
+        response = self.app.post('/upload/batch', data=body, content_type='application/x-ndjson')
+        data = json.loads(response.data)
+        self.assertFalse(data['success'])
+        self.assertEqual([result['status'] for result in data['results']], ['stored', 'failed'])
+        
+        # Un gzip truncado: las líneas completas ya leídas se almacenan igual
+        self.storage_mock.store_batch.side_effect = None
+        self.storage_mock.store_batch.return_value = {'success': True, 'message': 'ok', 'stored': 1}
+        compressed = gzip.compress(body * 500)
+        response = self.app.post('/upload/batch', data=compressed[:len(compressed) - 10],
+                                 content_type='application/x-ndjson', headers={'Content-Encoding': 'gzip'})
+        data = json.loads(response.data)
+        self.assertTrue(data['truncated'])
+        self.assertGreater(len(data['results']), 0)
+        self.assertTrue(all(result['status'] == 'stored' for result in data['results']))
+    
+    def test_upload_out_of_range_timestamp(self):
+        storage = JSONStorage(self.test_data_dir)
+        with patch('api_server.app.storage', storage):
+            # /upload guarda el snapshot en el archivo del día, como antes de indexar timestamps
+            response = self.app.post('/upload', json=dict(self.test_data, timestamp=1e20))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(json.loads(response.data)['success'])
+            
+            # /upload/batch rechaza solo esas líneas y guarda las demás
+            lines = [dict(self.test_data, timestamp=1e20), dict(self.test_data, timestamp=float('nan')),
+                     self.test_data]
+            body = ''.join(json.dumps(line) + '\n' for line in lines)
+            response = self.app.post('/upload/batch', data=body, content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertEqual([result['status'] for result in data['results']], ['rejected', 'rejected', 'stored'])
+            self.assertEqual(data['results'][0]['message'], 'Invalid timestamp')
+            self.assertEqual(len(storage.query_data('192.168.1.100', '2025-06-27')['data']), 1)
+    
+    def test_upload_endpoint_write_behind(self):
+        # Con escritura diferida la subida se confirma al quedar encolada
+        queue_mock = MagicMock()
+        queue_mock.submit.return_value = True
+        with patch('api_server.app.ingest_queue', queue_mock):
+            response = self.app.post('/upload', json=self.test_data)
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertTrue(data['success'])
+        self.assertTrue(data['queued'])
+        queue_mock.submit.assert_called_once_with(self.test_data)
+        self.storage_mock.store_data.assert_not_called()
+        
+        # Si la cola está llena se pide reintentar en lugar de adelantar el registro
+        queue_mock.submit.return_value = False
+        queue_mock.flush_interval = 1.0
+        with patch('api_server.app.ingest_queue', queue_mock):
+            response = self.app.post('/upload', json=self.test_data)
+        
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertFalse(json.loads(response.data)['success'])
+        self.storage_mock.store_data.assert_not_called()
+    
+    def test_upload_endpoint_delta(self):
+        from api_server.delta_sessions import DeltaSessions
+        from agent.delta import DeltaEncoder
+        
+        self.storage_mock.store_data.return_value = {'success': True, 'message': 'Data stored successfully', 'file_path': 'x.json'}
+        encoder = DeltaEncoder()
+        with patch('api_server.app.delta_sessions', DeltaSessions(self.test_data_dir)):
+            # Un delta sin base previa pide resincronizar
+            encoder.encode(self.test_data)
+            encoder.acknowledge()
+            changed = dict(self.test_data, timestamp='2025-06-27T10:01:00')
+            response = self.app.post('/upload', json=encoder.encode(changed))
+            self.assertEqual(response.status_code, 409)
+            self.assertTrue(json.loads(response.data)['resync'])
+            
+            # Keyframe y luego delta: se almacenan los snapshots completos
+            encoder.reset()
+            response = self.app.post('/upload', json=encoder.encode(self.test_data))
+            self.assertEqual(response.status_code, 200)
+            encoder.acknowledge()
+            response = self.app.post('/upload', json=encoder.encode(changed))
+            self.assertEqual(response.status_code, 200)
+        
+        stored = [call.args[0] for call in self.storage_mock.store_data.call_args_list]
+        self.assertEqual(stored, [self.test_data, changed])
+    
+    def test_upload_endpoint_partial_snapshots(self):
+        from api_server.partial_snapshots import PartialSnapshots
+        
+        self.storage_mock.store_data.return_value = {'success': True, 'message': 'Data stored successfully', 'file_path': 'x.json'}
+        self.storage_mock.store_batch.return_value = {'success': True, 'message': 'Stored', 'stored': 1}
+        identity = {key: self.test_data[key] for key in ('ip_address', 'hostname')}
+        full = dict(self.test_data, cpu_info={'model': 'Test CPU', 'avg_usage': 10.0},
+                    collected=['facts', 'cpu', 'processes', 'users'])
+        cpu_only = dict(identity, timestamp='2025-06-27T10:00:10', cpu_info={'avg_usage': 50.0}, collected=['cpu'])
+        with patch('api_server.app.partial_snapshots', PartialSnapshots(self.test_data_dir)):
+            self.assertEqual(self.app.post('/upload', json=full).status_code, 200)
+            self.assertEqual(self.app.post('/upload', json=cpu_only).status_code, 200)
+            
+            # Un snapshot reenviado anterior al último no se completa con valores posteriores
+            older = dict(identity, timestamp='2025-06-27T09:59:00', cpu_info={'avg_usage': 5.0}, collected=['cpu'])
+            response = self.app.post('/upload/batch', data=json.dumps(older) + '\n', content_type='application/x-ndjson')
+            self.assertEqual(json.loads(response.data)['stored'], 1)
+            
+            response = self.app.post('/upload', json=dict(cpu_only, collected='cpu'))
+            self.assertEqual(response.status_code, 400)
+        
+        # El parcial se almacena completo: los demás grupos conservan su último valor
+        stored = self.storage_mock.store_data.call_args_list[1].args[0]
+        self.assertEqual(stored['cpu_info'], {'model': 'Test CPU', 'avg_usage': 50.0})
+        self.assertEqual(stored['processes'], self.test_data['processes'])
+        self.assertEqual(stored['collected'], ['cpu'])
+        self.assertEqual(stored['timestamp'], '2025-06-27T10:00:10')
+        self.assertEqual(self.storage_mock.store_batch.call_args.args[0], [older])
+    
+    def test_metrics_endpoint(self):
+        self.storage_mock.store_data.return_value = {'success': True, 'message': 'Data stored successfully', 'file_path': 'x.json'}
+        for minute, usage in ((0, 20.0), (1, 40.0), (2, 60.0)):
+            snapshot = dict(self.test_data, timestamp=f'2025-06-27T10:0{minute}:00',
+                            cpu_info={'usage_percent': [usage, usage * 2], 'avg_usage': usage * 1.5})
+            self.app.post('/upload', json=snapshot)
+        
+        # Las series se extraen al almacenar y se leen por rango sin tocar los snapshots
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-27T10:01:00&to=2025-06-27T11:00:00'
+                                '&columns=cpu_avg,cpu_core_1,process_count,top_cpu_1')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['columns']['cpu_avg'], [60.0, 90.0])
+        self.assertEqual(data['columns']['cpu_core_1'], [80.0, 120.0])
+        self.assertEqual(data['columns']['process_count'], [2.0, 2.0])
+        self.assertEqual(data['columns']['top_cpu_1'], [10.5, 10.5])
+        self.assertEqual(data['columns']['ts'], [datetime(2025, 6, 27, 10, minute).timestamp() for minute in (1, 2)])
+        
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-27T10:00:00&to=2025-06-27T11:00:00&columns=../x')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/metrics?ip=10.0.0.1&from=2025-06-27T10:00:00&to=2025-06-27T11:00:00')
+        self.assertEqual(response.status_code, 404)
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_metrics_endpoint_rollups(self):
+        self.storage_mock.store_data.return_value = {'success': True, 'message': 'Data stored successfully', 'file_path': 'x.json'}
+        for timestamp, usage in (('2025-06-27T10:00:00', 20.0), ('2025-06-27T10:00:30', 40.0), ('2025-06-28T10:00:00', 60.0)):
+            snapshot = dict(self.test_data, timestamp=timestamp,
+                            cpu_info={'avg_usage': usage})
+            self.app.post('/upload', json=snapshot)
+        
+        # Un rango de dos meses con resolución automática devuelve buckets por hora
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-01T00:00:00&to=2025-07-31T00:00:00'
+                                '&resolution=auto&columns=cpu_avg')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['resolution'], '1h')
+        self.assertEqual(data['columns']['ts'], [datetime(2025, 6, day, 10).timestamp() for day in (27, 28)])
+        self.assertEqual(data['columns']['count'], [2.0, 1.0])
+        self.assertEqual(data['columns']['cpu_avg_max'], [40.0, 60.0])
+        self.assertEqual(data['columns']['cpu_avg_avg'], [30.0, 60.0])
+        self.assertNotIn('process_count_avg', data['columns'])
+        
+        # Un snapshot nuevo invalida los agregados del día
+        self.app.post('/upload', json=dict(self.test_data, timestamp='2025-06-28T23:00:00', cpu_info={'avg_usage': 80.0}))
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-28T00:00:00&to=2025-06-28T23:59:59&resolution=1d')
+        data = json.loads(response.data)
+        self.assertEqual(data['columns']['cpu_avg_min'], [60.0])
+        self.assertEqual(data['columns']['cpu_avg_max'], [80.0])
+        self.assertEqual(data['columns']['process_count_p95'], [2.0])
+        
+        # Los datos crudos siguen limitados a MAX_QUERY_RANGE
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-01T00:00:00&to=2025-07-31T00:00:00')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-27T00:00:00&resolution=5m')
+        self.assertEqual(response.status_code, 400)
+        response = self.app.get('/metrics?ip=192.168.1.100&from=2025-06-27T00:00:00&resolution=auto&max_points=0')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_health_endpoint_reports_ingest_queue(self):
+        queue_mock = MagicMock()
+        queue_mock.stats.return_value = {'queue_depth': 3, 'flush_lag_seconds': 0.5}
+        with patch('api_server.app.ingest_queue', queue_mock):
+            response = self.app.get('/health')
+        
+        data = json.loads(response.data)
+        self.assertEqual(data['ingest']['queue_depth'], 3)
+        self.assertEqual(data['ingest']['flush_lag_seconds'], 0.5)
+    
     def test_upload_endpoint_failure(self):
         # Configurar mock de almacenamiento para devolver fallo
         self.storage_mock.store_data.return_value = {
@@ -132,7 +399,7 @@ class TestAPIApp(unittest.TestCase):
         self.assertEqual(data['data'][0]['ip_address'], '192.168.1.100')
         
         # Verificar que el mock fue llamado con los parámetros correctos
-        self.storage_mock.query_data.assert_called_once_with('192.168.1.100', None)
+        self.storage_mock.query_data.assert_called_once_with('192.168.1.100', None, stream=True)
     
     def test_query_endpoint_with_ip_and_date(self):
         # Configurar mock para devolver datos de prueba
@@ -145,7 +412,122 @@ class TestAPIApp(unittest.TestCase):
         # Probar GET a /query con parámetros IP y fecha
         response = self.app.get('/query?ip=192.168.1.100&date=2025-06-27')
         
-        self.storage_mock.query_data.assert_called_once_with('192.168.1.100', '2025-06-27')
+        self.storage_mock.query_data.assert_called_once_with('192.168.1.100', '2025-06-27', stream=True)
+    
+    def test_query_endpoint_with_time_range(self):
+        self.storage_mock.query_range.return_value = {
+            'success': True,
+            'message': 'Data retrieved successfully',
+            'data': [self.test_data]
+        }
+        
+        # Probar GET a /query con un rango que abarca dos días
+        response = self.app.get('/query?ip=192.168.1.100&from=2025-06-26T22:00:00&to=2025-06-27T10:00:00')
+        
+        self.assertEqual(response.status_code, 200)
+        self.storage_mock.query_range.assert_called_once_with(
+            '192.168.1.100', datetime(2025, 6, 26, 22, 0), datetime(2025, 6, 27, 10, 0), stream=True)
+        self.storage_mock.query_data.assert_not_called()
+    
+    def test_query_endpoint_streams_json_array(self):
+        # Los registros llegan como iterador y se envían por partes
+        self.storage_mock.query_data.return_value = {
+            'success': True,
+            'message': 'Data retrieved successfully',
+            'data': iter([self.test_data, self.test_data])
+        }
+        
+        response = self.app.get('/query?ip=192.168.1.100')
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_streamed)
+        data = json.loads(response.data)
+        self.assertEqual(data['message'], 'Data retrieved successfully')
+        self.assertEqual(data['data'], [self.test_data, self.test_data])
+    
+    def test_query_endpoint_streams_ndjson(self):
+        self.storage_mock.query_data.return_value = {
+            'success': True,
+            'message': 'Data retrieved successfully',
+            'data': iter([self.test_data, self.test_data])
+        }
+        
+        response = self.app.get('/query?ip=192.168.1.100', headers={'Accept': 'application/x-ndjson'})
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = response.data.decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [self.test_data, self.test_data])
+    
+    def test_query_endpoint_stream_error_is_reported(self):
+        # Un error de lectura a mitad del stream no debe parecer un resultado completo
+        def failing_records():
+            yield self.test_data
+            raise OSError('disk read failed')
+        
+        self.storage_mock.query_data.return_value = {
+            'success': True,
+            'message': 'Data retrieved successfully',
+            'data': failing_records()
+        }
+        response = self.app.get('/query?ip=192.168.1.100')
+        data = json.loads(response.data)
+        self.assertFalse(data['success'])
+        self.assertIn('disk read failed', data['error'])
+        self.assertEqual(data['data'], [self.test_data])
+        
+        self.storage_mock.query_data.return_value['data'] = failing_records()
+        response = self.app.get('/query?ip=192.168.1.100', headers={'Accept': 'application/x-ndjson'})
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual(lines[0], self.test_data)
+        self.assertEqual(lines[-1]['success'], False)
+        self.assertIn('disk read failed', lines[-1]['error'])
+    
+    def test_query_endpoint_fields_and_filter(self):
+        self.storage_mock.query_data.return_value = {
+            'success': True,
+            'message': 'Data retrieved successfully',
+            'data': iter([self.test_data])
+        }
+        
+        response = self.app.get('/query?ip=192.168.1.100&fields=timestamp,processes.name&filter=processes.cpu_percent>10')
+        
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['data'], [{'timestamp': '2025-06-27T10:00:00', 'processes': [{'name': 'process1'}]}])
+    
+    def test_query_endpoint_invalid_filter(self):
+        response = self.app.get('/query?ip=192.168.1.100&filter=cpu')
+        
+        self.assertEqual(response.status_code, 400)
+        self.storage_mock.query_data.assert_not_called()
+    
+    def test_query_endpoint_invalid_time_range(self):
+        # Timestamp inválido, rango invertido y rango demasiado amplio
+        for query in ('from=yesterday', 'from=2025-06-27T10:00:00&to=2025-06-27T09:00:00',
+                      'from=2025-01-01T00:00:00&to=2025-06-27T00:00:00'):
+            response = self.app.get(f'/query?ip=192.168.1.100&{query}')
+            self.assertEqual(response.status_code, 400)
+        self.storage_mock.query_range.assert_not_called()
+    
+    def test_query_endpoint_timezone_aware_range(self):
+        # Los timestamps con zona horaria se convierten a hora local y pueden
+        # combinarse con timestamps sin zona
+        self.storage_mock.query_range.return_value = {
+            'success': True,
+            'message': 'Data retrieved successfully',
+            'data': iter([])
+        }
+        for query in ('from=2025-06-27T09:00:00Z&to=2025-06-27T10:00:00Z',
+                      'from=2025-06-27T09:00:00%2B00:00&to=2025-06-27T10:00:00'):
+            response = self.app.get(f'/query?ip=192.168.1.100&{query}')
+            self.assertEqual(response.status_code, 200)
+        
+        start, end = self.storage_mock.query_range.call_args[0][1:3]
+        self.assertIsNone(start.tzinfo)
+        self.assertIsNone(end.tzinfo)
+        expected = datetime(2025, 6, 27, 9, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+        self.assertEqual(start, expected)
     
     def test_query_endpoint_no_ip(self):
         # Probar GET a /query sin parámetro IP (debería devolver 400)
@@ -154,7 +536,7 @@ class TestAPIApp(unittest.TestCase):
         # Verify response
         self.assertEqual(response.status_code, 400)
         data = json.loads(response.data)
-{{ ... }}
+        self.assertFalse(data['success'])
         self.assertIn('IP address is required', data['message'])
     
     def test_list_endpoint(self):
@@ -180,6 +562,79 @@ class TestAPIApp(unittest.TestCase):
         
         # Verificar que el mock fue llamado
         self.storage_mock.list_available_data.assert_called_once()
+    
+    def test_list_endpoint_pagination(self):
+        storage = JSONStorage(self.test_data_dir)
+        with patch('api_server.app.storage', storage):
+            for ip_address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+                storage.store_data(dict(self.test_data, ip_address=ip_address))
+            
+            data = json.loads(self.app.get('/list?limit=2').data)
+            self.assertEqual([item['ip_address'] for item in data['available_data']], ['10.0.0.1', '10.0.0.2'])
+            data = json.loads(self.app.get(f"/list?limit=2&cursor={data['next_cursor']}").data)
+            self.assertEqual([item['ip_address'] for item in data['available_data']], ['10.0.0.3'])
+            self.assertIsNone(data['next_cursor'])
+            
+            data = json.loads(self.app.get('/list?ip=10.0.0.2&from=2000-01-01').data)
+            self.assertEqual(len(data['available_data']), 1)
+            self.assertEqual(data['available_data'][0]['records'], 1)
+            
+            for query in ('limit=0', 'cursor=bad', 'from=2025-13-01'):
+                self.assertEqual(self.app.get(f'/list?{query}').status_code, 400)
+    
+    def test_query_cache_and_etag(self):
+        storage = JSONStorage(self.test_data_dir)
+        with patch('api_server.app.storage', storage):
+            storage.store_data(self.test_data)
+            first = self.app.get('/query?ip=192.168.1.100')
+            # La respuesta se guarda al terminar de enviarse
+            self.assertEqual(len(json.loads(first.data)['data']), 1)
+            self.assertEqual(first.headers['X-Cache'], 'MISS')
+            etag = first.headers['ETag']
+            
+            # La misma consulta se sirve desde la caché sin leer el archivo
+            with patch.object(storage, 'query_data', side_effect=AssertionError('storage read')):
+                second = self.app.get('/query?ip=192.168.1.100')
+                self.assertEqual(second.headers['X-Cache'], 'HIT')
+                self.assertEqual(second.data, first.data)
+                
+                # Un cliente con la versión vigente recibe 304 sin cuerpo
+                response = self.app.get('/query?ip=192.168.1.100', headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.data, b'')
+            
+            # Una escritura en otra IP no invalida la respuesta; una en la misma IP y día sí
+            storage.store_data(dict(self.test_data, ip_address='10.0.0.1'))
+            self.assertEqual(self.app.get('/query?ip=192.168.1.100').headers['X-Cache'], 'HIT')
+            storage.store_data(self.test_data)
+            response = self.app.get('/query?ip=192.168.1.100', headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers['X-Cache'], 'MISS')
+            self.assertEqual(len(json.loads(response.data)['data']), 2)
+            
+            # /list también se guarda hasta que cambie el listado
+            self.assertEqual(self.app.get('/list').headers['X-Cache'], 'MISS')
+            self.assertEqual(self.app.get('/list').headers['X-Cache'], 'HIT')
+            
+            stats = json.loads(self.app.get('/health').data)['query_cache']
+            self.assertEqual(stats['hits'], 3)
+            self.assertEqual(stats['not_modified'], 1)
+            self.assertEqual(stats['invalidations'], 1)
+    
+    def test_query_cache_skips_failed_streams(self):
+        def failing_records():
+            yield self.test_data
+            raise OSError('disk read failed')
+        
+        self.storage_mock.data_version.return_value = []
+        self.storage_mock.query_data.side_effect = lambda *args, **kwargs: {
+            'success': True, 'message': 'Data retrieved successfully', 'data': failing_records()
+        }
+        self.app.get('/query?ip=192.168.1.100&date=2025-06-27')
+        response = self.app.get('/query?ip=192.168.1.100&date=2025-06-27')
+        # Un resultado truncado no se guarda: se vuelve a leer del almacenamiento
+        self.assertEqual(response.headers['X-Cache'], 'MISS')
+        self.assertEqual(self.storage_mock.query_data.call_count, 2)
 
 if __name__ == '__main__':
     unittest.main()
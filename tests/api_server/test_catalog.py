@@ -0,0 +1,60 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.catalog import Catalog, decode_cursor, encode_cursor
+
+
+class TestCatalog(unittest.TestCase):
+    
+    def setUp(self):
+        self.test_data_dir = tempfile.mkdtemp()
+        self.catalog = Catalog(self.test_data_dir)
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def test_add_accumulates_records_and_bounds(self):
+        self.assertTrue(self.catalog.created)
+        self.catalog.add('fe80::1', '2025-06-27', [{'timestamp': '2025-06-27T10:00:00'}], 100)
+        self.catalog.add('fe80::1', '2025-06-27', [{'timestamp': '2025-06-27T09:00:00'}, {'timestamp': 'invalid'}], 50)
+        
+        rows, cursor = self.catalog.page()
+        self.assertIsNone(cursor)
+        ip_address, date_str, records, size, first, last, _ = rows[0]
+        self.assertEqual((ip_address, date_str, records, size), ('fe80::1', '2025-06-27', 3, 150))
+        self.assertLess(first, last)
+        # Una segunda instancia abre el catálogo existente sin marcarlo como nuevo
+        self.assertFalse(Catalog(self.test_data_dir).created)
+    
+    def test_pages_and_filters(self):
+        for day in range(1, 6):
+            for ip_address in ('10.0.0.1', 'host_a'):
+                self.catalog.add(ip_address, f'2025-06-0{day}', [{}], 10)
+        
+        seen, cursor = [], None
+        while True:
+            rows, cursor = self.catalog.page(limit=3, cursor=cursor)
+            seen.extend((row[1], row[0]) for row in rows)
+            if cursor is None:
+                break
+        # Todas las entradas una sola vez, ordenadas por fecha e IP
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(seen, sorted(seen))
+        
+        rows, _ = self.catalog.page(ip_address='host_a', start_date='2025-06-02', end_date='2025-06-03')
+        self.assertEqual([(row[0], row[1]) for row in rows], [('host_a', '2025-06-02'), ('host_a', '2025-06-03')])
+    
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor('2025-06-27', 'fe80::1')), ('2025-06-27', 'fe80::1'))
+        with self.assertRaises(ValueError):
+            decode_cursor('not-a-cursor')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import sys
+import gzip
+import json
+import shutil
+import tempfile
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.compaction import (
+    CompactedFile, blocks_path, iter_compacted, load_compacted_index, read_blocks, temp_path, write_compacted
+)
+from api_server.record_index import index_path, read_record
+
+
+class TestCompaction(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_data_dir, '10.0.0.1_2025-06-27.jsonl.gz')
+        self.records = [
+            {'timestamp': f'2025-06-27 10:{minute:02d}:00', 'seq': minute, 'note': 'ñ' * minute}
+            for minute in range(50)
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+
+    def _compact(self, block_size=256):
+        self.assertEqual(write_compacted(self.path, self.records, block_size=block_size), len(self.records))
+        os.replace(temp_path(self.path), self.path)
+
+    def test_round_trip_in_blocks(self):
+        self._compact()
+        blocks, content_size = read_blocks(self.path)
+        self.assertGreater(len(blocks), 1)
+
+        # Cualquier herramienta gzip lee el archivo completo (miembros concatenados)
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            self.assertEqual([json.loads(line) for line in f], self.records)
+        self.assertEqual(list(iter_compacted(self.path)), self.records)
+
+        # Lectura por posición de registros sueltos, descomprimiendo solo su bloque
+        entries = load_compacted_index(self.path)
+        self.assertEqual(len(entries), len(self.records))
+        self.assertEqual(entries[-1][1] + entries[-1][2], content_size)
+        f = CompactedFile(self.path)
+        try:
+            for index in (49, 0, 23):
+                _, offset, length = entries[index]
+                self.assertEqual(read_record(f, offset, length), self.records[index])
+        finally:
+            f.close()
+
+    def test_missing_sidecars_are_rebuilt(self):
+        self._compact()
+        entries = load_compacted_index(self.path)
+        blocks = read_blocks(self.path)
+        os.remove(blocks_path(self.path))
+        os.remove(index_path(self.path))
+
+        self.assertEqual(load_compacted_index(self.path), entries)
+        self.assertEqual(read_blocks(self.path), blocks)
+
+    def test_sidecars_of_another_file_are_rebuilt(self):
+        # Archivos laterales de una compactación anterior (otro tamaño) no se usan
+        self._compact(block_size=128)
+        self.records = self.records[:10]
+        write_compacted(self.path, self.records)
+        self.assertIsNone(read_blocks(self.path))
+
+        entries = load_compacted_index(self.path)
+        self.assertEqual(len(entries), 50)
+        f = CompactedFile(self.path)
+        try:
+            self.assertEqual(read_record(f, entries[30][1], entries[30][2])['seq'], 30)
+        finally:
+            f.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+from datetime import datetime
+from unittest.mock import MagicMock
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.ingest import IngestQueue
+from api_server.storage import JSONStorage, JSONLinesStorage
+
+class TestIngestQueue(unittest.TestCase):
+    
+    def setUp(self):
+        # Crear un directorio temporal para pruebas
+        self.test_data_dir = tempfile.mkdtemp()
+        self.test_date = datetime.now().strftime('%Y-%m-%d')
+        self.queues = []
+    
+    def tearDown(self):
+        for queue in self.queues:
+            queue.stop()
+        shutil.rmtree(self.test_data_dir)
+    
+    def _queue(self, storage, **options):
+        queue = IngestQueue(storage, **options)
+        self.queues.append(queue)
+        return queue
+    
+    def _record(self, ip, i):
+        return {'ip_address': ip, 'hostname': 'test-host', 'timestamp': f'2025-06-27 12:00:{i % 60:02d}', 'seq': i}
+    
+    def test_flush_groups_by_ip_and_preserves_order(self):
+        storage = JSONLinesStorage(self.test_data_dir)
+        queue = self._queue(storage, batch_size=1000, flush_interval=60)
+        
+        for i in range(30):
+            self.assertTrue(queue.submit(self._record('10.0.0.1' if i % 2 else '10.0.0.2', i)))
+        
+        # Nada se escribe hasta alcanzar el tamaño o el intervalo
+        self.assertEqual(queue.stats()['queue_depth'], 30)
+        self.assertFalse(storage.has_data('10.0.0.1', self.test_date))
+        
+        self.assertTrue(queue.flush(timeout=10))
+        
+        for ip, parity in (('10.0.0.1', 1), ('10.0.0.2', 0)):
+            records = storage.query_data(ip)['data']
+            self.assertEqual([r['seq'] for r in records], [i for i in range(30) if i % 2 == parity])
+        stats = queue.stats()
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['flushed_records'], 30)
+        self.assertEqual(stats['flushes'], 2)
+    
+    def test_on_stored_receives_written_groups(self):
+        storage = JSONLinesStorage(self.test_data_dir)
+        stored = []
+        queue = self._queue(storage, batch_size=1000, flush_interval=60, on_stored=stored.extend)
+        for i in range(5):
+            queue.submit(self._record('10.0.0.1', i))
+        
+        self.assertTrue(queue.flush(timeout=10))
+        self.assertEqual([r['seq'] for r in stored], list(range(5)))
+    
+    def test_size_threshold_triggers_flush(self):
+        storage = MagicMock()
+        storage.store_batch.return_value = {'success': True, 'message': 'ok'}
+        queue = self._queue(storage, batch_size=5, flush_interval=60)
+        
+        for i in range(5):
+            queue.submit(self._record('10.0.0.1', i))
+        
+        deadline = time.monotonic() + 5
+        while not storage.store_batch.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        records = storage.store_batch.call_args[0][0]
+        self.assertEqual([r['seq'] for r in records], list(range(5)))
+        self.assertEqual(storage.store_batch.call_args[1], {'date': self.test_date, 'fsync': False})
+    
+    def test_time_threshold_triggers_flush(self):
+        storage = JSONStorage(self.test_data_dir)
+        queue = self._queue(storage, batch_size=1000, flush_interval=0.05)
+        
+        queue.submit(self._record('10.0.0.1', 1))
+        
+        deadline = time.monotonic() + 5
+        while queue.stats()['queue_depth'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        self.assertEqual(len(storage.query_data('10.0.0.1')['data']), 1)
+    
+    def test_fsync_policy(self):
+        storage = MagicMock()
+        storage.store_batch.return_value = {'success': True, 'message': 'ok'}
+        queue = self._queue(storage, batch_size=1000, flush_interval=60, fsync='batch')
+        
+        queue.submit(self._record('10.0.0.1', 1))
+        queue.flush(timeout=5)
+        
+        self.assertTrue(storage.store_batch.call_args[1]['fsync'])
+        
+        with self.assertRaises(ValueError):
+            IngestQueue(storage, fsync='always')
+    
+    def test_full_queue_rejects_records(self):
+        storage = MagicMock()
+        queue = self._queue(storage, batch_size=1000, flush_interval=60, max_pending=2)
+        
+        self.assertTrue(queue.submit(self._record('10.0.0.1', 1)))
+        self.assertTrue(queue.submit(self._record('10.0.0.1', 2)))
+        self.assertFalse(queue.submit(self._record('10.0.0.1', 3)))
+    
+    def test_failed_flush_is_retried(self):
+        storage = MagicMock()
+        storage.store_batch.side_effect = [
+            {'success': False, 'message': 'Error storing data: disk full'},
+            {'success': True, 'message': 'ok'}
+        ]
+        queue = self._queue(storage, batch_size=1000, flush_interval=0.05)
+        
+        queue.submit(self._record('10.0.0.1', 1))
+        
+        self.assertTrue(queue.flush(timeout=5))
+        self.assertEqual(storage.store_batch.call_count, 2)
+        stats = queue.stats()
+        self.assertEqual(stats['failed_flushes'], 1)
+        self.assertEqual(stats['flushed_records'], 1)
+        self.assertIn('disk full', stats['last_error'])
+    
+    def test_stop_flushes_pending_records(self):
+        storage = JSONLinesStorage(self.test_data_dir)
+        queue = self._queue(storage, batch_size=1000, flush_interval=60)
+        
+        # Subidas concurrentes desde varios hilos
+        def submit_many(worker):
+            for i in range(50):
+                queue.submit(self._record('10.0.0.1', worker * 50 + i))
+        threads = [threading.Thread(target=submit_many, args=(w,)) for w in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertTrue(queue.stop(timeout=10))
+        self.assertFalse(queue.submit(self._record('10.0.0.1', 999)))
+        
+        records = storage.query_data('10.0.0.1')['data']
+        self.assertEqual(sorted(r['seq'] for r in records), list(range(200)))
+    
+    def test_stats_report_flush_lag(self):
+        queue = self._queue(MagicMock(), batch_size=1000, flush_interval=60)
+        self.assertEqual(queue.stats()['flush_lag_seconds'], 0.0)
+        
+        queue.submit(self._record('10.0.0.1', 1))
+        time.sleep(0.05)
+        
+        stats = queue.stats()
+        self.assertEqual(stats['queue_depth'], 1)
+        self.assertEqual(stats['pending_groups'], 1)
+        self.assertGreaterEqual(stats['flush_lag_seconds'], 0.04)
+
+if __name__ == '__main__':
+    unittest.main()
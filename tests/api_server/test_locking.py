@@ -0,0 +1,83 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import threading
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.locking import KeyedLocks, LOCK_STRIPES, LOCKS_DIRNAME, key_lock, lock_path
+
+class TestKeyedLocks(unittest.TestCase):
+    
+    def setUp(self):
+        self.test_data_dir = tempfile.mkdtemp()
+        self.locks = KeyedLocks()
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def test_different_keys_do_not_contend(self):
+        # Mientras una clave está bloqueada, otra clave debe poder obtenerse de inmediato
+        acquired = threading.Event()
+        with key_lock(self.locks, self.test_data_dir, '10.0.0.1_2025-06-27'):
+            thread = threading.Thread(target=self._acquire, args=('10.0.0.2_2025-06-27', acquired))
+            thread.start()
+            self.assertTrue(acquired.wait(timeout=2))
+            thread.join()
+    
+    def test_same_key_is_exclusive(self):
+        acquired = threading.Event()
+        with key_lock(self.locks, self.test_data_dir, '10.0.0.1_2025-06-27'):
+            thread = threading.Thread(target=self._acquire, args=('10.0.0.1_2025-06-27', acquired))
+            thread.start()
+            self.assertFalse(acquired.wait(timeout=0.2))
+        self.assertTrue(acquired.wait(timeout=2))
+        thread.join()
+    
+    def test_locks_are_released(self):
+        # Los bloqueos sin uso se descartan y el archivo de bloqueo queda en data/.locks
+        with key_lock(self.locks, self.test_data_dir, 'key'):
+            self.assertEqual(len(self.locks), 1)
+        self.assertEqual(len(self.locks), 0)
+        self.assertTrue(os.path.exists(lock_path(self.test_data_dir, 'key')))
+    
+    def test_lock_files_are_bounded(self):
+        # Las claves comparten un número fijo de archivos de bloqueo por ámbito
+        for day in range(1, 29):
+            for host in range(100):
+                with key_lock(self.locks, self.test_data_dir, f'10.0.0.{host}_2025-02-{day:02d}'):
+                    pass
+        self.assertLessEqual(len(os.listdir(os.path.join(self.test_data_dir, LOCKS_DIRNAME))), LOCK_STRIPES)
+    
+    def test_nested_scopes_do_not_share_files(self):
+        # Dos claves del mismo archivo en el ámbito por defecto
+        stripes = {}
+        for index in range(LOCK_STRIPES + 1):
+            key = f'key{index}'
+            path = lock_path(self.test_data_dir, key)
+            if path in stripes:
+                break
+            stripes[path] = key
+        outer, inner = stripes[path], key
+        self.assertNotEqual(lock_path(self.test_data_dir, outer, 'rollups'), lock_path(self.test_data_dir, inner))
+        
+        # Anidar bloqueos de ámbitos distintos no espera por el archivo ya tomado
+        acquired = threading.Event()
+        def nested():
+            with key_lock(KeyedLocks(), self.test_data_dir, outer, scope='rollups'):
+                with key_lock(KeyedLocks(), self.test_data_dir, inner):
+                    acquired.set()
+        thread = threading.Thread(target=nested, daemon=True)
+        thread.start()
+        self.assertTrue(acquired.wait(timeout=2))
+        thread.join()
+    
+    def _acquire(self, key, event):
+        with key_lock(self.locks, self.test_data_dir, key):
+            event.set()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import datetime
+from unittest.mock import MagicMock
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.metrics_store import MetricsStore, extract_metrics, rebuild
+
+
+class TestMetricsStore(unittest.TestCase):
+    
+    def setUp(self):
+        self.test_data_dir = tempfile.mkdtemp()
+        self.metrics = MetricsStore(self.test_data_dir, top_n=2)
+        self.start = datetime.datetime(2025, 6, 27, 10, 0, 0)
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def snapshot(self, seconds, usage, processes=3):
+        return {
+            'ip_address': '192.168.1.100',
+            'timestamp': (self.start + datetime.timedelta(seconds=seconds)).isoformat(),
+            'cpu_info': {'usage_percent': [usage, usage * 2]},
+            'processes': [{'pid': n, 'cpu_percent': float(n), 'memory_percent': 10.0 - n} for n in range(processes)]
+        }
+    
+    def test_extract_metrics(self):
+        row = extract_metrics(self.snapshot(0, 10.0), top_n=2)
+        # Sin avg_usage, el promedio se calcula con los núcleos
+        self.assertEqual(row['cpu_avg'], 15.0)
+        self.assertEqual((row['cpu_core_0'], row['cpu_core_1']), (10.0, 20.0))
+        self.assertEqual(row['process_count'], 3.0)
+        self.assertEqual((row['top_cpu_1'], row['top_cpu_2']), (2.0, 1.0))
+        self.assertEqual((row['top_mem_1'], row['top_mem_2']), (10.0, 9.0))
+        self.assertNotIn('top_cpu_3', row)
+        self.assertIsNone(extract_metrics({'timestamp': 'invalid'}))
+    
+    def test_read_range_across_days(self):
+        late = {'ip_address': '192.168.1.100', 'timestamp': '2025-06-28T00:00:30', 'cpu_info': {'avg_usage': 99.0}}
+        self.metrics.append([self.snapshot(seconds, float(seconds)) for seconds in range(0, 100, 10)] + [late])
+        
+        series = self.metrics.read('192.168.1.100', self.start + datetime.timedelta(seconds=25),
+                                   datetime.datetime(2025, 6, 28, 1), ['cpu_avg', 'process_count'])
+        self.assertEqual(series['cpu_avg'], [45.0, 60.0, 75.0, 90.0, 105.0, 120.0, 135.0, 99.0])
+        # Las métricas que un snapshot no tiene se devuelven como None
+        self.assertEqual(series['process_count'], [3.0] * 7 + [None])
+        self.assertEqual(len(series['ts']), 8)
+    
+    def test_out_of_order_rows_stay_sorted(self):
+        self.metrics.append([self.snapshot(seconds, 1.0) for seconds in (30, 40)])
+        # Un snapshot reenviado desde el spool, anterior al último del día
+        self.metrics.append([self.snapshot(10, 2.0, processes=5)])
+        
+        series = self.metrics.read('192.168.1.100', self.start, self.start + datetime.timedelta(hours=1))
+        self.assertEqual([ts - self.start.timestamp() for ts in series['ts']], [10.0, 30.0, 40.0])
+        self.assertEqual(series['process_count'], [5.0, 3.0, 3.0])
+        self.assertEqual(series['cpu_core_0'], [2.0, 1.0, 1.0])
+    
+    def test_new_columns_are_padded(self):
+        first = self.snapshot(0, 1.0)
+        second = dict(self.snapshot(10, 1.0), cpu_info={'usage_percent': [1.0, 2.0, 3.0]})
+        self.metrics.append([first])
+        self.metrics.append([second])
+        
+        series = self.metrics.read('192.168.1.100', self.start, self.start + datetime.timedelta(hours=1), ['cpu_core_2'])
+        self.assertEqual(series['cpu_core_2'], [None, 3.0])
+    
+    def test_rebuild_from_storage(self):
+        storage = MagicMock()
+        storage.list_available_data.return_value = {
+            'success': True, 'message': '', 'available_data': [{'ip_address': '192.168.1.100', 'date': '2025-06-27'}]
+        }
+        storage.query_data.return_value = {'success': True, 'message': '', 'data': iter([self.snapshot(0, 1.0)])}
+        self.metrics.append([self.snapshot(50, 5.0)])
+        
+        # La reconstrucción descarta las series anteriores
+        self.assertEqual(rebuild(storage, self.metrics), 1)
+        series = self.metrics.read('192.168.1.100', self.start, self.start + datetime.timedelta(hours=1), ['cpu_avg'])
+        self.assertEqual(series['cpu_avg'], [1.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
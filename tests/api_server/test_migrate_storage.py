@@ -0,0 +1,120 @@
+import unittest
+import os
+import sys
+import json
+import shutil
+import tempfile
+from unittest.mock import patch
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.storage import JSONLinesStorage
+from api_server.catalog import CATALOG_DB
+from api_server.migrate_storage import migrate_directory, migrate_file, _write_marker
+
+class TestMigrateStorage(unittest.TestCase):
+    
+    def setUp(self):
+        # Crear un directorio temporal con un archivo heredado
+        self.test_data_dir = tempfile.mkdtemp()
+        self.records = [
+            {'ip_address': '10.0.0.1', 'hostname': 'host', 'timestamp': f'2025-06-27 12:0{i}:00'}
+            for i in range(3)
+        ]
+        self.legacy_path = os.path.join(self.test_data_dir, '10.0.0.1_2025-06-27.json')
+        with open(self.legacy_path, 'w') as f:
+            json.dump(self.records, f, indent=2)
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def test_migrate_directory(self):
+        result = migrate_directory(self.test_data_dir)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['migrated'], [{'filename': '10.0.0.1_2025-06-27.json', 'records': 3}])
+        self.assertFalse(os.path.exists(self.legacy_path))
+        
+        storage = JSONLinesStorage(self.test_data_dir)
+        self.assertEqual(list(storage.iter_records('10.0.0.1', '2025-06-27')), self.records)
+    
+    def test_migrate_keeps_order_with_existing_segments(self):
+        # Registros escritos después del cambio de backend deben quedar al final
+        storage = JSONLinesStorage(self.test_data_dir)
+        newer = {'ip_address': '10.0.0.1', 'hostname': 'host', 'timestamp': '2025-06-27 13:00:00'}
+        storage.append_records('10.0.0.1', '2025-06-27', [newer])
+        
+        result = migrate_directory(self.test_data_dir, keep_source=True)
+        
+        self.assertTrue(result['success'])
+        self.assertTrue(os.path.exists(self.legacy_path + '.migrated'))
+        self.assertEqual(list(storage.iter_records('10.0.0.1', '2025-06-27')), self.records + [newer])
+
+    def test_interrupted_migration_is_completed_without_duplicates(self):
+        # Interrupción después de colocar los segmentos pero antes de retirar el
+        # archivo heredado: la siguiente ejecución no debe duplicar registros
+        storage = JSONLinesStorage(self.test_data_dir)
+        newer = {'ip_address': '10.0.0.1', 'hostname': 'host', 'timestamp': '2025-06-27 13:00:00'}
+        storage.append_records('10.0.0.1', '2025-06-27', [newer])
+        
+        real_remove = os.remove
+        def failing_remove(path):
+            if path == self.legacy_path:
+                raise OSError('simulated crash')
+            real_remove(path)
+        
+        with patch('api_server.migrate_storage.os.remove', side_effect=failing_remove):
+            result = migrate_directory(self.test_data_dir)
+        self.assertFalse(result['success'])
+        self.assertTrue(os.path.exists(self.legacy_path + '.migrating'))
+        
+        result = migrate_directory(self.test_data_dir)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['migrated'], [{'filename': '10.0.0.1_2025-06-27.json', 'records': 4}])
+        self.assertFalse(os.path.exists(self.legacy_path))
+        self.assertFalse(os.path.exists(self.legacy_path + '.migrating'))
+        self.assertEqual(list(storage.iter_records('10.0.0.1', '2025-06-27')), self.records + [newer])
+    
+    def test_migration_interrupted_before_marker_is_repeated(self):
+        # Sin marcador nada cambió: la migración se repite desde el archivo heredado
+        with patch('api_server.migrate_storage._write_marker', side_effect=OSError('simulated crash')):
+            result = migrate_directory(self.test_data_dir)
+        self.assertFalse(result['success'])
+        self.assertTrue(os.path.exists(self.legacy_path))
+        
+        result = migrate_directory(self.test_data_dir)
+        
+        self.assertTrue(result['success'])
+        storage = JSONLinesStorage(self.test_data_dir)
+        self.assertEqual(list(storage.iter_records('10.0.0.1', '2025-06-27')), self.records)
+        # Además del segmento solo quedan el catálogo (actualizado con su índice lateral) y los bloqueos
+        files = [name for name in os.listdir(self.test_data_dir)
+                 if not name.startswith('.') and not name.endswith('.idx')]
+        self.assertEqual(files, ['10.0.0.1_2025-06-27.0000.jsonl'])
+        self.assertTrue(os.path.exists(os.path.join(self.test_data_dir, CATALOG_DB)))
+
+    def test_temp_segments_are_synced_before_marker(self):
+        # Un marcador en disco no debe apuntar a segmentos temporales que no lo están
+        synced = set()
+        real_fsync = os.fsync
+        def fsync(fd):
+            synced.add(os.fstat(fd).st_ino)
+            real_fsync(fd)
+        def write_marker(source_path, content):
+            temp_paths = [os.path.join(self.test_data_dir, name) for name in os.listdir(self.test_data_dir)
+                          if name.endswith('.jsonl.tmp')]
+            self.assertEqual(len(temp_paths), content['segments'])
+            self.assertTrue(all(os.stat(path).st_ino in synced for path in temp_paths))
+            _write_marker(source_path, content)
+        
+        storage = JSONLinesStorage(self.test_data_dir, max_segment_bytes=100)
+        with patch('api_server.migrate_storage.os.fsync', side_effect=fsync), \
+                patch('api_server.migrate_storage._write_marker', side_effect=write_marker):
+            result = migrate_file(storage, '10.0.0.1_2025-06-27.json')
+        self.assertTrue(result['success'])
+        self.assertEqual(len(storage.segment_paths('10.0.0.1', '2025-06-27')), 3)
+
+if __name__ == '__main__':
+    unittest.main()
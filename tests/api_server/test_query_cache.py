@@ -0,0 +1,57 @@
+import unittest
+import os
+import sys
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.query_cache import QueryCache, make_etag
+
+
+class TestQueryCache(unittest.TestCase):
+    
+    def test_hit_and_invalidation(self):
+        cache = QueryCache()
+        key = ('query', '192.168.1.100', '2025-06-27')
+        etag = make_etag(key, [('a.json', 10, 1)])
+        self.assertIsNone(cache.get(key, etag))
+        cache.put(key, etag, b'{}', 'application/json')
+        
+        self.assertEqual(cache.get(key, etag)[1], b'{}')
+        # Con otra versión de los datos la entrada deja de valer y se descarta
+        self.assertIsNone(cache.get(key, make_etag(key, [('a.json', 20, 2)])))
+        self.assertEqual(len(cache), 0)
+        
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (1, 2, 1))
+        self.assertEqual(stats['bytes'], 0)
+    
+    def test_lru_eviction_by_entries_and_bytes(self):
+        cache = QueryCache(max_entries=2, max_bytes=100, max_entry_bytes=60)
+        cache.put(('a',), '"a"', b'x' * 10, 'application/json')
+        cache.put(('b',), '"b"', b'x' * 10, 'application/json')
+        # Usar "a" la convierte en la más reciente: se desaloja "b"
+        cache.get(('a',), '"a"')
+        cache.put(('c',), '"c"', b'x' * 10, 'application/json')
+        self.assertIsNone(cache.get(('b',), '"b"'))
+        self.assertIsNotNone(cache.get(('a',), '"a"'))
+        
+        # Por bytes: 60 + 60 superan el máximo y se desalojan las menos usadas
+        cache.put(('d',), '"d"', b'x' * 60, 'application/json')
+        cache.put(('e',), '"e"', b'x' * 60, 'application/json')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.stats()['bytes'], 60)
+        self.assertEqual(cache.stats()['evictions'], 4)
+        
+        # Una respuesta mayor que max_entry_bytes no se guarda
+        self.assertFalse(cache.put(('f',), '"f"', b'x' * 61, 'application/json'))
+    
+    def test_etag_depends_on_key_and_version(self):
+        self.assertEqual(make_etag(('list',), 1), make_etag(('list',), 1))
+        self.assertNotEqual(make_etag(('list',), 1), make_etag(('list',), 2))
+        self.assertNotEqual(make_etag(('a',), 1), make_etag(('b',), 1))
+        self.assertTrue(make_etag(('a',), 1).startswith('"'))
+
+
+if __name__ == '__main__':
+    unittest.main()
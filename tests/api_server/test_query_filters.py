@@ -0,0 +1,80 @@
+import unittest
+import os
+import sys
+import copy
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.query_filters import QueryFilterError, apply_query, parse_fields, parse_predicates
+
+class TestQueryFilters(unittest.TestCase):
+    
+    def setUp(self):
+        # Snapshots de ejemplo con la estructura del recolector
+        self.records = [
+            {
+                'timestamp': '2025-06-27 12:00:00',
+                'hostname': 'web-1',
+                'cpu_info': {'avg_usage': 15.0, 'usage_percent': [10.0, 20.0]},
+                'processes': [
+                    {'pid': 1, 'name': 'nginx', 'cpu_percent': 12.5},
+                    {'pid': 2, 'name': 'python', 'cpu_percent': 3.0}
+                ]
+            },
+            {
+                'timestamp': '2025-06-27 12:05:00',
+                'hostname': 'web-1',
+                'cpu_info': {'avg_usage': 75.0, 'usage_percent': [70.0, 80.0]},
+                'processes': [
+                    {'pid': 1, 'name': 'nginx', 'cpu_percent': 60.0}
+                ]
+            }
+        ]
+    
+    def test_projection(self):
+        fields = parse_fields('cpu_info.avg_usage,timestamp,processes.name')
+        
+        result = list(apply_query(self.records, [], fields))
+        
+        self.assertEqual(result[0], {
+            'cpu_info': {'avg_usage': 15.0},
+            'timestamp': '2025-06-27 12:00:00',
+            'processes': [{'name': 'nginx'}, {'name': 'python'}]
+        })
+    
+    def test_projection_parent_field_wins(self):
+        self.assertEqual(parse_fields('cpu_info.avg_usage,cpu_info'), {'cpu_info': {}})
+        self.assertIsNone(parse_fields(''))
+    
+    def test_snapshot_predicate(self):
+        # Un predicado sobre un campo escalar filtra snapshots completos
+        result = list(apply_query(self.records, parse_predicates(['cpu_info.avg_usage>50']), None))
+        
+        self.assertEqual([r['timestamp'] for r in result], ['2025-06-27 12:05:00'])
+    
+    def test_list_predicate_filters_elements(self):
+        # Un predicado sobre una lista filtra sus elementos sin modificar el original
+        original = copy.deepcopy(self.records)
+        
+        result = list(apply_query(self.records, parse_predicates(['processes.cpu_percent>10']), None))
+        
+        self.assertEqual(len(result), 2)
+        self.assertEqual([p['name'] for p in result[0]['processes']], ['nginx'])
+        self.assertEqual(self.records, original)
+    
+    def test_string_predicates_and_combination(self):
+        predicates = parse_predicates(['processes.name=python', 'timestamp<2025-06-27 12:01:00'])
+        
+        result = list(apply_query(self.records, predicates, parse_fields('processes.pid')))
+        
+        self.assertEqual(result, [{'processes': [{'pid': 2}]}])
+    
+    def test_invalid_expressions(self):
+        with self.assertRaises(QueryFilterError):
+            parse_predicates(['cpu_info.avg_usage'])
+        with self.assertRaises(QueryFilterError):
+            parse_fields('cpu_info.avg usage')
+
+if __name__ == '__main__':
+    unittest.main()
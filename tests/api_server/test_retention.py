@@ -0,0 +1,107 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from datetime import date
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.storage import JSONLinesStorage
+from api_server.sqlite_storage import SQLiteStorage
+from api_server.retention import RetentionWorker, select_expired
+
+
+class TestSelectExpired(unittest.TestCase):
+
+    def setUp(self):
+        self.today = date(2025, 6, 30)
+        self.days = [
+            ('10.0.0.1', '2025-06-27', 100),
+            ('10.0.0.2', '2025-06-27', 100),
+            ('10.0.0.1', '2025-06-29', 100),
+            ('10.0.0.1', '2025-06-30', 500),
+        ]
+
+    def test_by_age(self):
+        self.assertEqual(select_expired(self.days, self.today, max_age_days=3),
+                         [('10.0.0.1', '2025-06-27'), ('10.0.0.2', '2025-06-27')])
+        self.assertEqual(select_expired(self.days, self.today, max_age_days=4), [])
+
+    def test_by_size_oldest_first_and_never_today(self):
+        self.assertEqual(select_expired(self.days, self.today, max_bytes=650),
+                         [('10.0.0.1', '2025-06-27'), ('10.0.0.2', '2025-06-27')])
+        # Aunque hoy solo supere el límite, el día en curso se conserva
+        self.assertEqual(len(select_expired(self.days, self.today, max_bytes=100)), 3)
+
+    def test_no_limits(self):
+        self.assertEqual(select_expired(self.days, self.today), [])
+
+
+class TestRetentionWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data_dir = tempfile.mkdtemp()
+        self.storage = JSONLinesStorage(self.test_data_dir, layout='daily')
+        self.record = {'ip_address': '10.0.0.1', 'timestamp': '2025-06-27 10:00:00', 'note': 'x' * 200}
+        for date_str in ('2025-06-27', '2025-06-28', '2025-06-29', '2025-06-30'):
+            self.storage.store_batch([self.record] * 10, date=date_str)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+
+    def _dates(self):
+        return [entry['date'] for entry in self.storage.list_available_data()['available_data']]
+
+    def test_run_once_deletes_and_compacts(self):
+        worker = RetentionWorker(self.storage, max_age_days=3, compact_after_days=1)
+        result = worker.run_once(date(2025, 6, 30))
+
+        self.assertTrue(result['success'])
+        self.assertEqual((result['deleted'], result['compacted']), (1, 2))
+        self.assertGreater(result['saved_bytes'], 0)
+        self.assertEqual(self._dates(), ['2025-06-28', '2025-06-29', '2025-06-30'])
+        self.assertFalse(os.path.exists(os.path.join(self.test_data_dir, '2025', '06', '27')))
+        # El día en curso no se compacta; los demás se siguen leyendo igual
+        self.assertEqual(len(self.storage.segment_paths('10.0.0.1', '2025-06-30')), 1)
+        self.assertEqual(self.storage.query_data('10.0.0.1', '2025-06-28')['data'], [self.record] * 10)
+
+        # La pasada siguiente solo revisa los días nuevos
+        self.assertEqual(worker.run_once(date(2025, 7, 1))['compacted'], 1)
+        self.assertEqual(worker.run_once(date(2025, 7, 1))['compacted'], 0)
+
+    def test_size_limit_uses_catalog_bytes(self):
+        sizes = {entry['date']: entry['bytes'] for entry in self.storage.list_available_data()['available_data']}
+        worker = RetentionWorker(self.storage, max_bytes=sizes['2025-06-29'] + sizes['2025-06-30'])
+
+        result = worker.run_once(date(2025, 6, 30))
+        self.assertEqual(result['freed_bytes'], sizes['2025-06-27'] + sizes['2025-06-28'])
+        self.assertEqual(self._dates(), ['2025-06-29', '2025-06-30'])
+
+    def test_sqlite_backend_deletes_without_compaction(self):
+        storage = SQLiteStorage(os.path.join(self.test_data_dir, 'sqlite'))
+        storage.store_batch([self.record], date='2025-06-27')
+        storage.store_batch([self.record], date='2025-06-30')
+
+        worker = RetentionWorker(storage, max_age_days=1, compact_after_days=1)
+        self.assertIsNone(worker.compact_after_days)
+        self.assertEqual(worker.run_once(date(2025, 6, 30))['deleted'], 1)
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            RetentionWorker(self.storage, compact_after_days=0)
+        with self.assertRaises(ValueError):
+            RetentionWorker(self.storage, max_age_days=0)
+
+    def test_background_thread(self):
+        worker = RetentionWorker(self.storage, max_age_days=1, interval=60)
+        worker.start()
+        worker.stop()
+        # La pasada inmediata del hilo eliminó todo salvo hoy (los días de prueba son pasados)
+        self.assertTrue(worker.last_result['success'])
+        self.assertEqual(self._dates(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+import datetime
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.metrics_store import MetricsStore
+from api_server.rollups import Rollups, choose_resolution
+
+
+class TestRollups(unittest.TestCase):
+    
+    def setUp(self):
+        self.test_data_dir = tempfile.mkdtemp()
+        self.metrics = MetricsStore(self.test_data_dir)
+        self.rollups = Rollups(self.metrics)
+        self.start = datetime.datetime(2025, 6, 27, 10, 0, 0)
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def snapshot(self, seconds, usage, processes=3):
+        return {
+            'ip_address': '192.168.1.100',
+            'timestamp': (self.start + datetime.timedelta(seconds=seconds)).isoformat(),
+            'cpu_info': {'avg_usage': usage},
+            'processes': [{'pid': n} for n in range(processes)]
+        }
+    
+    def test_minute_buckets(self):
+        # 20 snapshots en el minuto 10:00 con CPU 1..20 y uno en 10:01 sin CPU
+        self.metrics.append([self.snapshot(second, float(second // 2 + 1)) for second in range(0, 40, 2)])
+        self.metrics.append([{'ip_address': '192.168.1.100', 'timestamp': '2025-06-27T10:01:30', 'processes': []}])
+        
+        series = self.rollups.read('192.168.1.100', self.start, self.start + datetime.timedelta(hours=1), '1m')
+        self.assertEqual(series['ts'], [self.start.timestamp(), self.start.timestamp() + 60])
+        self.assertEqual(series['count'], [20.0, 1.0])
+        self.assertEqual(series['cpu_avg_min'], [1.0, None])
+        self.assertEqual(series['cpu_avg_max'], [20.0, None])
+        self.assertEqual(series['cpu_avg_avg'], [10.5, None])
+        # Percentil 95 por rango más cercano: el valor 19 de 20
+        self.assertEqual(series['cpu_avg_p95'], [19.0, None])
+        self.assertEqual(series['process_count_max'], [3.0, 0.0])
+    
+    def test_range_includes_overlapping_buckets(self):
+        self.metrics.append([self.snapshot(seconds, 50.0) for seconds in (0, 1800, 3600)])
+        
+        # El bucket de las 10:00 se solapa con un rango que empieza a las 10:30
+        series = self.rollups.read('192.168.1.100', self.start + datetime.timedelta(minutes=30),
+                                   self.start + datetime.timedelta(minutes=59), '1h', ['cpu_avg'])
+        self.assertEqual(series['ts'], [self.start.timestamp()])
+        self.assertEqual(series['count'], [2.0])
+        self.assertNotIn('process_count_min', series)
+        
+        with self.assertRaises(ValueError):
+            self.rollups.read('192.168.1.100', self.start, self.start, '5m')
+        with self.assertRaises(ValueError):
+            self.rollups.read('192.168.1.100', self.start, self.start, '1h', ['top_cpu_1'])
+    
+    def test_refresh_only_recomputes_changed_days(self):
+        self.metrics.append([self.snapshot(0, 10.0), self.snapshot(86400, 20.0)])
+        self.assertEqual(self.rollups.refresh_all(), 2)
+        
+        source = os.path.join(self.rollups.partition_dir('192.168.1.100', '2025-06-27'), '1d.f64')
+        modified = os.stat(source).st_mtime_ns
+        # Una escritura en el día siguiente no recalcula el anterior
+        self.metrics.append([self.snapshot(86460, 40.0)])
+        series = self.rollups.read('192.168.1.100', self.start, self.start + datetime.timedelta(days=2), '1d')
+        self.assertEqual(os.stat(source).st_mtime_ns, modified)
+        self.assertEqual(series['cpu_avg_max'], [10.0, 40.0])
+        self.assertEqual(series['count'], [1.0, 2.0])
+    
+    def test_choose_resolution(self):
+        day = datetime.timedelta(days=1)
+        self.assertEqual(choose_resolution(self.start, self.start + day, 1500), '1m')
+        self.assertEqual(choose_resolution(self.start, self.start + 30 * day, 1500), '1h')
+        self.assertEqual(choose_resolution(self.start, self.start + 365 * day, 1500), '1d')
+        self.assertEqual(choose_resolution(self.start, self.start + 365 * day, 10), '1d')
+
+
+if __name__ == '__main__':
+    unittest.main()
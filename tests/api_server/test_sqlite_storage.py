@@ -0,0 +1,136 @@
+import unittest
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime
+
+# Añadir directorio padre a la ruta para importar módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+
+from api_server.sqlite_storage import SQLiteStorage
+from api_server.storage import create_storage
+
+class TestSQLiteStorage(unittest.TestCase):
+    
+    def setUp(self):
+        # Crear un directorio temporal para pruebas
+        self.test_data_dir = tempfile.mkdtemp()
+        self.storage = SQLiteStorage(self.test_data_dir)
+        
+        self.test_ip = '192.168.1.100'
+        self.test_date = datetime.now().strftime('%Y-%m-%d')
+        self.test_data = {
+            'ip_address': self.test_ip,
+            'hostname': 'test-host',
+            'timestamp': '2025-06-27 12:00:00',
+            'cpu_info': {'avg_usage': 25.0}
+        }
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def test_store_and_query_data(self):
+        result = self.storage.store_data(self.test_data)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['file_path'], os.path.join(self.test_data_dir, 'prex.db'))
+        
+        result = self.storage.query_data(self.test_ip)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data'], [self.test_data])
+    
+    def test_query_data_stream(self):
+        for _ in range(300):
+            self.storage.store_data(self.test_data)
+        
+        result = self.storage.query_data(self.test_ip, stream=True)
+        
+        self.assertTrue(result['success'])
+        self.assertNotIsInstance(result['data'], list)
+        self.assertEqual(sum(1 for _ in result['data']), 300)
+    
+    def test_data_version_changes_only_for_written_day(self):
+        self.storage.store_data(self.test_data)
+        version = self.storage.data_version(self.test_ip, self.test_date)
+        listing = self.storage.listing_version()
+        self.assertEqual(version[0], 1)
+        
+        self.storage.store_data(dict(self.test_data, ip_address='10.0.0.1'))
+        self.assertEqual(self.storage.data_version(self.test_ip, self.test_date), version)
+        self.assertNotEqual(self.storage.listing_version(), listing)
+        self.storage.store_data(self.test_data)
+        self.assertNotEqual(self.storage.data_version(self.test_ip, self.test_date), version)
+    
+    def test_wal_mode(self):
+        mode = self.storage._connect().execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, 'wal')
+    
+    def test_query_nonexistent_date(self):
+        self.storage.store_data(self.test_data)
+        
+        result = self.storage.query_data(self.test_ip, '2000-01-01')
+        
+        self.assertFalse(result['success'])
+        self.assertIsNone(result['data'])
+    
+    def test_store_batch_and_query_range(self):
+        records = [dict(self.test_data, timestamp=f'2025-06-27 1{i}:00:00') for i in range(5)]
+        result = self.storage.store_batch(records, date='2025-06-27')
+        self.assertTrue(result['success'])
+        self.assertEqual(result['stored'], 5)
+        
+        result = self.storage.query_range(self.test_ip, datetime(2025, 6, 27, 11), datetime(2025, 6, 27, 13))
+        
+        self.assertTrue(result['success'])
+        self.assertEqual([r['timestamp'] for r in result['data']],
+                         ['2025-06-27 11:00:00', '2025-06-27 12:00:00', '2025-06-27 13:00:00'])
+        
+        result = self.storage.query_range(None, datetime(2025, 6, 27, 14), datetime(2025, 6, 27, 15),
+                                          hostname='other-host')
+        self.assertFalse(result['success'])
+    
+    def test_list_available_data(self):
+        self.storage.store_data(self.test_data)
+        self.storage.store_data(self.test_data)
+        self.storage.store_data(dict(self.test_data, ip_address='10.0.0.1'))
+        
+        result = self.storage.list_available_data()
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['available_data']), 2)
+        entry = next(item for item in result['available_data'] if item['ip_address'] == self.test_ip)
+        self.assertEqual(entry['records'], 2)
+        self.assertEqual(entry['date'], self.test_date)
+        
+        # Paginación y filtro por IP desde el catálogo
+        page = self.storage.list_available_data(limit=1)
+        self.assertEqual(len(page['available_data']), 1)
+        self.assertIsNotNone(page['next_cursor'])
+        page = self.storage.list_available_data(limit=1, cursor=page['next_cursor'])
+        self.assertIsNone(page['next_cursor'])
+        self.assertEqual(self.storage.list_available_data(ip_address='10.0.0.1')['available_data'][0]['records'], 1)
+        
+        # Una base anterior al catálogo lo reconstruye al abrirse
+        listing = self.storage.list_available_data()['available_data']
+        with self.storage._connect() as conn:
+            conn.execute("DROP TABLE catalog")
+        self.assertEqual(SQLiteStorage(self.test_data_dir).list_available_data()['available_data'], listing)
+    
+    def test_delete_day(self):
+        self.storage.store_batch([self.test_data, self.test_data], date='2025-06-27')
+        self.storage.store_batch([self.test_data], date='2025-06-28')
+        
+        result = self.storage.delete_day(self.test_ip, '2025-06-27')
+        self.assertTrue(result['success'])
+        self.assertGreater(result['bytes'], 0)
+        self.assertFalse(self.storage.query_data(self.test_ip, '2025-06-27')['success'])
+        self.assertEqual([entry['date'] for entry in self.storage.list_available_data()['available_data']], ['2025-06-28'])
+    
+    def test_create_storage(self):
+        self.assertIsInstance(create_storage('sqlite', data_dir=self.test_data_dir), SQLiteStorage)
+        # La distribución de los archivos no aplica a la base de datos
+        self.assertIsInstance(create_storage('sqlite', data_dir=self.test_data_dir, layout='daily'), SQLiteStorage)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,12 +4,21 @@ import sys
 import json
 import shutil
 import tempfile
-from datetime import datetime
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from datetime import datetime, timedelta
 
 # Añadir directorio padre a la ruta para importar módulos
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 
-from api_server.storage import JSONStorage
+from api_server.storage import JSONStorage, JSONLinesStorage, create_storage
+
+
+def _store_many(storage, data, count):
+    # Función auxiliar para escribir desde otro proceso (como un worker de gunicorn)
+    for _ in range(count):
+        storage.store_data(data)
 
 class TestJSONStorage(unittest.TestCase):
     
@@ -85,6 +94,16 @@ class TestJSONStorage(unittest.TestCase):
         self.assertEqual(len(result['data']), 1)  # Debería tener una entrada
         self.assertEqual(result['data'][0]['ip_address'], self.test_ip)
     
+    def test_query_data_stream(self):
+        self.storage.store_data(self.test_data)
+        self.storage.store_data(self.test_data)
+        
+        result = self.storage.query_data(self.test_ip, stream=True)
+        
+        self.assertTrue(result['success'])
+        self.assertNotIsInstance(result['data'], list)
+        self.assertEqual(list(result['data']), [self.test_data, self.test_data])
+    
     def test_query_nonexistent_ip(self):
         # Consultar datos para una IP inexistente
         result = self.storage.query_data('10.0.0.1')
@@ -122,6 +141,374 @@ class TestJSONStorage(unittest.TestCase):
         filenames = [item['filename'] for item in result['available_data']]
         self.assertIn(f"{self.test_ip}_{self.test_date}.json", filenames)
         self.assertIn(f"10.0.0.1_{self.test_date}.json", filenames)
+    
+    def test_list_available_data_from_catalog(self):
+        # IPv6 y hostnames con guion bajo, que el nombre de archivo no permite separar con split('_')
+        for ip_address in ('fe80::1', 'db_host_1', self.test_ip):
+            self.storage.store_data(dict(self.test_data, ip_address=ip_address))
+        self.storage.store_data(self.test_data)
+        
+        result = self.storage.list_available_data(limit=2)
+        self.assertEqual([item['ip_address'] for item in result['available_data']], ['192.168.1.100', 'db_host_1'])
+        result = self.storage.list_available_data(limit=2, cursor=result['next_cursor'])
+        self.assertEqual([item['ip_address'] for item in result['available_data']], ['fe80::1'])
+        self.assertIsNone(result['next_cursor'])
+        
+        entry = self.storage.list_available_data(ip_address=self.test_ip)['available_data'][0]
+        self.assertEqual(entry['records'], 2)
+        self.assertEqual(entry['bytes'], os.path.getsize(os.path.join(self.test_data_dir, entry['filename'])))
+        self.assertEqual(entry['first_timestamp'], datetime.fromisoformat(self.test_data['timestamp']).timestamp())
+        self.assertEqual(self.storage.list_available_data(start_date='2000-01-01', end_date='2000-12-31')['available_data'], [])
+        
+        # Un catálogo borrado se reconstruye igual a partir de los archivos
+        listing = self.storage.list_available_data()['available_data']
+        os.remove(os.path.join(self.test_data_dir, '.catalog.db'))
+        self.assertEqual(JSONStorage(self.test_data_dir).list_available_data()['available_data'], listing)
+    
+    @unittest.skipUnless(hasattr(os, 'fork'), 'requiere fork')
+    def test_store_data_multiple_processes(self):
+        # Varios procesos escribiendo la misma IP no deben perder registros
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_store_many, args=(self.storage, self.test_data, 10)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        
+        result = self.storage.query_data(self.test_ip)
+        self.assertEqual(len(result['data']), 40)
+    
+    def test_segments_roll_over_across_instances(self):
+        # Dos instancias (como dos workers) sobre el mismo directorio: ninguna debe
+        # seguir escribiendo en un segmento que la otra ya rotó
+        first = JSONLinesStorage(self.test_data_dir, max_segment_bytes=200)
+        second = JSONLinesStorage(self.test_data_dir, max_segment_bytes=200)
+        for i in range(20):
+            record = dict(self.test_data, seq=i)
+            (first if i < 10 or i % 2 else second).store_data(record)
+        
+        result = first.query_data(self.test_ip)
+        self.assertEqual([r['seq'] for r in result['data']], list(range(20)))
+        
+        for path in first.segment_paths(self.test_ip, self.test_date):
+            with open(path, 'rb') as f:
+                lines = f.readlines()
+            # Solo la última línea de un segmento puede superar el tamaño máximo
+            self.assertLess(sum(len(line) for line in lines[:-1]), 200)
+    
+    def test_store_data_concurrent_stress(self):
+        # Cientos de subidas concurrentes sobre pocas IPs no deben perder registros
+        ips = ['192.168.1.100', '10.0.0.1', '10.0.0.2']
+        records = [dict(self.test_data, ip_address=ips[i % len(ips)], seq=i) for i in range(300)]
+        
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            results = list(executor.map(self.storage.store_data, records))
+        
+        self.assertTrue(all(result['success'] for result in results))
+        stored = []
+        for ip in ips:
+            stored.extend(record['seq'] for record in self.storage.query_data(ip)['data'])
+        self.assertEqual(sorted(stored), list(range(300)))
+        # No deben quedar archivos temporales de escrituras atómicas
+        self.assertFalse([name for name in os.listdir(self.test_data_dir) if name.endswith('.tmp')])
+    
+    def test_store_data_matches_json_dump_format(self):
+        # El archivo debe seguir siendo idéntico al de json.dump(indent=2)
+        self.storage.store_data(self.test_data)
+        self.storage.store_data(self.test_data)
+        
+        expected_path = os.path.join(self.test_data_dir, f"{self.test_ip}_{self.test_date}.json")
+        with open(expected_path, 'r') as f:
+            content = f.read()
+        self.assertEqual(content, json.dumps([self.test_data, self.test_data], indent=2))
+    
+    def test_query_range(self):
+        now = datetime.now()
+        for minutes in (120, 60, 0):
+            self.storage.store_data(dict(self.test_data, timestamp=(now - timedelta(minutes=minutes)).isoformat()))
+        
+        result = self.storage.query_range(self.test_ip, now - timedelta(minutes=90), now)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['data']), 2)
+        
+        result = self.storage.query_range(self.test_ip, now - timedelta(days=3), now - timedelta(days=2))
+        self.assertFalse(result['success'])
+        self.assertIsNone(result['data'])
+    
+    def test_query_range_rebuilds_missing_index(self):
+        # Archivos escritos antes de existir los índices se indexan en la primera consulta
+        records = [dict(self.test_data, timestamp=f'{self.test_date} {hour:02d}:00:00', note='ñandú') for hour in range(4)]
+        expected_path = os.path.join(self.test_data_dir, f"{self.test_ip}_{self.test_date}.json")
+        with open(expected_path, 'w') as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+        
+        start = datetime.fromisoformat(f'{self.test_date} 01:00:00')
+        end = datetime.fromisoformat(f'{self.test_date} 02:00:00')
+        result = self.storage.query_range(self.test_ip, start, end)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(result['data'], records[1:3])
+        self.assertTrue(os.path.exists(expected_path + '.idx'))
+    
+    def test_index_rebuild_reads_file_in_chunks(self):
+        # El índice de un archivo heredado se construye por bloques, sin cargarlo
+        # completo; corchetes, comillas y escapes dentro de cadenas no deben confundirlo
+        records = [dict(self.test_data, seq=i, note='a"]}[\\ ñ' * i) for i in range(5)]
+        expected_path = os.path.join(self.test_data_dir, f"{self.test_ip}_{self.test_date}.json")
+        with open(expected_path, 'w') as f:
+            json.dump(records, f, ensure_ascii=False)
+        
+        with patch('api_server.record_index.SCAN_CHUNK_SIZE', 7):
+            result = self.storage.query_data(self.test_ip, stream=True)
+            self.assertEqual(list(result['data']), records)
+
+    def test_data_version_changes_only_for_written_day(self):
+        self.storage.store_data(self.test_data)
+        version = self.storage.data_version(self.test_ip, self.test_date)
+        other = self.storage.data_version('10.0.0.1', self.test_date)
+        self.assertEqual(len(version), 1)
+        
+        # Una escritura de otra IP no cambia la versión; una de la misma IP sí
+        self.storage.store_data(dict(self.test_data, ip_address='10.0.0.1'))
+        self.assertEqual(self.storage.data_version(self.test_ip, self.test_date), version)
+        self.assertNotEqual(self.storage.data_version('10.0.0.1', self.test_date), other)
+        self.storage.store_data(self.test_data)
+        self.assertNotEqual(self.storage.data_version(self.test_ip, self.test_date), version)
+    
+    def test_compact_day_then_late_write(self):
+        # El archivo JSON se compacta y una escritura posterior crea uno nuevo a su lado
+        self.storage.store_batch([dict(self.test_data, seq=0), dict(self.test_data, seq=1)], date='2025-06-27')
+        version = self.storage.data_version(self.test_ip, '2025-06-27')
+        self.assertEqual(self.storage.compact_day(self.test_ip, '2025-06-27')['records'], 2)
+        self.assertNotEqual(self.storage.data_version(self.test_ip, '2025-06-27'), version)
+        self.assertFalse(os.path.exists(os.path.join(self.test_data_dir, f"{self.test_ip}_2025-06-27.json")))
+        
+        self.storage.store_batch([dict(self.test_data, seq=2)], date='2025-06-27')
+        result = self.storage.query_data(self.test_ip, '2025-06-27')
+        self.assertEqual([record['seq'] for record in result['data']], [0, 1, 2])
+        self.assertEqual(self.storage.list_available_data()['available_data'][0]['records'], 3)
+
+class TestJSONLinesStorage(unittest.TestCase):
+    
+    def setUp(self):
+        # Crear un directorio temporal para pruebas
+        self.test_data_dir = tempfile.mkdtemp()
+        self.storage = JSONLinesStorage(self.test_data_dir)
+        
+        self.test_ip = '192.168.1.100'
+        self.test_date = datetime.now().strftime('%Y-%m-%d')
+        self.test_data = {
+            'ip_address': self.test_ip,
+            'hostname': 'test-host',
+            'timestamp': datetime.now().isoformat(),
+            'cpu_info': {'avg_usage': 25.0},
+            'processes': [{'pid': 1, 'name': 'process1'}]
+        }
+    
+    def tearDown(self):
+        shutil.rmtree(self.test_data_dir)
+    
+    def test_store_data_appends_lines(self):
+        # Cada escritura debe añadir exactamente una línea al segmento
+        self.storage.store_data(self.test_data)
+        result = self.storage.store_data(self.test_data)
+        
+        self.assertTrue(result['success'])
+        expected_path = os.path.join(self.test_data_dir, f"{self.test_ip}_{self.test_date}.0000.jsonl")
+        self.assertEqual(result['file_path'], expected_path)
+        with open(expected_path, 'r') as f:
+            lines = f.readlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0])['ip_address'], self.test_ip)
+    
+    def test_segments_roll_over(self):
+        # Con un tamaño máximo pequeño cada registro debe ir a un segmento nuevo
+        storage = JSONLinesStorage(self.test_data_dir, max_segment_bytes=10)
+        for _ in range(3):
+            storage.store_data(self.test_data)
+        
+        self.assertEqual(len(storage.segment_paths(self.test_ip, self.test_date)), 3)
+        
+        result = storage.query_data(self.test_ip)
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['data']), 3)
+    
+    def test_store_data_concurrent_stress(self):
+        # Las escrituras concurrentes no deben intercalar líneas ni desincronizar el índice
+        storage = JSONLinesStorage(self.test_data_dir, max_segment_bytes=4096)
+        records = [dict(self.test_data, ip_address=f'10.0.0.{i % 4}', seq=i) for i in range(400)]
+        
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            results = list(executor.map(storage.store_data, records))
+        
+        self.assertTrue(all(result['success'] for result in results))
+        start, end = datetime.now() - timedelta(hours=1), datetime.now() + timedelta(hours=1)
+        stored = []
+        for i in range(4):
+            by_day = storage.query_data(f'10.0.0.{i}')['data']
+            by_range = storage.query_range(f'10.0.0.{i}', start, end)['data']
+            self.assertEqual(len(by_day), len(by_range))
+            stored.extend(record['seq'] for record in by_day)
+        self.assertEqual(sorted(stored), list(range(400)))
+    
+    def test_query_reads_legacy_and_segments(self):
+        # Los archivos heredados se leen antes que los segmentos
+        legacy = dict(self.test_data, hostname='legacy-host')
+        with open(os.path.join(self.test_data_dir, f"{self.test_ip}_{self.test_date}.json"), 'w') as f:
+            json.dump([legacy], f, indent=2)
+        self.storage.store_data(self.test_data)
+        
+        result = self.storage.query_data(self.test_ip, self.test_date)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual([r['hostname'] for r in result['data']], ['legacy-host', 'test-host'])
+    
+    def test_query_nonexistent_ip(self):
+        result = self.storage.query_data('10.0.0.1')
+        self.assertFalse(result['success'])
+        self.assertIsNone(result['data'])
+    
+    def test_query_invalid_date(self):
+        result = self.storage.query_data(self.test_ip, '2025/01/01')
+        self.assertFalse(result['success'])
+        self.assertIn('Invalid date format', result['message'])
+    
+    def test_list_available_data_groups_segments(self):
+        storage = JSONLinesStorage(self.test_data_dir, max_segment_bytes=10)
+        storage.store_data(self.test_data)
+        storage.store_data(self.test_data)
+        storage.store_data(dict(self.test_data, ip_address='10.0.0.1'))
+        
+        result = storage.list_available_data()
+        
+        self.assertTrue(result['success'])
+        self.assertEqual(len(result['available_data']), 2)
+        entry = next(item for item in result['available_data'] if item['ip_address'] == self.test_ip)
+        self.assertEqual(entry['segments'], 2)
+        self.assertEqual(entry['date'], self.test_date)
+        self.assertEqual(entry['records'], 2)
+        self.assertEqual(entry['filename'], f"{self.test_ip}_{self.test_date}.0000.jsonl")
+        
+        # La reconstrucción desde los segmentos coincide con el catálogo mantenido en cada escritura
+        listing = storage.list_available_data()['available_data']
+        self.assertEqual(storage.rebuild_catalog(), 2)
+        self.assertEqual(storage.list_available_data()['available_data'], listing)
+    
+    def test_query_range_across_days(self):
+        # Un rango de varios días combina los segmentos de cada día
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        self.storage.append_records(self.test_ip, yesterday, [dict(self.test_data, timestamp=f'{yesterday} 23:00:00')])
+        self.storage.store_data(dict(self.test_data, timestamp=f'{self.test_date} 01:00:00'))
+        self.storage.store_data(dict(self.test_data, timestamp=f'{self.test_date} 02:00:00'))
+        
+        start = datetime.fromisoformat(f'{yesterday} 22:00:00')
+        end = datetime.fromisoformat(f'{self.test_date} 01:30:00')
+        result = self.storage.query_range(self.test_ip, start, end)
+        
+        self.assertTrue(result['success'])
+        self.assertEqual([r['timestamp'] for r in result['data']],
+                         [f'{yesterday} 23:00:00', f'{self.test_date} 01:00:00'])
+    
+    def test_query_range_indexes_unindexed_segments(self):
+        # Segmentos escritos sin índice (por ejemplo, migrados) se indexan al consultarlos
+        path = self.storage.segment_path(self.test_ip, self.test_date, 0)
+        with open(path, 'w') as f:
+            f.write(json.dumps(dict(self.test_data, timestamp=f'{self.test_date} 10:00:00')) + '\n')
+        
+        start = datetime.fromisoformat(f'{self.test_date} 09:00:00')
+        end = datetime.fromisoformat(f'{self.test_date} 11:00:00')
+        self.assertEqual(len(self.storage.query_range(self.test_ip, start, end)['data']), 1)
+        self.assertTrue(os.path.exists(path + '.idx'))
+        
+        # Los registros añadidos después se incorporan al índice existente
+        self.storage.store_data(dict(self.test_data, timestamp=f'{self.test_date} 10:30:00'))
+        self.assertEqual(len(self.storage.query_range(self.test_ip, start, end)['data']), 2)
+    
+    def test_daily_layout_keeps_days_together(self):
+        # Con la distribución diaria los archivos nuevos van a data/YYYY/MM/DD/
+        storage = JSONLinesStorage(self.test_data_dir, layout='daily')
+        path = storage.store_data(self.test_data)['file_path']
+        self.assertEqual(os.path.dirname(path), os.path.join(self.test_data_dir, *self.test_date.split('-')))
+        
+        # Un día que ya tenía archivos en data/ se sigue escribiendo y leyendo allí
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        self.storage.append_records(self.test_ip, yesterday, [self.test_data])
+        storage.append_records(self.test_ip, yesterday, [self.test_data])
+        self.assertEqual(len(self.storage.segment_paths(self.test_ip, yesterday)), 1)
+        self.assertEqual(len(storage.query_data(self.test_ip, yesterday)['data']), 2)
+        
+        # El catálogo reconstruido incluye los días de ambos directorios
+        self.assertEqual(storage.rebuild_catalog(), 2)
+        with self.assertRaises(ValueError):
+            JSONLinesStorage(self.test_data_dir, layout='hashed')
+    
+    def test_compact_day_is_read_transparently(self):
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        records = [dict(self.test_data, timestamp=f'{yesterday} 10:{minute:02d}:00', seq=minute) for minute in range(40)]
+        self.storage.append_records(self.test_ip, yesterday, records[:20])
+        self.storage.append_records(self.test_ip, yesterday, records[20:])
+        
+        result = self.storage.compact_day(self.test_ip, yesterday, block_size=512)
+        self.assertTrue(result['success'])
+        self.assertEqual(result['records'], 40)
+        self.assertLess(result['bytes_after'], result['bytes_before'])
+        self.assertEqual(self.storage.segment_paths(self.test_ip, yesterday), [])
+        
+        # Consultas por día, en streaming y por rango sobre el archivo compactado
+        self.assertEqual(self.storage.query_data(self.test_ip, yesterday)['data'], records)
+        self.assertEqual(list(self.storage.query_data(self.test_ip, yesterday, stream=True)['data']), records)
+        start = datetime.fromisoformat(f'{yesterday} 10:15:00')
+        end = datetime.fromisoformat(f'{yesterday} 10:17:00')
+        self.assertEqual([r['seq'] for r in self.storage.query_range(self.test_ip, start, end)['data']], [15, 16, 17])
+        
+        entry = self.storage.list_available_data()['available_data'][0]
+        self.assertEqual((entry['filename'], entry['records'], entry['segments']),
+                         (f'{self.test_ip}_{yesterday}.jsonl.gz', 40, 0))
+        
+        # Una escritura tardía se lee después del compactado y se incorpora al recompactar
+        self.storage.append_records(self.test_ip, yesterday, [records[0]])
+        self.assertEqual(self.storage.query_data(self.test_ip, yesterday)['data'], records + [records[0]])
+        self.assertEqual(self.storage.compact_day(self.test_ip, yesterday)['records'], 41)
+        self.assertEqual(self.storage.compact_day(self.test_ip, yesterday)['records'], 0)
+        self.assertEqual(self.storage.list_available_data()['available_data'][0]['records'], 41)
+    
+    def test_compact_day_completes_interrupted_run(self):
+        # Compactación interrumpida tras el marcador: la siguiente llamada no duplica registros
+        yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        records = [dict(self.test_data, seq=index) for index in range(5)]
+        segment = self.storage.append_records(self.test_ip, yesterday, records)
+        
+        path = os.path.join(self.test_data_dir, f'{self.test_ip}_{yesterday}.jsonl.gz')
+        from api_server.compaction import write_compacted
+        write_compacted(path, self.storage.iter_records(self.test_ip, yesterday))
+        with open(path + '.compacting', 'w') as f:
+            json.dump({"sources": [os.path.basename(segment)], "records": 5}, f)
+        
+        self.assertTrue(self.storage.compact_day(self.test_ip, yesterday)['success'])
+        self.assertFalse(os.path.exists(segment))
+        self.assertFalse(os.path.exists(path + '.compacting'))
+        self.assertEqual(self.storage.query_data(self.test_ip, yesterday)['data'], records)
+        self.assertEqual(self.storage.list_available_data()['available_data'][0]['records'], 5)
+    
+    def test_delete_day(self):
+        storage = JSONLinesStorage(self.test_data_dir, layout='daily')
+        path = storage.store_data(self.test_data)['file_path']
+        
+        result = storage.delete_day(self.test_ip, self.test_date)
+        self.assertTrue(result['success'])
+        self.assertGreater(result['bytes'], 0)
+        self.assertFalse(storage.query_data(self.test_ip)['success'])
+        self.assertEqual(storage.list_available_data()['available_data'], [])
+        # Los directorios del día vacíos también se eliminan
+        self.assertFalse(os.path.exists(os.path.join(self.test_data_dir, self.test_date[:4])))
+        self.assertFalse(os.path.exists(path + '.idx'))
+    
+    def test_create_storage(self):
+        self.assertIsInstance(create_storage('jsonl', data_dir=self.test_data_dir), JSONLinesStorage)
+        self.assertEqual(create_storage('jsonl', data_dir=self.test_data_dir, layout='daily').layout, 'daily')
+        with self.assertRaises(ValueError):
+            create_storage('unknown', data_dir=self.test_data_dir)
 
 if __name__ == '__main__':
     unittest.main()